@@ -1,3 +1,4 @@
+import multiprocessing
 import os
 import warnings
 import sys
@@ -14,6 +15,10 @@ warnings.filterwarnings("ignore")
 QtWidgets.QApplication.setAttribute(QtCore.Qt.AA_EnableHighDpiScaling, True)
 
 if __name__ == "__main__":
+    # DVHs are calculated on a pool of processes, which need to start
+    # without running the application again in frozen builds
+    multiprocessing.freeze_support()
+
     # logging.basicConfig(level=logging.DEBUG, format='%(levelname)s: %(filename)s - %(funcName)s - %(lineno)d : %(asctime)s - %(message)s')
 
     # On some configurations error traceback is not being displayed
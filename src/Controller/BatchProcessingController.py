@@ -1,7 +1,17 @@
 import datetime
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
 import threading
+import time
+from pathlib import Path
 from PySide6.QtCore import QThreadPool
 from src.Model.DICOM import DICOMDirectorySearch
+from src.Model.DICOM.DICOMScanIndex import ScanIndex
+from src.Model.batchprocessing.BatchJournal import INCOMPLETE_STATUSES, \
+    BatchJournal, get_changed_files, get_files_fingerprint, get_files_state
 from src.Model.batchprocessing.BatchProcessClinicalDataSR2CSV import \
     BatchProcessClinicalDataSR2CSV
 from src.Model.batchprocessing.BatchProcessCSV2ClinicalDataSR import \
@@ -28,6 +38,8 @@ from src.Model.batchprocessing. \
     import BatchprocessMachineLearningDataSelection
 from src.Model.batchprocessing.BatchProcessMachineLearning import \
     BatchProcessMachineLearning
+from src.Model.batchprocessing.PatientProcessPool import PATIENT_SUCCESS, \
+    merge_csv_files, process_patients
 from src.Model.DICOM.Structure.DICOMSeries import Series
 from src.Model.DICOM.Structure.DICOMImage import Image
 from src.Model.PatientDictContainer import PatientDictContainer
@@ -40,6 +52,46 @@ import pandas as pd
 import kaplanmeier as km
 import matplotlib.pyplot as plt
 
+# Processes that are not performed one after another on each patient
+NON_PATIENT_PROCESSES = ("roinamecleaning", "select_subgroup",
+                        "machine_learning", "machine_learning_data_selection",
+                        "kaplanmeier")
+
+
+def process_patient_in_worker(controller, patient, staging_directory,
+                              processes, interrupt_flag, progress_callback):
+    """
+    Perform the selected processes on a patient in a patient process of
+    the PatientProcessPool. The CSV files of the patient are written to a
+    staging directory, to be merged with those of the other patients. The
+    journal record of each process is reported as soon as the process is
+    done, so the processes that were done are known even if the patient
+    fails or is stopped part way.
+    :param controller: The BatchProcessingController of the batch.
+    :param patient: The patient to perform the processes on.
+    :param staging_directory: Directory to write the patient's CSV files
+                              to.
+    :param processes: The processes to perform on the patient.
+    :param interrupt_flag: A multiprocessing.Event() object that tells the
+                           processes to stop.
+    :param progress_callback: Object with emit() and report() methods that
+                              receive the current progress of the
+                              processes, and the name and journal record of
+                              each process that is done.
+    :return: Dictionary of the process names and statuses of the patient.
+    """
+    staging_directory = Path(staging_directory)
+    for name in ("dvh", "pyrad", "clinical"):
+        staging_directory.joinpath(name).mkdir(parents=True, exist_ok=True)
+    controller.dvh_output_path = str(staging_directory.joinpath("dvh"))
+    controller.pyrad_output_path = staging_directory.joinpath("pyrad")
+    controller.clinical_data_output_path = \
+        str(staging_directory.joinpath("clinical"))
+    controller.record_callback = \
+        lambda process, record: progress_callback.report((process, record))
+    return controller.process_patient(interrupt_flag, progress_callback,
+                                      patient, processes)
+
 
 class BatchProcessingController:
     """
@@ -83,10 +135,59 @@ class BatchProcessingController:
 
         self.machine_learning_process = None
 
+        # Number of patients processed at a time (None for one per core),
+        # and seconds each patient may take (None for no limit)
+        self.worker_count = None
+        self.patient_timeout = None
+
+        # Whether to skip the processes the batch journal records as
+        # completed on unchanged patients, the journal records of the
+        # patient being processed, and a function called with the name and
+        # journal record of each process once it is done
+        self.resume = False
+        self.journal_records = {}
+        self.record_callback = None
+
+        self.process_functions = self.get_process_functions()
+
         # Threadpool for file loading
         self.threadpool = QThreadPool()
         self.interrupt_flag = threading.Event()
 
+    def __getstate__(self):
+        """
+        The controller is sent to each patient process without its Qt
+        objects and the DICOM structure of the other patients.
+        """
+        state = self.__dict__.copy()
+        for name in ("progress_window", "threadpool", "interrupt_flag",
+                     "process_functions", "machine_learning_process",
+                     "dicom_structure"):
+            state[name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.process_functions = self.get_process_functions()
+
+    def get_process_functions(self):
+        """
+        :return: Dictionary of process names and the functions performing
+                 them on a patient.
+        """
+        return {
+            "select_subgroup": self.batch_select_subgroup_handler,
+            "iso2roi": self.batch_iso2roi_handler,
+            "suv2roi": self.batch_suv2roi_handler,
+            "dvh2csv": self.batch_dvh2csv_handler,
+            "pyrad2csv": self.batch_pyrad2csv_handler,
+            "pyrad2pyrad-sr": self.batch_pyrad2pyradsr_handler,
+            "csv2clinicaldata-sr": self.batch_csv2clinicaldatasr_handler,
+            "clinicaldata-sr2csv": self.batch_clinicaldatasr2csv_handler,
+            "roiname2fmaid": self.batch_roiname2fmaid_handler,
+            "fmaid2roiname": self.batch_fmaid2roiname_handler,
+        }
+
     def set_file_paths(self, file_paths):
         """
         Sets all the required paths
@@ -107,6 +208,54 @@ class BatchProcessingController:
         """
         self.processes = processes
 
+    def set_worker_count(self, worker_count):
+        """
+        Sets the number of patients processed at a time.
+        :param worker_count: Number of patient processes, or None for one
+                             per available core.
+        """
+        self.worker_count = worker_count
+
+    def set_patient_timeout(self, patient_timeout):
+        """
+        Sets the time each patient may take before it is stopped.
+        :param patient_timeout: Seconds, or None for no limit.
+        """
+        self.patient_timeout = patient_timeout
+
+    def set_resume(self, resume):
+        """
+        Sets whether the processes completed on unchanged patients by
+        previous batches are skipped.
+        :param resume: True to skip them, False to perform every process.
+        """
+        self.resume = resume
+
+    def get_process_settings(self, process, patient):
+        """
+        Get the settings a process is performed on a patient with, for the
+        batch journal. A process is only skipped when resuming if it was
+        completed with the same settings.
+        :param process: Name of the process.
+        :param patient: The patient to perform the process on.
+        :return: The settings as a JSON string.
+        """
+        if process == "select_subgroup":
+            settings = self.subgroup_filter_options
+        elif process == "suv2roi":
+            settings = (self.suv2roi_weights or {}).get(patient.patient_id)
+        elif process == "dvh2csv":
+            settings = self.dvh_output_path
+        elif process == "pyrad2csv":
+            settings = self.pyrad_output_path
+        elif process == "csv2clinicaldata-sr":
+            settings = self.clinical_data_input_path
+        elif process == "clinicaldata-sr2csv":
+            settings = self.clinical_data_output_path
+        else:
+            settings = None
+        return json.dumps(settings, default=str, sort_keys=True)
+
     def set_suv2roi_weights(self, suv2roi_weights):
         """
         Function used to set suv2roi_weights.
@@ -150,7 +299,8 @@ class BatchProcessingController:
         worker = Worker(DICOMDirectorySearch.get_dicom_structure,
                         path,
                         self.interrupt_flag,
-                        progress_callback=True)
+                        progress_callback=True,
+                        scan_index=ScanIndex())
 
         # Connect callbacks
         worker.signals.result.connect(search_complete_callback)
@@ -250,7 +400,9 @@ class BatchProcessingController:
 
     def perform_processes(self, interrupt_flag, progress_callback=None):
         """
-        Performs each selected process to each selected patient.
+        Performs each selected process to each selected patient. Patients
+        are processed at the same time, on a bounded number of patient
+        processes.
         :param interrupt_flag: A threading.Event() object that tells the
                                function to stop loading.
         :param progress_callback: A signal that receives the current
@@ -259,61 +411,108 @@ class BatchProcessingController:
         # Clear batch summary
         self.batch_summary = [{}, ""]
 
-        # Dictionary of process names and functions
-        self.process_functions = {
-            "select_subgroup": self.batch_select_subgroup_handler,
-            "iso2roi": self.batch_iso2roi_handler,
-            "suv2roi": self.batch_suv2roi_handler,
-            "dvh2csv": self.batch_dvh2csv_handler,
-            "pyrad2csv": self.batch_pyrad2csv_handler,
-            "pyrad2pyrad-sr": self.batch_pyrad2pyradsr_handler,
-            "csv2clinicaldata-sr": self.batch_csv2clinicaldatasr_handler,
-            "clinicaldata-sr2csv": self.batch_clinicaldatasr2csv_handler,
-            "roiname2fmaid": self.batch_roiname2fmaid_handler,
-            "fmaid2roiname": self.batch_fmaid2roiname_handler,
-        }
-
-        patient_count = len(self.dicom_structure.patients)
-        cur_patient_num = 0
         self.timestamp = self.create_timestamp()
-
-        # Loop through each patient
+        journal = self.open_journal()
+        selected_processes = [process for process in self.processes
+                              if process in self.process_functions]
+
+        # When resuming, the processes the journal records as completed
+        # with the same settings on the same files are skipped
+        patient_summaries = {}
+        patients = []
+        patient_processes = []
         for patient in self.dicom_structure.patients.values():
-            # Stop loading
-            if interrupt_flag.is_set():
-                # TODO: convert print to logging
-                print("Stopped Batch Processing")
-                PatientDictContainer().clear()
-                return False
-
-            cur_patient_num += 1
-
-            progress_callback.emit(("Loading patient ({}/{}) .. ".format(
-                cur_patient_num, patient_count), 20))
-
-            if "select_subgroup" in self.processes:
-                in_subgroup = self.process_functions["select_subgroup"](
-                    interrupt_flag,
-                    progress_callback,
-                    patient
-                )
-
-                if not in_subgroup:
-                    # dont complete processes on this patient
+            processes = selected_processes
+            if self.resume and journal is not None:
+                try:
+                    completed = journal.get_completed_processes(
+                        patient.patient_id,
+                        {process: self.get_process_settings(process,
+                                                            patient)
+                         for process in selected_processes
+                         if process != "select_subgroup"},
+                        get_files_fingerprint(patient.get_files()))
+                except sqlite3.Error:
+                    logging.exception("Could not read the batch journal")
+                    completed = set()
+                patient_summaries[patient] = {
+                    process: "RESUMED" for process in selected_processes
+                    if process in completed}
+                processes = [process for process in selected_processes
+                             if process not in completed]
+                if not set(processes) - {"select_subgroup"}:
                     continue
+            patients.append(patient)
+            patient_processes.append(processes)
+        patient_count = len(patients)
+
+        # CSV rows are written to a staging directory for each patient.
+        # Once every earlier patient is done, they are merged in patient
+        # order and the patient is recorded in the journal, so a batch
+        # that stops part way only has to redo the unfinished patients.
+        staging_directory = Path(tempfile.mkdtemp(prefix="onkodicom_batch_"))
+        results = {}
+        patient_records = {}
+        next_index = 0
+
+        def finish_patients():
+            nonlocal next_index
+            while next_index in results:
+                self.finish_patient(
+                    journal, patients[next_index], patient_processes[
+                        next_index], results.pop(next_index),
+                    patient_records.pop(next_index, {}),
+                    staging_directory.joinpath(str(next_index)),
+                    patient_summaries)
+                next_index += 1
+
+        def patient_progress(index, progress):
+            text, percentage = progress
+            progress_callback.emit(("Patient ({}/{}): {}".format(
+                index + 1, patient_count, text), percentage))
+
+        def patient_report(index, report):
+            process, record = report
+            patient_records.setdefault(index, {})[process] = record
+
+        def patient_completed(index, result, completed, total):
+            results[index] = result
+            finish_patients()
+            progress_callback.emit(("Completed patient ({}/{}) .. ".format(
+                completed, total), int(completed * 100 / total)))
+
+        progress_callback.emit(("Loading patients ({}) .. ".format(
+            patient_count), 20))
+
+        try:
+            patient_args = [
+                (self, patient, staging_directory.joinpath(str(index)),
+                 patient_processes[index])
+                for index, patient in enumerate(patients)]
+            for index, result in enumerate(process_patients(
+                    process_patient_in_worker, patient_args, interrupt_flag,
+                    worker_count=self.worker_count,
+                    timeout=self.patient_timeout,
+                    progress_callback=patient_progress,
+                    report_callback=patient_report,
+                    completed_callback=patient_completed)):
+                # Patients that were never started
+                if index >= next_index:
+                    results.setdefault(index, result)
+            finish_patients()
+        finally:
+            shutil.rmtree(staging_directory, ignore_errors=True)
 
-            # Perform processes on patient
-            for process in self.processes:
-                if process in ["roinamecleaning",
-                               "select_subgroup",
-                               "machine_learning",
-                               "machine_learning_data_selection",
-                               "kaplanmeier"]:
-                    continue
+        for patient in self.dicom_structure.patients.values():
+            if patient_summaries.get(patient):
+                self.batch_summary[0][patient] = patient_summaries[patient]
 
-                self.process_functions[process](interrupt_flag,
-                                                progress_callback,
-                                                patient)
+        # Stop loading
+        if interrupt_flag.is_set():
+            # TODO: convert print to logging
+            print("Stopped Batch Processing")
+            PatientDictContainer().clear()
+            return False
 
         # Perform batch ROI Name Cleaning on all patients
         if 'roinamecleaning' in self.processes:
@@ -365,6 +564,198 @@ class BatchProcessingController:
 
         PatientDictContainer().clear()
 
+    def open_journal(self):
+        """
+        Opens the batch journal next to the outputs of the batch, in the
+        first of the output directories (or the batch directory) it can be
+        opened in, as the batch directory may be read-only.
+        :return: The BatchJournal, or None if it could not be opened in
+                 any of the directories.
+        """
+        for directory in (self.dvh_output_path, self.pyrad_output_path,
+                          self.clinical_data_output_path, self.batch_path):
+            if not directory:
+                continue
+            try:
+                return BatchJournal(directory)
+            except sqlite3.Error as error:
+                logging.warning("Could not open the batch journal in %s: %s",
+                                directory, error)
+        logging.warning("Batch processing without a journal")
+        return None
+
+    def finish_patient(self, journal, patient, processes, result, records,
+                       staging_directory, patient_summaries):
+        """
+        Merges the CSV files of the processes that were completed on a
+        patient into those of the batch, and records the patient's
+        processes in the batch journal. If the patient failed or was
+        stopped, the processes that were not done are recorded with the
+        status of the patient.
+        :param journal: The BatchJournal of the batch, or None if the
+                        batch has no journal.
+        :param patient: The patient that is done.
+        :param processes: The processes that were performed on the patient.
+        :param result: The (status, result) tuple of the patient process.
+        :param records: Dictionary of the name of each process that was
+                        done to its journal record, as reported by the
+                        patient process.
+        :param staging_directory: Directory the patient's CSV files were
+                                  written to.
+        :param patient_summaries: Dictionary of each patient to the
+                                  dictionary of process name and status of
+                                  the patient, which is updated.
+        """
+        output_directories = (
+            (staging_directory.joinpath("dvh"), self.dvh_output_path),
+            (staging_directory.joinpath("pyrad"), self.pyrad_output_path),
+            (staging_directory.joinpath("clinical"),
+             self.clinical_data_output_path))
+
+        # The files written next to the patient's files are found by the
+        # next directory search, so they are part of the fingerprint
+        patient_files = patient.get_files()
+        staged_paths = []
+        for record in records.values():
+            artefacts = []
+            for path in record["artefacts"]:
+                for staged_directory, output_directory in output_directories:
+                    if Path(path).is_relative_to(staged_directory):
+                        # Staged rows are merged into the batch's CSV files,
+                        # unless the process was stopped part way
+                        if record["status"] not in INCOMPLETE_STATUSES:
+                            staged_paths.append(path)
+                        path = str(Path(output_directory).joinpath(
+                            Path(path).relative_to(staged_directory)))
+                        break
+                else:
+                    patient_files.append(path)
+                artefacts.append(path)
+            record["artefacts"] = artefacts
+        for staged_directory, output_directory in output_directories:
+            merge_csv_files(staged_directory, output_directory, staged_paths)
+
+        status, patient_result = result
+        patient_summary = patient_summaries.setdefault(patient, {})
+        if status == PATIENT_SUCCESS:
+            patient_summary.update(patient_result)
+        else:
+            for process in processes:
+                records.setdefault(process, {"status": status})
+            patient_summary.update(
+                {process: record["status"]
+                 for process, record in records.items()})
+
+        if journal is None:
+            return
+        for process, record in records.items():
+            record["settings"] = self.get_process_settings(process, patient)
+        try:
+            # The skipped processes are recorded again with the new
+            # fingerprint, in case the other processes changed the files
+            entries = journal.get_entries(patient.patient_id)
+            for process in patient_summary:
+                if patient_summary[process] == "RESUMED" \
+                        and process in entries:
+                    records[process] = entries[process]
+            journal.record(patient.patient_id, records,
+                           get_files_fingerprint(patient_files))
+        except sqlite3.Error:
+            logging.exception("Could not record patient %s in the batch "
+                              "journal", patient.patient_id)
+
+    def process_patient(self, interrupt_flag, progress_callback, patient,
+                        processes=None):
+        """
+        Performs each selected process to a patient.
+        :param interrupt_flag: A threading.Event() object that tells the
+                               function to stop loading.
+        :param progress_callback: A signal that receives the current
+                                  progress of the loading.
+        :param patient: The patient to perform the processes on.
+        :param processes: The processes to perform, or None for every
+                          selected process.
+        :return: Dictionary of process name and status of the patient.
+        """
+        if processes is None:
+            processes = self.processes
+        self.journal_records = {}
+
+        if "select_subgroup" in processes:
+            in_subgroup = self.perform_process(
+                "select_subgroup",
+                interrupt_flag,
+                progress_callback,
+                patient
+            )
+
+            if not in_subgroup:
+                # dont complete processes on this patient
+                return self.batch_summary[0].get(patient, {})
+
+        # Perform processes on patient
+        for process in processes:
+            if process in NON_PATIENT_PROCESSES:
+                continue
+
+            # Stop loading
+            if interrupt_flag.is_set():
+                PatientDictContainer().clear()
+                break
+
+            self.perform_process(process, interrupt_flag, progress_callback,
+                                 patient)
+
+        return self.batch_summary[0].get(patient, {})
+
+    def perform_process(self, process, interrupt_flag, progress_callback,
+                        patient):
+        """
+        Performs a process on a patient, and keeps the journal record of
+        its status, when it started and finished, and the files it wrote.
+        :param process: Name of the process.
+        :param interrupt_flag: A threading.Event() object that tells the
+                               function to stop loading.
+        :param progress_callback: A signal that receives the current
+                                  progress of the loading.
+        :param patient: The patient to perform the process on.
+        :return: The return value of the process's handler.
+        """
+        # Processes write next to the patient's files, or to the output
+        # directories
+        patient_files = patient.get_files()
+        directories = {Path(path).parent for path in patient_files}
+        if patient_files:
+            directories.add(Path(os.path.commonpath(patient_files)))
+        output_directories = [
+            path for path in (self.dvh_output_path, self.pyrad_output_path,
+                              self.clinical_data_output_path) if path]
+        files_state = {**get_files_state(directories),
+                       **get_files_state(output_directories, True)}
+        patient_summary = dict(self.batch_summary[0].get(patient, {}))
+
+        started = time.time()
+        result = self.process_functions[process](interrupt_flag,
+                                                 progress_callback,
+                                                 patient)
+        finished = time.time()
+
+        new_files_state = {**get_files_state(directories),
+                           **get_files_state(output_directories, True)}
+        statuses = [
+            status for name, status in
+            self.batch_summary[0].get(patient, {}).items()
+            if patient_summary.get(name) != status]
+        self.journal_records[process] = {
+            "status": statuses[-1] if statuses else "SUCCESS",
+            "started": started,
+            "finished": finished,
+            "artefacts": get_changed_files(files_state, new_files_state)
+        }
+        if self.record_callback is not None:
+            self.record_callback(process, self.journal_records[process])
+        return result
+
     def update_rtss(self, patient):
         """
         Updates the patient dict container with the newly created RTSS (if a
@@ -1,3 +1,4 @@
+import threading
 from shutil import which
 
 from PySide6 import QtCore, QtWidgets, QtGui
@@ -8,6 +9,7 @@ from src.Model.InitialModel import create_initial_model
 from src.Model.MovingDictContainer import MovingDictContainer
 from src.Model.MovingModel import read_images_for_fusion
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.Worker import Worker
 from src.View.BatchProcessingWindow import UIBatchProcessingWindow
 from src.View.FirstTimeWelcomeWindow import UIFirstTimeWelcomeWindow
 from src.View.ImageFusion.ImageFusionWindow import UIImageFusionWindow
@@ -208,9 +210,93 @@ class MainWindow(QtWidgets.QMainWindow, UIMainWindow):
         self.image_fusion_signal.emit()
 
     def update_image_fusion_ui(self):
+        """
+        Registers the moving image to the fixed image on a separate
+        thread. The VTKEngine of the image fusion views is given the
+        transforms of the registration as it converges, and the final
+        transform when it finishes. ROI transfer and manual fusion are
+        blocked until the registration finishes or is stopped, as both
+        use the transform of the VTKEngine.
+        """
         mvd = MovingDictContainer()
         if not mvd.is_empty():
-            read_images_for_fusion()
+            interrupt_flag = threading.Event()
+            vtk_engine = self._get_vtk_engine_from_images()
+
+            def set_transform(transform, final=False):
+                # Transforms still queued from a stopped registration
+                # are not shown
+                if transform is not None and not interrupt_flag.is_set():
+                    self.set_image_fusion_transform(vtk_engine, transform,
+                                                    final)
+
+            def registration_finished():
+                if not interrupt_flag.is_set():
+                    self.image_fusion_interrupt_flag = None
+                    self.block_image_fusion_edits(False)
+
+            worker = Worker(read_images_for_fusion,
+                            interrupt_flag=interrupt_flag,
+                            progress_callback=True)
+            worker.signals.progress.connect(set_transform)
+            worker.signals.result.connect(
+                lambda transform: set_transform(transform, True))
+            worker.signals.finished.connect(registration_finished)
+            self.image_fusion_interrupt_flag = interrupt_flag
+            self.block_image_fusion_edits(True)
+            self.image_fusion_threadpool = QtCore.QThreadPool()
+            self.image_fusion_threadpool.start(worker)
+
+    def stop_image_fusion_registration(self):
+        """
+        Stops a registration that is still running, and waits for it to
+        stop so it does not write into the cleared containers.
+        """
+        if getattr(self, 'image_fusion_interrupt_flag', None) is not None:
+            self.image_fusion_interrupt_flag.set()
+            self.image_fusion_threadpool.waitForDone()
+            self.image_fusion_interrupt_flag = None
+            self.block_image_fusion_edits(False)
+
+    def block_image_fusion_edits(self, blocked):
+        """
+        Blocks or unblocks ROI transfer and manual fusion.
+        :param blocked: Whether a registration is running.
+        """
+        self.action_handler.action_image_fusion.setEnabled(not blocked)
+        for name in ('fusion_options_tab',
+                     'image_fusion_roi_transfer_option_view'):
+            widget = getattr(self, name, None)
+            if widget is not None:
+                widget.setEnabled(not blocked)
+
+    def set_image_fusion_transform(self, vtk_engine, transform,
+                                   final=False):
+        """
+        Shows a transform of the registration in the image fusion views.
+        :param vtk_engine: The VTKEngine of the image fusion views.
+        :param transform: sitk.CompositeTransform from the fixed to the
+            moving image.
+        :param final: Whether the registration has finished, so the views
+            are drawn at full quality rather than quickly.
+        """
+        if vtk_engine is None:
+            # Without a VTKEngine the transform is only kept for ROI
+            # transfer
+            MovingDictContainer().set("tfm", transform)
+            return
+        vtk_engine.set_registration_transform(transform)
+        if not hasattr(self, 'image_fusion_view') \
+                or self.image_fusion_view_axial is None:
+            return
+        for view in [self.image_fusion_single_view,
+                     self.image_fusion_view_axial,
+                     self.image_fusion_view_coronal,
+                     self.image_fusion_view_sagittal]:
+            if final:
+                view.display_final_overlay()
+            else:
+                view.refresh_overlay()
 
     def pyradiomics_handler(self, path, filepaths, hashed_path):
         """
@@ -241,6 +327,7 @@ class MainWindow(QtWidgets.QMainWindow, UIMainWindow):
                 "Plastimatch's executable is installed.")
 
     def cleanup(self):
+        self.stop_image_fusion_registration()
         patient_dict_container = PatientDictContainer()
         patient_dict_container.clear()
         # Close 3d vtk widget
@@ -249,6 +336,7 @@ class MainWindow(QtWidgets.QMainWindow, UIMainWindow):
         self.cleanup_pt_ct_viewer()
 
     def cleanup_image_fusion(self):
+        self.stop_image_fusion_registration()
         # Explicity destroy objects - the purpose of this is to clear
         # any image fusion tabs that have been used previously.
         # Try-catch in the event user has not prompted image-fusion.
@@ -3,7 +3,6 @@ import logging
 from pydicom import dcmread
 from src.Model import ImageLoading
 from src.Model.PatientDictContainer import PatientDictContainer
-from src.Model.GetPatientInfo import DicomTree
 from src.Model.ROI import ordered_list_rois
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -49,7 +48,6 @@ def _parse_rtss_and_images(rtss_path: str, directory: str) -> dict:
     rois = ImageLoading.get_roi_info(ds)
     raw_contour, num_points = ImageLoading.get_raw_contour_data(ds)
     pixluts = ImageLoading.get_pixluts(read_data)
-    tree = DicomTree(None).dataset_to_dict(ds)
     roi_list = ordered_list_rois(rois)
 
     return {
@@ -58,7 +56,6 @@ def _parse_rtss_and_images(rtss_path: str, directory: str) -> dict:
         "raw_contour": raw_contour,
         "num_points": num_points,
         "pixluts": pixluts,
-        "dict_dicom_tree_rtss": tree,
         "list_roi_numbers": roi_list,
     }
 
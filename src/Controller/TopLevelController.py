@@ -103,15 +103,6 @@ class Controller:
         else:
             self.main_window.update_ui()
 
-        # Start auto fusion if in auto fusion mode
-        if isinstance(self.image_fusion_window, ImageFusionWindow) and \
-           hasattr(self.image_fusion_window, "auto_radio") and \
-           self.image_fusion_window.auto_radio.isChecked():
-            progress_window.update_progress(
-                ("Registering Images...\nThis may take a few minutes.",
-                90))
-            self.main_window.update_image_fusion_ui()
-
         if isinstance(self.pt_ct_window, OpenPTCTPatientWindow):
             progress_window.update_progress(("Loading Viewer", 90))
             self.main_window.load_pt_ct_tab()
@@ -218,6 +209,9 @@ class Controller:
         # Open the fusion tab
         if hasattr(self.main_window, "create_image_fusion_tab"):
             self.main_window.create_image_fusion_tab(manual=manual)
+        # Auto fusion registers the images once the fusion views exist
+        if not manual:
+            self.main_window.update_image_fusion_ui()
         # Show the main window and close the fusion window
         self.main_window.show()
         self.image_fusion_window.close()
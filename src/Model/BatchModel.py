@@ -0,0 +1,98 @@
+"""
+Initialisation of the PatientDictContainer for batch processing.
+
+The main window needs the whole image volume as pixel values, its
+windowing and the pixmap and polygon providers of the three views, none of
+which a batch process uses. Each BatchProcess instead declares the
+attributes of the PatientDictContainer it reads, and only those are
+calculated from the patient's datasets. No Qt objects are created, so
+batches can run without a display server.
+"""
+from src.Model import ImageLoading
+from src.Model.GetPatientInfo import get_basic_info, dict_instance_uid
+from src.Model.Isodose import get_dose_pixluts, calculate_rx_dose_in_cgray
+from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.ROI import ordered_list_rois
+
+
+def get_rx_dose_in_cgray(dict_container):
+    """
+    :param dict_container: Container of the patient's datasets.
+    :return: The prescription dose of the RT Plan in cGy, or 1 if the
+        patient has no RT Plan.
+    """
+    if dict_container.has_modality("rtplan"):
+        return calculate_rx_dose_in_cgray(dict_container.dataset["rtplan"])
+    return 1
+
+
+# The modality each attribute is calculated from, and the function that
+# calculates it from the container. Attributes of a modality the patient
+# does not have are not set. An attribute can be calculated from another
+# attribute with get_batch_model_attribute.
+BATCH_MODEL_ATTRIBUTES = {
+    "rtss_modified": (None, lambda container: False),
+    "basic_info": (None,
+                   lambda container: get_basic_info(container.dataset[0])),
+    "dict_uid": (None,
+                 lambda container: dict_instance_uid(container.dataset)),
+    "pixluts": (None,
+                lambda container: ImageLoading.get_pixluts(
+                    container.dataset)),
+    "file_rtss": ("rtss", lambda container: container.filepaths["rtss"]),
+    "dataset_rtss": ("rtss", lambda container: container.dataset["rtss"]),
+    "rois": ("rtss",
+             lambda container: ImageLoading.get_roi_info(
+                 container.dataset["rtss"])),
+    "raw_contour": ("rtss",
+                    lambda container: ImageLoading.get_raw_contour_data(
+                        container.dataset["rtss"])[0]),
+    "num_points": ("rtss",
+                   lambda container: ImageLoading.get_raw_contour_data(
+                       container.dataset["rtss"])[1]),
+    "list_roi_numbers": ("rtss",
+                         lambda container: ordered_list_rois(
+                             get_batch_model_attribute(container, "rois"))),
+    "selected_rois": ("rtss", lambda container: []),
+    "dose_pixluts": ("rtdose",
+                     lambda container: get_dose_pixluts(container.dataset)),
+    "selected_doses": ("rtdose", lambda container: []),
+    "rx_dose_in_cgray": ("rtdose", get_rx_dose_in_cgray),
+}
+
+
+def get_batch_model_attribute(dict_container, attribute):
+    """
+    Get an attribute of the container, calculating and setting it if it
+    has not been set yet.
+    :param dict_container: Container of the patient's datasets.
+    :param attribute: Name of the attribute, a key of
+        BATCH_MODEL_ATTRIBUTES.
+    :return: Value of the attribute, or None if the patient does not have
+        the modality it is calculated from.
+    """
+    if dict_container.has_attribute(attribute):
+        return dict_container.get(attribute)
+
+    modality, calculate = BATCH_MODEL_ATTRIBUTES[attribute]
+    if modality is not None and not dict_container.has_modality(modality):
+        return None
+    value = calculate(dict_container)
+    dict_container.set(attribute, value)
+    return value
+
+
+def create_batch_model(attributes, dict_container=None):
+    """
+    Set the attributes a batch process needs in the container. This is
+    called after the initial values of the container (i.e. dataset and
+    filepaths) are set.
+    :param attributes: Names of the attributes to set, keys of
+        BATCH_MODEL_ATTRIBUTES.
+    :param dict_container: Container to set the attributes in. Defaults
+        to the PatientDictContainer.
+    """
+    if dict_container is None:
+        dict_container = PatientDictContainer()
+    for attribute in attributes:
+        get_batch_model_attribute(dict_container, attribute)
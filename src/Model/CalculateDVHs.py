@@ -14,6 +14,7 @@ from pydicom.dataset import Dataset, FileMetaDataset, validate_file_meta
 from pydicom.sequence import Sequence
 from pydicom.tag import Tag
 from pydicom.uid import generate_uid, ImplicitVRLittleEndian
+from src.Model.DVHMetrics import get_dvh_metrics
 from src.Model.PatientDictContainer import PatientDictContainer
 from src import _version
 
@@ -152,65 +153,7 @@ def dvh2pandas(dict_dvh, patient_id):
     :param patient_id: Patient Identifier
     :return: pddf, dvh data converted to pandas Dataframe
     """
-    csv_header = []
-    csv_header.append('Patient ID')
-    csv_header.append('ROI')
-    csv_header.append('Volume (mL)')
-
-    dvh_csv_list = []
-
-    # DVH.CSV EXPORT
-    
-    #Row in centiGray cGy
-    for i in dict_dvh:
-        dvh_roi_list = []
-        dvh = dict_dvh[i]
-        name = dvh.name
-        volume = dvh.volume
-        dvh_roi_list.append(patient_id)
-        dvh_roi_list.append(name)
-        dvh_roi_list.append(volume)
-        
-        dose = dvh.relative_volume.counts
-        
-        trough_i = 0
-        peak_i = 0
-        for percent in np.arange(100, -0.5, -0.5):
-            last_volume = -1
-            for cgy in range(trough_i, len(dose), 10):
-                trough_i = cgy
-                if dose[cgy] == percent:
-                    last_volume = cgy
-                elif dose[cgy] > percent:
-                    peak_i = cgy
-                elif dose[cgy] < percent:
-                    break
-            if last_volume == -1 and peak_i != 0:
-                if dose[peak_i] != dose[trough_i]:
-                    volume_per_drop = -10 * (dose[peak_i] - dose[trough_i])/(peak_i - trough_i)
-                    per_drop = dose[peak_i] - percent
-                    substract_amount = per_drop/volume_per_drop * 10
-                    last_volume = trough_i - substract_amount
-                else:
-                    last_volume = trough_i
-            if last_volume != -1:
-                dvh_roi_list.append(str(round(last_volume)))
-            else:
-                dvh_roi_list.append('')
-        dvh_csv_list.append(dvh_roi_list)
-            
-    #Column in percentage %
-    for i in np.arange(100, -0.5, -0.5):
-        csv_header.append(str(i) + '%')
-
-    # Convert the list into pandas dataframe, with 2 digit rounding.
-    pddf = pd.DataFrame(dvh_csv_list, columns=csv_header).round(2)
-    # Fill empty blocks with 0.0
-    pddf.fillna(0.0, inplace=True)
-    pddf.set_index('Patient ID', inplace=True)
-
-    # Return pandas dataframe
-    return pddf
+    return get_dvh_metrics(dict_dvh, patient_id)
 
 
 def dvh2csv(dict_dvh, path, csv_name, patient_id):
@@ -231,53 +174,74 @@ def dvh2csv(dict_dvh, path, csv_name, patient_id):
     pddf_csv.to_csv(tar_path)
 
 
-def dvh2rtdose(dict_dvh):
+def dvh2rtdose(dict_dvh, rois=None):
     """
     Export dvh data to RT DOSE file.
     :param dict_dvh: A dictionary of DVH {ROINumber: DVH}
-    :param patient_id: Patient Identifier
+    :param rois: ROI numbers whose DVHs have changed. When given and the RT
+        Dose already has a DVHSequence, only the items of these ROIs are
+        rewritten; ROIs missing from dict_dvh have their item removed.
     """
-    # Create DVH sequence
-    dvh_sequence = Sequence([])
+    patient_dict_container = PatientDictContainer()
+    rt_dose = patient_dict_container.dataset['rtdose']
+
+    if rois is not None and 'DVHSequence' in rt_dose:
+        rois = set(rois)
+        # Keep the items of the unchanged ROIs
+        dvh_sequence = Sequence([
+            item for item in rt_dose.DVHSequence
+            if item.DVHReferencedROISequence[0].ReferencedROINumber
+            not in rois])
+        changed_rois = [roi for roi in dict_dvh if roi in rois]
+    else:
+        dvh_sequence = Sequence([])
+        changed_rois = list(dict_dvh)
 
     # Add DVHs to the sequence
-    for ds in dict_dvh:
-        # Create new DVH dataset
-        new_ds = Dataset()
-
-        # Add attributes
-        new_ds.add_new(Tag("DVHType"), "CS", dict_dvh[ds].dvh_type.upper())
-        new_ds.add_new(Tag("DoseUnits"), "CS", dict_dvh[ds].dose_units.upper())
-        new_ds.add_new(Tag("DoseType"), "CS", "PHYSICAL")
-        new_ds.add_new(Tag("DVHDoseScaling"), "DS", "1.0")
-        new_ds.add_new(Tag("DVHVolumeUnits"), "CS",
-                       dict_dvh[ds].volume_units.upper())
-        new_ds.add_new(Tag("DVHNumberOfBins"), "IS", len(dict_dvh[ds].bins))
-
-        # Calculate and add DVH data
-        dvh_data = []
-        for i in range(len(dict_dvh[ds].counts)):
-            dvh_data.append(str(dict_dvh[ds].bins[1]))
-            dvh_data.append(str(dict_dvh[ds].counts[i]))
-        new_ds.add_new(Tag("DVHData"), "DS", dvh_data)
-
-        # Reference ROI sequence dataset/sequence
-        referenced_roi_sequence = Dataset()
-        referenced_roi_sequence.add_new(Tag("DVHROIContributionType"), "CS",
-                                        "INCLUDED")
-        referenced_roi_sequence.add_new(Tag("ReferencedROINumber"), "IS", ds)
-        new_ds.add_new(Tag("DVHReferencedROISequence"), "SQ",
-                       Sequence([referenced_roi_sequence]))
-
-        # Add new DVH dataset to DVH sequences
-        dvh_sequence.append(new_ds)
+    for ds in changed_rois:
+        dvh_sequence.append(create_dvh_item(ds, dict_dvh[ds]))
 
     # Save new RT DOSE
-    patient_dict_container = PatientDictContainer()
-    patient_dict_container.dataset['rtdose'].DVHSequence = dvh_sequence
+    rt_dose.DVHSequence = dvh_sequence
 
     path = patient_dict_container.filepaths['rtdose']
-    patient_dict_container.dataset['rtdose'].save_as(path)
+    rt_dose.save_as(path)
+
+
+def create_dvh_item(roi, dvh):
+    """
+    Create the DVHSequence item of a DVH.
+    :param roi: ROINumber of the DVH.
+    :param dvh: The DVH.
+    :return: DVHSequence item dataset.
+    """
+    # Create new DVH dataset
+    new_ds = Dataset()
+
+    # Add attributes
+    new_ds.add_new(Tag("DVHType"), "CS", dvh.dvh_type.upper())
+    new_ds.add_new(Tag("DoseUnits"), "CS", dvh.dose_units.upper())
+    new_ds.add_new(Tag("DoseType"), "CS", "PHYSICAL")
+    new_ds.add_new(Tag("DVHDoseScaling"), "DS", "1.0")
+    new_ds.add_new(Tag("DVHVolumeUnits"), "CS",
+                   dvh.volume_units.upper())
+    new_ds.add_new(Tag("DVHNumberOfBins"), "IS", len(dvh.bins))
+
+    # Calculate and add DVH data
+    dvh_data = []
+    for i in range(len(dvh.counts)):
+        dvh_data.append(str(dvh.bins[1]))
+        dvh_data.append(str(dvh.counts[i]))
+    new_ds.add_new(Tag("DVHData"), "DS", dvh_data)
+
+    # Reference ROI sequence dataset/sequence
+    referenced_roi_sequence = Dataset()
+    referenced_roi_sequence.add_new(Tag("DVHROIContributionType"), "CS",
+                                    "INCLUDED")
+    referenced_roi_sequence.add_new(Tag("ReferencedROINumber"), "IS", roi)
+    new_ds.add_new(Tag("DVHReferencedROISequence"), "SQ",
+                   Sequence([referenced_roi_sequence]))
+    return new_ds
 
 
 def rtdose2dvh():
@@ -1,9 +1,19 @@
+import functools
+import threading
+
 import cv2
 import numpy as np
 import pydicom
 from PySide6 import QtCore, QtGui
 
 import src.constants as constant
+from src.Model.PixelVolume import LazySliceDataset, apply_rescale, \
+    decode_slices
+
+# Number of window/level lookup tables kept
+WINDOW_LUT_CACHE_SIZE = 32
+
+_render_buffers = threading.local()
 
 
 def convert_raw_data(ds, rescaled=True, is_ct=False):
@@ -13,42 +23,60 @@ def convert_raw_data(ds, rescaled=True, is_ct=False):
     :param rescaled: A boolean to determine if the data has already
     been rescaled
     :param is_ct: Boolean to determine if data is CT for rescaling
-    :return: np_pixels, a list of pixel arrays of all slices of the patient
+    :return: np_pixels, a 3D array of the pixel arrays of all slices of the
+        patient (or the shared PixelVolume when the slices were loaded lazily)
     """
     non_img_list = ['rtss', 'rtdose', 'rtplan', 'rtimage']
-    np_pixels = []
 
     # Invert pixel colour of MONOCHROME1-style images
     inverted = (ds[0].PhotometricInterpretation == "MONOCHROME1")
 
+    # Lazily loaded slices are decoded (and rescaled) by their shared
+    # PixelVolume when they are first needed
+    if isinstance(ds[0], LazySliceDataset):
+        pixel_volume = ds[0].pixel_volume
+        if not rescaled:
+            slopes, intercepts = zip(*[get_rescale(slice_ds, is_ct)
+                                       for slice_ds in pixel_volume.datasets])
+            pixel_volume.set_rescale(slopes, intercepts)
+        if inverted:
+            np_pixels = np.asarray(pixel_volume)
+            return np.amax(np_pixels) - np_pixels
+        return pixel_volume
+
     # Do the conversion to every slice (except RTSS, RTDOSE, RTPLAN)
-    for key in ds:
-        if key not in non_img_list:
-            if isinstance(key, str) and key[0:3] == 'sr-':
-                continue
-            else:
-                # dataset of current slice
-                np_tmp = ds[key]
-                np_tmp.convert_pixel_data()
-                if not rescaled:
-                    # Perform the rescale
-                    data_arr = np_tmp._pixel_array
-                    slope, intercept = get_rescale(np_tmp, is_ct)
-                    data_arr = (data_arr * slope + intercept)
-                    # Store the rescaled data
-                    ds[key]._pixel_array = data_arr
-                np_pixels.append(np_tmp._pixel_array)
+    datasets = [ds[key] for key in ds if key not in non_img_list
+                and not (isinstance(key, str) and key[0:3] == 'sr-')]
+
+    # Slices are decoded concurrently into one preallocated volume, then
+    # rescaled with a single vectorised operation
+    np_pixels = decode_slices(
+        datasets, get_slice_pixels,
+        dtype=None if rescaled else np.float32)
+    if not rescaled:
+        slopes, intercepts = zip(*[get_rescale(slice_ds, is_ct)
+                                   for slice_ds in datasets])
+        apply_rescale(np_pixels, slopes, intercepts)
+        # Store the rescaled data (as views of the volume)
+        for i, slice_ds in enumerate(datasets):
+            slice_ds._pixel_array = np_pixels[i]
 
     # Invert the colours based on max value
     if inverted:
-        max_val = np.amax(np_pixels)
-        np_pixels_inverted = np.multiply(np_pixels, -1)
-        np_pixels_inverted = np.add(np_pixels_inverted, max_val)
-        return np_pixels_inverted
+        return np.amax(np_pixels) - np_pixels
 
     return np_pixels
 
 
+def get_slice_pixels(slice_ds):
+    """
+    :param slice_ds: Dataset of an image slice.
+    :return: The (possibly already rescaled) pixel array of the slice.
+    """
+    slice_ds.convert_pixel_data()
+    return slice_ds._pixel_array
+
+
 def get_rescale(np_tmp, is_ct):
     """
     For an image, grabs the rescale slope and rescale intercept
@@ -114,6 +142,25 @@ def scaled_pixmap(np_pixels, window, level, width, height,
     :param color: String for conversion of pixels to specified color map
     :return: pixmap, a QPixmap of the slice
     """
+    return QtGui.QPixmap.fromImage(scaled_image(
+        np_pixels, window, level, width, height, fusion, color))
+
+
+def scaled_image(np_pixels, window, level, width, height,
+                 fusion=False, color=None):
+    """
+    Rescale the numpy pixels of image and convert to a scaled QImage. Unlike
+    QPixmap, QImage can safely be created outside the GUI thread.
+
+    :param np_pixels: A list of converted pixel arrays
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :param width: Pixel width of the window
+    :param height: Pixel height of the window
+    :param fusion: Boolean to set scaling for overlayed images
+    :param color: String for conversion of pixels to specified color map
+    :return: qimage, a QImage of the slice that owns its pixel data
+    """
 
     ''' The numpy pixel array is converted to a signed int before any additional operations are applied.
     This is due to the pydicom.dataset.Dataset.convert_pixel_data() function returning a numpy array of dtype uint16.
@@ -121,48 +168,107 @@ def scaled_pixmap(np_pixels, window, level, width, height,
     dtype could theoretically return any combination of unsigned/signed 1, 8, 16, 32, or 64 bit values.
     Undefined behaviour when np_pixels is any type other than uint16 or int16. '''
     np_pixels = np_pixels.astype(np.int16)
-    if window != 0 and level != 0:
-        # Transformation applied to each individual pixel to unique
-        # contrast level
-        np_pixels = (np_pixels - level) / window * 255
-    else:
-        max_val = np.amax(np_pixels)
-        min_val = np.amin(np_pixels)
-        np_pixels = (np_pixels - min_val) / (max_val - min_val) * 255
-
-    np_pixels[np_pixels < 0] = 0
-    np_pixels[np_pixels > 255] = 255
-    np_pixels = np_pixels.astype(np.int8)
-
-    # Process heatmap for conversion of the np_pixels to rgb for the purpose
-    # of displaying the PT/CT view in RGB colorspace.
+    if window == 0 or level == 0:
+        min_val = int(np.amin(np_pixels))
+        max_val = int(np.amax(np_pixels))
+        window = max_val - min_val
+        level = min_val
+
+    # Every int16 value is mapped to its display value with a single
+    # lookup in the table of the window, level and color map
+    lut = get_window_lut(window, level, color)
+    indices = np_pixels.view(np.uint16)
+    indices ^= 0x8000
+    buffer = get_render_buffer(np_pixels.shape + lut.shape[1:])
+    np.take(lut, indices, axis=0, out=buffer)
 
     # Convert numpy array data to QImage for PySide6
     if color == "Heat":
-
-        pixmap = QtGui.QPixmap(convert_pt_to_heatmap(np_pixels))
+        # Fix as colored images have 3*8 bits = 3 bytes instead of one
+        qimage = QtGui.QImage(
+            buffer,
+            buffer.shape[1],
+            buffer.shape[0],
+            buffer.shape[1] * 3,
+            QtGui.QImage.Format_RGB888)
 
     else:
-        # Generate a grayscale image and set pixmap to the image
-        bytes_per_line = np_pixels.shape[1]
-
+        # Generate a grayscale image. Indexed8 without a colour table
+        # cannot be smooth scaled as a QImage, Grayscale8 shows the same.
         qimage = QtGui.QImage(
-            np_pixels,
-            np_pixels.shape[1],
-            np_pixels.shape[0],
-            bytes_per_line,
-            QtGui.QImage.Format_Indexed8)
-
-        pixmap = QtGui.QPixmap(qimage)
+            buffer,
+            buffer.shape[1],
+            buffer.shape[0],
+            buffer.shape[1],
+            QtGui.QImage.Format_Grayscale8)
 
     if fusion:
         width = constant.DEFAULT_WINDOW_SIZE
         height = constant.DEFAULT_WINDOW_SIZE
 
     # Rescale the image accordingly
-    pixmap = pixmap.scaled(width, height, QtCore.Qt.IgnoreAspectRatio,
+    scaled = qimage.scaled(width, height, QtCore.Qt.IgnoreAspectRatio,
                            QtCore.Qt.SmoothTransformation)
-    return pixmap
+    # An image that is not resized still shares the reused buffer
+    if scaled.size() == qimage.size():
+        scaled = scaled.copy()
+    return scaled
+
+
+@functools.lru_cache(maxsize=WINDOW_LUT_CACHE_SIZE)
+def get_window_lut(window, level, color=None):
+    """
+    Get the lookup table that windows every int16 pixel value.
+
+    :param window: Window width of windowing function
+    :param level: Level value of windowing function
+    :param color: String for conversion of pixels to specified color map
+    :return: Read-only table indexed by the pixel value + 32768. uint8
+        display values, or (65536, 3) RGB values for the "Heat" color map.
+    """
+    values = np.arange(-32768, 32768, dtype=np.float64)
+    if window == 0:
+        lut = np.zeros(values.shape, dtype=np.uint8)
+    else:
+        # Transformation applied to each individual pixel to unique
+        # contrast level
+        lut = np.clip((values - level) / window * 255, 0, 255)
+        lut = lut.astype(np.uint8)
+
+    if color == "Heat":
+        lut = get_heatmap_colors()[lut]
+
+    lut.flags.writeable = False
+    return lut
+
+
+@functools.lru_cache(maxsize=1)
+def get_heatmap_colors():
+    """
+    :return: (256, 3) table of the RGB colors of the heat map, so a heat
+        map can be applied with a single lookup.
+    """
+    gray = np.arange(256, dtype=np.uint8).reshape(1, 256)
+    # cv2 works in BGR colorspace as opposed to RGB colorspace
+    colors = cv2.applyColorMap(gray, cv2.COLORMAP_HOT)[0, :, ::-1]
+    colors = np.ascontiguousarray(colors)
+    colors.flags.writeable = False
+    return colors
+
+
+def get_render_buffer(shape):
+    """
+    Get the buffer the windowed pixels of a slice are written to. Buffers
+    are reused per thread, so rendering a slice does not allocate.
+
+    :param shape: Shape of the buffer.
+    :return: uint8 array of the shape.
+    """
+    buffers = _render_buffers.__dict__.setdefault("buffers", {})
+    buffer = buffers.get(shape)
+    if buffer is None:
+        buffer = buffers[shape] = np.empty(shape, dtype=np.uint8)
+    return buffer
 
 
 def convert_pt_to_heatmap(np_pixels):
@@ -176,12 +282,8 @@ def convert_pt_to_heatmap(np_pixels):
     # Conversion of the array to UINT8, color spaces do not like int8.
     arr8 = np_pixels.astype(np.uint8)
 
-    # Apply a colormap to the imageset (np array)
-    heatmap = cv2.applyColorMap(arr8, cv2.COLORMAP_HOT)
-
-    # Convert the BGR colorspace to RGB, this is needed as cv2 works in BGR 
-    # colorspace as opposed to RGB colorspace.
-    heatmap = cv2.cvtColor(heatmap, cv2.COLOR_BGR2RGB)
+    # Apply the colormap to the imageset (np array) with a single lookup
+    heatmap = get_heatmap_colors()[arr8]
 
     # Fix as colored images have 3*8 bits = 3 bytes instead of one
     bytes_per_line = np_pixels.shape[1] * 3
@@ -191,7 +293,7 @@ def convert_pt_to_heatmap(np_pixels):
         heatmap.shape[1],
         heatmap.shape[0],
         bytes_per_line,
-        QtGui.QImage.Format_RGB888)
+        QtGui.QImage.Format_RGB888).copy()
 
     return qimage
 
@@ -210,7 +312,7 @@ def get_pixmaps(pixel_array, window, level, pixmap_aspect,
     :return: dict_pixmaps, a dictionary of all pixmaps within the patient.
     """
     # Convert pixel array to numpy 3d array
-    pixel_array_3d = np.array(pixel_array)
+    pixel_array_3d = np.asarray(pixel_array)
 
     # Pixmaps dictionaries of 3 views
     dict_pixmaps_axial = {}
@@ -0,0 +1,185 @@
+"""
+Extraction of the contours of many levels of a dose or SUV volume at once.
+
+ISO2ROI and SUV2ROI turn levels of a volume into ROIs. Instead of tracing
+one slice and one level at a time and converting every point to patient
+coordinates through ROI.pixel_to_rcs, the whole volume is copied into
+shared memory once and its slices are traced for every level on a bounded
+pool of processes. The points of all the contours of a slice are then
+converted to patient coordinates with a single lookup in the pixel LUTs,
+giving (N, 3) arrays that RTSSModel.add_contours can write directly.
+"""
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+from skimage import measure
+
+from src.Model.DVHEngine import INTERRUPT_POLL_INTERVAL, get_worker_count
+
+# Number of tasks each worker process is given, so the slices are spread
+# evenly when some of them take longer to trace
+TASKS_PER_WORKER = 4
+
+# Volume a worker process belongs to
+_worker_volume = {}
+
+# SharedMemory holding the volume, kept open by a worker process for as
+# long as it reads the volume
+_worker_memory = None
+
+
+def share_volume(volume):
+    """
+    Copy a volume into shared memory.
+    :param volume: 3D numpy array of the slices of the volume.
+    :return: The SharedMemory holding the volume.
+    """
+    memory = shared_memory.SharedMemory(create=True,
+                                        size=max(volume.nbytes, 1))
+    shared = np.ndarray(volume.shape, dtype=volume.dtype, buffer=memory.buf)
+    shared[:] = volume
+    return memory
+
+
+def init_contour_worker(memory_name, shape, dtype, levels):
+    """
+    Set up a worker process of the pool. The volume is read straight
+    from shared memory for every slice the process traces.
+    :param memory_name: Name of the SharedMemory holding the volume.
+    :param shape: Shape of the volume.
+    :param dtype: Data type of the volume.
+    :param levels: Dictionary of level name to level value.
+    """
+    global _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    _worker_volume["volume"] = np.ndarray(shape, dtype=dtype,
+                                          buffer=_worker_memory.buf)
+    _worker_volume["levels"] = levels
+
+
+def trace_slices_task(slice_indices):
+    """
+    Trace slices of the volume in a worker process.
+    :param slice_indices: Indices of the slices to trace.
+    :return: List of (slice index, dictionary of level name to the
+        contours of the level on the slice) tuples.
+    """
+    volume = _worker_volume["volume"]
+    return [(index, trace_slice(volume[index], _worker_volume["levels"]))
+            for index in slice_indices]
+
+
+def trace_slice(plane, levels):
+    """
+    :param plane: 2D numpy array of a slice of the volume.
+    :param levels: Dictionary of level name to level value.
+    :return: Dictionary of level name to the contours of the level on the
+        slice, as (N, 2) arrays of (row, column) points. Levels at or
+        above the maximum of the slice have no contours.
+    """
+    maximum = plane.max()
+    contours = {}
+    for name, level in levels.items():
+        if level < maximum:
+            level_contours = measure.find_contours(plane, level)
+            if level_contours:
+                contours[name] = level_contours
+    return contours
+
+
+def find_volume_contours(volume, levels, slice_indices=None,
+                         interrupt_flag=None, max_workers=None):
+    """
+    Trace every level on every slice of a volume on a pool of processes.
+    :param volume: 3D numpy array of the slices of the volume.
+    :param levels: Dictionary of level name to level value.
+    :param slice_indices: Indices of the slices to trace. Defaults to every
+        slice.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop.
+    :param max_workers: Number of worker processes. Defaults to one per
+        available core.
+    :return: Dictionary of level name to a dictionary of slice index to
+        the contours of the level on the slice, or None if interrupted.
+    """
+    volume = np.ascontiguousarray(volume)
+    if slice_indices is None:
+        slice_indices = range(len(volume))
+    slice_indices = list(slice_indices)
+    contours = {name: {} for name in levels}
+    if not slice_indices or not levels:
+        return contours
+
+    workers = max_workers or get_worker_count(len(slice_indices))
+    chunks = np.array_split(
+        slice_indices,
+        min(len(slice_indices), workers * TASKS_PER_WORKER))
+    memory = share_volume(volume)
+    # Workers are spawned, as the pool is started from Qt worker threads
+    executor = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_contour_worker,
+        initargs=(memory.name, volume.shape, volume.dtype, levels))
+    interrupted = False
+    try:
+        pending = {executor.submit(trace_slices_task, chunk.tolist())
+                   for chunk in chunks}
+        while pending:
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                interrupted = True
+                break
+            done, pending = wait(pending, timeout=INTERRUPT_POLL_INTERVAL,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                for index, slice_contours in future.result():
+                    for name, level_contours in slice_contours.items():
+                        contours[name][index] = level_contours
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+        memory.close()
+        memory.unlink()
+
+    if interrupted:
+        return None
+    # Slices in order, as they would be traced one after another
+    return {name: dict(sorted(level_contours.items()))
+            for name, level_contours in contours.items()}
+
+
+def grid_to_patient(contours, pixlut, z, dose_pixlut=None, step=1):
+    """
+    Convert the contours traced on a slice to patient coordinates, the way
+    ROI.pixel_to_rcs converts them one point at a time.
+    :param contours: List of (N, 2) arrays of (row, column) points on the
+        grid of the slice.
+    :param pixlut: Pixel LUT of the image slice.
+    :param z: z coordinate of the image slice.
+    :param dose_pixlut: Dose pixel LUT of the slice, if the contours were
+        traced on the dose grid rather than on the image.
+    :param step: Only every step-th point of each contour is kept.
+    :return: List of (N, 3) arrays of the x, y, z patient coordinates of
+        the points of each contour.
+    """
+    contours = [np.asarray(contour)[::step] for contour in contours]
+    if not contours:
+        return []
+    points = np.concatenate(contours)
+    if dose_pixlut is None:
+        columns = np.rint(points[:, 1]).astype(int)
+        rows = np.rint(points[:, 0]).astype(int)
+    else:
+        # Dose grid to image pixels
+        columns = np.rint(np.asarray(dose_pixlut[0])[
+            points[:, 1].astype(int)]).astype(int)
+        rows = np.rint(np.asarray(dose_pixlut[1])[
+            points[:, 0].astype(int)]).astype(int)
+
+    coordinates = np.empty((len(points), 3))
+    coordinates[:, 0] = np.asarray(pixlut[0])[columns - 1]
+    coordinates[:, 1] = np.asarray(pixlut[1])[rows - 1]
+    coordinates[:, 2] = z
+    splits = np.cumsum([len(contour) for contour in contours])[:-1]
+    return np.split(coordinates, splits)
@@ -5,18 +5,45 @@ Searches a given directory to extract a Patient>Study>Series>Image structure
 
 import logging
 import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
 
+from src.Model.DICOM.DICOMScanIndex import header_from_json, \
+    normalise_path, stat_file
 from src.Model.DICOM.Structure.DICOMStructure import DICOMStructure
 from src.Model.DICOM.Structure.DICOMPatient import Patient
 from src.Model.DICOM.Structure.DICOMStudy import Study
 from src.Model.DICOM.Structure.DICOMSeries import Series
 from src.Model.DICOM.Structure.DICOMImage import Image
 
+# The only tags needed to place a file in the Patient>Study>Series>Image
+# tree (including the ones read by Series.add_referenced_objects). Files are
+# read up to these tags only, so pixel data and large sequences such as
+# ROIContourSequence are never loaded.
+HEADER_TAGS = [
+    "PatientID",
+    "PatientName",
+    "StudyInstanceUID",
+    "StudyDescription",
+    "SeriesInstanceUID",
+    "SeriesDescription",
+    "SOPInstanceUID",
+    "SOPClassUID",
+    "Modality",
+    "FrameOfReferenceUID",
+    "ReferencedFrameOfReferenceUID",
+    "ReferencedFrameOfReferenceSequence",
+    "ReferencedStructureSetSequence",
+    "ReferencedRTPlanSequence",
+]
 
-def get_dicom_structure(path, interrupt_flag, progress_callback):
+
+def get_dicom_structure(path, interrupt_flag, progress_callback,
+                        max_workers=None, use_processes=False,
+                        scan_index=None):
     """
     Searches the given directory and creates a
     Patient>Study>Series>Image structure based on the DICOM files in the
@@ -27,121 +54,247 @@ def get_dicom_structure(path, interrupt_flag, progress_callback):
         or not the process has been interrupted.
     :param progress_callback: A function that receives the progress of
         the current search.
+    :param max_workers: Number of workers used to read the file headers.
+        Defaults to the executor's own default.
+    :param use_processes: Read the headers in a process pool instead of
+        a thread pool.
+    :param scan_index: Optional ScanIndex. Files that are unchanged since
+        they were last indexed are not read again, and the index is
+        updated with the files that were read.
     :return: Complete DICOMStructure object with associated DICOM files
     """
+    # The index looks up the files below the normalised path
+    path = normalise_path(path)
+    file_paths = get_file_paths(path, interrupt_flag)
+    if file_paths is None:
+        return None
 
-    dicom_structure = DICOMStructure()
+    indexed_headers, file_stats, removed_paths = \
+        check_scan_index(scan_index, path, file_paths)
+    paths_to_read = [file_path for file_path in file_paths
+                     if file_path not in indexed_headers]
 
-    files_searched = 0
+    executor_class = ProcessPoolExecutor if use_processes \
+        else ThreadPoolExecutor
+    executor = executor_class(max_workers=max_workers)
 
+    dicom_structure = DICOMStructure()
     files_with_no_patient_id = 1
+    index_records = []
 
-    for root, dirs, files in os.walk(path, topdown=True):
-        files = [f for f in files if not f[0] == "."]
-        dirs[:] = [d for d in dirs if not d[0] == "."]
-        for file in files:
-            if file[0] == ".":
-                break
+    try:
+        # Results come back in the same order as os.walk found them, so
+        # the resulting tree (and the no_id numbering) is deterministic.
+        headers_read = executor.map(read_dicom_header, paths_to_read,
+                                    chunksize=get_chunksize(
+                                        len(paths_to_read)))
+        for files_searched, file_path in enumerate(file_paths, start=1):
             if interrupt_flag.is_set():
-                return
+                return None
 
             # The progress is updated first because the total files
             # represent ALL files inside the selected directory, not
             # just the DICOM files. Otherwise, most files would be
             # skipped and the progress would be inaccurate.
-            files_searched += 1
             progress_callback.emit(files_searched)
 
-            # Fix to program crashing when encountering DICOMDIR files
-            if file == "DICOMDIR":
+            if file_path in indexed_headers:
+                dicom_file = indexed_headers[file_path]
+            else:
+                dicom_file = next(headers_read)
+                if file_stats.get(file_path) is not None:
+                    index_records.append(
+                        (file_path, *file_stats[file_path], dicom_file))
+
+            if dicom_file is None:
                 continue
 
-            file_path = root + os.sep + file
-            try:
-                dicom_file = dcmread(file_path)
-            except (InvalidDicomError, FileNotFoundError, PermissionError):
-                pass
+            if add_dicom_file(dicom_structure, file_path, dicom_file,
+                              files_with_no_patient_id):
+                files_with_no_patient_id += 1
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if scan_index is not None:
+        try:
+            scan_index.update_entries(index_records, removed_paths)
+        except sqlite3.Error:
+            logging.exception("Could not update the scan index")
+
+    return dicom_structure
+
+
+def check_scan_index(scan_index, path, file_paths):
+    """
+    Compares the files found in the directory against the scan index.
+    :param scan_index: ScanIndex, or None if no index is used.
+    :param path: The root directory of the search.
+    :param file_paths: Paths of all files found in the directory.
+    :return: Tuple of (indexed_headers, file_stats, removed_paths).
+        indexed_headers maps the paths of unchanged files to their indexed
+        header (None for files that are not DICOM files), file_stats maps
+        every other path to its (mtime, size), and removed_paths lists the
+        indexed files that no longer exist.
+    """
+    if scan_index is None:
+        return {}, {}, []
+
+    try:
+        entries = scan_index.get_entries(path)
+    except sqlite3.Error:
+        logging.exception("Could not read the scan index")
+        entries = {}
+
+    indexed_headers = {}
+    file_stats = {}
+    for file_path in file_paths:
+        file_stat = stat_file(file_path)
+        entry = entries.get(file_path)
+        if entry is not None and file_stat is not None \
+                and entry[:2] == file_stat:
+            indexed_headers[file_path] = header_from_json(entry[2])
+        else:
+            file_stats[file_path] = file_stat
+
+    found_paths = set(file_paths)
+    removed_paths = [file_path for file_path in entries
+                     if file_path not in found_paths]
+
+    return indexed_headers, file_stats, removed_paths
+
+
+def get_file_paths(path, interrupt_flag):
+    """
+    Walks the given directory and returns the paths of every file that
+    could be a DICOM file, in os.walk order.
+    :param path: The root directory to search from.
+    :param interrupt_flag: A threading.Event() flag to indicate whether
+        or not the process has been interrupted.
+    :return: List of file paths, or None if the walk was interrupted.
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(path, topdown=True):
+        if interrupt_flag.is_set():
+            return None
+        files = [f for f in files if not f[0] == "."]
+        dirs[:] = [d for d in dirs if not d[0] == "."]
+        for file in files:
+            file_paths.append(os.path.join(root, file))
+    return file_paths
+
+
+def get_chunksize(file_count):
+    """
+    Chunk size used when mapping files over a pool. Only matters for
+    process pools, where each chunk is a round trip to a worker.
+    :param file_count: Number of files to be read.
+    :return: Number of files per chunk.
+    """
+    return max(1, min(64, file_count // ((os.cpu_count() or 1) * 8)))
+
+
+def read_dicom_header(file_path):
+    """
+    Reads only the tags in HEADER_TAGS from a file.
+    :param file_path: Path of the file to read.
+    :return: Header-only pydicom Dataset, or None if the file is not a
+        readable DICOM file.
+    """
+    # Fix to program crashing when encountering DICOMDIR files
+    if os.path.basename(file_path) == "DICOMDIR":
+        return None
+
+    try:
+        return dcmread(file_path, stop_before_pixels=True,
+                       specific_tags=HEADER_TAGS)
+    except (InvalidDicomError, FileNotFoundError, PermissionError):
+        return None
+
+
+def add_dicom_file(dicom_structure, file_path, dicom_file,
+                   files_with_no_patient_id):
+    """
+    Adds a single DICOM file to the Patient>Study>Series>Image structure.
+    :param dicom_structure: DICOMStructure to add the file to.
+    :param file_path: Path of the DICOM file.
+    :param dicom_file: (Header-only) dataset of the DICOM file.
+    :param files_with_no_patient_id: Number used to build a placeholder
+        patient ID when the file has no PatientID.
+    :return: True if the placeholder patient ID was used.
+    """
+    used_placeholder_id = False
+    if "PatientID" in dicom_file:
+        patient_id = dicom_file.PatientID
+    else:
+        patient_id = "no_id_" + str(files_with_no_patient_id)
+        used_placeholder_id = True
+
+    if not (
+        "SOPInstanceUID" in dicom_file
+        and "SOPClassUID" in dicom_file
+        and "Modality" in dicom_file
+    ):
+        return used_placeholder_id
+
+    new_image = Image(
+        file_path,
+        dicom_file.SOPInstanceUID,
+        dicom_file.SOPClassUID,
+        dicom_file.Modality,
+    )
+    if not dicom_structure.has_patient(patient_id):
+        if "SeriesInstanceUID" not in dicom_file:
+            logging.error("No SeriesInstanceUID found in %s", file_path)
+            return used_placeholder_id
+        new_series = Series(dicom_file.SeriesInstanceUID)
+        new_series.series_description = dicom_file.get("SeriesDescription")
+        new_series.add_referenced_objects(dicom_file)
+        new_series.add_image(new_image)
+
+        new_study = Study(dicom_file.StudyInstanceUID)
+        new_study.study_description = dicom_file.get("StudyDescription")
+        new_study.add_series(new_series)
+
+        new_patient = Patient(patient_id, dicom_file.PatientName)
+        new_patient.add_study(new_study)
+
+        dicom_structure.add_patient(new_patient)
+    else:
+        existing_patient = dicom_structure.get_patient(dicom_file.PatientID)
+        if not existing_patient.has_study(dicom_file.StudyInstanceUID):
+            new_series = Series(dicom_file.SeriesInstanceUID)
+            new_series.series_description = dicom_file.get(
+                "SeriesDescription"
+            )
+            new_series.add_referenced_objects(dicom_file)
+            new_series.add_image(new_image)
+
+            new_study = Study(dicom_file.StudyInstanceUID)
+            new_study.study_description = dicom_file.get("StudyDescription")
+            new_study.add_series(new_series)
+
+            existing_patient.add_study(new_study)
+        else:
+            existing_study = existing_patient.get_study(
+                dicom_file.StudyInstanceUID
+            )
+            if not existing_study.has_series(dicom_file.SeriesInstanceUID):
+                new_series = Series(dicom_file.SeriesInstanceUID)
+                new_series.series_description = dicom_file.get(
+                    "SeriesDescription"
+                )
+                new_series.add_referenced_objects(dicom_file)
+                new_series.add_image(new_image)
+
+                existing_study.add_series(new_series)
             else:
-                if "PatientID" in dicom_file:
-                    patient_id = dicom_file.PatientID
-                else:
-                    patient_id = "no_id_" + str(files_with_no_patient_id)
-                    files_with_no_patient_id += 1
-
-                if (
-                    "SOPInstanceUID" in dicom_file
-                    and "SOPClassUID" in dicom_file
-                    and "Modality" in dicom_file
-                ):
-                    new_image = Image(
-                        file_path,
-                        dicom_file.SOPInstanceUID,
-                        dicom_file.SOPClassUID,
-                        dicom_file.Modality,
+                existing_series = existing_study.get_series(
+                    dicom_file.SeriesInstanceUID
+                )
+                if not existing_series.has_image(dicom_file.SOPInstanceUID):
+                    existing_series.series_description = dicom_file.get(
+                        "SeriesDescription"
                     )
-                    if not dicom_structure.has_patient(patient_id):
-                        if "SeriesInstanceUID" not in dicom_file:
-                            logging.error("No SeriesInstanceUID found in %s", file_path)
-                            continue
-                        new_series = Series(dicom_file.SeriesInstanceUID)
-                        new_series.series_description = dicom_file.get(
-                            "SeriesDescription"
-                        )
-                        new_series.add_referenced_objects(dicom_file)
-                        new_series.add_image(new_image)
-
-                        new_study = Study(dicom_file.StudyInstanceUID)
-                        new_study.study_description = dicom_file.get("StudyDescription")
-                        new_study.add_series(new_series)
-
-                        new_patient = Patient(patient_id, dicom_file.PatientName)
-                        new_patient.add_study(new_study)
-
-                        dicom_structure.add_patient(new_patient)
-                    else:
-                        existing_patient = dicom_structure.get_patient(
-                            dicom_file.PatientID
-                        )
-                        if not existing_patient.has_study(dicom_file.StudyInstanceUID):
-                            new_series = Series(dicom_file.SeriesInstanceUID)
-                            new_series.series_description = dicom_file.get(
-                                "SeriesDescription"
-                            )
-                            new_series.add_referenced_objects(dicom_file)
-                            new_series.add_image(new_image)
-
-                            new_study = Study(dicom_file.StudyInstanceUID)
-                            new_study.study_description = dicom_file.get(
-                                "StudyDescription"
-                            )
-                            new_study.add_series(new_series)
-
-                            existing_patient.add_study(new_study)
-                        else:
-                            existing_study = existing_patient.get_study(
-                                dicom_file.StudyInstanceUID
-                            )
-                            if not existing_study.has_series(
-                                dicom_file.SeriesInstanceUID
-                            ):
-                                new_series = Series(dicom_file.SeriesInstanceUID)
-                                new_series.series_description = dicom_file.get(
-                                    "SeriesDescription"
-                                )
-                                new_series.add_referenced_objects(dicom_file)
-                                new_series.add_image(new_image)
-
-                                existing_study.add_series(new_series)
-                            else:
-                                existing_series = existing_study.get_series(
-                                    dicom_file.SeriesInstanceUID
-                                )
-                                if not existing_series.has_image(
-                                    dicom_file.SOPInstanceUID
-                                ):
-                                    existing_series.series_description = dicom_file.get(
-                                        "SeriesDescription"
-                                    )
-                                    existing_series.add_image(new_image)
+                    existing_series.add_image(new_image)
 
-    return dicom_structure
+    return used_placeholder_id
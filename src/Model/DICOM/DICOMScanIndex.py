@@ -0,0 +1,170 @@
+"""
+Persistent index of the files found by the DICOM directory search.
+Stores the path, modification time, size and header tags of every file that
+has been scanned, so a re-scan only needs to stat each file and re-read the
+ones that are new or have changed.
+"""
+
+import logging
+import os
+import sqlite3
+from pathlib import Path
+
+from pydicom import Dataset
+
+
+class ScanIndex:
+    """
+    SQLite backed index of scanned files, stored in the hidden OnkoDICOM
+    directory. Each row holds the path, st_mtime_ns and st_size of a file
+    together with the key UIDs and the header-only dataset (as DICOM JSON)
+    read by DICOMDirectorySearch. Files that are not DICOM files are stored
+    with an empty header so they are not parsed again either.
+
+    Example usage:
+    scan_index = ScanIndex()
+    dicom_structure = get_dicom_structure(path, interrupt_flag,
+                                          progress_callback,
+                                          scan_index=scan_index)
+    """
+
+    def __init__(self, db_file='ScanIndex.db'):
+        """
+        :param db_file: Name of the index database file inside the hidden
+            directory.
+        """
+        self.db_file_path = Path(
+            os.environ['USER_ONKODICOM_HIDDEN']).joinpath(db_file)
+        self.set_up_index_db()
+
+    def set_up_index_db(self):
+        """
+        Create the SCAN_INDEX table inside the SQLite database
+        """
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("""
+                    CREATE TABLE IF NOT EXISTS SCAN_INDEX (
+                        path TEXT PRIMARY KEY,
+                        mtime INTEGER,
+                        size INTEGER,
+                        patient_id TEXT,
+                        study_uid TEXT,
+                        series_uid TEXT,
+                        sop_instance_uid TEXT,
+                        sop_class_uid TEXT,
+                        modality TEXT,
+                        header TEXT
+                    );
+                """)
+        connection.commit()
+        connection.close()
+
+    def get_entries(self, path):
+        """
+        Get every indexed file below the given directory.
+        :param path: Root directory of the search.
+        :return: Dictionary of file path to a (mtime, size, header) tuple,
+            where header is the DICOM JSON of the file or None if the file
+            is not a DICOM file.
+        """
+        lower, upper = get_path_range(path)
+        connection = sqlite3.connect(self.db_file_path)
+        cursor = connection.cursor()
+        cursor.execute("""SELECT path, mtime, size, header FROM SCAN_INDEX
+                          WHERE path >= ? AND path < ?;""", (lower, upper))
+        entries = {row[0]: (row[1], row[2], row[3])
+                   for row in cursor.fetchall()}
+        connection.close()
+        return entries
+
+    def update_entries(self, records, removed_paths):
+        """
+        Insert or replace the given records and remove the files that no
+        longer exist.
+        :param records: List of (path, mtime, size, dataset) tuples, where
+            dataset is the header-only dataset of the file or None.
+        :param removed_paths: Paths of files that have been deleted.
+        """
+        rows = []
+        for file_path, mtime, size, dicom_file in records:
+            if dicom_file is None:
+                rows.append((file_path, mtime, size,
+                             None, None, None, None, None, None, None))
+                continue
+            try:
+                header = dicom_file.to_json()
+            except Exception:
+                # The file is read again on the next search instead
+                logging.warning("Could not index the header of %s",
+                                file_path, exc_info=True)
+                continue
+            rows.append((file_path, mtime, size,
+                         dicom_file.get("PatientID"),
+                         dicom_file.get("StudyInstanceUID"),
+                         dicom_file.get("SeriesInstanceUID"),
+                         dicom_file.get("SOPInstanceUID"),
+                         dicom_file.get("SOPClassUID"),
+                         dicom_file.get("Modality"),
+                         header))
+
+        connection = sqlite3.connect(self.db_file_path)
+        connection.executemany("""INSERT OR REPLACE INTO SCAN_INDEX
+                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);""",
+                               rows)
+        connection.executemany("DELETE FROM SCAN_INDEX WHERE path = ?;",
+                               [(file_path,) for file_path in removed_paths])
+        connection.commit()
+        connection.close()
+
+    def clear(self):
+        """
+        Remove every entry from the index.
+        """
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("DELETE FROM SCAN_INDEX;")
+        connection.commit()
+        connection.close()
+
+
+def get_path_range(path):
+    """
+    Get the range of path strings that lie below the given directory, for
+    use in an indexed range query.
+    :param path: Directory path.
+    :return: Tuple of (lower, upper) bounds.
+    """
+    prefix = os.path.join(normalise_path(path), "")
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def normalise_path(path):
+    """
+    Normalise a directory path, so the paths of the files found below it
+    are stored and looked up in the same form.
+    :param path: Directory path.
+    :return: Normalised path string, without a trailing separator.
+    """
+    return os.path.normpath(os.fspath(path))
+
+
+def stat_file(file_path):
+    """
+    :param file_path: Path of the file.
+    :return: Tuple of (st_mtime_ns, st_size), or None if the file can no
+        longer be accessed.
+    """
+    try:
+        stat_result = os.stat(file_path)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def header_from_json(header):
+    """
+    :param header: DICOM JSON stored in the index, or None.
+    :return: Header-only dataset, or None if the file is not a DICOM file.
+    """
+    if header is None:
+        return None
+    return Dataset.from_json(header)
@@ -101,6 +101,18 @@ class Study:
 
         return rt_classes == contained_classes
 
+    def __getstate__(self):
+        """
+        Studies are sent to the spawned batch patient processes without
+        their widgets, which cannot be pickled.
+        """
+        state = self.__dict__.copy()
+        state["widget_item"] = None
+        for name in ("image_series_widgets", "rtstruct_widgets",
+                     "rtplan_widgets"):
+            state[name] = {}
+        return state
+
     def get_widget_item(self):
         """
         :return: DICOMWidgetItem to be used in a QTreeWidget.
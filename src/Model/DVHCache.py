@@ -0,0 +1,251 @@
+"""
+Persistent cache of calculated DVHs.
+Calculating the DVH of every ROI of a patient is slow, so the DVHs are
+stored in the hidden OnkoDICOM directory once they have been calculated. A
+DVH is keyed by the SOPInstanceUID of the RT Dose together with a hash of
+the ROI's contours and of the dose grid, so an ROI whose contours and dose
+have not changed is never calculated again, both across GUI sessions and
+batch processing runs.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import dicompylercore
+import numpy as np
+from dicompylercore import dvh
+
+# Largest total size (in bytes) of the stored DVHs before the least
+# recently used ones are evicted
+DVH_CACHE_MAX_SIZE = 256 * 1024 * 1024
+
+
+class DVHCache:
+    """
+    SQLite backed store of DVHs. Each row holds the key of an ROI's DVH,
+    its bins and counts as a compressed npz blob, the remaining attributes
+    of the DVH as JSON, and the time it was last used.
+
+    Example usage:
+    dvh_cache = DVHCache()
+    raw_dvh = ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose, rois,
+                                     dict_thickness, interrupt_flag,
+                                     dvh_cache=dvh_cache)
+    """
+
+    def __init__(self, db_file='DVHCache.db', max_size=DVH_CACHE_MAX_SIZE):
+        """
+        :param db_file: Name of the cache database file inside the hidden
+            directory.
+        :param max_size: Largest total size of the stored DVHs in bytes.
+        """
+        self.db_file_path = Path(
+            os.environ['USER_ONKODICOM_HIDDEN']).joinpath(db_file)
+        self.max_size = max_size
+        self.set_up_cache_db()
+
+    def set_up_cache_db(self):
+        """
+        Create the DVH_CACHE table inside the SQLite database
+        """
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("""
+                    CREATE TABLE IF NOT EXISTS DVH_CACHE (
+                        key TEXT PRIMARY KEY,
+                        data BLOB,
+                        attributes TEXT,
+                        size INTEGER,
+                        last_used REAL
+                    );
+                """)
+        connection.commit()
+        connection.close()
+
+    def get_dvhs(self, keys):
+        """
+        Get the stored DVHs of the given keys.
+        :param keys: Dictionary of ROI number to DVH key.
+        :return: Dictionary of ROI number to DVH, for the keys that are in
+            the cache.
+        """
+        if not keys:
+            return {}
+        rois_by_key = {key: roi for roi, key in keys.items()}
+        connection = sqlite3.connect(self.db_file_path)
+        cursor = connection.cursor()
+        found = []
+        key_list = list(rois_by_key)
+        # Stay below SQLite's limit on the number of query parameters
+        for start in range(0, len(key_list), 500):
+            chunk = key_list[start:start + 500]
+            cursor.execute(
+                "SELECT key, data, attributes FROM DVH_CACHE WHERE key IN "
+                "(%s);" % ", ".join("?" * len(chunk)), chunk)
+            found.extend(cursor.fetchall())
+        now = time.time()
+        connection.executemany(
+            "UPDATE DVH_CACHE SET last_used = ? WHERE key = ?;",
+            [(now, row[0]) for row in found])
+        connection.commit()
+        connection.close()
+
+        return {rois_by_key[key]: dvh_from_blob(data, attributes)
+                for key, data, attributes in found}
+
+    def set_dvhs(self, keys, dict_dvh):
+        """
+        Store calculated DVHs, then evict the least recently used DVHs
+        if the cache has grown larger than its maximum size.
+        :param keys: Dictionary of ROI number to DVH key.
+        :param dict_dvh: Dictionary of ROI number to DVH.
+        """
+        now = time.time()
+        rows = []
+        for roi, roi_dvh in dict_dvh.items():
+            if roi not in keys or roi_dvh is None:
+                continue
+            data, attributes = dvh_to_blob(roi_dvh)
+            rows.append((keys[roi], data, attributes, len(data), now))
+        if not rows:
+            return
+
+        connection = sqlite3.connect(self.db_file_path)
+        connection.executemany("""INSERT OR REPLACE INTO DVH_CACHE
+                                  VALUES (?, ?, ?, ?, ?);""", rows)
+        self.evict(connection, {row[0] for row in rows})
+        connection.commit()
+        connection.close()
+
+    def evict(self, connection, kept_keys=()):
+        """
+        Delete the least recently used DVHs until the total size of the
+        cache is no larger than its maximum size.
+        :param connection: Open connection to the cache database.
+        :param kept_keys: Keys of the DVHs that have just been stored,
+            which are kept even if they alone exceed the maximum size.
+        """
+        cursor = connection.cursor()
+        cursor.execute("SELECT SUM(size) FROM DVH_CACHE;")
+        total_size = cursor.fetchone()[0] or 0
+        if total_size <= self.max_size:
+            return
+
+        cursor.execute("SELECT key, size FROM DVH_CACHE "
+                       "ORDER BY last_used ASC;")
+        evicted = []
+        for key, size in cursor.fetchall():
+            if total_size <= self.max_size:
+                break
+            if key in kept_keys:
+                continue
+            evicted.append((key,))
+            total_size -= size
+        connection.executemany("DELETE FROM DVH_CACHE WHERE key = ?;",
+                               evicted)
+
+    def clear(self):
+        """
+        Remove every DVH from the cache.
+        """
+        connection = sqlite3.connect(self.db_file_path)
+        connection.execute("DELETE FROM DVH_CACHE;")
+        connection.commit()
+        connection.close()
+
+
+def get_dvh_keys(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                 dose_limit=None, engine="dicompylercore"):
+    """
+    Get the cache key of the DVH of every ROI.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Dictionary of ROI information.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :param engine: Name of the engine the DVHs are calculated with.
+    :return: Dictionary of ROI number to DVH key.
+    """
+    dose_hash = get_dose_hash(dataset_rtdose)
+    contour_hashes = get_contour_hashes(dataset_rtss)
+
+    keys = {}
+    for roi in rois:
+        roi_hash = hashlib.sha256()
+        roi_hash.update(dataset_rtdose.SOPInstanceUID.encode())
+        roi_hash.update(dose_hash)
+        roi_hash.update(json.dumps([
+            engine, dicompylercore.__version__, rois[roi].get("name"),
+            dict_thickness.get(roi), dose_limit]).encode())
+        roi_hash.update(contour_hashes.get(roi, "").encode())
+        keys[roi] = roi_hash.hexdigest()
+    return keys
+
+
+def get_contour_hashes(dataset_rtss):
+    """
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :return: Dictionary of ROI number to a hash of the contours of the ROI.
+    """
+    contour_hashes = {}
+    for roi_contour in dataset_rtss.get("ROIContourSequence", []):
+        roi_hash = hashlib.sha256()
+        for contour in roi_contour.get("ContourSequence", []):
+            roi_hash.update(str(contour.get("ContourGeometricType")).encode())
+            roi_hash.update(
+                np.asarray(contour.ContourData, dtype=np.float64).tobytes())
+        contour_hashes[roi_contour.ReferencedROINumber] = roi_hash.hexdigest()
+    return contour_hashes
+
+
+def get_dose_hash(dataset_rtdose):
+    """
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :return: Digest of the dose grid and its geometry.
+    """
+    dose_hash = hashlib.sha256()
+    for keyword in ["ImagePositionPatient", "ImageOrientationPatient",
+                    "PixelSpacing", "GridFrameOffsetVector",
+                    "DoseGridScaling", "Rows", "Columns"]:
+        dose_hash.update(str(dataset_rtdose.get(keyword)).encode())
+    dose_hash.update(dataset_rtdose.PixelData)
+    return dose_hash.digest()
+
+
+def dvh_to_blob(roi_dvh):
+    """
+    :param roi_dvh: dicompylercore DVH.
+    :return: Tuple of the bins and counts as npz bytes, and the other
+        attributes of the DVH as JSON.
+    """
+    data = io.BytesIO()
+    np.savez_compressed(data, bins=roi_dvh.bins, counts=roi_dvh.counts)
+    color = roi_dvh.color
+    attributes = {
+        "dvh_type": roi_dvh.dvh_type,
+        "dose_units": roi_dvh.dose_units,
+        "volume_units": roi_dvh.volume_units,
+        "rx_dose": roi_dvh.rx_dose,
+        "name": roi_dvh.name,
+        "color": None if color is None else np.asarray(color).tolist(),
+        "notes": roi_dvh.notes,
+    }
+    return data.getvalue(), json.dumps(attributes)
+
+
+def dvh_from_blob(data, attributes):
+    """
+    :param data: npz bytes of the bins and counts of a DVH.
+    :param attributes: JSON of the other attributes of the DVH.
+    :return: dicompylercore DVH.
+    """
+    arrays = np.load(io.BytesIO(data))
+    attributes = json.loads(attributes)
+    if attributes["color"] is not None:
+        attributes["color"] = np.array(attributes["color"])
+    return dvh.DVH(arrays["counts"], arrays["bins"], **attributes)
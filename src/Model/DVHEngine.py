@@ -0,0 +1,202 @@
+"""
+Calculation of the DVHs of many ROIs on a bounded pool of processes.
+
+The pool has at most one process per available core. The RT Struct and the
+header of the RT Dose are sent to each process once when it starts, and the
+dose grid itself is handed over through shared memory instead of being
+pickled. Each process then calculates DVHs with dicompylercore until every
+ROI is done. The largest ROIs are started first, so one large ROI does not
+hold up the end of the calculation, and every DVH is returned to the caller
+as soon as it is ready.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+from dicompylercore import dvhcalc
+from pydicom import config
+from pydicom.dataelem import DataElement
+from pydicom.dataset import Dataset
+
+PIXEL_DATA_TAG = 0x7FE00010
+
+# Seconds between checks of the interrupt flag while waiting for DVHs
+INTERRUPT_POLL_INTERVAL = 0.2
+
+# Datasets of the calculation a worker process belongs to
+_worker_datasets = {}
+
+# SharedMemory holding the dose grid, kept open by a worker process for as
+# long as it reads the grid
+_worker_memory = None
+
+# Number of cores the pools of this process may use, when other processes
+# are calculating at the same time. None for every available core.
+_core_limit = None
+
+
+def get_available_cores():
+    """
+    :return: Number of cores available to OnkoDICOM.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def set_core_limit(core_limit):
+    """
+    Limit the number of worker processes of the pools of this process.
+    :param core_limit: Number of cores the pools may use, or None for
+        every available core.
+    """
+    global _core_limit
+    _core_limit = core_limit
+
+
+def get_worker_count(task_count):
+    """
+    :param task_count: Number of DVHs to calculate.
+    :return: Number of worker processes to use, which is never more than
+        the number of cores available to OnkoDICOM.
+    """
+    cores = get_available_cores()
+    if _core_limit is not None:
+        cores = min(cores, _core_limit)
+    return max(1, min(cores, task_count))
+
+
+def get_roi_sizes(dataset_rtss):
+    """
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :return: Dictionary of ROI number to the number of contour points of
+        the ROI.
+    """
+    roi_sizes = {}
+    for roi_contour in dataset_rtss.get("ROIContourSequence", []):
+        roi_sizes[roi_contour.ReferencedROINumber] = sum(
+            len(contour.get("ContourData", []))
+            for contour in roi_contour.get("ContourSequence", []))
+    return roi_sizes
+
+
+def share_dose(dataset_rtdose):
+    """
+    Copy the dose grid of an RT Dose into shared memory.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :return: Tuple of the RT Dose without its pixel data, a (VR, length)
+        tuple of the pixel data, and the SharedMemory holding it.
+    """
+    pixel_element = dataset_rtdose[PIXEL_DATA_TAG]
+    pixel_data = pixel_element.value
+    memory = shared_memory.SharedMemory(create=True,
+                                        size=max(len(pixel_data), 1))
+    memory.buf[:len(pixel_data)] = pixel_data
+
+    dose_header = Dataset()
+    for element in dataset_rtdose:
+        if element.tag != PIXEL_DATA_TAG:
+            dose_header.add(element)
+    if hasattr(dataset_rtdose, "file_meta"):
+        dose_header.file_meta = dataset_rtdose.file_meta
+    return dose_header, (pixel_element.VR, len(pixel_data)), memory
+
+
+def init_dvh_worker(dataset_rtss, dose_header, pixel_data_info,
+                    memory_name):
+    """
+    Set up a worker process of the pool. The datasets are kept for every
+    DVH the process calculates, and the pixel data of the RT Dose is read
+    straight from shared memory.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dose_header: RTDOSE DICOM dataset object without pixel data.
+    :param pixel_data_info: Tuple of the VR and length of the pixel data.
+    :param memory_name: Name of the SharedMemory holding the pixel data.
+    """
+    global _worker_memory
+    vr, length = pixel_data_info
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    # pydicom only expects bytes, but decodes any buffer of pixel data
+    dose_header.add(DataElement(PIXEL_DATA_TAG, vr,
+                                _worker_memory.buf[:length],
+                                validation_mode=config.IGNORE))
+    _worker_datasets["rtss"] = dataset_rtss
+    _worker_datasets["rtdose"] = dose_header
+
+
+def calc_dvh_task(roi, thickness, dose_limit=None):
+    """
+    Calculate the DVH of an ROI in a worker process.
+    :param roi: ROI number.
+    :param thickness: Thickness of the ROI, or None.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :return: Tuple of the ROI number and its DVH.
+    """
+    dvh = dvhcalc.get_dvh(_worker_datasets["rtss"],
+                          _worker_datasets["rtdose"], roi, dose_limit,
+                          thickness=thickness)
+    return roi, dvh
+
+
+def calc_dvhs_in_pool(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                      dose_limit=None, interrupt_flag=None,
+                      result_callback=None, max_workers=None):
+    """
+    Calculate the DVHs of the given ROIs on a pool of processes.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Iterable of the ROI numbers to calculate.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :param result_callback: Function called with (roi, dvh, completed,
+        total) every time a DVH has been calculated.
+    :param max_workers: Number of worker processes. Defaults to one per
+        available core.
+    :return: Tuple of the dictionary of calculated DVHs, and whether the
+        calculation was interrupted before every DVH was calculated.
+    """
+    roi_sizes = get_roi_sizes(dataset_rtss)
+    roi_list = sorted(rois, key=lambda roi: roi_sizes.get(roi, 0),
+                      reverse=True)
+    dict_dvh = {}
+    if not roi_list:
+        return dict_dvh, False
+
+    dose_header, pixel_data_info, memory = share_dose(dataset_rtdose)
+    # Workers are spawned, as the pool is started from Qt worker threads
+    # and forking a process with running threads can deadlock the child
+    executor = ProcessPoolExecutor(
+        max_workers=max_workers or get_worker_count(len(roi_list)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_dvh_worker,
+        initargs=(dataset_rtss, dose_header, pixel_data_info, memory.name))
+    interrupted = False
+    try:
+        futures = [executor.submit(calc_dvh_task, roi,
+                                   dict_thickness.get(roi), dose_limit)
+                   for roi in roi_list]
+        pending = set(futures)
+        while pending:
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                interrupted = True
+                break
+            done, pending = wait(pending, timeout=INTERRUPT_POLL_INTERVAL,
+                                 return_when=FIRST_COMPLETED)
+            # DVHs finished between two polls are returned in the order
+            # they were started
+            for future in sorted(done, key=futures.index):
+                roi, dvh = future.result()
+                dict_dvh[roi] = dvh
+                if result_callback is not None:
+                    result_callback(roi, dvh, len(dict_dvh), len(roi_list))
+    finally:
+        executor.shutdown(wait=not interrupted, cancel_futures=True)
+        memory.close()
+        memory.unlink()
+
+    return dict_dvh, interrupted
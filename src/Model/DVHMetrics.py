@@ -0,0 +1,72 @@
+"""
+Dose metrics of the DVHs of many ROIs at once, for the DVH CSV exports.
+
+For every 0.5 % step of relative volume from 100 % down to 0 %, the DVH
+CSV holds the highest dose (in cGy) that at least that much of each ROI
+receives. The cumulative DVH of an ROI never increases with dose, so the
+bin each step falls in is found for all the steps at once with
+np.searchsorted, and the dose is interpolated linearly within the bin.
+The metrics of all the ROIs are built into a table a column at a time,
+ready to be written to or appended to a CSV file.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Relative volumes (%) of the dose columns of the DVH CSV
+DVH_PERCENTAGES = np.arange(100, -0.5, -0.5)
+
+
+def get_dose_at_volumes(counts, percentages=DVH_PERCENTAGES):
+    """
+    :param counts: Cumulative relative volume (%) of each 1 cGy dose bin.
+    :param percentages: Relative volumes (%) to find the dose of.
+    :return: Array of the highest dose (cGy) received by at least each
+        relative volume, interpolated between the dose bins. The dose is
+        NaN where the volume is more than the DVH reaches.
+    """
+    percentages = np.asarray(percentages, dtype=float)
+    # Rounding errors are not allowed to make the curve increase
+    counts = np.minimum.accumulate(np.asarray(counts, dtype=float))
+    if counts.size == 0:
+        return np.full(percentages.shape, np.nan)
+
+    # Last bin with at least each relative volume, -1 for none
+    last_bins = counts.size - 1 - np.searchsorted(
+        counts[::-1], percentages, side="left")
+    bins = np.clip(last_bins, 0, counts.size - 1)
+    next_bins = np.minimum(bins + 1, counts.size - 1)
+
+    drop = counts[bins] - counts[next_bins]
+    fraction = np.divide(counts[bins] - percentages, drop,
+                         out=np.zeros(percentages.shape), where=drop > 0)
+    return np.where(last_bins >= 0, bins + fraction, np.nan)
+
+
+def get_dvh_metrics(dict_dvh, patient_id):
+    """
+    Get the dose metrics of DVHs as a table.
+    :param dict_dvh: A dictionary of DVH {ROINumber: DVH}
+    :param patient_id: Patient Identifier
+    :return: pandas DataFrame indexed by patient ID, with a row of the ROI
+        name, volume (mL) and dose (cGy) at each relative volume of
+        DVH_PERCENTAGES for each ROI.
+    """
+    dvhs = list(dict_dvh.values())
+    doses = np.empty((len(dvhs), len(DVH_PERCENTAGES)))
+    for row, dvh in enumerate(dvhs):
+        doses[row] = get_dose_at_volumes(dvh.relative_volume.counts)
+
+    # Doses are whole cGy, with an empty cell where there is no dose
+    dose_columns = pd.DataFrame(
+        np.round(doses),
+        columns=[str(percent) + '%' for percent in DVH_PERCENTAGES]
+    ).astype("Int64")
+    roi_columns = pd.DataFrame({
+        'Patient ID': [patient_id] * len(dvhs),
+        'ROI': [dvh.name for dvh in dvhs],
+        'Volume (mL)': pd.Series(
+            [dvh.volume for dvh in dvhs], dtype=float).round(2).fillna(0.0)
+    })
+    return pd.concat([roi_columns, dose_columns], axis=1) \
+        .set_index('Patient ID')
@@ -0,0 +1,217 @@
+"""
+Tree model of the elements of a DICOM dataset for the DICOM tree view.
+
+DicomTree converted every element of a dataset, and every item of its
+sequences, into nested OrderedDicts before the tree view copied them into
+a QStandardItemModel, which for a large RTSTRUCT means millions of
+entries. The DicomTreeModel reads the pydicom dataset that is already in
+memory directly. The rows of a dataset or sequence are only created when
+the view expands it, a batch at a time, and the text of an element is
+only formatted when the view displays it.
+"""
+from PySide6 import QtCore
+
+# Number of rows of a dataset or sequence created at a time
+DICOM_TREE_FETCH_SIZE = 256
+
+DICOM_TREE_HEADERS = ("Name", "Value", "Tag", "VM", "VR")
+
+# Pixel data is not shown in the tree
+PIXEL_DATA_TAG = 0x7FE00010
+
+
+class DicomTreeNode:
+    """
+    A row of the tree: a data element, or an item of a sequence.
+    """
+    __slots__ = ("parent", "row", "name", "element", "dataset",
+                 "children", "sources")
+
+    def __init__(self, parent, row, name, element=None, dataset=None):
+        """
+        :param parent: Parent DicomTreeNode, or None for the root.
+        :param row: Row of the node under its parent.
+        :param name: Text of the name column of an item, or None for a
+            data element, whose name is taken from the element.
+        :param element: pydicom DataElement of the row.
+        :param dataset: pydicom Dataset of a sequence item or of the root.
+        """
+        self.parent = parent
+        self.row = row
+        self.name = name
+        self.element = element
+        self.dataset = dataset
+        # Child rows created so far
+        self.children = []
+        # Tags of the elements of a dataset, or items of a sequence, that
+        # the child rows are created from. Found when first needed.
+        self.sources = None
+
+    def child_sources(self):
+        """
+        :return: List of the tags of the elements of the dataset of the
+            node, or of the items of its sequence.
+        """
+        if self.sources is None:
+            if self.dataset is not None:
+                self.sources = [tag for tag in self.dataset.keys()
+                                if tag != PIXEL_DATA_TAG]
+            elif self.element.VR == "SQ":
+                self.sources = list(self.element.value)
+            else:
+                self.sources = []
+        return self.sources
+
+    def has_children(self):
+        """
+        :return: True if the node has child rows, without creating them.
+        """
+        return len(self.child_sources()) > 0
+
+    def create_child(self, row):
+        """
+        :param row: Row of the child under this node.
+        :return: DicomTreeNode of the row.
+        """
+        source = self.child_sources()[row]
+        if self.dataset is not None:
+            return DicomTreeNode(self, row, None,
+                                 element=self.dataset[source])
+        return DicomTreeNode(self, row, "item " + str(row), dataset=source)
+
+    def text(self, column):
+        """
+        :param column: Column of the tree.
+        :return: The text of the column for the node.
+        """
+        if self.element is None:
+            return self.name if column == 0 else ""
+        element = self.element
+        if column == 0:
+            return element.name
+        # Sequences only show their name, the way DicomTree listed them
+        if element.VR == "SQ":
+            return ""
+        if column == 1:
+            return str(element.value)
+        if column == 2:
+            return repr(element.tag)
+        if column == 3:
+            return str(element.VM)
+        return str(element.VR)
+
+
+class DicomTreeModel(QtCore.QAbstractItemModel):
+    """
+    Item model of a pydicom dataset, whose sequences are expanded on
+    demand.
+
+    Example usage:
+    model = DicomTreeModel()
+    tree_view.setModel(model)
+    model.set_dataset(patient_dict_container.get("dataset_rtss"))
+    """
+
+    def __init__(self, dataset=None, fetch_size=DICOM_TREE_FETCH_SIZE,
+                 parent=None):
+        """
+        :param dataset: pydicom Dataset shown by the model, or None for an
+            empty model.
+        :param fetch_size: Number of rows created at a time.
+        :param parent: Parent QObject.
+        """
+        super().__init__(parent)
+        self.fetch_size = fetch_size
+        self.root = None
+        self.set_dataset(dataset)
+
+    def set_dataset(self, dataset):
+        """
+        Show another dataset.
+        :param dataset: pydicom Dataset, or None to clear the model.
+        """
+        self.beginResetModel()
+        self.root = DicomTreeNode(None, 0, None, dataset=dataset) \
+            if dataset is not None else None
+        if self.root is not None:
+            self._create_children(self.root)
+        self.endResetModel()
+
+    def node(self, index):
+        """
+        :param index: QModelIndex of a row, or an invalid index for the root.
+        :return: DicomTreeNode of the row.
+        """
+        if index.isValid():
+            return index.internalPointer()
+        return self.root
+
+    def _create_children(self, node):
+        """
+        Create the next batch of child rows of a node.
+        :param node: DicomTreeNode to create rows under.
+        """
+        start = len(node.children)
+        end = min(start + self.fetch_size, len(node.child_sources()))
+        node.children.extend(node.create_child(row)
+                             for row in range(start, end))
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        node = self.node(parent)
+        if node is None or not 0 <= row < len(node.children) \
+                or not 0 <= column < len(DICOM_TREE_HEADERS):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index=QtCore.QModelIndex()):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QtCore.QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        node = self.node(parent)
+        return len(node.children) if node is not None else 0
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return len(DICOM_TREE_HEADERS)
+
+    def hasChildren(self, parent=QtCore.QModelIndex()):
+        if parent.column() > 0:
+            return False
+        node = self.node(parent)
+        return node is not None and node.has_children()
+
+    def canFetchMore(self, parent):
+        node = self.node(parent)
+        return node is not None \
+            and len(node.children) < len(node.child_sources())
+
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        start = len(node.children)
+        end = min(start + self.fetch_size, len(node.child_sources()))
+        if end > start:
+            self.beginInsertRows(parent, start, end - 1)
+            self._create_children(node)
+            self.endInsertRows()
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return index.internalPointer().text(index.column())
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if orientation == QtCore.Qt.Horizontal \
+                and role == QtCore.Qt.DisplayRole:
+            return DICOM_TREE_HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable
@@ -1,9 +1,10 @@
-from skimage import measure
+import numpy as np
 from src.Controller.PathHandler import data_path
-from src.Model import ImageLoading
-from src.Model import ROI
-from src.Model.Isodose import get_dose_grid
+from src.Model.ContourExtraction import find_volume_contours, \
+    grid_to_patient
+from src.Model.IsodoseProvider import get_isodose_provider
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.RTSSModel import RTSSModel
 
 
 class ISO2ROI:
@@ -35,7 +36,8 @@ class ISO2ROI:
 
         # Calculate dose boundaries
         progress_callback.emit(("Calculating Boundaries", 50))
-        boundaries = self.calculate_isodose_boundaries(isodose_levels)
+        boundaries = self.calculate_isodose_boundaries(isodose_levels,
+                                                       interrupt_flag)
 
         # Return if boundaries could not be calculated
         if not boundaries:
@@ -71,18 +73,19 @@ class ISO2ROI:
                                             int(items[0])]
         return isodose_levels
 
-    def calculate_isodose_boundaries(self, isodose_levels):
+    def calculate_isodose_boundaries(self, isodose_levels,
+                                     interrupt_flag=None):
         """
         Calculates isodose boundaries for each isodose level.
-        :return: coutours, a list containing the countours for each
-                 isodose level.
+        :param isodose_levels: dictionary of isodose levels, as returned
+                               by get_iso_levels.
+        :param interrupt_flag: interrupt flag to stop process
+        :return: coutours, a dictionary where the key is the isodose
+                 level and the value is a dictionary of slice index to
+                 the contours of the level on the slice.
         """
         # Initialise variables needed to find isodose levels
         patient_dict_container = PatientDictContainer()
-        pixmaps = patient_dict_container.get("pixmaps_axial")
-        slider_min = 0
-        slider_max = len(pixmaps)
-
         rt_plan_dose = patient_dict_container.dataset['rtdose']
         rt_dose_dose = patient_dict_container.get("rx_dose_in_cgray")
 
@@ -90,32 +93,35 @@ class ISO2ROI:
         if not rt_dose_dose:
             return None
 
-        contours = {}
-
+        # Dose level of each isodose level, in units of the dose grid
+        levels = {}
         for item in isodose_levels:
-            # Calculate boundaries for each isodose level for each slice
-            contours[item] = []
-            for slider_id in range(slider_min, slider_max):
-                contours[item].append([])
-                temp_ds = patient_dict_container.dataset[slider_id]
-                z = temp_ds.ImagePositionPatient[2]
-                grid = get_dose_grid(rt_plan_dose, float(z))
-
-                if not (len(grid) == 0):
-                    if isodose_levels[item][0]:
-                        dose_level = isodose_levels[item][1] / \
-                                     (rt_plan_dose.DoseGridScaling * 100)
-                        contours[item][slider_id] =\
-                            (measure.find_contours(grid, dose_level))
-                    else:
-                        dose_level = isodose_levels[item][1] * \
-                                     rt_dose_dose / \
-                                     (rt_plan_dose.DoseGridScaling * 10000)
-                        contours[item][slider_id] = \
-                            (measure.find_contours(grid, dose_level))
-
-        # Return list of contours for each isodose level for each slice
-        return contours
+            if isodose_levels[item][0]:
+                levels[item] = isodose_levels[item][1] / \
+                               (rt_plan_dose.DoseGridScaling * 100)
+            else:
+                levels[item] = isodose_levels[item][1] * rt_dose_dose / \
+                               (rt_plan_dose.DoseGridScaling * 10000)
+
+        # Dose plane of every slice inside the dose grid, decoded and
+        # interpolated once for all the isodose levels
+        isodose_provider = get_isodose_provider(patient_dict_container)
+        slice_indices = []
+        planes = []
+        for slider_id in range(len(isodose_provider.frames)):
+            grid = isodose_provider.get_dose_plane(slider_id)
+            if grid is not None:
+                slice_indices.append(slider_id)
+                planes.append(grid)
+        if not planes:
+            return {item: {} for item in levels}
+        volume = np.zeros((len(isodose_provider.frames),)
+                          + planes[0].shape)
+        volume[slice_indices] = planes
+
+        # Return contours of each isodose level for each slice
+        return find_volume_contours(volume, levels, slice_indices,
+                                    interrupt_flag)
 
     def generate_roi(self, contours, progress_callback):
         """
@@ -126,78 +132,36 @@ class ISO2ROI:
         # Initialise variables needed for function
         patient_dict_container = PatientDictContainer()
         dataset_rtss = patient_dict_container.get("dataset_rtss")
-        pixmaps = patient_dict_container.get("pixmaps_axial")
-        slider_min = 0
-        slider_max = len(pixmaps) - 1
+        pixluts = patient_dict_container.get("pixluts")
+        dose_pixluts = patient_dict_container.get("dose_pixluts")
+        dict_uid = patient_dict_container.get("dict_uid")
 
-        # Get existing ROIs
-        existing_rois = []
-        rois = patient_dict_container.get("dataset_rtss")
-        if rois:
-            for roi in rois.StructureSetROISequence:
-                existing_rois.append(roi.ROIName)
+        rtss_model = RTSSModel(dataset_rtss)
 
         # Loop through each isodose level
         for item in contours:
             # Delete ROI if it already exists to recreate it
-            if item in existing_rois:
-                dataset_rtss = ROI.delete_roi(dataset_rtss, item)
-
-                # Update patient dict container
-                current_rois = patient_dict_container.get("rois")
-                keys = []
-                for key, value in current_rois.items():
-                    if value["name"] == item:
-                        keys.append(key)
-                for key in keys:
-                    del current_rois[key]
-                patient_dict_container.set("rois", current_rois)
-
-            # Calculate isodose ROI for each slice, skip if slice has no
-            # contour data
-            for i in range(slider_min, slider_max):
-                if not len(contours[item][i]):
-                    continue
+            rtss_model.delete_roi(item)
 
+            # Calculate isodose ROI for each slice with contour data
+            roi_list = []
+            for i, slice_contours in contours[item].items():
                 # Get required data for calculating ROI
                 dataset = patient_dict_container.dataset[i]
-                pixlut = patient_dict_container.get("pixluts")
-                pixlut = pixlut[dataset.SOPInstanceUID]
-                z_coord = dataset.SliceLocation
-                curr_slice_uid = patient_dict_container.get("dict_uid")[i]
-                dose_pixluts = patient_dict_container.get("dose_pixluts")
-                dose_pixluts = dose_pixluts[curr_slice_uid]
-
-                # Loop through each contour for each slice.
-                # Convert the pixel points to RCS points, append z value
-                single_array = []
-
-                # Loop through each contour
-                for j in range(len(contours[item][i])):
-                    single_array.append([])
-                    # Loop through every second point in the contour
-                    for point in contours[item][i][j][::2]:
-                        # Transform into dose pixel
-                        dose_pixels = [dose_pixluts[0][int(point[1])],
-                                       dose_pixluts[1][int(point[0])]]
-                        # Transform into RCS pixel
-                        rcs_pixels = ROI.pixel_to_rcs(pixlut,
-                                                      round(dose_pixels[0]),
-                                                      round(dose_pixels[1]))
-                        # Append point coordinates to the single array
-                        single_array[j].append(rcs_pixels[0])
-                        single_array[j].append(rcs_pixels[1])
-                        single_array[j].append(z_coord)
-
-                # Create the ROI(s)
-                for array in single_array:
-                    rtss = ROI.create_roi(dataset_rtss, item,
-                                          [{'coords': array, 'ds': dataset}],
-                                          "DOSE_REGION")
-
-                    # Save the updated rtss
-                    patient_dict_container.set("dataset_rtss", rtss)
-                    patient_dict_container.set("rois",
-                                               ImageLoading.get_roi_info(rtss))
+
+                # Convert every second point of the contours from dose
+                # pixels to RCS points, with the slice's z value
+                for array in grid_to_patient(
+                        slice_contours, pixluts[dataset.SOPInstanceUID],
+                        dataset.SliceLocation, dose_pixluts[dict_uid[i]],
+                        step=2):
+                    roi_list.append({'coords': array, 'ds': dataset})
+
+            # Create the ROI(s)
+            rtss_model.add_contours(item, roi_list, "DOSE_REGION")
+
+        # Save the updated rtss
+        patient_dict_container.set("dataset_rtss", rtss_model.to_dataset())
+        patient_dict_container.set("rois", rtss_model.get_roi_info())
 
         progress_callback.emit(("Writing to RT Structure Set", 85))
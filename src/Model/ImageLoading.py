@@ -24,14 +24,20 @@ import contextlib
 import logging
 import math
 import re
-
-from multiprocessing import Queue, Process
+import sqlite3
 
 import numpy as np
 from dicompylercore import dvhcalc
 from pydicom import dcmread, DataElement, FileDataset
+from pydicom.filereader import read_file_meta_info
 from pydicom.errors import InvalidDicomError
 
+from src.Model.DVHCache import get_contour_hashes, get_dvh_keys
+from src.Model.DVHEngine import calc_dvhs_in_pool
+from src.Model.VectorisedDVH import UNSUPPORTED_DATASET_ERRORS, \
+    calc_dvhs_vectorised, is_supported_dose
+from src.Model.PixelVolume import LAZY_DEFER_SIZE, LazySliceDataset, \
+    attach_pixel_volume
 from src.View.ImageLoader import ImageLoader
 
 logger = logging.getLogger(__name__)
@@ -165,7 +171,26 @@ def _is_correct_orientation(slice_data: FileDataset) -> bool:
         return False
 
 
-def get_datasets(filepath_list, file_type=None, parent_window=None):
+def is_sliceable_file(file):
+    """
+    Check whether a file is an image slice from its file meta information
+    alone, before the rest of the file is read.
+    :param file: Path of the DICOM file.
+    :return: True if the SOP class in the file meta information is of an
+        image slice. False otherwise, including files without file meta
+        information.
+    """
+    try:
+        file_meta = read_file_meta_info(file)
+    except InvalidDicomError:
+        return False
+    allowed_class = allowed_classes.get(
+        file_meta.get("MediaStorageSOPClassUID"))
+    return allowed_class is not None and allowed_class["sliceable"]
+
+
+def get_datasets(filepath_list, file_type=None, parent_window=None,
+                 lazy_pixels=False):
     """
     This function generates two dictionaries: the dictionary of PyDicom
     datasets, and the dictionary of filepaths. These two dictionaries
@@ -176,6 +201,9 @@ def get_datasets(filepath_list, file_type=None, parent_window=None):
     are filepaths pointing to the location of the .dcm file on the
     user's computer.
     :param filepath_list: List of all files to be searched.
+    :param lazy_pixels: Read image slices without their pixel data. The
+        slices are LazySliceDatasets sharing one PixelVolume that decodes
+        each slice when it is first needed.
     :return: Tuple (read_data_dict, file_names_dict)
     """
     read_data_dict = {}
@@ -187,7 +215,11 @@ def get_datasets(filepath_list, file_type=None, parent_window=None):
     for file in natural_sort(filepath_list):
 
         with contextlib.suppress(InvalidDicomError):
-            read_file = dcmread(file)
+            # RT objects are edited and saved back to the same file, so
+            # they must not hold deferred elements and are read in full
+            read_file = dcmread(
+                file, defer_size=LAZY_DEFER_SIZE
+                if lazy_pixels and is_sliceable_file(file) else None)
 
         if read_file.SOPClassUID not in allowed_classes:
             raise NotAllowedClassError(
@@ -196,6 +228,9 @@ def get_datasets(filepath_list, file_type=None, parent_window=None):
 
         allowed_class = allowed_classes[read_file.SOPClassUID]
 
+        if lazy_pixels and allowed_class["sliceable"]:
+            read_file = LazySliceDataset(read_file)
+
         # Check slice is Axial - might add option for user to delete from directory
         if allowed_class['sliceable'] and not _is_correct_orientation(read_file):
             logger.warning(f"Skipping {file} as it is not an axial slice")
@@ -236,6 +271,9 @@ def get_datasets(filepath_list, file_type=None, parent_window=None):
         read_data_dict, file_names_dict
     )
 
+    if lazy_pixels:
+        attach_pixel_volume(sorted_read_data_dict)
+
     # Notify user of abnormal slice alignment on initial load
     if incorrectly_aligned_slices and isinstance(parent_window, ImageLoader):
         parent_window.is_incorrect_slice = True
@@ -530,7 +568,8 @@ def get_thickness_dict(dataset_rtss, read_data_dict):
 
 
 def calc_dvhs(
-    dataset_rtss, dataset_rtdose, rois, dict_thickness, interrupt_flag, dose_limit=None
+    dataset_rtss, dataset_rtdose, rois, dict_thickness, interrupt_flag,
+    dose_limit=None, dvh_cache=None
 ):
     """
     :param dataset_rtss: RTSTRUCT DICOM dataset object.
@@ -541,67 +580,255 @@ def calc_dvhs(
     :param interrupt_flag: A threading.Event() object that tells the
         function to stop calculation.
     :param dose_limit: Limit of dose for DVH calculation.
+    :param dvh_cache: Optional DVHCache. DVHs found in the cache are not
+        calculated again, and calculated DVHs are stored in it.
     :return: Dictionary of all the DVHs of all the ROIs of the patient.
     """
-    dict_dvh = {}
+    try:
+        if is_supported_dose(dataset_rtdose):
+            return vectorised_calc_dvh(
+                dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                dose_limit, dvh_cache, interrupt_flag)
+    except UNSUPPORTED_DATASET_ERRORS:
+        # dicompylercore calculates the DVHs instead
+        logger.exception("Vectorised DVH calculation failed")
+
+    dvh_keys, dict_dvh = get_cached_dvhs(
+        dataset_rtss, dataset_rtdose, rois, dict_thickness, dose_limit,
+        dvh_cache)
     roi_list = []
     for key in rois:
-        roi_list.append(key)
+        if key not in dict_dvh:
+            roi_list.append(key)
 
+    calculated = {}
     for roi in roi_list:
         thickness = None
         if roi in dict_thickness:
             thickness = dict_thickness[roi]
-        dict_dvh[roi] = dvhcalc.get_dvh(
+        calculated[roi] = dvhcalc.get_dvh(
             dataset_rtss, dataset_rtdose, roi, dose_limit, thickness=thickness
         )
         if interrupt_flag.is_set():  # Stop calculating at the next DVH.
+            store_cached_dvhs(dvh_cache, dvh_keys, calculated)
             return
 
+    store_cached_dvhs(dvh_cache, dvh_keys, calculated)
+    dict_dvh.update(calculated)
     return dict_dvh
 
 
-def calc_dvh_worker(rtss, dose, roi, queue, thickness, dose_limit=None):
-    dvh = {roi: dvhcalc.get_dvh(rtss, dose, roi, dose_limit, thickness=thickness)}
-    queue.put(dvh)
+def multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                   dose_limit=None, dvh_cache=None, interrupt_flag=None,
+                   result_callback=None):
+    """
+    Multiprocessing variant of calc_dvhs. The DVHs are calculated with
+    the native engine of VectorisedDVH, or on a pool with at most one
+    process per available core for dose grids the engine does not
+    support.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Dictionary of ROI information.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :param dvh_cache: Optional DVHCache. DVHs found in the cache are not
+        calculated again, and calculated DVHs are stored in it.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :param result_callback: Function called with (roi, dvh, completed,
+        total) every time a DVH has been calculated.
+    :return: Dictionary of all the DVHs of all the ROIs of the patient, or
+        None if the calculation was interrupted.
+    """
+    try:
+        if is_supported_dose(dataset_rtdose):
+            return vectorised_calc_dvh(
+                dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                dose_limit, dvh_cache, interrupt_flag, result_callback)
+    except UNSUPPORTED_DATASET_ERRORS:
+        # dicompylercore calculates the DVHs instead
+        logger.exception("Vectorised DVH calculation failed")
+
+    dvh_keys, dict_dvh = get_cached_dvhs(
+        dataset_rtss, dataset_rtdose, rois, dict_thickness, dose_limit,
+        dvh_cache)
+    roi_list = [roi for roi in rois if roi not in dict_dvh]
+
+    calculated, interrupted = calc_dvhs_in_pool(
+        dataset_rtss, dataset_rtdose, roi_list, dict_thickness, dose_limit,
+        interrupt_flag, result_callback)
+
+    store_cached_dvhs(dvh_cache, dvh_keys, calculated)
+    if interrupted:
+        return
+
+    dict_dvh.update(calculated)
+    return dict_dvh
 
 
-def multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness, dose_limit=None):
+def vectorised_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                        dose_limit=None, dvh_cache=None, interrupt_flag=None,
+                        result_callback=None):
     """
-    Multiprocessing variant of calc_dvh for fork-based platforms.
+    Variant of calc_dvhs that calculates the DVHs of all the ROIs at once
+    with the native engine of VectorisedDVH instead of dicompylercore.
+    calc_dvhs and multi_calc_dvh use it for every dose grid the engine
+    supports.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Dictionary of ROI information.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :param dvh_cache: Optional DVHCache. DVHs found in the cache are not
+        calculated again, and calculated DVHs are stored in it.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :param result_callback: Function called with (roi, dvh, completed,
+        total) every time a DVH has been calculated.
+    :return: Dictionary of all the DVHs of all the ROIs of the patient, or
+        None if the calculation was interrupted.
     """
-    queue = Queue()
-    processes = []
-    dict_dvh = {}
+    dvh_keys, dict_dvh = get_cached_dvhs(
+        dataset_rtss, dataset_rtdose, rois, dict_thickness, dose_limit,
+        dvh_cache, engine="vectorised")
+    roi_list = [roi for roi in rois if roi not in dict_dvh]
+
+    if not roi_list:
+        return dict_dvh
+
+    completed = 0
+
+    def dvh_calculated(roi, dvh):
+        nonlocal completed
+        completed += 1
+        result_callback(roi, dvh, completed, len(roi_list))
+
+    calculated = calc_dvhs_vectorised(
+        dataset_rtss, dataset_rtdose, roi_list, dict_thickness, dose_limit,
+        interrupt_flag,
+        dvh_calculated if result_callback is not None else None)
+    if calculated is None:
+        return
+
+    store_cached_dvhs(dvh_cache, dvh_keys, calculated)
+    dict_dvh.update(calculated)
+    return dict_dvh
 
-    roi_list = []
-    roi_list.extend(iter(rois))
-    for i in range(len(roi_list)):
-        thickness = None
-        if roi_list[i] in dict_thickness:
-            thickness = dict_thickness[roi_list[i]]
-        p = Process(
-            target=calc_dvh_worker,
-            args=(
-                dataset_rtss,
-                dataset_rtdose,
-                roi_list[i],
-                queue,
-                thickness,
-                dose_limit,
-            ),
-        )
-        processes.append(p)
-        p.start()
 
-    for process in processes:
-        dvh = queue.get()
-        dict_dvh.update(dvh)
+def get_cached_dvhs(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                    dose_limit=None, dvh_cache=None, engine="dicompylercore"):
+    """
+    Look up the DVHs of the ROIs in the DVH cache.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Dictionary of ROI information.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose for DVH calculation.
+    :param dvh_cache: DVHCache, or None to calculate every DVH.
+    :param engine: Name of the engine the DVHs are calculated with.
+    :return: Tuple of the cache keys of the ROIs, and a dictionary of the
+        DVHs found in the cache.
+    """
+    if dvh_cache is None:
+        return {}, {}
+    try:
+        dvh_keys = get_dvh_keys(dataset_rtss, dataset_rtdose, rois,
+                                dict_thickness, dose_limit, engine)
+        return dvh_keys, dvh_cache.get_dvhs(dvh_keys)
+    except (sqlite3.Error, AttributeError, KeyError, ValueError) as error:
+        # The DVHs are calculated as if there was no cache
+        logger.warning("DVH cache lookup failed: %s", error)
+        return {}, {}
+
 
-    for process in processes:
-        process.join()
+def store_cached_dvhs(dvh_cache, dvh_keys, dict_dvh):
+    """
+    Store calculated DVHs in the DVH cache.
+    :param dvh_cache: DVHCache, or None.
+    :param dvh_keys: Dictionary of ROI number to DVH key.
+    :param dict_dvh: Dictionary of ROI number to calculated DVH.
+    """
+    if dvh_cache is None or not dvh_keys:
+        return
+    try:
+        dvh_cache.set_dvhs(dvh_keys, dict_dvh)
+    except sqlite3.Error as error:
+        logger.warning("Could not store DVHs in the DVH cache: %s", error)
 
-    return dict_dvh
+
+def get_dvh_roi_hashes(dataset_rtss, raw_dvh):
+    """
+    Get the contour hashes of the ROIs that have a DVH, to track which
+    ROIs change after their DVHs have been calculated.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object the DVHs belong to.
+    :param raw_dvh: Dictionary of ROI number to DVH.
+    :return: Dictionary of ROI number to contour hash.
+    """
+    return {roi: contour_hash for roi, contour_hash
+            in get_contour_hashes(dataset_rtss).items() if roi in raw_dvh}
+
+
+def get_rtss_changes(dvh_roi_hashes, dataset_rtss):
+    """
+    Compare a structure set with the contour hashes of the ROIs at the
+    time their DVHs were calculated.
+    :param dvh_roi_hashes: Dictionary produced by get_dvh_roi_hashes(..).
+    :param dataset_rtss: The current RTSTRUCT DICOM dataset object.
+    :return: Dictionary of the lists of "added", "modified" and "removed"
+        ROI numbers.
+    """
+    contour_hashes = get_contour_hashes(dataset_rtss)
+    return {
+        "added": [roi for roi in contour_hashes
+                  if roi not in dvh_roi_hashes],
+        "modified": [roi for roi in contour_hashes if roi in dvh_roi_hashes
+                     and contour_hashes[roi] != dvh_roi_hashes[roi]],
+        "removed": [roi for roi in dvh_roi_hashes
+                    if roi not in contour_hashes],
+    }
+
+
+def calc_changed_dvhs(dataset_rtss, dataset_rtdose, read_data_dict, raw_dvh,
+                      dvh_x_y, rtss_changes, dvh_cache=None,
+                      interrupt_flag=None):
+    """
+    Recalculate the DVHs of the ROIs that have been added or modified, and
+    drop those of the ROIs that have been removed, keeping every other DVH.
+    :param dataset_rtss: The current RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param read_data_dict: Dictionary of the datasets of the patient.
+    :param raw_dvh: Dictionary of the current DVHs.
+    :param dvh_x_y: Dictionary produced by converge_to_0_dvh(raw_dvh).
+    :param rtss_changes: Dictionary produced by get_rtss_changes(..).
+    :param dvh_cache: Optional DVHCache.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :return: Tuple of the updated raw_dvh and dvh_x_y dictionaries, or
+        None if the calculation was interrupted.
+    """
+    all_rois = get_roi_info(dataset_rtss)
+    rois = {roi: all_rois[roi]
+            for roi in rtss_changes["added"] + rtss_changes["modified"]
+            if roi in all_rois}
+    dict_thickness = get_thickness_dict(dataset_rtss, read_data_dict)
+
+    calculated = multi_calc_dvh(dataset_rtss, dataset_rtdose, rois,
+                                dict_thickness, dvh_cache=dvh_cache,
+                                interrupt_flag=interrupt_flag)
+    if calculated is None:
+        return
+
+    raw_dvh = dict(raw_dvh)
+    dvh_x_y = dict(dvh_x_y)
+    for roi in rtss_changes["removed"]:
+        raw_dvh.pop(roi, None)
+        dvh_x_y.pop(roi, None)
+    raw_dvh.update(calculated)
+    dvh_x_y.update(converge_to_0_dvh(calculated))
+    return raw_dvh, dvh_x_y
 
 
 def converge_to_0_dvh(raw_dvh):
@@ -0,0 +1,221 @@
+"""
+Automatic linear registration of a moving image to a fixed image.
+
+The registration is set up the way platipy's linear_registration sets it
+up, with the multi-resolution pyramid, the metric sampling and the number
+of threads taken from imageFusion.json. While the optimiser converges, the
+current transform is passed to a callback every few iterations, so the
+fused views can show the registration as it improves, and the registration
+stops early when its interrupt flag is set.
+"""
+import json
+import os
+
+import SimpleITK as sitk
+
+from src.Controller.PathHandler import data_path
+
+# Settings used for any setting imageFusion.json does not have
+DEFAULT_REGISTRATION_SETTINGS = {
+    "reg_method": "rigid",
+    "metric": "mean_squares",
+    "optimiser": "gradient_descent",
+    "shrink_factors": [8],
+    "smooth_sigmas": [10],
+    "sampling_rate": 0.25,
+    "sampling_strategy": "random",
+    "final_interp": 2,
+    "number_of_iterations": 50,
+    "default_value": -1000,
+    "number_of_threads": 0,
+    "preview_interval": 10,
+}
+
+# Seed of the metric sampling, so a registration can be repeated
+SAMPLING_SEED = 42
+
+REGISTRATION_TRANSFORMS = {
+    "translation": lambda: sitk.TranslationTransform(3),
+    "rigid": sitk.VersorRigid3DTransform,
+    "similarity": sitk.Similarity3DTransform,
+    "affine": lambda: sitk.AffineTransform(3),
+    "scale": lambda: sitk.ScaleTransform(3),
+    "scaleversor": sitk.ScaleVersor3DTransform,
+    "scaleskewversor": sitk.ScaleSkewVersor3DTransform,
+}
+
+SAMPLING_STRATEGIES = {
+    "none": sitk.ImageRegistrationMethod.NONE,
+    "regular": sitk.ImageRegistrationMethod.REGULAR,
+    "random": sitk.ImageRegistrationMethod.RANDOM,
+}
+
+
+def get_registration_settings():
+    """
+    Read the registration settings from imageFusion.json.
+    :return: Dictionary of the registration settings, with the default
+        value of any setting the file does not have.
+    """
+    settings = dict(DEFAULT_REGISTRATION_SETTINGS)
+    if os.path.exists(data_path("imageFusion.json")):
+        with open(data_path("imageFusion.json"), "r") as file_input:
+            settings.update(json.load(file_input))
+    return settings
+
+
+def set_metric(registration, metric):
+    """
+    :param registration: The sitk.ImageRegistrationMethod.
+    :param metric: Name of the metric to optimise.
+    """
+    metric = metric.lower()
+    # The add-on options have always spelt correlation this way
+    if metric in ("correlation", "coorelation"):
+        registration.SetMetricAsCorrelation()
+    elif metric == "mean_squares":
+        registration.SetMetricAsMeanSquares()
+    elif metric == "mattes_mi":
+        registration.SetMetricAsMattesMutualInformation()
+    elif metric == "joint_hist_mi":
+        registration.SetMetricAsJointHistogramMutualInformation()
+    else:
+        raise ValueError("Unknown registration metric: %s" % metric)
+
+
+def set_optimiser(registration, optimiser, number_of_iterations):
+    """
+    :param registration: The sitk.ImageRegistrationMethod.
+    :param optimiser: Name of the optimiser.
+    :param number_of_iterations: Number of iterations at each level of
+        the pyramid.
+    """
+    optimiser = optimiser.lower()
+    if optimiser == "lbfgsb":
+        registration.SetOptimizerAsLBFGSB(
+            gradientConvergenceTolerance=1e-5,
+            numberOfIterations=number_of_iterations,
+            maximumNumberOfCorrections=50,
+            maximumNumberOfFunctionEvaluations=1024,
+            costFunctionConvergenceFactor=1e7)
+    elif optimiser == "gradient_descent_line_search":
+        registration.SetOptimizerAsGradientDescentLineSearch(
+            learningRate=1.0, numberOfIterations=number_of_iterations)
+    elif optimiser == "gradient_descent":
+        # A fixed learning rate overshoots at the finer levels of a
+        # pyramid, so it is estimated from the scales at every iteration
+        registration.SetOptimizerAsGradientDescent(
+            learningRate=1.0, numberOfIterations=number_of_iterations,
+            estimateLearningRate=registration.EachIteration)
+    else:
+        raise ValueError("Unknown registration optimiser: %s" % optimiser)
+
+
+def resample(image, reference_image, transform, interpolator,
+             default_value, number_of_threads=0):
+    """
+    Resample an image onto the grid of a reference image.
+    :param image: SimpleITK image to resample.
+    :param reference_image: SimpleITK image whose grid is resampled onto.
+    :param transform: Transform from the reference image to the image.
+    :param interpolator: SimpleITK interpolator.
+    :param default_value: Value of voxels outside the image.
+    :param number_of_threads: Number of threads, or 0 for the SimpleITK
+        default.
+    :return: The resampled image.
+    """
+    resampler = sitk.ResampleImageFilter()
+    resampler.SetReferenceImage(reference_image)
+    resampler.SetTransform(transform)
+    resampler.SetInterpolator(interpolator)
+    resampler.SetDefaultPixelValue(default_value)
+    if number_of_threads:
+        resampler.SetNumberOfThreads(number_of_threads)
+    return resampler.Execute(image)
+
+
+def register(fixed_image, moving_image, settings=None, interrupt_flag=None,
+             transform_callback=None):
+    """
+    Register the moving image to the fixed image.
+    :param fixed_image: SimpleITK image of the fixed image.
+    :param moving_image: SimpleITK image of the moving image.
+    :param settings: Dictionary of registration settings. Defaults to the
+        settings of imageFusion.json.
+    :param interrupt_flag: A threading.Event() object that tells the
+        registration to stop.
+    :param transform_callback: Function called with the current transform
+        (a sitk.CompositeTransform), the level of the pyramid and the
+        iteration every preview_interval iterations of each level.
+    :return: Tuple of the moving image resampled onto the fixed image and
+        the sitk.CompositeTransform from the fixed to the moving image, or
+        None if interrupted.
+    """
+    if settings is None:
+        settings = get_registration_settings()
+    number_of_threads = settings["number_of_threads"]
+
+    moving_image_type = moving_image.GetPixelIDValue()
+    fixed_image = sitk.Cast(fixed_image, sitk.sitkFloat32)
+    moving_image = sitk.Cast(moving_image, sitk.sitkFloat32)
+
+    # Align the centres of the images before optimising
+    initial_transform = sitk.CenteredTransformInitializer(
+        fixed_image, moving_image, sitk.Euler3DTransform(), False)
+
+    registration = sitk.ImageRegistrationMethod()
+    if number_of_threads:
+        registration.SetNumberOfThreads(number_of_threads)
+    registration.SetShrinkFactorsPerLevel(settings["shrink_factors"])
+    registration.SetSmoothingSigmasPerLevel(settings["smooth_sigmas"])
+    registration.SmoothingSigmasAreSpecifiedInPhysicalUnitsOn()
+    registration.SetMovingInitialTransform(initial_transform)
+    set_metric(registration, settings["metric"])
+    registration.SetInterpolator(sitk.sitkLinear)
+
+    registration.SetMetricSamplingPercentage(settings["sampling_rate"],
+                                             SAMPLING_SEED)
+    registration.SetMetricSamplingStrategy(
+        SAMPLING_STRATEGIES[settings["sampling_strategy"].lower()])
+    registration.SetOptimizerScalesFromPhysicalShift()
+
+    try:
+        optimised_transform = \
+            REGISTRATION_TRANSFORMS[settings["reg_method"].lower()]()
+    except KeyError:
+        raise ValueError("Unknown registration method: %s"
+                         % settings["reg_method"])
+    registration.SetInitialTransform(optimised_transform)
+    set_optimiser(registration, settings["optimiser"],
+                  settings["number_of_iterations"])
+
+    def current_transform():
+        transform = sitk.Transform(optimised_transform)
+        transform.SetParameters(registration.GetOptimizerPosition())
+        return sitk.CompositeTransform([initial_transform, transform])
+
+    def iteration_event():
+        if interrupt_flag is not None and interrupt_flag.is_set():
+            registration.StopRegistration()
+            return
+        interval = settings["preview_interval"]
+        iteration = registration.GetOptimizerIteration()
+        if transform_callback is not None and interval \
+                and iteration % interval == 0:
+            transform_callback(current_transform(),
+                               registration.GetCurrentLevel(), iteration)
+
+    registration.AddCommand(sitk.sitkIterationEvent, iteration_event)
+    output_transform = registration.Execute(fixed_image, moving_image)
+    if interrupt_flag is not None and interrupt_flag.is_set():
+        return None
+
+    combined_transform = sitk.CompositeTransform(
+        [initial_transform, output_transform])
+    registered_image = resample(
+        moving_image, fixed_image, combined_transform,
+        settings["final_interp"], settings["default_value"],
+        number_of_threads)
+    return sitk.Cast(registered_image, moving_image_type), \
+        combined_transform
+
@@ -73,35 +73,61 @@ def get_dose_grid(rtd, z=0):
     """
 
     if 'GridFrameOffsetVector' in rtd:
-        z = float(z)
+        frames = get_dose_grid_frames(rtd, z)
+        if frames is None:
+            return np.array([])
+        return interpolate_dose_grid(rtd.pixel_array, frames)
 
-        planes = rtd.ImageOrientationPatient[0] \
-                 * np.array(rtd.GridFrameOffsetVector) \
-                 + rtd.ImagePositionPatient[2]
-        frame = -1
 
-        if np.amin(np.fabs(planes - z)) < 0.5:
-            frame = np.argmin(np.fabs(planes - z))
-            return rtd.pixel_array[frame]
+def get_dose_grid_frames(rtd, z=0):
+    """
+    Find the frames of the dose grid that the dose plane at the given
+    slice position is interpolated from.
+
+    :param rtd:     Data from RTDose file, with a GridFrameOffsetVector
+    :param z:       Position of slice in mm
+    :return:        Tuple of the frame the position is on, or of the
+                    upper frame, lower frame and fractional distance from
+                    the lower to the upper frame. None if the position is
+                    outside the dose grid.
+    """
+    z = float(z)
+
+    planes = rtd.ImageOrientationPatient[0] \
+             * np.array(rtd.GridFrameOffsetVector) \
+             + rtd.ImagePositionPatient[2]
 
-        if (z > np.amin(planes)) or (z < np.amax(planes)):
-            u_min = np.fabs(planes - z)
-            l_min = u_min.copy()
-            ub = np.argmin(u_min)
+    if np.amin(np.fabs(planes - z)) < 0.5:
+        return (np.argmin(np.fabs(planes - z)),)
 
-            l_min[ub] = np.amax(u_min)
-            lb = np.argmin(l_min)
+    if (z > np.amin(planes)) or (z < np.amax(planes)):
+        u_min = np.fabs(planes - z)
+        l_min = u_min.copy()
+        ub = np.argmin(u_min)
 
-            # Fractional distance from bottom to top
-            # Plane is at upper plane if 1, lower plane if 0
-            fz = (z - planes[lb]) / (planes[ub] - planes[lb])
+        l_min[ub] = np.amax(u_min)
+        lb = np.argmin(l_min)
 
-            plane = fz * rtd.pixel_array[ub] \
-                    + (1.0 - fz) * rtd.pixel_array[lb]
+        # Fractional distance from bottom to top
+        # Plane is at upper plane if 1, lower plane if 0
+        fz = (z - planes[lb]) / (planes[ub] - planes[lb])
+        return ub, lb, fz
 
-            return plane
+    return None
+
+
+def interpolate_dose_grid(pixel_array, frames):
+    """
+    :param pixel_array:     Decoded pixel array of the RTDose file
+    :param frames:          Frames of the dose plane, as returned by
+                            get_dose_grid_frames
+    :return:                Dose grid as a 2d numpy array
+    """
+    if len(frames) == 1:
+        return pixel_array[frames[0]]
 
-        return np.array([])
+    ub, lb, fz = frames
+    return fz * pixel_array[ub] + (1.0 - fz) * pixel_array[lb]
 
 
 def calculate_rx_dose_in_cgray(rtplan):
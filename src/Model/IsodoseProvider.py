@@ -0,0 +1,114 @@
+"""
+Cached isodose contours for the axial view.
+
+Drawing isodoses used to interpolate the dose plane of the slice from the
+RT Dose (decoding its pixel data again) and trace every selected level with
+marching squares on each repaint. The IsodoseProvider decodes the dose grid
+once, finds the frames each image slice is interpolated from when it is
+created, and keeps the traced contours in an LRU cache keyed by (slice,
+dose level), so scrolling back over a slice costs a dictionary lookup.
+"""
+import threading
+from collections import OrderedDict
+
+from skimage import measure
+
+from src.Model.Isodose import get_dose_grid_frames, interpolate_dose_grid
+
+# Number of (slice, dose level) contour lists kept in the cache
+ISODOSE_CACHE_SIZE = 512
+
+# Number of interpolated dose planes kept in the cache
+DOSE_PLANE_CACHE_SIZE = 16
+
+
+class IsodoseProvider:
+    """
+    Traces the isodose contours of the image slices on request.
+
+    Example usage:
+    isodose_provider = get_isodose_provider(patient_dict_container)
+    contours = isodose_provider.get_contours(slice_index, dose_level)
+    """
+
+    def __init__(self, rtd, slice_positions, cache_size=ISODOSE_CACHE_SIZE):
+        """
+        :param rtd: RTDOSE DICOM dataset object.
+        :param slice_positions: z position (mm) of every image slice, in
+            slice order.
+        :param cache_size: Number of contour lists kept in the cache.
+        """
+        self.rtd = rtd
+        self.cache_size = cache_size
+        self.pixel_array = rtd.pixel_array
+        if 'GridFrameOffsetVector' in rtd:
+            self.frames = [get_dose_grid_frames(rtd, z)
+                           for z in slice_positions]
+        else:
+            self.frames = [None] * len(slice_positions)
+
+        self._contours = OrderedDict()
+        self._planes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_dose_plane(self, slice_index):
+        """
+        :param slice_index: Index of the image slice.
+        :return: Dose grid of the slice as a 2d numpy array, or None if the
+            slice is outside the dose grid.
+        """
+        frames = self.frames[slice_index]
+        if frames is None:
+            return None
+        with self._lock:
+            plane = self._planes.get(slice_index)
+            if plane is not None:
+                self._planes.move_to_end(slice_index)
+                return plane
+        plane = interpolate_dose_grid(self.pixel_array, frames)
+        with self._lock:
+            self._planes[slice_index] = plane
+            while len(self._planes) > DOSE_PLANE_CACHE_SIZE:
+                self._planes.popitem(last=False)
+        return plane
+
+    def get_contours(self, slice_index, dose_level):
+        """
+        :param slice_index: Index of the image slice.
+        :param dose_level: Dose level in units of the dose grid.
+        :return: List of (N, 2) arrays of the (row, column) points of the
+            isodose contours on the dose grid of the slice.
+        """
+        key = (slice_index, dose_level)
+        with self._lock:
+            contours = self._contours.get(key)
+            if contours is not None:
+                self._contours.move_to_end(key)
+                return contours
+
+        plane = self.get_dose_plane(slice_index)
+        contours = [] if plane is None \
+            else measure.find_contours(plane, dose_level)
+        with self._lock:
+            self._contours[key] = contours
+            while len(self._contours) > self.cache_size:
+                self._contours.popitem(last=False)
+        return contours
+
+
+def get_isodose_provider(dict_container):
+    """
+    :param dict_container: Container of the patient's datasets.
+    :return: The IsodoseProvider of the container's RT Dose, which is
+        created the first time isodoses are drawn and again whenever the
+        RT Dose is replaced.
+    """
+    dataset_rtdose = dict_container.dataset['rtdose']
+    isodose_provider = dict_container.get("isodose_provider")
+    if isodose_provider is None or isodose_provider.rtd is not dataset_rtdose:
+        slice_positions = [
+            dict_container.dataset[index].ImagePositionPatient[2]
+            for index in sorted(dict_container.get("dict_uid"))]
+        isodose_provider = IsodoseProvider(dataset_rtdose, slice_positions)
+        dict_container.set("isodose_provider", isodose_provider)
+    return isodose_provider
@@ -0,0 +1,48 @@
+"""
+Line and fill settings of the ROI and isodose display.
+
+The settings are saved by the Add-On Options window to the
+line&fill_configuration file, one value per line. The views read them for
+every polygon they draw, so the parsed settings are kept and the file is
+only parsed again after it has been saved.
+"""
+import os
+
+from src.Controller.PathHandler import data_path
+
+# Settings used when the configuration file is empty
+DEFAULT_LINE_FILL_CONFIGURATION = {
+    "roi_line": 1,
+    "roi_opacity": 10,
+    "iso_line": 2,
+    "iso_opacity": 5,
+    "line_width": 2.0,
+}
+
+_configuration = {"key": None, "settings": None}
+
+
+def get_line_fill_configuration():
+    """
+    :return: Dictionary of the ROI line style and opacity, the isodose line
+        style and opacity, and the line width.
+    """
+    path = data_path('line&fill_configuration')
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if _configuration["key"] != key:
+        with open(path, 'r') as stream:
+            elements = stream.readlines()
+        if len(elements) > 0:
+            settings = {
+                "roi_line": int(elements[0].replace('\n', '')),
+                "roi_opacity": int(elements[1].replace('\n', '')),
+                "iso_line": int(elements[2].replace('\n', '')),
+                "iso_opacity": int(elements[3].replace('\n', '')),
+                "line_width": float(elements[4].replace('\n', '')),
+            }
+        else:
+            settings = dict(DEFAULT_LINE_FILL_CONFIGURATION)
+        _configuration["key"] = key
+        _configuration["settings"] = settings
+    return _configuration["settings"]
@@ -5,8 +5,7 @@ import pydicom
 from src.constants import CT_RESCALE_INTERCEPT
 
 from src.Model.CalculateImages import convert_raw_data, get_pixmaps
-from src.Model.GetPatientInfo import get_basic_info, DicomTree, \
-    dict_instance_uid
+from src.Model.GetPatientInfo import get_basic_info, dict_instance_uid
 from src.Model.Isodose import get_dose_pixluts, calculate_rx_dose_in_cgray
 
 from src.Model.PatientDictContainer import PatientDictContainer
@@ -15,7 +14,7 @@ from src.Model.MovingDictContainer import MovingDictContainer
 from src.Model.ROI import ordered_list_rois
 from src.Controller.PathHandler import data_path
 
-from src.Model.ImageFusion import create_fused_model, get_fused_window
+from src.Model.ImageFusion import create_fused_model
 
 
 def create_moving_model():
@@ -117,9 +116,6 @@ def create_moving_model():
         moving_dict_container.set("file_rtss", filepaths['rtss'])
         moving_dict_container.set("dataset_rtss", dataset['rtss'])
 
-        dicom_tree_rtss = DicomTree(filepaths['rtss'])
-        moving_dict_container.set("dict_dicom_tree_rtss", dicom_tree_rtss.dict)
-
         moving_dict_container.set("list_roi_numbers", ordered_list_rois(
             moving_dict_container.get("rois")))
         moving_dict_container.set("selected_rois", [])
@@ -128,10 +124,6 @@ def create_moving_model():
 
     # Set RTDOSE attributes
     if moving_dict_container.has_modality("rtdose"):
-        dicom_tree_rtdose = DicomTree(filepaths['rtdose'])
-        moving_dict_container.set(
-            "dict_dicom_tree_rtdose", dicom_tree_rtdose.dict)
-
         moving_dict_container.set("dose_pixluts", get_dose_pixluts(dataset))
 
         moving_dict_container.set("selected_doses", [])
@@ -143,12 +135,8 @@ def create_moving_model():
         rx_dose_in_cgray = calculate_rx_dose_in_cgray(dataset["rtplan"])
         moving_dict_container.set("rx_dose_in_cgray", rx_dose_in_cgray)
 
-        dicom_tree_rtplan = DicomTree(filepaths['rtplan'])
-        moving_dict_container.set("dict_dicom_tree_rtplan",
-                                  dicom_tree_rtplan.dict)
-
 
-def read_images_for_fusion(level=0, window=0):
+def read_images_for_fusion(interrupt_flag=None, progress_callback=None):
     """
     Performs initial image fusion, this is by converting the old and
     new images for transformations into SITK object. Images are co-registered 
@@ -156,15 +144,15 @@ def read_images_for_fusion(level=0, window=0):
     added to the patient dataset.
     
     Args:
-        level(int): midpoint of window
-        window(Any): range of values, should at least contain low bound and 
-        high bound
+        interrupt_flag(threading.Event): stops the image fusion when set
+        progress_callback: when given, the intermediate transforms of the
+        registration are emitted to it as it converges
+    Return:
+        tfm (sitk.CompositeTransform) of the image fusion, or None if
+        interrupted
     """
     patient_dict_container = PatientDictContainer()
     moving_dict_container = MovingDictContainer()
-    if level == 0 or window == 0:
-        level = patient_dict_container.get("level")
-        window = patient_dict_container.get("window")
 
     amount = len(patient_dict_container.filepaths)
     orig_fusion_list = []
@@ -190,11 +178,12 @@ def read_images_for_fusion(level=0, window=0):
     new_image = sitk.ReadImage(new_fusion_list)
     moving_dict_container.set("sitk_moving", new_image)
 
-    create_fused_model(orig_image, new_image)
-    color_axial, color_sagittal, color_coronal, tfm = \
-        get_fused_window(level, window)
+    transform_callback = None
+    if progress_callback is not None:
+        def transform_callback(transform, level, iteration):
+            progress_callback.emit(transform)
 
-    patient_dict_container.set("color_axial", color_axial)
-    patient_dict_container.set("color_sagittal", color_sagittal)
-    patient_dict_container.set("color_coronal", color_coronal)
-    moving_dict_container.set("tfm", tfm)
+    # The transform is shown and stored for ROI transfer by the VTKEngine
+    # of the fusion views, on the GUI thread
+    return create_fused_model(orig_image, new_image, interrupt_flag,
+                              transform_callback)
@@ -8,6 +8,10 @@ Keyword arguments for DICOM-RT:
     rois
     raw_dvh
     dvh_x_y
+    dvh_roi_hashes (contour hashes of the ROIs when their DVHs were
+        calculated)
+    rtss_changes (ROIs added, modified and removed since then, cleared
+        whenever dataset_rtss is set)
     raw_contour
     num_points
     pixluts
@@ -87,6 +91,9 @@ class PatientDictContainer(metaclass=Singleton):
         :param value: The value of the new item.
         """
         self.additional_data[key] = value
+        if key == "dataset_rtss":
+            # The tracked changes are of the previous structure set
+            self.additional_data.pop("rtss_changes", None)
 
     def get(self, keyword):
         """
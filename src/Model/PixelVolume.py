@@ -0,0 +1,284 @@
+"""
+Lazy pixel loading for image series.
+
+When ImageLoading.get_datasets is called with lazy_pixels=True, every image
+slice is read without its pixel data and wrapped in a LazySliceDataset. All
+slices of the series share one PixelVolume, a preallocated
+(slices, rows, cols) array that each slice is decoded into the first time
+it is needed. Uncompressed slices are read straight from the file through
+numpy.memmap; compressed slices are decoded by pydicom from the file, so the
+encoded pixel data is never kept in memory either.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pydicom.dataset import FileDataset
+from pydicom.pixels import pixel_array as read_pixel_array
+from pydicom.pixels.utils import pixel_dtype
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian
+
+# Elements larger than this (in bytes) are not read until accessed. This
+# keeps PixelData (and its file offset) out of memory for the image slices.
+LAZY_DEFER_SIZE = 1024
+
+PIXEL_DATA_TAG = 0x7FE00010
+
+MEMMAP_TRANSFER_SYNTAXES = [ImplicitVRLittleEndian, ExplicitVRLittleEndian]
+
+
+class LazySliceDataset(FileDataset):
+    """
+    Header-only FileDataset of a single image slice. pixel_array returns the
+    slice's view of the PixelVolume shared by the whole series, so pixel
+    data is only decoded when the slice is first used and is never copied
+    into the dataset itself.
+    """
+
+    def __init__(self, read_file):
+        """
+        :param read_file: FileDataset read with defer_size so that its
+            PixelData has not been loaded.
+        """
+        super().__init__(read_file.filename, read_file, read_file.preamble,
+                         read_file.file_meta, *read_file.original_encoding)
+        self.pixel_volume = None
+        self.slice_index = None
+
+    @property
+    def pixel_array(self):
+        """
+        :return: The slice's pixel data, rescaled if the PixelVolume has
+            been given a rescale.
+        """
+        return self.pixel_volume[self.slice_index]
+
+    def convert_pixel_data(self, handler_name=""):
+        """
+        Keeps _pixel_array usable for code that converts the pixel data
+        explicitly before reading it.
+        """
+        self._pixel_array = self.pixel_array
+
+
+class PixelVolume:
+    """
+    Shared (slices, rows, cols) pixel array of an image series whose slices
+    are decoded on demand. Behaves like the list of slice arrays returned
+    by CalculateImages.convert_raw_data: it can be indexed, iterated and
+    turned into a numpy array (which decodes every remaining slice).
+    """
+
+    def __init__(self, datasets):
+        """
+        :param datasets: List of LazySliceDatasets ordered by slice index.
+        """
+        self.datasets = datasets
+        first_slice = datasets[0]
+        self.shape = (len(datasets), first_slice.Rows, first_slice.Columns)
+        self.slopes = None
+        self.intercepts = None
+        self.volume = None
+        self.loaded = np.zeros(len(datasets), dtype=bool)
+        self._lock = threading.Lock()
+
+    @property
+    def dtype(self):
+        """
+        :return: float32 once a rescale is set, otherwise the stored pixel
+            data type.
+        """
+        if self.slopes is not None:
+            return np.dtype(np.float32)
+        return pixel_dtype(self.datasets[0])
+
+    def set_rescale(self, slopes, intercepts):
+        """
+        Set the per-slice rescale applied when slices are decoded. Slices
+        that have already been decoded are rescaled in place.
+        :param slopes: Rescale slope of every slice.
+        :param intercepts: Rescale intercept of every slice.
+        """
+        with self._lock:
+            self.slopes = np.asarray(slopes, dtype=np.float32)
+            self.intercepts = np.asarray(intercepts, dtype=np.float32)
+            if self.volume is not None:
+                volume = self.volume.astype(np.float32)
+                loaded = self.loaded
+                volume[loaded] = \
+                    volume[loaded] * self.slopes[loaded, None, None] \
+                    + self.intercepts[loaded, None, None]
+                self.volume = volume
+
+    def allocate(self):
+        """
+        Allocate the shared volume if it does not exist yet.
+        :return: The volume.
+        """
+        with self._lock:
+            if self.volume is None:
+                self.volume = np.empty(self.shape, dtype=self.dtype)
+            return self.volume
+
+    def load_slice(self, index):
+        """
+        Decode a slice into the volume if it has not been decoded yet.
+        Safe to call from several threads at once.
+        :param index: Slice index.
+        """
+        if self.loaded[index]:
+            return
+        pixels = read_slice_pixels(self.datasets[index])
+        self.allocate()
+        with self._lock:
+            if self.loaded[index]:
+                return
+            # set_rescale may have replaced the volume since it was
+            # allocated
+            volume = self.volume
+            if self.slopes is not None:
+                np.multiply(pixels, self.slopes[index], out=volume[index],
+                            casting="unsafe")
+                volume[index] += self.intercepts[index]
+            else:
+                volume[index] = pixels
+            self.loaded[index] = True
+
+    def load_all(self, max_workers=None):
+        """
+        Decode every slice that has not been decoded yet, on a thread pool.
+        :param max_workers: Number of decoding threads. Defaults to the
+            executor's own default.
+        :return: The complete volume.
+        """
+        indices = np.flatnonzero(~self.loaded)
+        if len(indices) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(self.load_slice, indices))
+        elif len(indices) == 1:
+            self.load_slice(indices[0])
+        return self.allocate()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            self.load_slice(index)
+            return self.volume[index]
+        return self.load_all()[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __array__(self, dtype=None, copy=None):
+        volume = self.load_all()
+        if dtype is not None:
+            return volume.astype(dtype)
+        return volume
+
+
+def decode_slices(datasets, read_pixels, dtype=None, max_workers=None):
+    """
+    Decode the pixel data of a series of slices concurrently, straight into
+    one preallocated (slices, rows, cols) array.
+    :param datasets: List of slice datasets.
+    :param read_pixels: Function that returns the 2D pixel array of a
+        slice dataset.
+    :param dtype: dtype of the returned volume. Defaults to the dtype of
+        the first decoded slice.
+    :param max_workers: Number of decoding threads. Defaults to the
+        executor's own default.
+    :return: 3D numpy array of the slices.
+    """
+    first_slice = read_pixels(datasets[0])
+    volume = np.empty((len(datasets),) + first_slice.shape,
+                      dtype=dtype or first_slice.dtype)
+    volume[0] = first_slice
+
+    def decode(index):
+        volume[index] = read_pixels(datasets[index])
+
+    if len(datasets) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(decode, range(1, len(datasets))))
+    return volume
+
+
+def apply_rescale(volume, slopes, intercepts):
+    """
+    Rescale a whole volume in place with per-slice slopes and intercepts.
+    :param volume: Float (slices, rows, cols) array.
+    :param slopes: Rescale slope of every slice.
+    :param intercepts: Rescale intercept of every slice.
+    :return: The rescaled volume.
+    """
+    slopes = np.asarray(slopes, dtype=volume.dtype)
+    intercepts = np.asarray(intercepts, dtype=volume.dtype)
+    # Most series share a single rescale, which avoids broadcasting
+    if np.all(slopes == slopes[0]) and np.all(intercepts == intercepts[0]):
+        volume *= slopes[0]
+        volume += intercepts[0]
+    else:
+        volume *= slopes[:, None, None]
+        volume += intercepts[:, None, None]
+    return volume
+
+
+def attach_pixel_volume(read_data_dict):
+    """
+    Create the PixelVolume shared by the image slices of a sorted
+    read_data_dict.
+    :param read_data_dict: Dictionary returned by ImageLoading.get_datasets.
+    :return: The PixelVolume, or None if there are no lazy image slices.
+    """
+    datasets = [dataset for key, dataset in read_data_dict.items()
+                if isinstance(key, int)
+                and isinstance(dataset, LazySliceDataset)]
+    if not datasets:
+        return None
+
+    pixel_volume = PixelVolume(datasets)
+    for index, dataset in enumerate(datasets):
+        dataset.pixel_volume = pixel_volume
+        dataset.slice_index = index
+    return pixel_volume
+
+
+def is_memmappable(dataset):
+    """
+    :param dataset: Image slice dataset.
+    :return: True if the pixel data is stored in a form numpy.memmap can
+        read as it is.
+    """
+    if dataset.file_meta.get("TransferSyntaxUID") \
+            not in MEMMAP_TRANSFER_SYNTAXES:
+        return False
+    if dataset.get("SamplesPerPixel", 1) != 1 \
+            or int(dataset.get("NumberOfFrames", 1) or 1) != 1:
+        return False
+    if dataset.BitsAllocated not in (8, 16, 32):
+        return False
+    # Signed data with unused high bits needs sign extension
+    return dataset.BitsStored == dataset.BitsAllocated \
+        or dataset.PixelRepresentation == 0
+
+
+def read_slice_pixels(dataset):
+    """
+    Read the pixel data of a slice without keeping it in the dataset.
+    :param dataset: LazySliceDataset of the slice.
+    :return: 2D array of the stored pixel values.
+    """
+    pixel_element = dataset.get_item(PIXEL_DATA_TAG, keep_deferred=True)
+    is_deferred = getattr(pixel_element, "value", None) is None \
+        and getattr(pixel_element, "value_tell", None) is not None
+
+    if is_deferred and is_memmappable(dataset):
+        return np.memmap(dataset.filename, dtype=pixel_dtype(dataset),
+                         mode="r", offset=pixel_element.value_tell,
+                         shape=(dataset.Rows, dataset.Columns))
+    if is_deferred:
+        return read_pixel_array(dataset.filename)
+    return read_pixel_array(dataset)
@@ -0,0 +1,222 @@
+"""
+On-demand pixmap generation for the axial, coronal and sagittal views.
+
+Instead of rendering a pixmap for every slice of all three planes up front
+(and again for the whole volume on every window/level change), the
+PixmapProvider renders a slice only when a view asks for it. Rendered slices
+are kept in an LRU cache keyed by (plane, index, window, level, size), and
+the neighbouring slices of the one requested are rendered in the background
+so scrolling stays smooth.
+"""
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+from PySide6 import QtGui
+from PySide6.QtCore import QThreadPool
+
+from src.Model.CalculateImages import scaled_image, scaled_size
+from src.Model.Worker import Worker
+
+# Number of rendered slices kept in the cache
+PIXMAP_CACHE_SIZE = 256
+
+# Number of slices on each side of a requested slice rendered in advance
+PIXMAP_PREFETCH = 2
+
+PLANES = ("axial", "coronal", "sagittal")
+
+
+class PixmapProvider:
+    """
+    Renders the pixmaps of a pixel volume on request.
+
+    Example usage:
+    pixmap_provider = PixmapProvider(pixel_values, window, level,
+                                     pixmap_aspect)
+    pixmaps_axial = pixmap_provider.plane("axial")
+    pixmap = pixmaps_axial[slice_index]
+    pixmap_provider.set_window(new_window, new_level)
+    """
+
+    def __init__(self, pixel_values, window, level, pixmap_aspect,
+                 fusion=False, color=None, cache_size=PIXMAP_CACHE_SIZE,
+                 prefetch=PIXMAP_PREFETCH):
+        """
+        :param pixel_values: 3D array, list of slice arrays or PixelVolume.
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        :param pixmap_aspect: Scaling ratio for axial, coronal, and
+            sagittal pixmaps
+        :param fusion: Boolean to determine if pixmaps will be fused
+        :param color: String for conversion of pixels to specified color map
+        :param cache_size: Number of rendered slices kept in the cache.
+        :param prefetch: Number of neighbouring slices rendered in advance
+            on each side of a requested slice.
+        """
+        self.pixel_values = pixel_values
+        self.window = window
+        self.level = level
+        self.fusion = fusion
+        self.color = color
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+
+        first_slice = np.asarray(pixel_values[0])
+        self.shape = (len(pixel_values),) + first_slice.shape
+        self.sizes = {
+            "axial": scaled_size(self.shape[1] * pixmap_aspect["axial"],
+                                 self.shape[2]),
+            "coronal": scaled_size(self.shape[1],
+                                   self.shape[0] * pixmap_aspect["coronal"]),
+            "sagittal": scaled_size(
+                self.shape[2] * pixmap_aspect["sagittal"], self.shape[0]),
+        }
+        self.planes = {plane: PlanePixmaps(self, plane) for plane in PLANES}
+
+        self._cache = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._volume = None
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(1)
+
+    def plane(self, plane):
+        """
+        :param plane: "axial", "coronal" or "sagittal".
+        :return: Dictionary-like PlanePixmaps of the plane.
+        """
+        return self.planes[plane]
+
+    def slice_count(self, plane):
+        """
+        :param plane: "axial", "coronal" or "sagittal".
+        :return: Number of slices in the plane.
+        """
+        return self.shape[PLANES.index(plane)]
+
+    def set_window(self, window, level):
+        """
+        Change the window and level of the pixmaps returned from now on.
+        Slices already rendered with other values stay in the cache.
+        :param window: Window width of windowing function
+        :param level: Level value of windowing function
+        """
+        self.window = window
+        self.level = level
+
+    def cache_key(self, plane, index):
+        """
+        :return: Cache key of a slice with the current window and level.
+        """
+        return (plane, index, self.window, self.level) + self.sizes[plane]
+
+    def get_pixmap(self, plane, index):
+        """
+        Get the pixmap of a slice, rendering it if it is not cached, and
+        start rendering its neighbours in the background.
+        :param plane: "axial", "coronal" or "sagittal".
+        :param index: Slice index in the plane.
+        :return: QPixmap of the slice.
+        """
+        key = self.cache_key(plane, index)
+        image = self.get_cached(key)
+        if image is None:
+            image = self.render(plane, index, key)
+        self.prefetch_neighbours(plane, index)
+        return QtGui.QPixmap.fromImage(image)
+
+    def get_cached(self, key):
+        """
+        :param key: Cache key.
+        :return: The cached QImage, or None.
+        """
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+            return image
+
+    def render(self, plane, index, key):
+        """
+        Render a slice and store it in the cache.
+        :return: QImage of the slice.
+        """
+        width, height = self.sizes[plane]
+        image = scaled_image(self.get_slice(plane, index), key[2], key[3],
+                             width, height, self.fusion, self.color)
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return image
+
+    def get_slice(self, plane, index):
+        """
+        :return: 2D pixel array of a slice. Axial slices only need their
+            own pixel data; the other planes need the whole volume.
+        """
+        if plane == "axial":
+            return np.asarray(self.pixel_values[index])
+        if self._volume is None:
+            self._volume = np.asarray(self.pixel_values)
+        if plane == "coronal":
+            return self._volume[:, index, :]
+        return self._volume[:, :, index]
+
+    def prefetch_neighbours(self, plane, index):
+        """
+        Render the slices next to the given one on a background thread.
+        """
+        keys = []
+        for offset in range(1, self.prefetch + 1):
+            for neighbour in (index + offset, index - offset):
+                if 0 <= neighbour < self.slice_count(plane):
+                    key = self.cache_key(plane, neighbour)
+                    with self._lock:
+                        if key in self._cache or key in self._pending:
+                            continue
+                        self._pending.add(key)
+                    keys.append((neighbour, key))
+        if keys:
+            self.threadpool.start(Worker(self.render_pending, plane, keys))
+
+    def render_pending(self, plane, keys):
+        """
+        Render the given slices, skipping any that were rendered meanwhile.
+        :param plane: "axial", "coronal" or "sagittal".
+        :param keys: List of (index, cache key) tuples.
+        """
+        for index, key in keys:
+            try:
+                if self.get_cached(key) is None:
+                    self.render(plane, index, key)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+
+class PlanePixmaps(Mapping):
+    """
+    Read-only, dictionary-like view of the pixmaps of one plane. Stored in
+    the model in place of the eager dictionaries of pixmaps, so views keep
+    using pixmaps[slice_index] and len(pixmaps).
+    """
+
+    def __init__(self, provider, plane):
+        self.provider = provider
+        self.plane = plane
+
+    def __getitem__(self, index):
+        if not isinstance(index, (int, np.integer)) \
+                or not 0 <= index < len(self):
+            raise KeyError(index)
+        return self.provider.get_pixmap(self.plane, int(index))
+
+    def __len__(self):
+        return self.provider.slice_count(self.plane)
+
+    def __iter__(self):
+        return iter(range(len(self)))
@@ -0,0 +1,324 @@
+"""
+On-demand ROI polygon generation for the axial, coronal and sagittal views.
+
+Instead of calculating the polygons of every slice of all three planes when
+an ROI is selected, the PolygonProvider calculates the polygons of a slice
+only when a view asks for them. Calculated polygons are kept in an LRU cache
+keyed by (plane, ROI name, slice), and the polygons of the neighbouring
+slices are calculated in the background so scrolling stays smooth. When the
+contours of an ROI change, only the cached polygons of that ROI are thrown
+away.
+"""
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from PySide6.QtCore import QThreadPool
+
+from src.Model.ROI import calc_roi_polygon, calculate_slice_pixels, \
+    get_roi_contour_pixel
+from src.Model.ROIMask import ROIMask
+from src.Model.Worker import Worker
+from src.View.util.PatientDictContainerHelper import get_dict_slice_to_uid
+
+# Number of (plane, ROI, slice) polygon lists kept in the cache
+POLYGON_CACHE_SIZE = 1024
+
+# Number of slices on each side of a requested slice calculated in advance
+POLYGON_PREFETCH = 2
+
+PLANES = ("axial", "coronal", "sagittal")
+
+
+class PolygonProvider:
+    """
+    Calculates the polygons of the selected ROIs on request.
+
+    Example usage:
+    polygon_provider = PolygonProvider(patient_dict_container)
+    polygon_provider.add_roi(roi_name)
+    polygons = polygon_provider.plane("axial")[roi_name][slice_uid]
+    polygon_provider.update_contours()
+    """
+
+    def __init__(self, dict_container, cache_size=POLYGON_CACHE_SIZE,
+                 prefetch=POLYGON_PREFETCH):
+        """
+        :param dict_container: Container of the raw contours, pixel LUTs,
+            slice UIDs and pixmaps of the patient.
+        :param cache_size: Number of polygon lists kept in the cache.
+        :param prefetch: Number of neighbouring slices calculated in advance
+            on each side of a requested slice.
+        """
+        self.dict_container = dict_container
+        self.cache_size = cache_size
+        self.prefetch = prefetch
+        # Names of the ROIs being displayed, in the order they were added
+        self.roi_names = {}
+        self.planes = {plane: PlanePolygons(self, plane) for plane in PLANES}
+
+        self._cache = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        # ROI name to the raw contours its polygons were calculated from
+        self._raw_contours = {}
+        # ROI name to its ROIMask, for the coronal and sagittal planes
+        self._masks = {}
+        # ROI name to the number of times its polygons were invalidated, so
+        # polygons calculated from old contours are not cached
+        self._versions = {}
+        self._axial_indices = None
+        self.threadpool = QThreadPool()
+        self.threadpool.setMaxThreadCount(1)
+
+    def plane(self, plane):
+        """
+        :param plane: "axial", "coronal" or "sagittal".
+        :return: Dictionary-like PlanePolygons of the plane.
+        """
+        return self.planes[plane]
+
+    def add_roi(self, roi_name):
+        """
+        Display an ROI. Its polygons are calculated when they are asked for.
+        :param roi_name: Name of the ROI.
+        """
+        self.roi_names[roi_name] = None
+
+    def remove_roi(self, roi_name):
+        """
+        Stop displaying an ROI. Its cached polygons are kept in case it is
+        displayed again.
+        :param roi_name: Name of the ROI.
+        """
+        self.roi_names.pop(roi_name, None)
+
+    def clear_rois(self):
+        """
+        Stop displaying every ROI.
+        """
+        self.roi_names.clear()
+
+    def invalidate(self, roi_name):
+        """
+        Throw away the cached polygons of an ROI.
+        :param roi_name: Name of the ROI.
+        """
+        with self._lock:
+            self._versions[roi_name] = self._versions.get(roi_name, 0) + 1
+            self._raw_contours.pop(roi_name, None)
+            self._masks.pop(roi_name, None)
+            for key in [key for key in self._cache if key[1] == roi_name]:
+                del self._cache[key]
+
+    def update_contours(self):
+        """
+        Invalidate the polygons of the ROIs whose raw contours in the
+        container changed since their polygons were calculated.
+        """
+        raw_contour = self.dict_container.get("raw_contour")
+        with self._lock:
+            calculated = list(self._raw_contours.items())
+        for roi_name, contours in calculated:
+            if raw_contour.get(roi_name) != contours:
+                self.invalidate(roi_name)
+
+    def slice_ids(self, plane):
+        """
+        :param plane: "axial", "coronal" or "sagittal".
+        :return: List of the identifiers of the slices of the plane, in
+            order. Axial slices are identified by their UID, coronal and
+            sagittal slices by their index.
+        """
+        if plane == "axial":
+            return list(self.dict_container.get("dict_uid").values())
+        return list(range(len(self.dict_container.get("pixmaps_" + plane))))
+
+    def slice_index(self, plane, slice_id):
+        """
+        :return: Position of a slice in the plane's list of slice_ids, or
+            None if the plane has no such slice.
+        """
+        if plane != "axial":
+            if isinstance(slice_id, int) \
+                    and 0 <= slice_id < len(self.slice_ids(plane)):
+                return slice_id
+            return None
+        if self._axial_indices is None:
+            self._axial_indices = {
+                uid: index
+                for index, uid in enumerate(self.slice_ids("axial"))}
+        return self._axial_indices.get(slice_id)
+
+    def get_polygons(self, plane, roi_name, slice_id):
+        """
+        Get the polygons of an ROI on a slice, calculating them if they are
+        not cached, and start calculating its neighbours in the background.
+        :param plane: "axial", "coronal" or "sagittal".
+        :param roi_name: Name of the ROI.
+        :param slice_id: Identifier of the slice in the plane.
+        :return: List of polygons of type QPolygonF.
+        """
+        key = (plane, roi_name, slice_id)
+        polygons = self.get_cached(key)
+        if polygons is None:
+            polygons = self.calculate(key)
+        self.prefetch_neighbours(plane, roi_name, slice_id)
+        return polygons
+
+    def get_cached(self, key):
+        """
+        :param key: Cache key.
+        :return: The cached list of polygons, or None.
+        """
+        with self._lock:
+            polygons = self._cache.get(key)
+            if polygons is not None:
+                self._cache.move_to_end(key)
+            return polygons
+
+    def calculate(self, key):
+        """
+        Calculate the polygons of an ROI on a slice and store them in the
+        cache.
+        :return: List of polygons of type QPolygonF.
+        """
+        plane, roi_name, slice_id = key
+        with self._lock:
+            version = self._versions.get(roi_name, 0)
+        raw_contour = self.dict_container.get("raw_contour").get(roi_name, {})
+        aspect = self.dict_container.get("pixmap_aspect")
+
+        if plane == "axial":
+            dict_rois_contours = {roi_name: {}}
+            if slice_id in raw_contour:
+                dict_rois_contours[roi_name][slice_id] = \
+                    calculate_slice_pixels(
+                        self.dict_container.get("pixluts")[slice_id],
+                        raw_contour[slice_id])
+            polygons = calc_roi_polygon(roi_name, slice_id,
+                                        dict_rois_contours)
+        else:
+            roi_mask = self.get_roi_mask(roi_name, raw_contour)
+            dict_rois_contours = {
+                roi_name: {slice_id: roi_mask.plane_contours(plane,
+                                                             slice_id)}}
+            pixmap_aspect = aspect["coronal"] if plane == "coronal" \
+                else 1 / aspect["sagittal"]
+            polygons = calc_roi_polygon(roi_name, slice_id,
+                                        dict_rois_contours, pixmap_aspect)
+
+        with self._lock:
+            if self._versions.get(roi_name, 0) == version:
+                self._raw_contours[roi_name] = raw_contour
+                self._cache[key] = polygons
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return polygons
+
+    def get_roi_mask(self, roi_name, raw_contour):
+        """
+        :param roi_name: Name of the ROI.
+        :param raw_contour: Raw contours of the ROI.
+        :return: ROIMask of the ROI, which is rasterised from its axial
+            contours the first time a coronal or sagittal plane is needed.
+        """
+        with self._lock:
+            roi_mask = self._masks.get(roi_name)
+            version = self._versions.get(roi_name, 0)
+        if roi_mask is None:
+            axial_contours = get_roi_contour_pixel(
+                {roi_name: raw_contour}, [roi_name],
+                self.dict_container.get("pixluts"))
+            shape = (len(self.slice_ids("axial")),
+                     len(self.slice_ids("coronal")),
+                     len(self.slice_ids("sagittal")))
+            roi_mask = ROIMask.from_contour_pixels(
+                axial_contours[roi_name],
+                get_dict_slice_to_uid(self.dict_container), shape)
+            with self._lock:
+                if self._versions.get(roi_name, 0) == version:
+                    self._masks[roi_name] = roi_mask
+        return roi_mask
+
+    def prefetch_neighbours(self, plane, roi_name, slice_id):
+        """
+        Calculate the polygons of the ROI on the slices next to the given
+        one on a background thread.
+        """
+        slice_ids = self.slice_ids(plane)
+        index = self.slice_index(plane, slice_id)
+        keys = []
+        for offset in range(1, self.prefetch + 1):
+            for neighbour in (index + offset, index - offset):
+                if 0 <= neighbour < len(slice_ids):
+                    key = (plane, roi_name, slice_ids[neighbour])
+                    with self._lock:
+                        if key in self._cache or key in self._pending:
+                            continue
+                        self._pending.add(key)
+                    keys.append(key)
+        if keys:
+            self.threadpool.start(Worker(self.calculate_pending, keys))
+
+    def calculate_pending(self, keys):
+        """
+        Calculate the given polygons, skipping any that were calculated
+        meanwhile.
+        :param keys: List of cache keys.
+        """
+        for key in keys:
+            try:
+                if self.get_cached(key) is None:
+                    self.calculate(key)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+
+class PlanePolygons(Mapping):
+    """
+    Read-only, dictionary-like view of the polygons of the displayed ROIs on
+    one plane. Stored in the model in place of the eager dictionaries of
+    polygons, so views keep using polygons[roi_name][slice_id].
+    """
+
+    def __init__(self, provider, plane):
+        self.provider = provider
+        self.plane = plane
+
+    def __getitem__(self, roi_name):
+        if roi_name not in self.provider.roi_names:
+            raise KeyError(roi_name)
+        return ROIPolygons(self.provider, self.plane, roi_name)
+
+    def __len__(self):
+        return len(self.provider.roi_names)
+
+    def __iter__(self):
+        return iter(list(self.provider.roi_names))
+
+
+class ROIPolygons(Mapping):
+    """
+    Read-only, dictionary-like view of the polygons of one ROI on every
+    slice of a plane.
+    """
+
+    def __init__(self, provider, plane, roi_name):
+        self.provider = provider
+        self.plane = plane
+        self.roi_name = roi_name
+
+    def __getitem__(self, slice_id):
+        if self.provider.slice_index(self.plane, slice_id) is None:
+            raise KeyError(slice_id)
+        return self.provider.get_polygons(self.plane, self.roi_name,
+                                          slice_id)
+
+    def __len__(self):
+        return len(self.provider.slice_ids(self.plane))
+
+    def __iter__(self):
+        return iter(self.provider.slice_ids(self.plane))
@@ -1,14 +1,12 @@
 import collections
 import datetime
 import logging
-import random
 from copy import deepcopy
 from pathlib import Path
 
 import pydicom
 import numpy as np
 from alphashape import alphashape
-from pydicom import Dataset, Sequence
 from pydicom.dataset import FileMetaDataset, validate_file_meta
 from pydicom.tag import Tag
 from pydicom.uid import ImplicitVRLittleEndian, generate_uid
@@ -18,9 +16,9 @@ from shapely.geometry import GeometryCollection, MultiPolygon, Polygon
 from shapely.validation import make_valid
 
 from src.constants import DEFAULT_WINDOW_SIZE
-from src.Model.MovingDictContainer import MovingDictContainer
-
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.ROIMask import ROIMask
+from src.Model.RTSSModel import RTSSModel
 from src.Model.Transform import inv_linear_transform
 from src.View.util.PatientDictContainerHelper import get_dict_slice_to_uid
 
@@ -71,25 +69,9 @@ def delete_roi(rtss, roi_name):
     :param roi_name: ROIName
     :return: rtss, updated rtss dataset
     """
-    # ROINumber
-    roi_number = -1
-    # Delete related StructureSetROISequence element
-    for i, elem in enumerate(rtss.StructureSetROISequence):
-        if elem.ROIName == roi_name:
-            roi_number = rtss.StructureSetROISequence[i].ROINumber
-            del rtss.StructureSetROISequence[i]
-
-    # Delete related ROIContourSequence element
-    for i, elem in enumerate(rtss.ROIContourSequence):
-        if elem.ReferencedROINumber == roi_number:
-            del rtss.ROIContourSequence[i]
-
-    # Delete related RTROIObservationsSequence element
-    for i, elem in enumerate(rtss.RTROIObservationsSequence):
-        if elem.ReferencedROINumber == roi_number:
-            del rtss.RTROIObservationsSequence[i]
-
-    return rtss
+    rtss_model = RTSSModel(rtss)
+    rtss_model.delete_roi(roi_name)
+    return rtss_model.to_dataset()
 
 
 def add_to_roi(rtss, roi_name, roi_coordinates, data_set):
@@ -101,91 +83,27 @@ def add_to_roi(rtss, roi_name, roi_coordinates, data_set):
     :param data_set: Data Set of selected DICOM image file
     :return: rtss, with added ROI
     """
-
-    # Creating a new ROIContourSequence, ContourSequence,
-    # ContourImageSequence
-    contour_sequence = Sequence([Dataset()])
-    contour_image_sequence = Sequence([Dataset()])
-
-    number_of_contour_points = len(roi_coordinates) / 3
-    referenced_sop_class_uid = data_set.SOPClassUID
-    referenced_sop_instance_uid = data_set.SOPInstanceUID
-
-    existing_roi_number = None
-    for item in rtss["StructureSetROISequence"]:
-        if item.ROIName == roi_name:
-            existing_roi_number = item.ROINumber
-
-    position = None
-
-    # Get the index of the ROI
-    for index, contour in enumerate(rtss.ROIContourSequence):
-        if contour.ReferencedROINumber == existing_roi_number:
-            position = index
-
-    new_contour_number = len(rtss.ROIContourSequence[position].ContourSequence) + 1
-
-    # ROI Sequence
-    for contour in contour_sequence:
-        # if data_set.get("ReferencedImageSequence"):
-        contour.add_new(Tag("ContourImageSequence"), "SQ", contour_image_sequence)
-
-        # Contour Sequence
-        for contour_image in contour_image_sequence:
-            # CT Image Storage
-            contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI", referenced_sop_class_uid)
-            contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI", referenced_sop_instance_uid)
-
-        contour.add_new(Tag("ContourNumber"), "IS", new_contour_number)
-        if not _is_closed_contour(roi_coordinates):
-            contour.add_new(Tag("ContourGeometricType"), "CS", "OPEN_PLANAR")
-            contour.add_new(Tag("NumberOfContourPoints"), "IS", number_of_contour_points)
-            contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
-        else:
-            contour.add_new(Tag("ContourGeometricType"), "CS", "CLOSED_PLANAR")
-            contour.add_new(Tag("NumberOfContourPoints"), "IS", number_of_contour_points - 1)
-            contour.add_new(Tag("ContourData"), "DS", roi_coordinates[0:-3])
-
-    rtss.ROIContourSequence[position].ContourSequence.extend(contour_sequence)
-
-    return rtss
+    rtss_model = RTSSModel(rtss)
+    rtss_model.add_contour(rtss_model.get_roi_number(roi_name),
+                           roi_coordinates, data_set)
+    return rtss_model.to_dataset()
 
 
-def create_roi(rtss, roi_name, roi_list, rt_roi_interpreted_type="ORGAN", rtss_owner="PATIENT"):
+def create_roi(rtss, roi_name, roi_list, rt_roi_interpreted_type="ORGAN"):
     """
-    Create new contours of an ROI to rtss :param rtss: dataset of RTSS
-    :param roi_name: ROIName :param roi_list: the list of contours to be
-    added to the rtss. Each element consists of coordinates of pixels for
-    new contour and data set of selected DICOM image file. :param
-    rt_roi_interpreted_type: the interpreted type of the new ROI :param
-    rtss_owner: the type of patient dict container (either PATIENT or
-    MOVING) caller wants to create ROI to :return: rtss, with added ROI
+    Create new contours of an ROI to rtss. The contours are added to the
+    ROI with the given name if the rtss already has one.
+    :param rtss: dataset of RTSS
+    :param roi_name: ROIName
+    :param roi_list: the list of contours to be added to the rtss. Each
+        element consists of coordinates of pixels for new contour and data
+        set of selected DICOM image file.
+    :param rt_roi_interpreted_type: the interpreted type of the new ROI
+    :return: rtss, with added ROI
     """
-    if rtss_owner == "MOVING":
-        patient_dict_container = MovingDictContainer()
-    else:
-        patient_dict_container = PatientDictContainer()
-
-    existing_rois = patient_dict_container.get("rois")
-    roi_exists = False
-
-    # This is for adding a new slice to an already existing ROI.
-    # For Future Development.
-    # Check to see if the ROI already exists
-    for key, value in existing_rois.items():
-        if value["name"] == roi_name:
-            roi_exists = True
-    for roi_info in roi_list:
-        data_set = roi_info["ds"]
-        roi_coordinates = roi_info["coords"]
-        if not roi_exists:
-            rtss = add_new_roi(rtss, roi_name, roi_coordinates, data_set, rt_roi_interpreted_type)
-            roi_exists = True
-        else:
-            # Add contour image data to existing ROI
-            rtss = add_to_roi(rtss, roi_name, roi_coordinates, data_set)
-
-    return rtss
+    rtss_model = RTSSModel(rtss)
+    rtss_model.add_contours(roi_name, roi_list, rt_roi_interpreted_type)
+    return rtss_model.to_dataset()
 
 
 def add_new_roi(rtss, roi_name, roi_coordinates, data_set, rt_roi_interpreted_type):
@@ -198,114 +116,11 @@ def add_new_roi(rtss, roi_name, roi_coordinates, data_set, rt_roi_interpreted_ty
     :param rt_roi_interpreted_type: the interpreted type of the new ROI
     :return: rtss, with added ROI
     """
-    number_of_contour_points = len(roi_coordinates) / 3
-    referenced_sop_class_uid = data_set.SOPClassUID
-    referenced_sop_instance_uid = data_set.SOPInstanceUID
-
-    # Check if there is any ROIs in rtss
-    if not len(rtss["StructureSetROISequence"].value):
-        referenced_frame_of_reference_uid = data_set.FrameOfReferenceUID
-        roi_number = 1
-    else:
-        first_roi_sequence = rtss["StructureSetROISequence"].value[0]
-        referenced_frame_of_reference_uid = first_roi_sequence.ReferencedFrameOfReferenceUID
-        roi_number = rtss["StructureSetROISequence"].value[-1].ROINumber + 1
-
-    # Colour TBC
-    red = random.randint(0, 255)
-    green = random.randint(0, 255)
-    blue = random.randint(0, 255)
-    rgb = [red, green, blue]
-
-    # Saving a new StructureSetROISequence
-    structure_set_sequence = Sequence([Dataset()])
-
-    original_structure_set = rtss.StructureSetROISequence
-
-    for structure_set in structure_set_sequence:
-        structure_set.add_new(Tag("ROINumber"), "IS", roi_number)
-        structure_set.add_new(Tag("ReferencedFrameOfReferenceUID"), "UI", referenced_frame_of_reference_uid)
-        structure_set.add_new(Tag("ROIName"), "LO", roi_name)
-        structure_set.add_new(Tag("ROIGenerationAlgorithm"), "CS", "")
-
-    # Combine old and new structure set
-    original_structure_set.extend(structure_set_sequence)
-    rtss.add_new(Tag("StructureSetROISequence"), "SQ", original_structure_set)
-
-    # Saving a new ROIContourSequence, ContourSequence,
-    # ContourImageSequence
-    roi_contour_sequence = Sequence([Dataset()])
-    contour_sequence = Sequence([Dataset()])
-    contour_image_sequence = Sequence([Dataset()])
-
-    # Original File
-    original_roi_contour = rtss.ROIContourSequence
-
-    # ROI Contour Sequence
-    for roi_contour in roi_contour_sequence:
-        roi_contour.add_new(Tag("ROIDisplayColor"), "IS", rgb)
-        roi_contour.add_new(Tag("ContourSequence"), "SQ", contour_sequence)
-
-        # ROI Sequence
-        for contour in contour_sequence:
-            # if data_set.get("ReferencedImageSequence"):
-            contour.add_new(Tag("ContourImageSequence"), "SQ", contour_image_sequence)
-
-            # Contour Sequence
-            for contour_image in contour_image_sequence:
-                contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI", referenced_sop_class_uid)  # CT Image Storage
-                contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI", referenced_sop_instance_uid)
-
-            contour.add_new(Tag("ContourNumber"), "IS", 1)
-            if not _is_closed_contour(roi_coordinates):
-                contour.add_new(Tag("ContourGeometricType"), "CS", "OPEN_PLANAR")
-                contour.add_new(Tag("NumberOfContourPoints"), "IS", number_of_contour_points)
-                contour.add_new(Tag("ContourData"), "DS", roi_coordinates)
-            else:
-                contour.add_new(Tag("ContourGeometricType"), "CS", "CLOSED_PLANAR")
-                contour.add_new(Tag("NumberOfContourPoints"), "IS", number_of_contour_points - 1)
-                contour.add_new(Tag("ContourData"), "DS", roi_coordinates[0:-3])
-
-        roi_contour.add_new(Tag("ReferencedROINumber"), "IS", roi_number)
-
-    # Combine original ROIContourSequence with new
-    original_roi_contour.extend(roi_contour_sequence)
-
-    rtss.add_new(Tag("ROIContourSequence"), "SQ", original_roi_contour)
-
-    # Saving a new RTROIObservationsSequence
-    rt_roi_observations_sequence = Sequence([Dataset()])
-
-    original_roi_observation_sequence = rtss.RTROIObservationsSequence
-
-    for ROI_observations in rt_roi_observations_sequence:
-        # TODO: Check to make sure that there aren't multiple
-        #  observations per ROI, e.g. increment from existing
-        #  Observation Numbers?
-        ROI_observations.add_new(Tag("ObservationNumber"), "IS", roi_number)
-        ROI_observations.add_new(Tag("ReferencedROINumber"), "IS", roi_number)
-        ROI_observations.add_new(Tag("RTROIInterpretedType"), "CS", rt_roi_interpreted_type)
-        ROI_observations.add_new(Tag("ROIInterpreter"), "CS", "")
-
-    original_roi_observation_sequence.extend(rt_roi_observations_sequence)
-    rtss.add_new(Tag("RTROIObservationsSequence"), "SQ", original_roi_observation_sequence)
-    return rtss
-
-
-def _within_tolerance(a: float, b: float, tol=0.01):
-    return abs(a - b) < tol
-
-
-def _is_closed_contour(roi_coordinates):
-    if len(roi_coordinates) % 3 != 0:
-        return False
-
-    first_contour_point = roi_coordinates[:3]
-    last_contour_point = roi_coordinates[-3:]
-    closed = map(_within_tolerance, first_contour_point, last_contour_point)
-    if False in closed:
-        return False
-    return True
+    rtss_model = RTSSModel(rtss)
+    roi_number = rtss_model.add_roi(roi_name, data_set,
+                                    rt_roi_interpreted_type)
+    rtss_model.add_contour(roi_number, roi_coordinates, data_set)
+    return rtss_model.to_dataset()
 
 
 def get_raw_contour_data(rtss):
@@ -426,33 +241,7 @@ def calculate_pixels(pixlut, contour, prone=False, feetfirst=False):
     :param feetfirst: label of feetfirst or head first
     :return: contour pixels
     """
-    pixels = []
-
-    np_x = np.array(pixlut[0])
-    np_y = np.array(pixlut[1])
-    if not feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmax(np_x > con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmin(np_y < con_y)
-            pixels.append([x, y])
-
-    return pixels
+    return calculate_pixels_array(pixlut, contour, prone, feetfirst).tolist()
 
 
 def calculate_pixels_sagittal(pixlut, contour, prone=False, feetfirst=False):
@@ -467,31 +256,69 @@ def calculate_pixels_sagittal(pixlut, contour, prone=False, feetfirst=False):
     ----------
     contour : object
     """
-    pixels = []
-    np_x = np.array(pixlut[0])
-    np_y = np.array(pixlut[1])
-    if not feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmax(np_x > con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if feetfirst and not prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmax(np_y > con_y)
-            pixels.append([x, y])
-    if prone:
-        for i in range(0, len(contour), 3):
-            con_x = contour[i]
-            con_y = contour[i + 1]
-            x = np.argmin(np_x < con_x)
-            y = np.argmin(np_y < con_y)
-            pixels.append([x, y])
-    return pixels
+    return calculate_pixels_array(pixlut, contour, prone, feetfirst).tolist()
+
+
+def calculate_pixels_array(pixlut, contour_points, prone=False,
+                           feetfirst=False):
+    """
+    Convert all the points of one or more contours to pixels in one call.
+    A point is mapped to the first column (row) whose position is past
+    it, or at or past it in the directions that are flipped for feet first
+    and prone patients.
+    :param pixlut: transformation matrix, the x positions of the columns
+        and the y positions of the rows of the image
+    :param contour_points: (N, 3) array, or flat list, of the x, y, z
+        coordinates of the contour points
+    :param prone: label of prone
+    :param feetfirst: label of feetfirst or head first
+    :return: (N, 2) numpy array of the column and row of each point
+    """
+    points = np.asarray(contour_points, dtype=np.float64).reshape(-1, 3)
+    x = get_first_position_index(pixlut[0], points[:, 0],
+                                 inclusive=feetfirst or prone)
+    y = get_first_position_index(pixlut[1], points[:, 1], inclusive=prone)
+    return np.column_stack((x, y))
+
+
+def get_first_position_index(positions, values, inclusive=False):
+    """
+    Vectorised np.argmax(positions > value), or np.argmin(positions <
+    value) if inclusive, for every value. The running maximum of the
+    positions is sorted, so a binary search finds the first position past
+    each value without scanning every position.
+    :param positions: positions of the columns or rows of an image
+    :param values: coordinates of points along the same axis
+    :param inclusive: whether a position equal to a value is past it
+    :return: index of the first position past each value, or 0 if no
+        position is past it
+    """
+    running_max = np.maximum.accumulate(np.asarray(positions,
+                                                   dtype=np.float64))
+    indices = np.searchsorted(running_max, values,
+                              side="left" if inclusive else "right")
+    indices[indices == len(running_max)] = 0
+    return indices
+
+
+def calculate_slice_pixels(pixlut, contours, prone=False, feetfirst=False):
+    """
+    Convert all the contours of an ROI on one slice to pixels at once.
+    :param pixlut: transformation matrix of the slice
+    :param contours: list of raw contour data (3D)
+    :param prone: label of prone
+    :param feetfirst: label of feetfirst or head first
+    :return: list of the contour pixels of each contour
+    """
+    if not contours:
+        return []
+    contour_points = [np.asarray(contour, dtype=np.float64).reshape(-1, 3)
+                      for contour in contours]
+    pixels = calculate_pixels_array(pixlut, np.concatenate(contour_points),
+                                    prone, feetfirst)
+    ends = np.cumsum([len(points) for points in contour_points])[:-1]
+    return [contour_pixels.tolist()
+            for contour_pixels in np.split(pixels, ends)]
 
 
 def convert_hull_list_to_contours_data(rois_to_save, patient_dict_container):
@@ -610,10 +437,8 @@ def get_contour_pixel(
         # slice
         dict_pixels_of_roi = collections.defaultdict(list)
         raw_contours = dict_raw_contour_data[roi]
-        number_of_contours = len(raw_contours[curr_slice])
-        for i in range(number_of_contours):
-            contour_pixels = calculate_pixels(pixlut, raw_contours[curr_slice][i], prone, feetfirst)
-            dict_pixels_of_roi[curr_slice].append(contour_pixels)
+        dict_pixels_of_roi[curr_slice].extend(calculate_slice_pixels(
+            pixlut, raw_contours[curr_slice], prone, feetfirst))
         dict_pixels[roi] = dict_pixels_of_roi
 
     return dict_pixels
@@ -633,11 +458,8 @@ def get_roi_contour_pixel(dict_raw_contour_data, roi_list, dict_pixluts):
         dict_pixels_of_roi = collections.defaultdict(list)
         raw_contour = dict_raw_contour_data[roi]
         for roi_slice in raw_contour:
-            pixlut = dict_pixluts[roi_slice]
-            number_of_contours = len(raw_contour[roi_slice])
-            for i in range(number_of_contours):
-                contour_pixels = calculate_pixels(pixlut, raw_contour[roi_slice][i])
-                dict_pixels_of_roi[roi_slice].append(contour_pixels)
+            dict_pixels_of_roi[roi_slice].extend(calculate_slice_pixels(
+                dict_pixluts[roi_slice], raw_contour[roi_slice]))
         dict_pixels[roi] = dict_pixels_of_roi
     return dict_pixels
 
@@ -645,56 +467,24 @@ def get_roi_contour_pixel(dict_raw_contour_data, roi_list, dict_pixluts):
 def transform_rois_contours(axial_rois_contours):
     """
     Transform the axial ROI contours into coronal and sagittal
-    contours
+    contours, by tracing the coronal and sagittal planes of a mask of
+    each ROI
     :param axial_rois_contours: the dictionary of axial ROI contours
     :return: Tuple of coronal and sagittal ROI contours
     """
     coronal_rois_contours = {}
     sagittal_rois_contours = {}
-    slice_ids = get_dict_slice_to_uid(PatientDictContainer())
-    for name in axial_rois_contours.keys():
-        coronal_rois_contours[name] = {}
-        sagittal_rois_contours[name] = {}
-        for slice_id in slice_ids:
-            contours = axial_rois_contours[name][slice_id]
-            for contour in contours:
-                for i in range(len(contour)):
-                    if contour[i][1] in coronal_rois_contours[name]:
-                        coronal_rois_contours[name][contour[i][1]][0].append([contour[i][0], slice_ids[slice_id]])
-                    else:
-                        coronal_rois_contours[name][contour[i][1]] = [[]]
-                        coronal_rois_contours[name][contour[i][1]][0].append([contour[i][0], slice_ids[slice_id]])
-
-                    if contour[i][0] in sagittal_rois_contours[name]:
-                        sagittal_rois_contours[name][contour[i][0]][0].append([contour[i][1], slice_ids[slice_id]])
-                    else:
-                        sagittal_rois_contours[name][contour[i][0]] = [[]]
-                        sagittal_rois_contours[name][contour[i][0]][0].append([contour[i][1], slice_ids[slice_id]])
-
-    coronal_rois_contours = convert_coordinates_map_to_polygon_of_rois(coronal_rois_contours)
-    sagittal_rois_contours = convert_coordinates_map_to_polygon_of_rois(sagittal_rois_contours)
+    patient_dict_container = PatientDictContainer()
+    slice_ids = get_dict_slice_to_uid(patient_dict_container)
+    dataset = patient_dict_container.dataset[0]
+    shape = (len(slice_ids), dataset.Rows, dataset.Columns)
+    for name, contours in axial_rois_contours.items():
+        roi_mask = ROIMask.from_contour_pixels(contours, slice_ids, shape)
+        coronal_rois_contours[name] = roi_mask.outlines("coronal")
+        sagittal_rois_contours[name] = roi_mask.outlines("sagittal")
     return coronal_rois_contours, sagittal_rois_contours
 
 
-def convert_coordinates_map_to_polygon_of_rois(contours_map):
-    """
-
-    this function converts a map (dictionary) of ROI contours into polygon for
-    better ROI display
-
-    :param contours_map: a map(dictionary) of ROI contours.
-
-    """
-    polygon_dict = {}
-    for name, contours_dict in contours_map.items():
-        polygon_dict[name] = {}
-        for slice_id, contour_array in contours_dict.items():
-            roi_array = contour_array[0]
-            hull_list = calculate_concave_hull_of_points(roi_array, alpha=0)
-            polygon_dict[name][slice_id] = hull_list
-    return polygon_dict
-
-
 def calculate_concave_hull_of_points(pixel_coords, alpha=0.2):
     """
     Return the alpha shape of the highlighted pixels using the alpha
@@ -0,0 +1,162 @@
+"""
+Bit-packed 3D masks of ROIs for reslicing them into coronal and sagittal
+outlines.
+
+The axial contours of an ROI are rasterised once onto the image grid, and
+the mask is cropped to the bounding box of the ROI and packed 8 columns to
+a byte. A coronal or sagittal plane of the mask is then traced with
+marching squares (skimage.measure.find_contours), which follows concave
+shapes and holes that a hull of the contour points cannot.
+"""
+import cv2
+import numpy as np
+from skimage import measure
+
+
+class ROIMask:
+    """
+    Mask of an ROI on the image grid of (slices, rows, columns).
+
+    Example usage:
+    roi_mask = ROIMask.from_contour_pixels(contour_pixels, slice_indices,
+                                           (slices, rows, columns))
+    outlines = roi_mask.plane_contours("coronal", row)
+    """
+
+    def __init__(self, packed, offset, size, shape):
+        """
+        :param packed: Mask cropped to the bounding box of the ROI, packed
+            along the columns with np.packbits.
+        :param offset: (slice, row, column) of the first voxel of the
+            bounding box.
+        :param size: (slices, rows, columns) of the bounding box.
+        :param shape: (slices, rows, columns) of the image grid.
+        """
+        self.packed = packed
+        self.offset = offset
+        self.size = size
+        self.shape = shape
+
+    @classmethod
+    def from_contour_pixels(cls, contour_pixels, slice_indices, shape):
+        """
+        Rasterise the axial contours of an ROI. Contours on the same slice
+        are combined with XOR, so inner contours cut holes out of the ROI.
+        :param contour_pixels: Dictionary of slice UID to the list of
+            contours of the ROI on the slice, each a list of [column, row]
+            pixels, as returned by ROI.get_roi_contour_pixel for one ROI.
+        :param slice_indices: Dictionary of slice UID to slice index.
+        :param shape: (slices, rows, columns) of the image grid.
+        :return: ROIMask of the ROI.
+        """
+        slices = {}
+        for uid, contours in contour_pixels.items():
+            if uid in slice_indices and len(contours):
+                slices[slice_indices[uid]] = [
+                    np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+                    for contour in contours]
+        if not slices:
+            return cls(np.zeros((0, 0, 0), dtype=np.uint8), (0, 0, 0),
+                       (0, 0, 0), shape)
+
+        points = np.concatenate([contour for contours in slices.values()
+                                 for contour in contours])
+        first = np.maximum(np.floor(points.min(axis=0)).astype(int), 0)
+        last = np.minimum(np.ceil(points.max(axis=0)).astype(int),
+                          (shape[2] - 1, shape[1] - 1))
+        first_slice, last_slice = min(slices), max(slices)
+        offset = (first_slice, int(first[1]), int(first[0]))
+        size = (last_slice - first_slice + 1,
+                max(int(last[1] - first[1]) + 1, 0),
+                max(int(last[0] - first[0]) + 1, 0))
+
+        packed = np.zeros((size[0], size[1], (size[2] + 7) // 8),
+                          dtype=np.uint8)
+        origin = np.array([offset[2], offset[1]])
+        for slice_index, contours in slices.items():
+            mask = np.zeros(size[1:], dtype=np.uint8)
+            for contour in contours:
+                # Scanline fill of the contour, on the pixels it encloses
+                # and runs through
+                filled = np.zeros(size[1:], dtype=np.uint8)
+                cv2.fillPoly(filled, [np.rint(contour - origin).astype(
+                    np.int32)], 1)
+                mask ^= filled
+            packed[slice_index - first_slice] = np.packbits(mask, axis=-1)
+        return cls(packed, offset, size, shape)
+
+    def plane(self, plane, index):
+        """
+        :param plane: "coronal" or "sagittal".
+        :param index: Row (coronal) or column (sagittal) of the plane.
+        :return: 2D boolean array of the plane cropped to the bounding box
+            of the ROI, with the slices along the first axis, or None if
+            the plane does not cross the ROI.
+        """
+        axis = 1 if plane == "coronal" else 2
+        position = index - self.offset[axis]
+        if not 0 <= position < self.size[axis]:
+            return None
+        if plane == "coronal":
+            return np.unpackbits(self.packed[:, position, :], axis=-1,
+                                 count=self.size[2]).astype(bool)
+        # A column of the mask is one bit of every byte of a column of the
+        # packed array
+        byte, bit = divmod(position, 8)
+        return ((self.packed[:, :, byte] >> (7 - bit)) & 1).astype(bool)
+
+    def plane_contours(self, plane, index):
+        """
+        Trace the outlines of the ROI on a coronal or sagittal plane.
+        :param plane: "coronal" or "sagittal".
+        :param index: Row (coronal) or column (sagittal) of the plane.
+        :return: List of contours, each a list of [x, slice] points, where
+            x is the column (coronal) or row (sagittal). Points lie on the
+            edges of the pixels, so the outline of a pixel at (x, slice)
+            runs from x to x + 1 and from slice to slice + 1.
+        """
+        mask = self.plane(plane, index)
+        if mask is None or not mask.any():
+            return []
+        x_offset = self.offset[2] if plane == "coronal" else self.offset[1]
+        # Padding the plane closes the outlines that touch its border
+        padded = np.pad(mask, 1).astype(np.uint8)
+        contours = []
+        for contour in measure.find_contours(padded, 0.5):
+            points = np.floor(
+                contour[:, ::-1] + (x_offset, self.offset[0])
+            ).astype(int)
+            contours.append(simplify_outline(points))
+        return contours
+
+    def outlines(self, plane):
+        """
+        :param plane: "coronal" or "sagittal".
+        :return: Dictionary of the row (coronal) or column (sagittal) of
+            every plane that crosses the ROI to the outlines on it.
+        """
+        axis = 1 if plane == "coronal" else 2
+        outlines = {}
+        for index in range(self.offset[axis],
+                           self.offset[axis] + self.size[axis]):
+            contours = self.plane_contours(plane, index)
+            if contours:
+                outlines[index] = contours
+        return outlines
+
+
+def simplify_outline(points):
+    """
+    :param points: (N, 2) integer array of the points of a closed outline,
+        whose last point repeats the first one.
+    :return: List of the points where the outline changes direction, so
+        runs of points along the pixel edges become single segments.
+    """
+    points = points[:-1]
+    if len(points) < 3:
+        return points.tolist()
+    previous = points - np.roll(points, 1, axis=0)
+    following = np.roll(points, -1, axis=0) - points
+    turns = previous[:, 0] * following[:, 1] \
+        != previous[:, 1] * following[:, 0]
+    return points[turns].tolist()
@@ -0,0 +1,288 @@
+"""
+Indexed, in-memory model of the ROIs of an RT Struct for editing.
+
+Finding an ROI in a pydicom RT Struct means scanning its sequences, and
+every contour appended to it creates several nested Sequence objects. Code
+that generates many contours (ISO2ROI, SUV2ROI, drawing and transferring
+ROIs) therefore edits an RTSSModel instead: ROIs are found through
+dictionaries keyed by ROI number and name, new contours are kept as numpy
+arrays of points, and the pydicom sequences are only written when the
+model is turned back into a dataset with to_dataset().
+"""
+
+import random
+
+import numpy as np
+from pydicom import Dataset, Sequence
+from pydicom.tag import Tag
+
+# Largest distance (in mm) between the first and last point of a closed
+# contour
+CLOSED_CONTOUR_TOLERANCE = 0.01
+
+
+class PendingContours:
+    """
+    Columns of the contours added to an ROI that have not been written to
+    the RT Struct yet. Row i of each column describes the i-th contour.
+    """
+
+    def __init__(self):
+        self.points = []
+        self.geometric_types = []
+        self.sop_class_uids = []
+        self.sop_instance_uids = []
+
+    def __len__(self):
+        return len(self.points)
+
+    def append(self, roi_coordinates, data_set):
+        """
+        :param roi_coordinates: Flat list of the x, y, z coordinates of the
+            points of the contour, or an (N, 3) array of the points.
+        :param data_set: Data set of the image the contour is drawn on.
+        """
+        points = np.asarray(roi_coordinates, dtype=np.float64).reshape(-1, 3)
+        if len(points) > 1 and np.all(np.abs(points[0] - points[-1])
+                                      < CLOSED_CONTOUR_TOLERANCE):
+            # The last point of a closed contour repeats the first one
+            self.points.append(points[:-1])
+            self.geometric_types.append("CLOSED_PLANAR")
+        else:
+            self.points.append(points)
+            self.geometric_types.append("OPEN_PLANAR")
+        self.sop_class_uids.append(data_set.SOPClassUID)
+        self.sop_instance_uids.append(data_set.SOPInstanceUID)
+
+    def to_sequence(self, first_contour_number):
+        """
+        :param first_contour_number: ContourNumber of the first contour.
+        :return: List of the ContourSequence items of the contours.
+        """
+        contours = []
+        for i, points in enumerate(self.points):
+            contour_image = Dataset()
+            contour_image.add_new(Tag("ReferencedSOPClassUID"), "UI",
+                                  self.sop_class_uids[i])
+            contour_image.add_new(Tag("ReferencedSOPInstanceUID"), "UI",
+                                  self.sop_instance_uids[i])
+
+            contour = Dataset()
+            contour.add_new(Tag("ContourImageSequence"), "SQ",
+                            Sequence([contour_image]))
+            contour.add_new(Tag("ContourNumber"), "IS",
+                            first_contour_number + i)
+            contour.add_new(Tag("ContourGeometricType"), "CS",
+                            self.geometric_types[i])
+            contour.add_new(Tag("NumberOfContourPoints"), "IS", len(points))
+            contour.add_new(Tag("ContourData"), "DS", points.ravel().tolist())
+            contours.append(contour)
+        return contours
+
+
+class RTSSModel:
+    """
+    Editable model of the ROIs of an RT Struct, indexed by ROI number and
+    name.
+
+    Example usage:
+    rtss_model = RTSSModel(dataset_rtss)
+    rtss_model.delete_roi("ISO 50")
+    rtss_model.add_contours("ISO 50", roi_list, "DOSE_REGION")
+    dataset_rtss = rtss_model.to_dataset()
+    rois = rtss_model.get_roi_info()
+    """
+
+    def __init__(self, rtss):
+        """
+        :param rtss: RTSTRUCT DICOM dataset object. It is edited in place.
+        """
+        self.rtss = rtss
+        for keyword in ["StructureSetROISequence", "ROIContourSequence",
+                        "RTROIObservationsSequence"]:
+            if keyword not in rtss:
+                setattr(rtss, keyword, Sequence())
+
+        # ROI number to its item of each sequence
+        self.structure_sets = {}
+        self.roi_contours = {}
+        self.observations = {}
+        # ROI name to ROI number
+        self.roi_numbers = {}
+        # ROI number to ROI information, like ImageLoading.get_roi_info
+        self.rois = {}
+        # ROI number to the contours not written to the RT Struct yet
+        self.pending_contours = {}
+
+        for structure_set in rtss.StructureSetROISequence:
+            roi_number = structure_set.get("ROINumber")
+            if roi_number is None:
+                continue
+            roi_name = structure_set.get("ROIName")
+            self.structure_sets[roi_number] = structure_set
+            self.roi_numbers[roi_name] = roi_number
+            self.rois[roi_number] = {
+                "uid": structure_set.get("ReferencedFrameOfReferenceUID"),
+                "name": roi_name,
+                "algorithm": structure_set.get("ROIGenerationAlgorithm"),
+            }
+        for roi_contour in rtss.ROIContourSequence:
+            self.roi_contours[roi_contour.ReferencedROINumber] = roi_contour
+        for observation in rtss.RTROIObservationsSequence:
+            self.observations[observation.ReferencedROINumber] = observation
+
+    def get_roi_number(self, roi_name):
+        """
+        :param roi_name: ROIName
+        :return: ROINumber of the ROI with the name, or None.
+        """
+        return self.roi_numbers.get(roi_name)
+
+    def get_roi_info(self):
+        """
+        :return: Dictionary of ROI information, as returned by
+            ImageLoading.get_roi_info for the edited RT Struct.
+        """
+        return {roi_number: dict(info)
+                for roi_number, info in self.rois.items()}
+
+    def add_roi(self, roi_name, data_set, rt_roi_interpreted_type="ORGAN"):
+        """
+        Add a new ROI without contours.
+        :param roi_name: ROIName
+        :param data_set: Data set of an image of the ROI, which gives the
+            frame of reference of the first ROI of the RT Struct.
+        :param rt_roi_interpreted_type: The interpreted type of the new ROI
+        :return: ROINumber of the new ROI
+        """
+        if self.structure_sets:
+            referenced_frame_of_reference_uid = next(
+                iter(self.structure_sets.values())
+            ).ReferencedFrameOfReferenceUID
+            roi_number = max(self.structure_sets) + 1
+        else:
+            referenced_frame_of_reference_uid = data_set.FrameOfReferenceUID
+            roi_number = 1
+
+        structure_set = Dataset()
+        structure_set.add_new(Tag("ROINumber"), "IS", roi_number)
+        structure_set.add_new(Tag("ReferencedFrameOfReferenceUID"), "UI",
+                              referenced_frame_of_reference_uid)
+        structure_set.add_new(Tag("ROIName"), "LO", roi_name)
+        structure_set.add_new(Tag("ROIGenerationAlgorithm"), "CS", "")
+        self.rtss.StructureSetROISequence.append(structure_set)
+
+        self.create_roi_contour(roi_number)
+
+        observation = Dataset()
+        observation.add_new(Tag("ObservationNumber"), "IS", roi_number)
+        observation.add_new(Tag("ReferencedROINumber"), "IS", roi_number)
+        observation.add_new(Tag("RTROIInterpretedType"), "CS",
+                            rt_roi_interpreted_type)
+        observation.add_new(Tag("ROIInterpreter"), "CS", "")
+        self.rtss.RTROIObservationsSequence.append(observation)
+
+        self.structure_sets[roi_number] = structure_set
+        self.observations[roi_number] = observation
+        self.roi_numbers[roi_name] = roi_number
+        self.rois[roi_number] = {
+            "uid": referenced_frame_of_reference_uid,
+            "name": roi_name,
+            "algorithm": "",
+        }
+        return roi_number
+
+    def create_roi_contour(self, roi_number):
+        """
+        Add the ROIContourSequence item of an ROI, with a random colour and
+        no contours.
+        :param roi_number: ROINumber of the ROI.
+        """
+        # Colour TBC
+        rgb = [random.randint(0, 255) for _ in range(3)]
+        roi_contour = Dataset()
+        roi_contour.add_new(Tag("ROIDisplayColor"), "IS", rgb)
+        roi_contour.add_new(Tag("ContourSequence"), "SQ", Sequence())
+        roi_contour.add_new(Tag("ReferencedROINumber"), "IS", roi_number)
+        self.rtss.ROIContourSequence.append(roi_contour)
+        self.roi_contours[roi_number] = roi_contour
+
+    def add_contours(self, roi_name, roi_list,
+                     rt_roi_interpreted_type="ORGAN"):
+        """
+        Add contours to an ROI, creating the ROI if it does not exist.
+        :param roi_name: ROIName
+        :param roi_list: List of the contours to add. Each element is a
+            dictionary of the coordinates of the points of the contour
+            ('coords') and the data set of the image it is drawn on ('ds').
+        :param rt_roi_interpreted_type: The interpreted type of the ROI if
+            it is created.
+        :return: ROINumber of the ROI
+        """
+        roi_number = self.get_roi_number(roi_name)
+        if roi_number is None and roi_list:
+            roi_number = self.add_roi(roi_name, roi_list[0]["ds"],
+                                      rt_roi_interpreted_type)
+        for roi_info in roi_list:
+            self.add_contour(roi_number, roi_info["coords"], roi_info["ds"])
+        return roi_number
+
+    def add_contour(self, roi_number, roi_coordinates, data_set):
+        """
+        Add a contour to an existing ROI.
+        :param roi_number: ROINumber of the ROI.
+        :param roi_coordinates: Flat list of the x, y, z coordinates of the
+            points of the contour, or an (N, 3) array of the points.
+        :param data_set: Data set of the image the contour is drawn on.
+        """
+        if roi_number not in self.structure_sets:
+            raise KeyError("ROI %s is not in the RT Struct" % roi_number)
+        if roi_number not in self.roi_contours:
+            self.create_roi_contour(roi_number)
+        self.pending_contours.setdefault(
+            roi_number, PendingContours()).append(roi_coordinates, data_set)
+
+    def delete_roi(self, roi_name):
+        """
+        Delete an ROI and its contours.
+        :param roi_name: ROIName
+        :return: True if the ROI existed.
+        """
+        roi_number = self.roi_numbers.pop(roi_name, None)
+        if roi_number is None:
+            return False
+
+        for index, sequence, keyword in [
+                (self.structure_sets, self.rtss.StructureSetROISequence,
+                 "ROINumber"),
+                (self.roi_contours, self.rtss.ROIContourSequence,
+                 "ReferencedROINumber"),
+                (self.observations, self.rtss.RTROIObservationsSequence,
+                 "ReferencedROINumber")]:
+            index.pop(roi_number, None)
+            for i in reversed(range(len(sequence))):
+                if sequence[i].get(keyword) == roi_number:
+                    del sequence[i]
+        self.rois.pop(roi_number, None)
+        self.pending_contours.pop(roi_number, None)
+
+        # Another ROI with the same name takes its place in the index
+        for structure_set in self.structure_sets.values():
+            if structure_set.get("ROIName") == roi_name:
+                self.roi_numbers[roi_name] = structure_set.ROINumber
+        return True
+
+    def to_dataset(self):
+        """
+        Write the pending contours to the RT Struct.
+        :return: The updated RTSTRUCT DICOM dataset object.
+        """
+        for roi_number, pending in self.pending_contours.items():
+            roi_contour = self.roi_contours[roi_number]
+            if "ContourSequence" not in roi_contour:
+                roi_contour.add_new(Tag("ContourSequence"), "SQ", Sequence())
+            contour_sequence = roi_contour.ContourSequence
+            contour_sequence.extend(
+                pending.to_sequence(len(contour_sequence) + 1))
+        self.pending_contours = {}
+        return self.rtss
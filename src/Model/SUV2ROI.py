@@ -1,8 +1,9 @@
 import numpy
-from skimage import measure
 from src.Model import ImageLoading
-from src.Model import ROI
+from src.Model.ContourExtraction import find_volume_contours, \
+    grid_to_patient
 from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.RTSSModel import RTSSModel
 from src.View.InputDialogs import PatientWeightDialog
 
 
@@ -36,7 +37,7 @@ class SUV2ROI:
 
         # Calculate contours
         progress_callback.emit(("Calculating Boundaries", 40))
-        contour_data = self.calculate_contours()
+        contour_data = self.calculate_contours(interrupt_flag)
 
         # Stop loading
         if interrupt_flag.is_set():
@@ -157,51 +158,45 @@ class SUV2ROI:
         # Return SUV data
         return suv
 
-    def calculate_contours(self):
+    def calculate_contours(self, interrupt_flag=None):
         """
         Calculate SUV boundaries for each slice from an SUV value of 1
         all the way to the maximum SUV value in that slice.
+        :param interrupt_flag: interrupt flag to stop process.
         :return: Dictionary where key is SUV ROI name and value is
-                 a list containing tuples of slice id and lists of
-                 contours.
+                 a dictionary of slice id to the list of contours on the
+                 slice.
         """
-        # Create dictionary to store contour data
-        contour_data = {}
-
         # Initialise variables needed for function
         patient_dict_container = PatientDictContainer()
         slider_min = 0
-        slider_max = len(patient_dict_container.get("pixmaps_axial"))
+        slider_max = len(
+            ImageLoading.get_image_uid_list(patient_dict_container.dataset))
 
-        # Loop through each PET image in the dataset
+        # Get SUV data from each PET image in the dataset
+        suv_volume = []
         for slider_id in range(slider_min, slider_max):
-            # Get SUV data from PET file
             temp_ds = patient_dict_container.dataset[slider_id]
             suv_data = self.pet2suv(temp_ds)
 
             # Return None if PET 2 SUV failed
             if suv_data is None:
                 return None
+            suv_volume.append(suv_data)
 
-            # Set current and max SUV for the current slice
-            current_suv = 1
-            max_suv = numpy.amax(suv_data)
-
-            # Continue calculating SUV contours for the slice until the
-            # max SUV has been reached.
-            while current_suv < max_suv:
-                # Find the contours for the SUV (i)
-                contours = measure.find_contours(suv_data, current_suv)
+        if not suv_volume:
+            return {}
+        suv_volume = numpy.array(suv_volume, dtype=float)
 
-                # Get the SUV name
-                name = "SUV-" + str(current_suv)
-                if name not in contour_data:
-                    contour_data[name] = []
-                contour_data[name].append((slider_id, contours))
-                current_suv += 1
+        # Every whole SUV below the maximum SUV of the volume. Each slice
+        # is only contoured up to its own maximum SUV.
+        max_suv = numpy.amax(suv_volume)
+        levels = {"SUV-" + str(suv): suv
+                  for suv in range(1, int(numpy.ceil(max_suv)))}
 
         # Return contour data
-        return contour_data
+        return find_volume_contours(suv_volume, levels,
+                                    interrupt_flag=interrupt_flag)
 
     def generate_ROI(self, contours, progress_callback):
         """
@@ -213,13 +208,9 @@ class SUV2ROI:
         # Initialise variables needed for function
         patient_dict_container = PatientDictContainer()
         dataset_rtss = patient_dict_container.get("dataset_rtss")
+        pixluts = patient_dict_container.get("pixluts")
 
-        # Get existing ROIs
-        existing_rois = []
-        rois = patient_dict_container.get("dataset_rtss")
-        if rois:
-            for roi in rois.StructureSetROISequence:
-                existing_rois.append(roi.ROIName)
+        rtss_model = RTSSModel(dataset_rtss)
 
         # Loop through each SUV level
         item_count = len(contours)
@@ -227,54 +218,26 @@ class SUV2ROI:
         progress_increment = round((95 - 60)/item_count)
         for item in contours:
             # Delete ROI if it already exists to recreate it
-            if item in existing_rois:
-                dataset_rtss = ROI.delete_roi(dataset_rtss, item)
-
-                # Update patient dict container
-                current_rois = patient_dict_container.get("rois")
-                keys = []
-                for key, value in current_rois.items():
-                    if value["name"] == item:
-                        keys.append(key)
-                for key in keys:
-                    del current_rois[key]
-                patient_dict_container.set("rois", current_rois)
+            rtss_model.delete_roi(item)
 
             progress_callback.emit(("Generating ROIs", current_progress))
             current_progress += progress_increment
 
             # Loop through each slice
-            for i in range(len(contours[item])):
-                slider_id = contours[item][i][0]
+            roi_list = []
+            for slider_id, slice_contours in contours[item].items():
                 dataset = patient_dict_container.dataset[slider_id]
-                pixlut = patient_dict_container.get("pixluts")
-                pixlut = pixlut[dataset.SOPInstanceUID]
-                z_coord = dataset.SliceLocation
-
-                # List storing lists that contain all points for a
-                # contour.
-                single_array = []
-
-                # Loop through each contour
-                for j in range(len(contours[item][i][1])):
-                    single_array.append([])
-                    # Loop through every point in the contour
-                    for point in contours[item][i][1][j]:
-                        # Convert pixel coordinates to RCS points
-                        rcs_pixels = ROI.pixel_to_rcs(pixlut, round(point[1]),
-                                                      round(point[0]))
-                        # Append RCS points to the single array
-                        single_array[j].append(rcs_pixels[0])
-                        single_array[j].append(rcs_pixels[1])
-                        single_array[j].append(z_coord)
-
-                # Create the ROI(s)
-                for array in single_array:
-                    rtss = ROI.create_roi(dataset_rtss, item,
-                                          [{'coords': array, 'ds': dataset}],
-                                          "")
-
-                    # Save the updated rtss
-                    patient_dict_container.set("dataset_rtss", rtss)
-                    patient_dict_container.set("rois",
-                                               ImageLoading.get_roi_info(rtss))
+
+                # Convert the pixel coordinates of every contour to RCS
+                # points, with the slice's z value
+                for array in grid_to_patient(
+                        slice_contours, pixluts[dataset.SOPInstanceUID],
+                        dataset.SliceLocation):
+                    roi_list.append({'coords': array, 'ds': dataset})
+
+            # Create the ROI(s)
+            rtss_model.add_contours(item, roi_list, "")
+
+        # Save the updated rtss
+        patient_dict_container.set("dataset_rtss", rtss_model.to_dataset())
+        patient_dict_container.set("rois", rtss_model.get_roi_info())
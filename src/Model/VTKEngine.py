@@ -12,8 +12,10 @@ import atexit
 import glob
 import logging
 import SimpleITK as sitk
+from src.constants import CT_RESCALE_INTERCEPT
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
+from src.Model.ImageLoading import img_stack_displacement
 from src.View.util.PatientDictContainerHelper import get_dict_slice_to_uid, \
     read_dicom_image_to_sitk
 
@@ -36,6 +38,8 @@ that happens here is:
 # Helper functions for DICOM handling and matrix computations
 # ------------------------------ DICOM Utilities ------------------------------
 
+IMAGE_MODALITIES = ["CT", "MR"]  # only volume-capable modalities
+
 def get_first_slice_ipp(filepaths):
     """
     Return the origin that SimpleITK uses when reading the DICOM series.
@@ -82,8 +86,6 @@ def prepare_dicom_slice_dir(input_dir: str) -> str:
     temp_dir = tempfile.mkdtemp(prefix="dicom_slices_")
     found = False
 
-    IMAGE_MODALITIES = ["CT", "MR"]  # only volume-capable modalities
-
     for f in Path(input_dir).glob("*"):
         if not f.is_file():
             continue
@@ -104,6 +106,61 @@ def prepare_dicom_slice_dir(input_dir: str) -> str:
 
     return temp_dir
 
+def volume_spacing(datasets) -> tuple[float, float, float]:
+    """
+    Return the voxel spacing vtkDICOMImageReader gives an image series: the column and row spacing,
+    then the distance between slices along the stack axis (or the slice thickness of a single slice).
+    """
+    first = datasets[0]
+    row_spacing, column_spacing = (float(v) for v in first.PixelSpacing)
+    if len(datasets) > 1:
+        displacements = [img_stack_displacement(ds.ImageOrientationPatient, ds.ImagePositionPatient)
+                         for ds in (datasets[0], datasets[-1])]
+        slice_spacing = abs(displacements[0] - displacements[-1]) / (len(datasets) - 1)
+    else:
+        slice_spacing = float(getattr(first, "SliceThickness", 1.0) or 1.0)
+    return column_spacing, row_spacing, slice_spacing
+
+def volume_to_vtk_image(volume: np.ndarray, spacing) -> vtk.vtkImageChangeInformation:
+    """
+    Wrap a (slices, rows, columns) volume as vtkImageData without copying it, laid out the way the
+    vtkDICOMImageReader + y-flip pipeline lays out a series (slices sorted the same way, first row at y = 0).
+    Returns a pipeline source so it can be used in place of the reader.
+    """
+    volume = np.ascontiguousarray(volume)
+    image = vtk.vtkImageData()
+    image.SetDimensions(volume.shape[2], volume.shape[1], volume.shape[0])
+    image.SetSpacing(*spacing)
+    # Shares the volume's memory; numpy_support keeps a reference to it on the VTK array
+    image.GetPointData().SetScalars(numpy_support.numpy_to_vtk(volume.ravel(), deep=False))
+
+    source = vtk.vtkImageChangeInformation()
+    source.SetInputData(image)
+    source.Update()
+    return source
+
+def container_volume(dict_container):
+    """
+    Return (source, first slice IPP, minimum value) of the image series already loaded in a
+    PatientDictContainer or MovingDictContainer, or None if it holds no CT/MR volume.
+    Values are rescaled the way vtkDICOMImageReader rescales them, so CT volumes are in HU.
+    """
+    pixel_values = dict_container.get("pixel_values")
+    datasets = [dict_container.dataset[key] for key in sorted(k for k in dict_container.dataset
+                                                              if isinstance(k, int))]
+    if pixel_values is None or not datasets \
+            or getattr(datasets[0], "Modality", "").upper() not in IMAGE_MODALITIES:
+        return None
+    volume = np.asarray(pixel_values)
+    if volume.ndim != 3 or len(volume) != len(datasets):
+        return None
+    if datasets[0].Modality == "CT":
+        # CT pixel values are stored offset for display, VTK works in HU like vtkDICOMImageReader
+        volume = np.subtract(volume, CT_RESCALE_INTERCEPT, dtype=np.float32)
+    source = volume_to_vtk_image(volume, volume_spacing(datasets))
+    origin = np.array([float(v) for v in datasets[0].ImagePositionPatient])
+    return source, origin, float(volume.min())
+
 LPS_TO_RAS = np.diag([-1.0, -1.0, 1.0, 1.0])
 
 def lps_matrix_to_ras(M: np.ndarray) -> np.ndarray:
@@ -175,6 +232,10 @@ class VTKEngine:
         self.reslice3d.SetBackgroundLevel(0.0)
         self.reslice3d.SetAutoCropOutput(1)
 
+        # Single-slice reslices of the moving image, one per orientation,
+        # so interactive transforms only reslice the plane being viewed
+        self.reslice2d = {}
+
         # Blend
         self.blend = vtk.vtkImageBlend()
         self.blend.SetOpacity(0, 1.0)
@@ -250,11 +311,47 @@ class VTKEngine:
         flip.SetInputConnection(r.GetOutputPort())
         flip.SetFilteredAxis(1) # flip y-axis to match program orientation elsewhere
         flip.Update()
-        self.fixed_reader = flip
 
-        # Compute voxel->LPS then LPS->RAS
+        # Cleanup temp folder
+        shutil.rmtree(slice_dir, ignore_errors=True)
+        self._temp_dirs.remove(slice_dir)
+
+        # Set background level
+        img = r.GetOutput()
+        scalars = numpy_support.vtk_to_numpy(img.GetPointData().GetScalars())
+        background = float(scalars.min()) if scalars is not None and scalars.size > 0 else None
+
         origin = get_first_slice_ipp(self.patient_dict_container.filepaths)
-        vox2lps = compute_dicom_matrix(r, origin_override=origin)
+        self._set_fixed(flip, compute_dicom_matrix(r, origin_override=origin), background)
+        return True
+
+    def load_fixed_from_container(self) -> bool:
+        """
+        Loads the fixed image volume already held in the PatientDictContainer, without reading any files.
+        The numpy volume is shared with VTK rather than copied.
+
+        Returns:
+            bool: True if the fixed image was loaded, False if the container holds no CT/MR volume.
+        """
+        loaded = container_volume(self.patient_dict_container)
+        if loaded is None:
+            return False
+        source, origin, background = loaded
+        self._set_fixed(source, compute_dicom_matrix(source, origin_override=origin), background)
+        return True
+
+    def _set_fixed(self, source, vox2lps: np.ndarray, background: float | None):
+        """
+        Sets up the VTK pipeline for a loaded fixed image.
+
+        Args:
+            source: VTK pipeline source of the fixed volume, in display (y-flipped) orientation.
+            vox2lps (np.ndarray): The voxel->LPS matrix of the volume.
+            background (float | None): Minimum value of the volume, used as the reslice background.
+        """
+        self.fixed_reader = source
+
+        # Compute voxel->LPS then LPS->RAS
         self.fixed_matrix = lps_matrix_to_ras(vox2lps)
 
         logging.info("Fixed voxel->RAS matrix (no flip):\n%s", self.fixed_matrix)
@@ -264,20 +361,13 @@ class VTKEngine:
         voxel_at_ras0 = np.linalg.inv(self.fixed_matrix) @ ras_origin
         logging.info("Voxel coords of RAS (0,0,0): %s", voxel_at_ras0)
 
-        # Cleanup temp folder
-        shutil.rmtree(slice_dir, ignore_errors=True)
-        self._temp_dirs.remove(slice_dir)
-
         # Set background level
-        img = r.GetOutput()
-        scalars = numpy_support.vtk_to_numpy(img.GetPointData().GetScalars())
-        if scalars is not None and scalars.size > 0:
-            self.reslice3d.SetBackgroundLevel(float(scalars.min()))
+        if background is not None:
+            self.reslice3d.SetBackgroundLevel(background)
 
         # Render step
         self._wire_blend()
         self._sync_reslice_output_to_fixed()
-        return True
 
 
     # Loading moving layer
@@ -310,11 +400,42 @@ class VTKEngine:
         flip.SetInputConnection(r.GetOutputPort())
         flip.SetFilteredAxis(1)
         flip.Update()
-        self.moving_reader = flip
 
-        # Compute voxel->LPS then LPS->RAS
+        # Cleanup temp folder
+        shutil.rmtree(slice_dir, ignore_errors=True)
+        self._temp_dirs.remove(slice_dir)
+
         origin = get_first_slice_ipp(self.moving_image_container.filepaths)
-        vox2lps = compute_dicom_matrix(r, origin_override=origin)
+        self._set_moving(flip, compute_dicom_matrix(r, origin_override=origin))
+        return True
+
+    def load_moving_from_container(self) -> bool:
+        """
+        Loads the moving image volume already held in the MovingDictContainer, without reading any files.
+        The numpy volume is shared with VTK rather than copied.
+
+        Returns:
+            bool: True if the moving image was loaded, False if the container holds no CT/MR volume.
+        """
+        loaded = container_volume(self.moving_image_container)
+        if loaded is None:
+            return False
+        self.moving_dir = self.moving_image_container.path
+        source, origin, _ = loaded
+        self._set_moving(source, compute_dicom_matrix(source, origin_override=origin))
+        return True
+
+    def _set_moving(self, source, vox2lps: np.ndarray):
+        """
+        Sets up the pre-registration transform and the VTK pipeline for a loaded moving image.
+
+        Args:
+            source: VTK pipeline source of the moving volume, in display (y-flipped) orientation.
+            vox2lps (np.ndarray): The voxel->LPS matrix of the volume.
+        """
+        self.moving_reader = source
+
+        # Compute voxel->LPS then LPS->RAS
         self.moving_matrix = lps_matrix_to_ras(vox2lps)
 
         logging.info("Moving voxel->RAS matrix (no flip):\n%s", self.moving_matrix)
@@ -324,10 +445,6 @@ class VTKEngine:
         voxel_at_ras0 = np.linalg.inv(self.moving_matrix) @ ras_origin
         logging.info("Voxel coords of RAS (0,0,0): %s", voxel_at_ras0)
 
-        # Cleanup temp folder
-        shutil.rmtree(slice_dir, ignore_errors=True)
-        self._temp_dirs.remove(slice_dir)
-
         # Compute pre-registration transform
         R_fixed = self.fixed_matrix[0:3,0:3] / np.array([np.linalg.norm(self.fixed_matrix[0:3,i]) for i in range(3)])
         R_moving = self.moving_matrix[0:3,0:3] / np.array([np.linalg.norm(self.moving_matrix[0:3,i]) for i in range(3)])
@@ -353,11 +470,10 @@ class VTKEngine:
                 vtkmat.SetElement(i,j, pre_transform[i,j])
 
         # Render step
-        self.reslice3d.SetInputConnection(flip.GetOutputPort())
+        self.reslice3d.SetInputConnection(source.GetOutputPort())
         self.reslice3d.SetResliceAxes(vtkmat)
         self._sync_reslice_output_to_fixed()
         self._wire_blend()
-        return True
 
 
 
@@ -380,6 +496,44 @@ class VTKEngine:
         self._blend_dirty = True
         self._apply_transform()
 
+    def set_registration_transform(self, transform: sitk.Transform):
+        """
+        Sets the translation and rotation from a transform found by automatic registration.
+        The views then show the moving image as registered. The user transform is a rotation and translation,
+        so the views only show the rigid part of a transform with scale or shear (e.g. similarity or affine
+        registration), but ROI transfer still uses the full transform.
+
+        Args:
+            transform (sitk.Transform): The affine (fixed -> moving) transform of the registration, in LPS.
+        """
+        # Matrix and translation of the transform about the LPS origin
+        offset = np.array(transform.TransformPoint((0.0, 0.0, 0.0)))
+        matrix = np.column_stack([
+            np.array(transform.TransformPoint(tuple(axis))) - offset
+            for axis in np.eye(3)
+        ])
+
+        # The user transform is the inverse (moving -> fixed) transform, see _update_sitk_transform
+        R = np.linalg.inv(matrix)
+        t_vec = -R @ offset - self.undo
+        u, _, vt = np.linalg.svd(R)
+        rigid = np.allclose(R, u @ vt, atol=1e-6)
+        R = u @ vt  # nearest rotation, dropping any scale or shear
+
+        # Euler angles of R = Rz * Ry * Rx
+        rx = np.arctan2(R[2, 1], R[2, 2])
+        ry = np.arcsin(np.clip(-R[2, 0], -1.0, 1.0))
+        rz = np.arctan2(R[1, 0], R[0, 0])
+
+        # Invert x and y for RAS controls
+        self._tx, self._ty, self._tz = float(-t_vec[0]), float(-t_vec[1]), float(t_vec[2])
+        self._rx, self._ry, self._rz = (float(angle) for angle in np.rad2deg([-rx, -ry, rz]))
+        self._apply_transform()
+
+        if not rigid:
+            # Replaces the rigid transform _update_sitk_transform stored for ROI transfer
+            self.moving_image_container.set("tfm", transform)
+
     def set_opacity(self, alpha: float):
         self.blend.SetOpacity(1, float(np.clip(alpha, 0.0, 1.0)))
         self._blend_dirty = True
@@ -402,9 +556,8 @@ class VTKEngine:
 
         # Get the fixed (always present) and moving (if available) VTK images
         fixed_img = self.fixed_reader.GetOutput()
-        moving_img = self.reslice3d.GetOutput() if self.moving_reader else None
-        if self.moving_reader:
-            self.reslice3d.Update()
+        moving_img = self.reslice_slice(orientation, slice_idx) \
+            if self.moving_reader else None
 
         # Use instance window/level if set, else defaults
         window_center = getattr(self, "level", LEVEL_DEFAULT)
@@ -465,6 +618,44 @@ class VTKEngine:
                                        window_width=window_width) if moving_img else None
         return fixed_slice, moving_slice
 
+    def reslice_slice(self, orientation: str, slice_idx: int):
+        """
+        Reslices a single plane of the moving image onto the fixed image grid.
+        The reslice of each orientation has the settings of reslice3d but an output extent of one slice, so
+        it only interpolates the voxels of the plane being viewed. VTK only re-executes it when the transform,
+        interpolation or slice has changed.
+
+        Args:
+            orientation (str): The orientation of the slice (axial, coronal, sagittal).
+            slice_idx (int): The index of the slice in the fixed image.
+
+        Returns:
+            vtkImageData: The resliced plane, with the extent of one slice of the fixed image.
+        """
+        axis = {VTKEngine.ORI_SAGITTAL: 0, VTKEngine.ORI_CORONAL: 1, VTKEngine.ORI_AXIAL: 2}.get(orientation)
+        if axis is None:
+            return None
+
+        reslice = self.reslice2d.get(orientation)
+        if reslice is None:
+            reslice = vtk.vtkImageReslice()
+            self.reslice2d[orientation] = reslice
+
+        # Follow the settings of the full reslice, which is where the transform is applied
+        reslice.SetInputConnection(self.reslice3d.GetInputConnection(0, 0))
+        reslice.SetResliceAxes(self.reslice3d.GetResliceAxes())
+        reslice.SetInterpolationMode(self.reslice3d.GetInterpolationMode())
+        reslice.SetBackgroundLevel(self.reslice3d.GetBackgroundLevel())
+        reslice.SetOutputSpacing(self.reslice3d.GetOutputSpacing())
+        reslice.SetOutputOrigin(self.reslice3d.GetOutputOrigin())
+
+        extent = list(self.reslice3d.GetOutputExtent())
+        index = int(np.clip(slice_idx, extent[2 * axis], extent[2 * axis + 1]))
+        extent[2 * axis] = extent[2 * axis + 1] = index
+        reslice.SetOutputExtent(extent)
+        reslice.Update()
+        return reslice.GetOutput()
+
     def get_slice_qimage(self, orientation: str, slice_idx: int, fixed_color="Purple", moving_color="Green",
                              coloring_enabled=True, mask_rect=None) -> QtGui.QImage:
         """
@@ -0,0 +1,307 @@
+"""
+Native calculation of the DVHs of many ROIs at once.
+
+dicompylercore calculates the DVH of one ROI at a time, looking up the dose
+plane of every contour plane again for each ROI. This engine instead groups
+the contours of all the ROIs by plane, so each dose plane is looked up once
+(with Isodose.get_dose_grid) and binned once. The contours of every ROI on
+the plane are rasterised onto the dose grid positions of
+ROI.calculate_matrix into a stack of masks, and a single np.bincount over
+the ROI and dose bin of every masked voxel gives the histograms of all the
+ROIs on the plane.
+
+The results follow dicompylercore's get_dvh: the same plane thickness,
+dose bins (1 cGy wide), handling of contours outside the dose grid and
+cumulative DVH in Gy and cm^3, so the DVHs can be used interchangeably.
+"""
+
+import numpy as np
+from dicompylercore import dvh, dvhcalc
+from matplotlib.path import Path
+
+from src.Model.Isodose import get_dose_grid
+from src.Model.ROI import calculate_matrix
+
+# Dose planes closer than this (in mm) to a contour plane are used as is
+DOSE_PLANE_THRESHOLD = 0.5
+
+# Errors raised on RT Struct and RT Dose datasets the engine cannot
+# calculate DVHs on, such as missing or malformed attributes
+UNSUPPORTED_DATASET_ERRORS = (AttributeError, IndexError, KeyError,
+                              TypeError, ValueError)
+
+# Orientations with the x axis across the columns of the dose grid
+AXIAL_ORIENTATIONS = [
+    [1, 0, 0, 0, 1, 0],  # Head First Supine
+    [-1, 0, 0, 0, -1, 0],  # Head First Prone
+    [-1, 0, 0, 0, 1, 0],  # Feet First Supine
+    [1, 0, 0, 0, -1, 0],  # Feet First Prone
+]
+
+
+def calc_dvhs_vectorised(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                         dose_limit=None, interrupt_flag=None,
+                         result_callback=None):
+    """
+    Calculate the DVHs of the given ROIs in a single pass over the planes
+    of the RT Struct. The DVH of an ROI is created as soon as the last of
+    its planes has been binned.
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param rois: Iterable of the ROI numbers to calculate.
+    :param dict_thickness: Dictionary where the keys are ROI numbers and
+        the values are thicknesses of the ROI.
+    :param dose_limit: Limit of dose in cGy for DVH calculation.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop calculation.
+    :param result_callback: Function called with the ROI number and DVH
+        of each ROI as soon as its DVH has been calculated.
+    :return: Dictionary of ROI number to cumulative DVH, or None if the
+        calculation was interrupted.
+    """
+    roi_list = list(rois)
+    if not is_supported_dose(dataset_rtdose):
+        # Decubitus and single plane dose grids are left to dicompylercore
+        dict_dvh = {}
+        for roi in roi_list:
+            dict_dvh[roi] = dvhcalc.get_dvh(
+                dataset_rtss, dataset_rtdose, roi, dose_limit,
+                thickness=dict_thickness.get(roi))
+            if result_callback is not None:
+                result_callback(roi, dict_dvh[roi])
+            if interrupt_flag is not None and interrupt_flag.is_set():
+                return
+        return dict_dvh
+
+    names = get_roi_names(dataset_rtss)
+    roi_planes = get_roi_planes(dataset_rtss, roi_list)
+    pixel_array = dataset_rtdose.pixel_array
+    scaling = dataset_rtdose.DoseGridScaling
+    max_dose = int(float(pixel_array.max()) * scaling * 100) + 1
+    if isinstance(dose_limit, int) and dose_limit < max_dose:
+        max_dose = dose_limit
+
+    x_positions, y_positions = calculate_matrix(dataset_rtdose)
+    voxel_area = abs(np.mean(np.diff(x_positions))) \
+        * abs(np.mean(np.diff(y_positions)))
+    frame_positions = get_frame_positions(dataset_rtdose)
+
+    # Contours of every ROI, grouped by plane
+    planes = {}
+    for index, roi in enumerate(roi_list):
+        for z, contours in roi_planes.get(roi, {}).items():
+            planes.setdefault(z, []).append((index, contours))
+
+    histograms = np.zeros((len(roi_list), max_dose), dtype=np.int64)
+    voxel_counts = np.zeros(len(roi_list), dtype=np.int64)
+    outside_dose = np.zeros(len(roi_list), dtype=bool)
+    remaining_planes = [len(roi_planes.get(roi, {})) for roi in roi_list]
+    dict_dvh = {}
+
+    def finish_roi(index):
+        roi = roi_list[index]
+        z_planes = roi_planes.get(roi, {})
+        thickness = dict_thickness.get(roi) or get_plane_thickness(z_planes)
+        volume = voxel_counts[index] * voxel_area * thickness / 1000
+        notes = None
+        if outside_dose[index]:
+            notes = 'Dose grid does not encompass every contour.' + \
+                ' Volume calculated for all contours.'
+        dict_dvh[roi] = create_dvh(histograms[index], volume,
+                                   names.get(roi), notes)
+        if result_callback is not None:
+            result_callback(roi, dict_dvh[roi])
+
+    for z, plane_rois in planes.items():
+        if interrupt_flag is not None and interrupt_flag.is_set():
+            return
+
+        dose_plane = get_dose_plane(dataset_rtdose, frame_positions, z)
+        in_dose_grid = dose_plane is not None
+        if not in_dose_grid:
+            # The volume of the contours is still calculated, using the
+            # dose plane at the origin like dicompylercore does
+            dose_plane = get_dose_grid(dataset_rtdose,
+                                       dataset_rtdose.ImagePositionPatient[2])
+        dose_bins, in_range = get_dose_bins(dose_plane, scaling, max_dose)
+
+        indices = np.array([index for index, _ in plane_rois])
+        masks = get_plane_masks([contours for _, contours in plane_rois],
+                                x_positions, y_positions)
+        masked_rois, masked_voxels = np.nonzero(masks[:, in_range])
+        plane_histograms = np.bincount(
+            masked_rois * max_dose + dose_bins[masked_voxels],
+            minlength=len(indices) * max_dose).reshape(len(indices), max_dose)
+
+        voxel_counts[indices] += plane_histograms.sum(axis=1)
+        if in_dose_grid:
+            histograms[indices] += plane_histograms
+        else:
+            outside_dose[indices] = True
+
+        for index in indices:
+            remaining_planes[index] -= 1
+            if not remaining_planes[index]:
+                finish_roi(index)
+
+    # ROIs without contours
+    for index, roi in enumerate(roi_list):
+        if roi not in dict_dvh:
+            finish_roi(index)
+    return {roi: dict_dvh[roi] for roi in roi_list}
+
+
+def is_supported_dose(dataset_rtdose):
+    """
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :return: True if the dose grid is a stack of axial planes the engine
+        can calculate DVHs on.
+    """
+    if "GridFrameOffsetVector" not in dataset_rtdose \
+            or int(dataset_rtdose.get("NumberOfFrames", 1)) < 2:
+        return False
+    orientation = dataset_rtdose.ImageOrientationPatient
+    return any(np.allclose(orientation, axial)
+               for axial in AXIAL_ORIENTATIONS)
+
+
+def get_roi_names(dataset_rtss):
+    """
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :return: Dictionary of ROI number to ROI name.
+    """
+    return {roi.ROINumber: roi.ROIName
+            for roi in dataset_rtss.get("StructureSetROISequence", [])}
+
+
+def get_roi_planes(dataset_rtss, rois):
+    """
+    :param dataset_rtss: RTSTRUCT DICOM dataset object.
+    :param rois: Iterable of ROI numbers.
+    :return: Dictionary of ROI number to a dictionary of plane to the
+        (x, y) points of the contours on the plane. Planes are keyed by
+        their rounded z position like dicompylercore keys them.
+    """
+    rois = set(rois)
+    roi_planes = {}
+    for roi_contour in dataset_rtss.get("ROIContourSequence", []):
+        roi = roi_contour.ReferencedROINumber
+        if roi not in rois:
+            continue
+        planes = roi_planes.setdefault(roi, {})
+        for contour in roi_contour.get("ContourSequence", []):
+            points = np.asarray(contour.ContourData,
+                                dtype=np.float64).reshape(-1, 3)
+            z = str(round(float(points[0][2]), 2)) + '0'
+            planes.setdefault(z, []).append(points[:, 0:2])
+    return roi_planes
+
+
+def get_plane_thickness(planes):
+    """
+    :param planes: Dictionary of plane to contours of an ROI.
+    :return: Smallest distance between the planes of the ROI, or 0 if the
+        ROI has a single plane.
+    """
+    z_positions = np.sort([float(z) for z in planes])
+    if len(z_positions) < 2:
+        return 0
+    return float(np.min(np.diff(z_positions)))
+
+
+def get_frame_positions(dataset_rtdose):
+    """
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :return: z position of every frame of the dose grid, as
+        Isodose.get_dose_grid calculates them.
+    """
+    return dataset_rtdose.ImageOrientationPatient[0] \
+        * np.array(dataset_rtdose.GridFrameOffsetVector, dtype=np.float64) \
+        + dataset_rtdose.ImagePositionPatient[2]
+
+
+def get_dose_plane(dataset_rtdose, frame_positions, z):
+    """
+    :param dataset_rtdose: RTDOSE DICOM dataset object.
+    :param frame_positions: z position of every frame of the dose grid.
+    :param z: Plane key of a contour plane.
+    :return: Dose plane at the contour plane, or None if the plane is
+        outside the dose grid.
+    """
+    z = float(z)
+    if np.amin(np.fabs(frame_positions - z)) >= DOSE_PLANE_THRESHOLD \
+            and (z < np.amin(frame_positions)
+                 or z > np.amax(frame_positions)):
+        return None
+    return get_dose_grid(dataset_rtdose, z)
+
+
+def get_dose_bins(dose_plane, scaling, max_dose):
+    """
+    Bin a dose plane the way np.histogram(bins=max_dose,
+    range=(0, max_dose)) bins it.
+    :param dose_plane: 2d array of the dose grid.
+    :param scaling: DoseGridScaling of the RT Dose.
+    :param max_dose: Number of 1 cGy bins.
+    :return: Tuple of the bin of every voxel that is inside the range of
+        the bins, and the flattened mask of those voxels.
+    """
+    dose = (dose_plane * scaling * 100).ravel()
+    in_range = (dose >= 0) & (dose <= max_dose)
+    dose_bins = np.minimum(np.floor(dose[in_range]).astype(np.int64),
+                           max_dose - 1)
+    return dose_bins, in_range
+
+
+def get_plane_masks(roi_contours, x_positions, y_positions):
+    """
+    Rasterise the contours of several ROIs on one plane onto the dose grid.
+    Contours of the same ROI are combined with XOR, so inner contours cut
+    holes out of the ROI.
+    :param roi_contours: List of the (x, y) points of the contours of each
+        ROI on the plane.
+    :param x_positions: x position of every column of the dose grid.
+    :param y_positions: y position of every row of the dose grid.
+    :return: (ROIs, rows * columns) boolean array of the mask of each ROI.
+    """
+    masks = np.zeros((len(roi_contours), len(y_positions), len(x_positions)),
+                     dtype=bool)
+    for mask, contours in zip(masks, roi_contours):
+        for contour in contours:
+            # Only the voxels inside the bounding box of the contour can be
+            # inside the contour
+            columns = np.flatnonzero(
+                (x_positions >= contour[:, 0].min())
+                & (x_positions <= contour[:, 0].max()))
+            rows = np.flatnonzero(
+                (y_positions >= contour[:, 1].min())
+                & (y_positions <= contour[:, 1].max()))
+            if not len(columns) or not len(rows):
+                continue
+            columns = slice(columns[0], columns[-1] + 1)
+            rows = slice(rows[0], rows[-1] + 1)
+            x, y = np.meshgrid(x_positions[columns], y_positions[rows])
+            inside = Path(contour).contains_points(
+                np.column_stack((x.ravel(), y.ravel())))
+            mask[rows, columns] ^= inside.reshape(x.shape)
+    return masks.reshape(len(roi_contours), -1)
+
+
+def create_dvh(histogram, volume, name, notes=None):
+    """
+    :param histogram: Differential voxel counts in 1 cGy bins.
+    :param volume: Volume of the ROI in cm^3.
+    :param name: Name of the ROI.
+    :param notes: Notes of the DVH.
+    :return: Cumulative dicompylercore DVH of the ROI.
+    """
+    if histogram.max() > 0:
+        counts = np.trim_zeros(histogram * volume / histogram.sum(), trim='b')
+        bins = np.arange(0, 2) if counts.size == 1 \
+            else np.arange(0, counts.size + 1) / 100
+    else:
+        counts = np.array([0])
+        bins = np.arange(0, 2)
+        notes = 'Empty DVH'
+    return dvh.DVH(counts=counts, bins=bins, dvh_type='differential',
+                   dose_units='Gy', notes=notes, name=name).cumulative
@@ -52,14 +52,11 @@ def windowing_model_direct(window, level, init, fixed_image_array=None):
 
     # Update the dictionary of pixmaps with the updated window and level values for DICOM view
     if init[0]:
-        pixel_values = patient_dict_container.get("pixel_values")
-        pixmap_aspect = patient_dict_container.get("pixmap_aspect")
-        pixmaps_axial, pixmaps_coronal, pixmaps_sagittal = \
-            get_pixmaps(pixel_values, window, level, pixmap_aspect)
-
-        patient_dict_container.set("pixmaps_axial", pixmaps_axial)
-        patient_dict_container.set("pixmaps_coronal", pixmaps_coronal)
-        patient_dict_container.set("pixmaps_sagittal", pixmaps_sagittal)
+        # Pixmaps are rendered on demand, so only the provider's window
+        # and level need updating
+        pixmap_provider = patient_dict_container.get("pixmap_provider")
+        pixmap_provider.set_window(window, level)
+
         patient_dict_container.set("window", window)
         patient_dict_container.set("level", level)
 
@@ -0,0 +1,181 @@
+"""
+Journal of the batch processes performed on each patient.
+
+Every process a batch performs on a patient is recorded with its status,
+start and end times, the files it wrote, and a fingerprint of the
+patient's files once the patient was done. A batch writing to the same
+outputs can then resume, skipping the processes that were completed on
+patients whose files have not changed since, so re-running a cohort only
+processes the patients that were added or changed, or that did not finish.
+"""
+
+import hashlib
+import json
+import sqlite3
+from pathlib import Path
+
+from src.Model.DICOM.DICOMScanIndex import stat_file
+
+# Statuses of processes that did not finish, and are performed again when a
+# batch is resumed
+INCOMPLETE_STATUSES = ("INTERRUPT", "TIMEOUT", "ERROR")
+
+# Seconds to wait for another process writing to the journal
+JOURNAL_TIMEOUT = 30
+
+
+def get_files_fingerprint(file_paths):
+    """
+    :param file_paths: Paths of the files of a patient.
+    :return: Hash of the paths, modification times and sizes of the files.
+    """
+    entries = []
+    for file_path in sorted({str(Path(path)) for path in file_paths}):
+        stat_result = stat_file(file_path)
+        if stat_result is not None:
+            entries.append([file_path, *stat_result])
+    return hashlib.sha256(json.dumps(entries).encode()).hexdigest()
+
+
+class BatchJournal:
+    """
+    SQLite backed journal of batch processing, stored next to the outputs
+    of the batch. Each row holds the status of a process performed on a
+    patient, the settings it was performed with, when it started and
+    finished, the files it wrote (as a JSON list), and the fingerprint of
+    the patient's files after the patient was done.
+
+    Example usage:
+    batch_journal = BatchJournal(dvh_output_path)
+    completed = batch_journal.get_completed_processes(
+        patient_id, {"dvh2csv": settings}, fingerprint)
+    ...
+    batch_journal.record(patient_id, records, fingerprint)
+    """
+
+    def __init__(self, directory, db_file='BatchJournal.db'):
+        """
+        :param directory: Directory to store the journal in.
+        :param db_file: Name of the journal database file.
+        """
+        self.db_file_path = Path(directory).joinpath(db_file)
+        self.set_up_journal_db()
+
+    def connect(self):
+        """
+        :return: Connection to the journal database.
+        """
+        return sqlite3.connect(self.db_file_path, timeout=JOURNAL_TIMEOUT)
+
+    def set_up_journal_db(self):
+        """
+        Create the BATCH_JOURNAL table inside the SQLite database
+        """
+        connection = self.connect()
+        connection.execute("""
+                    CREATE TABLE IF NOT EXISTS BATCH_JOURNAL (
+                        patient_id TEXT,
+                        process TEXT,
+                        status TEXT,
+                        settings TEXT,
+                        fingerprint TEXT,
+                        started REAL,
+                        finished REAL,
+                        artefacts TEXT,
+                        PRIMARY KEY (patient_id, process)
+                    );
+                """)
+        connection.commit()
+        connection.close()
+
+    def get_entries(self, patient_id):
+        """
+        :param patient_id: PatientID of the patient.
+        :return: Dictionary of process name to a dictionary of the status,
+            settings, fingerprint, started, finished and artefacts of the
+            process.
+        """
+        connection = self.connect()
+        cursor = connection.cursor()
+        cursor.execute("""SELECT process, status, settings, fingerprint,
+                          started, finished, artefacts FROM BATCH_JOURNAL
+                          WHERE patient_id = ?;""", (patient_id,))
+        entries = {
+            row[0]: {"status": row[1], "settings": row[2],
+                     "fingerprint": row[3], "started": row[4],
+                     "finished": row[5], "artefacts": json.loads(row[6])}
+            for row in cursor.fetchall()}
+        connection.close()
+        return entries
+
+    def get_completed_processes(self, patient_id, process_settings,
+                                fingerprint):
+        """
+        :param patient_id: PatientID of the patient.
+        :param process_settings: Dictionary of the name of each process to
+            the settings it is to be performed with, as a string.
+        :param fingerprint: Fingerprint of the patient's files.
+        :return: Set of the processes that were completed with the same
+            settings on the same files.
+        """
+        entries = self.get_entries(patient_id)
+        return {
+            process for process, settings in process_settings.items()
+            if process in entries
+            and entries[process]["status"] not in INCOMPLETE_STATUSES
+            and entries[process]["settings"] == settings
+            and entries[process]["fingerprint"] == fingerprint}
+
+    def record(self, patient_id, records, fingerprint):
+        """
+        Record the processes performed on a patient.
+        :param patient_id: PatientID of the patient.
+        :param records: Dictionary of process name to a dictionary of its
+            status, settings, started, finished and artefacts.
+        :param fingerprint: Fingerprint of the patient's files after the
+            processes, or None if they did not finish.
+        """
+        if not records:
+            return
+        connection = self.connect()
+        connection.executemany(
+            """INSERT OR REPLACE INTO BATCH_JOURNAL (patient_id, process,
+               status, settings, fingerprint, started, finished, artefacts)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?);""",
+            [(patient_id, process, record["status"], record["settings"],
+              fingerprint, record.get("started"), record.get("finished"),
+              json.dumps([str(path)
+                          for path in record.get("artefacts", [])]))
+             for process, record in records.items()])
+        connection.commit()
+        connection.close()
+
+
+def get_files_state(directories, recursive=False):
+    """
+    :param directories: Directories to look for files in.
+    :param recursive: Whether to look in the subdirectories too.
+    :return: Dictionary of the path of each file in the directories to its
+        modification time and size.
+    """
+    files_state = {}
+    for directory in directories:
+        directory = Path(directory)
+        if not directory.is_dir():
+            continue
+        paths = directory.rglob("*") if recursive else directory.iterdir()
+        for path in paths:
+            if path.is_file():
+                files_state[str(path)] = stat_file(str(path))
+    return files_state
+
+
+def get_changed_files(files_state, new_files_state):
+    """
+    :param files_state: Files state from get_files_state().
+    :param new_files_state: Files state of the same directories from later.
+    :return: Sorted list of the paths of the files that were written in
+        between.
+    """
+    return sorted(path for path, stat_result in new_files_state.items()
+                  if files_state.get(path) != stat_result)
@@ -4,7 +4,7 @@ from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
 from src.Model import ImageLoading
 from src.Model import ROI
-from src.Model.GetPatientInfo import DicomTree
+from src.Model.BatchModel import create_batch_model
 from src.Model.PatientDictContainer import PatientDictContainer
 
 
@@ -16,6 +16,10 @@ class BatchProcess:
 
     allowed_classes = {}
 
+    # Attributes of the PatientDictContainer the process reads, which are
+    # set once the datasets are loaded. See BatchModel.BATCH_MODEL_ATTRIBUTES.
+    model_attributes = ()
+
     def __init__(self, progress_callback, interrupt_flag, patient_files):
         """
         Class initialiser function.
@@ -102,20 +106,8 @@ class BatchProcess:
         patient_dict_container.set_initial_values(path, read_data_dict,
                                                   file_names_dict)
 
-        # If an RT Struct is included, set relevant values in the
-        # PatientDictContainer
-        if 'rtss' in file_names_dict:
-            dataset_rtss = dcmread(file_names_dict['rtss'])
-            rois = ImageLoading.get_roi_info(dataset_rtss)
-            dict_raw_contour_data, dict_numpoints = \
-                ImageLoading.get_raw_contour_data(dataset_rtss)
-            dict_pixluts = ImageLoading.get_pixluts(read_data_dict)
-
-            # Add RT Struct values to PatientDictContainer
-            patient_dict_container.set("rois", rois)
-            patient_dict_container.set("raw_contour", dict_raw_contour_data)
-            patient_dict_container.set("num_points", dict_numpoints)
-            patient_dict_container.set("pixluts", dict_pixluts)
+        # Set the attributes the process needs
+        create_batch_model(cls.model_attributes, patient_dict_container)
 
         return True
 
@@ -288,10 +280,6 @@ class BatchProcess:
         patient_dict_container.set("file_rtss", filepaths['rtss'])
         patient_dict_container.set("dataset_rtss", dataset['rtss'])
 
-        dicom_tree_rtss = DicomTree(filepaths['rtss'])
-        patient_dict_container.set("dict_dicom_tree_rtss",
-                                   dicom_tree_rtss.dict)
-
         dict_pixluts = ImageLoading.get_pixluts(
             patient_dict_container.dataset)
         patient_dict_container.set("pixluts", dict_pixluts)
@@ -1,10 +1,9 @@
 import os
 from src.Model import CalculateDVHs
 from src.Model import ImageLoading
+from src.Model.DVHCache import DVHCache
 from src.Model.batchprocessing.BatchProcess import BatchProcess
 from src.Model.PatientDictContainer import PatientDictContainer
-import pandas as pd
-import numpy as np
 
 
 class BatchProcessDVH2CSV(BatchProcess):
@@ -26,6 +25,9 @@ class BatchProcessDVH2CSV(BatchProcess):
         },
     }
 
+    # Attributes of the PatientDictContainer read by DVH2CSV
+    model_attributes = ("rois",)
+
     def __init__(self, progress_callback, interrupt_flag, patient_files,
                  output_path):
         """
@@ -96,9 +98,9 @@ class BatchProcessDVH2CSV(BatchProcess):
                 dict_thickness = \
                     ImageLoading.get_thickness_dict(dataset_rtss,
                                                     read_data_dict)
-                raw_dvh = ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose,
-                                                 rois, dict_thickness,
-                                                 self.interrupt_flag)
+                raw_dvh = ImageLoading.multi_calc_dvh(
+                    dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                    dvh_cache=DVHCache(), interrupt_flag=self.interrupt_flag)
             except TypeError:
                 self.summary = "DVH_TYPE_ERROR"
                 return False
@@ -145,62 +147,8 @@ class BatchProcessDVH2CSV(BatchProcess):
 
         create_header = not os.path.isfile(tar_path)
 
-        dvh_csv_list = []
-
-        csv_header = []
-        csv_header.append('Patient ID')
-        csv_header.append('ROI')
-        csv_header.append('Volume (mL)')
-
-        # DVH.CSV EXPORT
-        
-        #Row in centiGray cGy
-        for i in dict_dvh:
-            dvh_roi_list = []
-            dvh = dict_dvh[i]
-            name = dvh.name
-            volume = dvh.volume
-            dvh_roi_list.append(patient_id)
-            dvh_roi_list.append(name)
-            dvh_roi_list.append(volume)
-            
-            dose = dvh.relative_volume.counts
-            
-            trough_i = 0
-            peak_i = 0
-            for percent in np.arange(100, -0.5, -0.5):
-                last_volume = -1
-                for cgy in range(trough_i, len(dose), 10):
-                    trough_i = cgy
-                    if dose[cgy] == percent:
-                        last_volume = cgy
-                    elif dose[cgy] > percent:
-                        peak_i = cgy
-                    elif dose[cgy] < percent:
-                        break
-                if last_volume == -1 and peak_i != 0:
-                    if dose[peak_i] != dose[trough_i]:
-                        volume_per_drop = -10 * (dose[peak_i] - dose[trough_i])/(peak_i - trough_i)
-                        per_drop = dose[peak_i] - percent
-                        substract_amount = per_drop/volume_per_drop * 10
-                        last_volume = trough_i - substract_amount
-                    else:
-                        last_volume = trough_i
-                if last_volume != -1:
-                    dvh_roi_list.append(str(round(last_volume)))
-                else:
-                    dvh_roi_list.append('')
-            dvh_csv_list.append(dvh_roi_list)
-                
-        #Column in percentage %
-        for i in np.arange(100, -0.5, -0.5):
-            csv_header.append(str(i) + '%')
-
-        # Convert the list into pandas dataframe, with 2 digit rounding.
-        pddf_csv = pd.DataFrame(dvh_csv_list, columns=csv_header).round(2)
-        # Fill empty blocks with 0.0
-        pddf_csv.fillna(0.0, inplace=True)
-        pddf_csv.set_index('Patient ID', inplace=True)
+        # Calculate the dose metrics of every ROI
+        pddf_csv = CalculateDVHs.dvh2pandas(dict_dvh, patient_id)
         # Convert and export pandas dataframe to CSV file
         pddf_csv.to_csv(tar_path, mode='a', header=create_header)
 
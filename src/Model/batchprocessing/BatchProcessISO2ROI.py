@@ -1,5 +1,4 @@
 from src.Controller.PathHandler import data_path
-from src.Model import InitialModel
 from src.Model import ImageLoading
 from src.Model.ISO2ROI import ISO2ROI
 from src.Model.PatientDictContainer import PatientDictContainer
@@ -35,6 +34,11 @@ class BatchProcessISO2ROI(BatchProcess):
         }
     }
 
+    # Attributes of the PatientDictContainer read by ISO2ROI
+    model_attributes = ("rtss_modified", "dict_uid", "pixluts",
+                        "dose_pixluts", "rx_dose_in_cgray", "file_rtss",
+                        "dataset_rtss")
+
     def __init__(self, progress_callback, interrupt_flag, patient_files):
         """
         Class initialiser function.
@@ -74,9 +78,6 @@ class BatchProcessISO2ROI(BatchProcess):
         # Update progress
         self.progress_callback.emit(("Setting up...", 30))
 
-        # Initialise
-        InitialModel.create_initial_model_batch()
-
         # Stop loading
         if self.interrupt_flag.is_set():
             # TODO: convert print to logging
@@ -124,7 +125,16 @@ class BatchProcessISO2ROI(BatchProcess):
 
         # Calculate boundaries
         self.progress_callback.emit(("Calculating boundaries...", 60))
-        boundaries = iso2roi.calculate_isodose_boundaries(isodose_levels)
+        boundaries = iso2roi.calculate_isodose_boundaries(
+            isodose_levels, self.interrupt_flag)
+
+        # Stop loading
+        if self.interrupt_flag.is_set():
+            # TODO: convert print to logging
+            print("Stopped ISO2ROI")
+            self.patient_dict_container.clear()
+            self.summary = "INTERRUPT"
+            return False
 
         # Return if boundaries could not be calculated
         if not boundaries:
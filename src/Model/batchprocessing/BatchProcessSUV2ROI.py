@@ -1,4 +1,3 @@
-from src.Model import InitialModel
 from src.Model import ImageLoading
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.SUV2ROI import SUV2ROI
@@ -24,6 +23,10 @@ class BatchProcessSUV2ROI(BatchProcess):
         }
     }
 
+    # Attributes of the PatientDictContainer read by SUV2ROI
+    model_attributes = ("rtss_modified", "pixluts", "file_rtss",
+                        "dataset_rtss")
+
     def __init__(self, progress_callback, interrupt_flag, patient_files,
                  patient_weight):
         """
@@ -64,9 +67,6 @@ class BatchProcessSUV2ROI(BatchProcess):
         # Update progress
         self.progress_callback.emit(("Setting up...", 30))
 
-        # Initialise
-        InitialModel.create_initial_model_batch()
-
         # Stop loading
         if self.interrupt_flag.is_set():
             self.patient_dict_container.clear()
@@ -99,17 +99,17 @@ class BatchProcessSUV2ROI(BatchProcess):
 
         # Calculate boundaries
         self.progress_callback.emit(("Calculating Boundaries", 60))
-        contour_data = suv2roi.calculate_contours()
-
-        if not contour_data:
-            self.summary = "SUV_" + suv2roi.failure_reason
-            return False
+        contour_data = suv2roi.calculate_contours(self.interrupt_flag)
 
         # Stop loading
         if self.interrupt_flag.is_set():
             self.summary = "INTERRUPT"
             return False
 
+        if not contour_data:
+            self.summary = "SUV_" + suv2roi.failure_reason
+            return False
+
         # Generate ROIs
         self.progress_callback.emit(("Generating ROIs...", 80))
         suv2roi.generate_ROI(contour_data, self.progress_callback)
@@ -0,0 +1,321 @@
+"""
+Batch processing of many patients at once, in processes of their own.
+
+The batch processes of a patient read and write the PatientDictContainer
+singleton, so two patients cannot be processed by threads of the same
+process. The patients are processed by a bounded number of patient
+processes instead, each with a container of its own, which is cleared
+before the process moves on to its next patient. The processes are
+started once and kept for the whole batch, so a batch of many small
+patients does not pay for starting a process for every patient. The
+interrupt flag of the batch is passed on to every process, and a patient
+that takes longer than the timeout is stopped along with its process and
+recorded as timed out, without holding up the rest of the batch.
+
+Processes that append rows to a shared CSV file write them to a staging
+directory of their patient instead, and the staged files are appended to
+the real files in patient order, so the output does not depend on which
+patient finished first.
+"""
+import logging
+import multiprocessing
+import os
+import time
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+
+from src.Model.DVHEngine import INTERRUPT_POLL_INTERVAL, \
+    get_available_cores, get_worker_count, set_core_limit
+from src.Model.PatientDictContainer import PatientDictContainer
+
+# Seconds an interrupted patient is given to stop before its process is
+# terminated
+STOP_GRACE_PERIOD = 10
+
+# Status of each patient of the batch
+PATIENT_SUCCESS = "SUCCESS"
+PATIENT_ERROR = "ERROR"
+PATIENT_TIMEOUT = "TIMEOUT"
+PATIENT_INTERRUPT = "INTERRUPT"
+
+
+class PipeProgress:
+    """
+    Stands in for the progress signal of a batch process in a patient
+    process, and sends the progress, and anything the patient reports as
+    it goes, to the batch process's parent.
+    """
+
+    def __init__(self, connection):
+        """
+        :param connection: Sending end of the pipe to the parent.
+        """
+        self.connection = connection
+
+    def emit(self, progress):
+        """
+        :param progress: Tuple of the progress text and percentage.
+        """
+        self.connection.send(("progress", progress))
+
+    def report(self, value):
+        """
+        :param value: Picklable value to pass on to the parent, which is
+            kept even if the patient does not finish.
+        """
+        self.connection.send(("report", value))
+
+
+def run_patient(function, args, connection, interrupt_flag):
+    """
+    Process a patient, and send its (status, result) tuple to the parent.
+    :param function: Function processing the patient, called with args,
+        the interrupt flag and a progress callback.
+    :param args: Tuple of the arguments of the function.
+    :param connection: End of the pipe to the parent.
+    :param interrupt_flag: A multiprocessing.Event() object that tells the
+        function to stop processing.
+    """
+    try:
+        result = function(*args, interrupt_flag, PipeProgress(connection))
+    except Exception:
+        logging.error("Batch processing of patient failed:\n%s",
+                      traceback.format_exc())
+        connection.send((PATIENT_ERROR, None))
+    else:
+        connection.send((PATIENT_SUCCESS, result))
+
+
+def run_worker(connection, interrupt_flag, core_limit):
+    """
+    Process the patients the parent sends one after another, until it
+    sends None. This is the target of each patient process.
+    :param connection: End of the pipe to the parent, which sends the
+        (function, args) tuple of each patient.
+    :param interrupt_flag: A multiprocessing.Event() object that tells the
+        functions to stop processing.
+    :param core_limit: Number of cores the pools of the process may use.
+    """
+    set_core_limit(core_limit)
+    try:
+        while True:
+            patient = connection.recv()
+            if patient is None:
+                break
+            function, args = patient
+            run_patient(function, args, connection, interrupt_flag)
+            # The next patient starts with an empty container
+            PatientDictContainer().clear()
+    except EOFError:
+        # The parent has stopped
+        pass
+    finally:
+        connection.close()
+
+
+def get_patient_worker_count(patient_count, worker_count=None):
+    """
+    :param patient_count: Number of patients in the batch.
+    :param worker_count: Number of patients processed at a time, or None
+        for one per available core.
+    :return: Number of patient processes to run at a time.
+    """
+    if worker_count:
+        return max(1, min(worker_count, patient_count))
+    return get_worker_count(patient_count)
+
+
+def process_patients(function, patient_args, interrupt_flag,
+                     worker_count=None, timeout=None, progress_callback=None,
+                     report_callback=None, completed_callback=None):
+    """
+    Process the patients on a bounded number of patient processes, each
+    processing one patient at a time.
+    :param function: Picklable function processing a patient. It is
+        called with the arguments of the patient, followed by an interrupt
+        flag and a progress callback with emit() and report() methods.
+    :param patient_args: List of the tuples of arguments of each patient,
+        which must be picklable as the patient processes are spawned.
+    :param interrupt_flag: A threading.Event() object that tells the
+        function to stop processing.
+    :param worker_count: Number of patients processed at a time, or None
+        for one per available core.
+    :param timeout: Seconds a patient may take before it is stopped, or
+        None for no limit.
+    :param progress_callback: Function called with the index of the patient
+        and the progress tuple whenever a patient reports progress.
+    :param report_callback: Function called with the index of the patient
+        and the value whenever a patient reports a value, including the
+        values a patient reported before it failed or was stopped.
+    :param completed_callback: Function called with the index of the
+        patient, its (status, result) tuple, the number of patients done
+        and the number of patients whenever a patient is done.
+    :return: List of the (status, result) tuples of each patient, in the
+        order of patient_args. The result is the return value of the
+        function if the status is PATIENT_SUCCESS, and None otherwise.
+    """
+    process_count = get_patient_worker_count(len(patient_args),
+                                             worker_count)
+    # The pools of the patients share the cores between them
+    core_limit = max(1, get_available_cores() // process_count)
+
+    # Patient processes are spawned, as forking a process with running Qt
+    # threads can deadlock or crash the child
+    context = multiprocessing.get_context("spawn")
+    stop_flag = context.Event()
+    stop_time = None
+    waiting = deque(enumerate(patient_args))
+    # Pipe to each patient process, to a list of the process and the index
+    # of the patient it is processing and the time the patient started, or
+    # None while it waits for the next patient
+    processes = {}
+    results = [None] * len(patient_args)
+    completed = 0
+
+    def complete(index, result):
+        nonlocal completed
+        results[index] = result
+        completed += 1
+        if completed_callback is not None:
+            completed_callback(index, result, completed, len(patient_args))
+
+    def receive(connection):
+        index = processes[connection][1][0]
+        message, value = connection.recv()
+        if message == "progress":
+            if progress_callback is not None:
+                progress_callback(index, value)
+        elif message == "report":
+            if report_callback is not None:
+                report_callback(index, value)
+        else:
+            processes[connection][1] = None
+            complete(index, (message, value))
+
+    def stop(connection, status=None):
+        if status is not None:
+            processes[connection][0].terminate()
+        # What the process sent before it ended is still in the pipe
+        try:
+            while processes[connection][1] is not None and connection.poll():
+                receive(connection)
+        except (EOFError, OSError):
+            pass
+        process, patient = processes.pop(connection)
+        process.join()
+        connection.close()
+        if patient is not None:
+            if status is None:
+                # The process ended without a result
+                status = PATIENT_INTERRUPT if stop_flag.is_set() \
+                    else PATIENT_ERROR
+            complete(patient[0], (status, None))
+
+    try:
+        while waiting or any(patient is not None
+                             for _, patient in processes.values()):
+            if interrupt_flag.is_set() and not stop_flag.is_set():
+                stop_flag.set()
+                stop_time = time.monotonic()
+
+            # Send the next patients to the waiting processes, and start
+            # new processes while there are fewer than process_count
+            while waiting and not stop_flag.is_set():
+                idle = [connection for connection, (_, patient)
+                        in processes.items() if patient is None]
+                if idle:
+                    connection = idle[0]
+                elif len(processes) < process_count:
+                    connection, child_connection = context.Pipe()
+                    process = context.Process(
+                        target=run_worker,
+                        args=(child_connection, stop_flag, core_limit))
+                    process.start()
+                    child_connection.close()
+                    processes[connection] = [process, None]
+                else:
+                    break
+                index, args = waiting.popleft()
+                try:
+                    connection.send((function, args))
+                except OSError:
+                    # The process ended while it was waiting
+                    waiting.appendleft((index, args))
+                    stop(connection)
+                    continue
+                processes[connection][1] = (index, time.monotonic())
+
+            running = [connection for connection, (_, patient)
+                       in processes.items() if patient is not None]
+            if not running:
+                break
+            for connection in wait(running, timeout=INTERRUPT_POLL_INTERVAL):
+                try:
+                    receive(connection)
+                except EOFError:
+                    stop(connection)
+
+            # Stop the patients that have taken too long, along with their
+            # processes
+            now = time.monotonic()
+            for connection, (_, patient) in list(processes.items()):
+                if patient is None:
+                    continue
+                index, start_time = patient
+                if timeout and now - start_time > timeout:
+                    logging.warning("Batch processing of patient %s timed "
+                                    "out", index)
+                    stop(connection, PATIENT_TIMEOUT)
+                elif stop_time is not None \
+                        and now - stop_time > STOP_GRACE_PERIOD:
+                    stop(connection, PATIENT_INTERRUPT)
+    finally:
+        # The processes end once they are told there are no more patients
+        for connection in processes:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for connection, (process, _) in processes.items():
+            process.join(STOP_GRACE_PERIOD)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            connection.close()
+
+    return [result if result is not None else (PATIENT_INTERRUPT, None)
+            for result in results]
+
+
+def merge_csv_files(staging_directory, target_directory, staged_paths=None):
+    """
+    Append the CSV files a patient wrote to a staging directory to the CSV
+    files of the same name under the target directory. The header of a
+    staged file is only written if the target file does not exist yet,
+    the way the batch processes write their CSV files.
+    :param staging_directory: Directory the patient's files were written
+        to.
+    :param target_directory: Directory of the CSV files of the batch.
+    :param staged_paths: Paths of the staged files to append, or None for
+        every CSV file in the staging directory.
+    """
+    staging_directory = Path(staging_directory)
+    if not staging_directory.is_dir():
+        return
+    if staged_paths is not None:
+        staged_paths = {str(Path(path)) for path in staged_paths}
+    for staged_path in sorted(staging_directory.rglob("*.csv")):
+        if staged_paths is not None and str(staged_path) not in staged_paths:
+            continue
+        target_path = Path(target_directory).joinpath(
+            staged_path.relative_to(staging_directory))
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        write_header = not os.path.isfile(target_path)
+        with open(staged_path, "r", newline="") as staged_file, \
+                open(target_path, "a", newline="") as target_file:
+            header = staged_file.readline()
+            if write_header:
+                target_file.write(header)
+            target_file.write(staged_file.read())
@@ -212,6 +212,13 @@ class UIBatchProcessingWindow(object):
         self.info_label = QtWidgets.QLabel(info_text)
         self.info_label.setFont(label_font)
 
+        # Resume checkbox
+        self.resume_checkbox = QtWidgets.QCheckBox(
+            "Skip patients completed by previous batches")
+        self.resume_checkbox.setFont(label_font)
+        self.resume_checkbox.setStyleSheet(
+            StyleSheetReader().get_stylesheet())
+
         # Back button
         self.back_button = QtWidgets.QPushButton("Exit")
         self.back_button.setObjectName("BatchExitButton")
@@ -249,6 +256,7 @@ class UIBatchProcessingWindow(object):
 
         # Add bottom widgets (buttons)
         self.bottom_layout.addWidget(self.info_label, 0, 0, 2, 4)
+        self.bottom_layout.addWidget(self.resume_checkbox, 2, 0, 1, 2)
         self.bottom_layout.addWidget(self.back_button, 2, 2, 1, 1)
         self.bottom_layout.addWidget(self.begin_button, 2, 3, 1, 1)
         self.layout.addLayout(self.bottom_layout)
@@ -424,6 +432,8 @@ class UIBatchProcessingWindow(object):
         # Setup the batch processing controller
         self.batch_processing_controller.set_file_paths(file_directories)
         self.batch_processing_controller.set_processes(selected_processes)
+        self.batch_processing_controller.set_resume(
+            self.resume_checkbox.isChecked())
         self.batch_processing_controller.set_suv2roi_weights(suv2roi_weights)
         self.batch_processing_controller.set_kaplanmeier_target_col(kaplanmeier_target_col)
         self.batch_processing_controller.set_kaplanmeier_duration_of_life_col(kaplanmeier_duration_of_life_col)
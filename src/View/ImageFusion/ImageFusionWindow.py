@@ -1,3 +1,4 @@
+import logging
 import threading, queue, traceback
 
 from PySide6 import QtGui, QtWidgets
@@ -9,9 +10,12 @@ from PySide6.QtWidgets import QWidget, QTreeWidget, QTreeWidgetItem, \
 
 from pydicom import dcmread
 
+from src.Model.MovingDictContainer import MovingDictContainer
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model import ImageLoading
 from src.Model.DICOM import DICOMDirectorySearch
+from src.Model.DICOM.DICOMScanIndex import ScanIndex
+from src.Model.VTKEngine import VTKEngine
 from src.Model.Worker import Worker
 from src.View.ImageFusion.FusionResultWrapper import FusionResultWrapper
 from src.View.ImageFusion.ImageFusionProgressWindow \
@@ -368,7 +372,8 @@ class UIImageFusionWindow(object):
             # Then, create a new thread that will load the selected folder
             worker = Worker(DICOMDirectorySearch.get_dicom_structure,
                             self.filepath,
-                            self.interrupt_flag, progress_callback=True)
+                            self.interrupt_flag, progress_callback=True,
+                            scan_index=ScanIndex())
             worker.signals.result.connect(self.on_search_complete)
             worker.signals.progress.connect(self.search_progress)
 
@@ -734,7 +739,12 @@ class UIImageFusionWindow(object):
             wrapper = FusionResultWrapper(results, self.progress_window)
             self.image_fusion_info_initialized.emit(wrapper)
         elif results is True:
+            # Auto fusion: the views draw the images with a VTKEngine, which
+            # the registration gives its transforms to as it runs
             images = {}
+            engine = self.create_auto_fusion_engine()
+            if engine is not None:
+                images = {"vtk_engine": engine, "transform_data": None}
             wrapper = FusionResultWrapper(images, self.progress_window)
             self.image_fusion_info_initialized.emit(wrapper)
         elif results is False:
@@ -745,6 +755,22 @@ class UIImageFusionWindow(object):
                                 f"Unexpected result type returned from fusion loader: {type(results)}")
 
 
+    def create_auto_fusion_engine(self):
+        """
+        Creates the VTKEngine that the auto fusion views draw the fixed and
+        moving images with, from the images already loaded.
+        :return: The VTKEngine, or None if it could not load the images.
+        """
+        engine = VTKEngine()
+        fixed_loaded = engine.load_fixed_from_container() \
+            or engine.load_fixed(PatientDictContainer().path)
+        if not fixed_loaded or not (
+                engine.load_moving_from_container()
+                or engine.load_moving(MovingDictContainer().path)):
+            logging.error("Could not load the auto fusion images with VTK")
+            return None
+        return engine
+
     def on_loading_error(self, exception):
         """
         Error handling for progress window.
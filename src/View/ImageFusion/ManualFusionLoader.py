@@ -179,7 +179,9 @@ class ManualFusionLoader(QtCore.QObject):
         # Use VTKEngine to load images
         engine = VTKEngine()
 
-        fixed_loaded = engine.load_fixed(fixed_dir)
+        # The image volumes are already in the containers, so they are handed to VTK without
+        # reading the files again. Reading from the directories is only a fallback.
+        fixed_loaded = engine.load_fixed_from_container() or engine.load_fixed(fixed_dir)
         if not fixed_loaded:
             logging.error("<manualFusionLoader.py>Could not load fixed image")
             raise RuntimeError("Failed to load fixed image with VTK.")
@@ -192,7 +194,7 @@ class ManualFusionLoader(QtCore.QObject):
             self.signal_error.emit((False, "Loading cancelled"))
             return
 
-        moving_loaded = engine.load_moving(moving_dir)
+        moving_loaded = engine.load_moving_from_container() or engine.load_moving(moving_dir)
         if not moving_loaded:
             logging.error("<manualFusionLoader.py_load_with_vtk>Failed to load moving image with VTK.")
             raise RuntimeError("Failed to load moving image with VTK.")
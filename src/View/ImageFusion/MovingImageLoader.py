@@ -1,6 +1,5 @@
 import logging
 import os
-import platform
 from pathlib import Path
 
 from PySide6 import QtCore
@@ -8,10 +7,10 @@ from PySide6.QtWidgets import QMessageBox
 from pydicom import dcmread
 
 from src.Model import ImageLoading
+from src.Model.DVHCache import DVHCache
 from src.Model.MovingDictContainer import MovingDictContainer
 from src.Model.MovingModel import create_moving_model
 from src.Model.ROI import create_initial_rtss_from_ct
-from src.Model.GetPatientInfo import DicomTree
 from src.Model.DicomUtils import truncate_ds_fields
 
 from src.View.ImageLoader import ImageLoader
@@ -67,12 +66,10 @@ class MovingImageLoader(ImageLoader):
                    file_names_dict, moving_dict_container, interrupt_flag):
         dataset_rtdose = dcmread(file_names_dict['rtdose'])
 
-        fork_safe_platforms = ['Linux']
-        if platform.system() in fork_safe_platforms:
-            raw_dvh = ImageLoading.multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness)
-        else:
-            raw_dvh = ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose, rois,
-                                             dict_thickness, interrupt_flag)
+        raw_dvh = ImageLoading.multi_calc_dvh(dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                                              dvh_cache=DVHCache(), interrupt_flag=interrupt_flag)
+        if raw_dvh is None:  # Stop loading.
+            return False
 
         dvh_x_y = ImageLoading.converge_to_0_dvh(raw_dvh)
 
@@ -108,8 +105,6 @@ class MovingImageLoader(ImageLoader):
 
         moving_dict_container.set("file_rtss", rtss_path)
         moving_dict_container.set("dataset_rtss", rtss)
-        ordered_dict = DicomTree(None).dataset_to_dict(rtss)
-        moving_dict_container.set("dict_dicom_tree_rtss", ordered_dict)
         moving_dict_container.set("selected_rois", [])
 
         return True
@@ -733,7 +733,7 @@ class UITransferROIWindow:
                 try:
                     new_rtss = ROI.create_roi(
                         patient_dict_container.get("dataset_rtss"),
-                        roi_name, roi_list, rtss_owner="MOVING")
+                        roi_name, roi_list)
                     self.moving_dict_container.set("dataset_rtss", new_rtss)
                     self.moving_dict_container.set("rtss_modified", True)
                 except Exception as e:
@@ -1,6 +1,5 @@
 import logging
 import os
-import platform
 from pathlib import Path
 
 from PySide6.QtCore import Slot
@@ -13,7 +12,7 @@ from src.Model.CalculateDVHs import (
     dvh2rtdose,
     rtdose2dvh,
 )
-from src.Model.GetPatientInfo import DicomTree
+from src.Model.DVHCache import DVHCache
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.ROI import create_initial_rtss_from_ct
 from src.Model.xrRtstruct import create_initial_rtss_from_cr
@@ -69,7 +68,7 @@ class ImageLoader(QtCore.QObject):
             # Gets the common root folder.
             path = os.path.dirname(os.path.commonprefix(self.selected_files))
             read_data_dict, file_names_dict = ImageLoading.get_datasets(
-                self.selected_files, parent_window=self
+                self.selected_files, parent_window=self, lazy_pixels=True
             )
             # Enter ack loop if incorrect slice detected
             if self.is_incorrect_slice:
@@ -167,29 +166,18 @@ class ImageLoader(QtCore.QObject):
                 if self.calc_dvh:
                     dataset_rtdose = dcmread(file_names_dict["rtdose"])
 
-                    # Spawn-based platforms (i.e Windows and MacOS) have
-                    # a large overhead when creating a new process, which
-                    # ends up making multiprocessing on these platforms more
-                    # expensive than linear calculation. As such,
-                    # multiprocessing is only available on Linux until a better
-                    # solution is found.
-                    fork_safe_platforms = ["Linux"]
-                    if platform.system() in fork_safe_platforms:
-                        progress_callback.emit(("Calculating DVHs...", 60))
-                        raw_dvh = ImageLoading.multi_calc_dvh(
-                            dataset_rtss, dataset_rtdose, rois, dict_thickness
-                        )
-                    else:
-                        progress_callback.emit(
-                            ("Calculating DVHs... (This may take a while)", 60)
-                        )
-                        raw_dvh = ImageLoading.calc_dvhs(
-                            dataset_rtss,
-                            dataset_rtdose,
-                            rois,
-                            dict_thickness,
-                            interrupt_flag,
-                        )
+                    # Each finished DVH moves the progress bar along
+                    def dvh_calculated(roi, dvh, completed, total):
+                        progress_callback.emit((
+                            "Calculating DVHs... (%s/%s)" % (completed, total),
+                            60 + 20 * completed // total))
+
+                    progress_callback.emit(("Calculating DVHs...", 60))
+                    raw_dvh = ImageLoading.multi_calc_dvh(
+                        dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                        dvh_cache=DVHCache(), interrupt_flag=interrupt_flag,
+                        result_callback=dvh_calculated
+                    )
 
                     if interrupt_flag.is_set():  # Stop loading.
                         return False
@@ -204,6 +192,9 @@ class ImageLoader(QtCore.QObject):
                     patient_dict_container.set("raw_dvh", raw_dvh)
                     patient_dict_container.set("dvh_x_y", dvh_x_y)
                     patient_dict_container.set("dvh_outdated", False)
+                    patient_dict_container.set(
+                        "dvh_roi_hashes",
+                        ImageLoading.get_dvh_roi_hashes(dataset_rtss, raw_dvh))
 
                     # Write DVH data to the RT Dose
                     dvh2rtdose(raw_dvh)
@@ -262,8 +253,6 @@ class ImageLoader(QtCore.QObject):
         # Set some patient dict container attributes
         patient_dict_container.set("file_rtss", rtss_path)
         patient_dict_container.set("dataset_rtss", rtss)
-        ordered_dict = DicomTree(None).dataset_to_dict(rtss)
-        patient_dict_container.set("dict_dicom_tree_rtss", ordered_dict)
         patient_dict_container.set("selected_rois", [])
 
     def load_temp_rtdose(self, path, progress_callback, interrupt_flag):
@@ -312,8 +301,6 @@ class ImageLoader(QtCore.QObject):
         # Set some patient dict container attributes
         patient_dict_container.set("file_rtdose", rtdose_path)
         patient_dict_container.set("dataset_rtdose", rtdose)
-        ordered_dict = DicomTree(None).dataset_to_dict(rtdose)
-        patient_dict_container.set("dict_dicom_tree_rtdose", ordered_dict)
         # patient_dict_container.set("selected_rois", [])
 
     def update_calc_dvh(self, advice):
@@ -8,6 +8,7 @@ from PySide6.QtWidgets import QWidget, QTreeWidget, QTreeWidgetItem, \
     QLabel, QLineEdit, QSizePolicy, QPushButton
 
 from src.Model.DICOM import DICOMDirectorySearch
+from src.Model.DICOM.DICOMScanIndex import ScanIndex
 from src.Model.Worker import Worker
 from src.View.PTCTFusion.PTCTProgressWindow import PTCTProgressWindow
 from src.View.StyleSheetReader import StyleSheetReader
@@ -295,7 +296,8 @@ class UIOpenPTCTPatientWindow(object):
             # Then, create a new thread that will load the selected folder
             worker = Worker(DICOMDirectorySearch.get_dicom_structure,
                             self.filepath,
-                            self.interrupt_flag, progress_callback=True)
+                            self.interrupt_flag, progress_callback=True,
+                            scan_index=ScanIndex())
             worker.signals.result.connect(self.on_search_complete)
             worker.signals.progress.connect(self.search_progress)
 
@@ -87,6 +87,18 @@ class BatchSummaryWindow(QtWidgets.QDialog):
                 elif patient_summary[process] == "INTERRUPT":
                     summary_text += process.upper() \
                         + " skipped as it was interrupted."
+                # Completed by a previous batch on the same files
+                elif patient_summary[process] == "RESUMED":
+                    summary_text += process.upper() \
+                        + " skipped as it was completed by an earlier batch."
+                # Patient took longer than the patient timeout
+                elif patient_summary[process] == "TIMEOUT":
+                    summary_text += process.upper() \
+                        + " stopped as the patient took too long."
+                # Patient process failed
+                elif patient_summary[process] == "ERROR":
+                    summary_text += process.upper() \
+                        + " failed with an unexpected error."
                 # ISO2ROI no RX Dose value exists
                 elif patient_summary[process] == "ISO_NO_RX_DOSE":
                     summary_text += process.upper() \
@@ -11,6 +11,7 @@ from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
 from src.Controller.PathHandler import resource_path
 from src.Model import ImageLoading
 from src.Model.CalculateDVHs import dvh2csv, dvh2rtdose, rtdose2dvh
+from src.Model.DVHCache import DVHCache
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.Worker import Worker
 from src.View.StyleSheetReader import StyleSheetReader
@@ -185,7 +186,7 @@ class DVHTab(QtWidgets.QWidget):
                 self.patient_dict_container.set("dvh_outdated", False)
                 progress_window.exec_()
 
-                self.export_rtdose()
+                self.export_rtdose(progress_window.changed_rois)
         else:
             # Create a message box and add attributes
             mb = QtWidgets.QMessageBox()
@@ -216,7 +217,7 @@ class DVHTab(QtWidgets.QWidget):
                 self.patient_dict_container.set("dvh_outdated", False)
                 progress_window.exec_()
 
-                self.export_rtdose()
+                self.export_rtdose(progress_window.changed_rois)
 
     def dvh_calculation_finished(self):
         # Clear the screen
@@ -254,11 +255,13 @@ class DVHTab(QtWidgets.QWidget):
             "The DVH Data was saved successfully in your directory!",
             QtWidgets.QMessageBox.Ok)
 
-    def export_rtdose(self):
+    def export_rtdose(self, rois=None):
         """
         Exports DVH data into the RT Dose file in the dataset directory.
+        :param rois: ROI numbers whose DVHs have changed, or None to
+            export every DVH.
         """
-        dvh2rtdose(self.raw_dvh)
+        dvh2rtdose(self.raw_dvh, rois)
         QtWidgets.QMessageBox.information(
             self, "Message",
             "The DVH Data was saved successfully in your directory!",
@@ -278,6 +281,10 @@ class DVHTab(QtWidgets.QWidget):
             dvh_x_y = ImageLoading.converge_to_0_dvh(result)
             self.patient_dict_container.set("raw_dvh", result)
             self.patient_dict_container.set("dvh_x_y", dvh_x_y)
+            # ROIs without a DVH in the RT Dose count as added ROIs
+            self.patient_dict_container.set(
+                "dvh_roi_hashes", ImageLoading.get_dvh_roi_hashes(
+                    self.patient_dict_container.dataset['rtss'], result))
 
             # If incomplete, tell the user about this
             if incomplete:
@@ -325,27 +332,65 @@ class CalculateDVHProgressWindow(QtWidgets.QDialog):
 
         self.threadpool = QtCore.QThreadPool()
         self.patient_dict_container = PatientDictContainer()
+        # ROI numbers whose DVHs were recalculated or removed, or None when
+        # every DVH was calculated
+        self.changed_rois = None
 
-        dataset_rtss = self.patient_dict_container.dataset["rtss"]
         dataset_rtdose = self.patient_dict_container.dataset["rtdose"]
-        rois = self.patient_dict_container.get("rois")
-
-        dict_thickness = ImageLoading.get_thickness_dict(dataset_rtss, self.patient_dict_container.dataset)
-
         interrupt_flag = threading.Event()
-        fork_safe_platforms = ['Linux']
-        if platform.system() in fork_safe_platforms:
-            worker = Worker(ImageLoading.multi_calc_dvh, dataset_rtss, dataset_rtdose, rois, dict_thickness)
+
+        # Once DVHs have been calculated, only the ROIs that have been
+        # added or modified since then are calculated again
+        dvh_roi_hashes = self.patient_dict_container.get("dvh_roi_hashes")
+        if dvh_roi_hashes is not None \
+                and self.patient_dict_container.get("raw_dvh") is not None:
+            dataset_rtss = self.patient_dict_container.get("dataset_rtss")
+            # The structure tab tracks the changes as ROIs are edited.
+            # They are dropped whenever the structure set is replaced, and
+            # found here from the contour hashes instead.
+            rtss_changes = self.patient_dict_container.get("rtss_changes")
+            if rtss_changes is None:
+                rtss_changes = ImageLoading.get_rtss_changes(dvh_roi_hashes,
+                                                             dataset_rtss)
+            self.changed_rois = rtss_changes["added"] \
+                + rtss_changes["modified"] + rtss_changes["removed"]
+            worker = Worker(ImageLoading.calc_changed_dvhs, dataset_rtss, dataset_rtdose,
+                            self.patient_dict_container.dataset,
+                            self.patient_dict_container.get("raw_dvh"),
+                            self.patient_dict_container.get("dvh_x_y"),
+                            rtss_changes, dvh_cache=DVHCache(), interrupt_flag=interrupt_flag)
+            worker.signals.result.connect(self.changed_dvhs_calculated)
         else:
-            worker = Worker(ImageLoading.calc_dvhs, dataset_rtss, dataset_rtdose, rois, dict_thickness, interrupt_flag)
+            dataset_rtss = self.patient_dict_container.dataset["rtss"]
+            rois = self.patient_dict_container.get("rois")
+
+            dict_thickness = ImageLoading.get_thickness_dict(dataset_rtss, self.patient_dict_container.dataset)
 
-        worker.signals.result.connect(self.dvh_calculated)
+            worker = Worker(ImageLoading.multi_calc_dvh, dataset_rtss, dataset_rtdose, rois, dict_thickness,
+                            dvh_cache=DVHCache(), interrupt_flag=interrupt_flag)
+            worker.signals.result.connect(self.dvh_calculated)
 
+        self.dataset_rtss = dataset_rtss
         self.threadpool.start(worker)
 
     def dvh_calculated(self, result):
         dvh_x_y = ImageLoading.converge_to_0_dvh(result)
-        self.patient_dict_container.set("raw_dvh", result)
+        self.set_dvhs(result, dvh_x_y)
+
+    def changed_dvhs_calculated(self, result):
+        raw_dvh, dvh_x_y = result
+        self.set_dvhs(raw_dvh, dvh_x_y)
+
+    def set_dvhs(self, raw_dvh, dvh_x_y):
+        """
+        Store the calculated DVHs, along with the contour hashes of their
+        ROIs so that later changes to the ROIs can be tracked.
+        """
+        self.patient_dict_container.set("raw_dvh", raw_dvh)
         self.patient_dict_container.set("dvh_x_y", dvh_x_y)
+        self.patient_dict_container.set(
+            "dvh_roi_hashes",
+            ImageLoading.get_dvh_roi_hashes(self.dataset_rtss, raw_dvh))
+        self.patient_dict_container.set("rtss_changes", None)
         self.signal_dvh_calculated.emit()
         self.close()
@@ -1,10 +1,10 @@
 from PySide6 import QtWidgets, QtCore, QtGui
-from skimage import measure
 
 from src.View.mainpage.DicomView import DicomView
-from src.Model.Isodose import get_dose_grid
+from src.Model.IsodoseProvider import get_isodose_provider
+from src.Model.LineFillConfiguration import get_line_fill_configuration
 from src.Model.PatientDictContainer import PatientDictContainer
-from src.Controller.PathHandler import data_path, resource_path
+from src.Controller.PathHandler import resource_path
 
 
 class DicomAxialView(DicomView):
@@ -291,34 +291,26 @@ class DicomAxialView(DicomView):
         """
         slider_id = self.slider.value()
         curr_slice_uid = self.patient_dict_container.get("dict_uid")[slider_id]
-        z = self.patient_dict_container.dataset[slider_id].ImagePositionPatient[2]
         dataset_rtdose = self.patient_dict_container.dataset['rtdose']
-        grid = get_dose_grid(dataset_rtdose, float(z))
-
-        if not (len(grid) == 0):
+        isodose_provider = get_isodose_provider(self.patient_dict_container)
+
+        if isodose_provider.get_dose_plane(slider_id) is not None:
+            line_fill_configuration = get_line_fill_configuration()
+            iso_line = line_fill_configuration["iso_line"]
+            iso_opacity = int(
+                (line_fill_configuration["iso_opacity"] / 100) * 255)
+            line_width = line_fill_configuration["line_width"]
             # sort selected_doses in ascending order so that the high dose isodose washes
             # paint over the lower dose isodose washes
             for sd in sorted(self.patient_dict_container.get("selected_doses")):
                 dose_level = sd * self.patient_dict_container.get("rx_dose_in_cgray") / \
                     (dataset_rtdose.DoseGridScaling * 10000)
-                contours = measure.find_contours(grid, dose_level)
+                contours = isodose_provider.get_contours(slider_id, dose_level)
 
                 polygons = self.calc_dose_polygon(
                     self.patient_dict_container.get("dose_pixluts")[curr_slice_uid], contours)
 
                 brush_color = self.iso_color[sd]
-                with open(data_path('line&fill_configuration'), 'r') as stream:
-                    elements = stream.readlines()
-                    if len(elements) > 0:
-                        iso_line = int(elements[2].replace('\n', ''))
-                        iso_opacity = int(elements[3].replace('\n', ''))
-                        line_width = float(elements[4].replace('\n', ''))
-                    else:
-                        iso_line = 2
-                        iso_opacity = 5
-                        line_width = 2.0
-                    stream.close()
-                iso_opacity = int((iso_opacity / 100) * 255)
                 brush_color.setAlpha(iso_opacity)
                 pen_color = QtGui.QColor(
                     brush_color.red(), brush_color.green(), brush_color.blue())
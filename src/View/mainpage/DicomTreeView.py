@@ -1,6 +1,6 @@
-from PySide6 import QtWidgets, QtGui, QtCore
+from PySide6 import QtWidgets, QtCore
 
-from src.Model.GetPatientInfo import DicomTree
+from src.Model.DicomTreeModel import DicomTreeModel
 from src.Model.PatientDictContainer import PatientDictContainer
 
 
@@ -17,8 +17,10 @@ class DicomTreeView(QtWidgets.QWidget):
         self.selector = self.create_selector_combobox()
 
         self.tree_view = QtWidgets.QTreeView()
-        self.model_tree = QtGui.QStandardItemModel(0, 5)
-        self.init_headers_tree()
+        # Rows all have the same height, so the view does not need to
+        # measure every row it lays out
+        self.tree_view.setUniformRowHeights(True)
+        self.model_tree = DicomTreeModel()
         self.tree_view.setModel(self.model_tree)
         self.init_parameters_tree()
 
@@ -27,13 +29,6 @@ class DicomTreeView(QtWidgets.QWidget):
         self.dicom_tree_layout.addWidget(self.tree_view)
         self.setLayout(self.dicom_tree_layout)
 
-    def init_headers_tree(self):
-        self.model_tree.setHeaderData(0, QtCore.Qt.Horizontal, "Name")
-        self.model_tree.setHeaderData(1, QtCore.Qt.Horizontal, "Value")
-        self.model_tree.setHeaderData(2, QtCore.Qt.Horizontal, "Tag")
-        self.model_tree.setHeaderData(3, QtCore.Qt.Horizontal, "VM")
-        self.model_tree.setHeaderData(4, QtCore.Qt.Horizontal, "VR")
-
     def init_parameters_tree(self):
         self.tree_view.header().resizeSection(0, 250)
         self.tree_view.header().resizeSection(1, 350)
@@ -44,7 +39,6 @@ class DicomTreeView(QtWidgets.QWidget):
         self.tree_view.setEditTriggers(
             QtWidgets.QAbstractItemView.NoEditTriggers | QtWidgets.QAbstractItemView.NoEditTriggers)
         self.tree_view.setAlternatingRowColors(True)
-        self.tree_view.expandAll()
 
     def create_selector_combobox(self):
         combobox = QtWidgets.QComboBox()
@@ -89,68 +83,26 @@ class DicomTreeView(QtWidgets.QWidget):
 
     def update_tree(self, image_slice, id, name):
         """
-        Update the DICOM Tree view.
+        Update the DICOM Tree view. The tree shows the dataset already in
+        the patient dict container, and its sequences are only read when
+        they are expanded.
         :param image_slice: Boolean indicating if it is an image slice or not
         :param id: ID for the selected file
         :param name: Name of the selected dataset if not an image file
         :return:
         """
-        self.model_tree.clear()
-
         if image_slice:
-            filename = self.patient_dict_container.filepaths[id]
-            dicom_tree_slice = DicomTree(filename)
-            dict_tree = dicom_tree_slice.dict
-
-        elif name == "rtdose":
-            dict_tree = self.patient_dict_container.get(
-                "dict_dicom_tree_rtdose")
+            dataset = self.patient_dict_container.dataset[id]
 
         elif name == "rtss":
-            dict_tree = self.patient_dict_container.get("dict_dicom_tree_rtss")
+            # The RTSS dataset is replaced whenever the ROIs are changed
+            dataset = self.patient_dict_container.get("dataset_rtss")
 
-        elif name == "rtplan":
-            dict_tree = self.patient_dict_container.get(
-                "dict_dicom_tree_rtplan")
-
-        elif name == "sr-cd":
-            dict_tree = self.patient_dict_container.get("dict_dicom_tree_sr_cd")
-
-        elif name == "sr-rad":
-            dict_tree = \
-                self.patient_dict_container.get("dict_dicom_tree_sr_pyrad")
+        elif name in ("rtdose", "rtplan", "sr-cd", "sr-rad"):
+            dataset = self.patient_dict_container.dataset[name]
 
         else:
-            dict_tree = None
+            dataset = None
             print("Error filename in update_tree function")
 
-        parent_item = self.model_tree.invisibleRootItem()
-        self.recurse_build_model(dict_tree, parent_item)
-        self.init_headers_tree()
-        self.tree_view.setModel(self.model_tree)
-        self.init_parameters_tree()
-        self.dicom_tree_layout.addWidget(self.tree_view)
-
-    def recurse_build_model(self, dict_tree, parent):
-        """
-        Update recursively the model used for the DICOM Tree view
-        :param dict_tree: The dictionary to be displayed
-        :param parent: Parent node of the tree
-        :return:
-        """
-        for key in dict_tree:
-            value = dict_tree[key]
-            # If the value is a dictionary
-            if isinstance(value, type(dict_tree)):
-                # Recurse until leaf
-                item_child = QtGui.QStandardItem(key)
-                parent.appendRow(self.recurse_build_model(value, item_child))
-            else:
-                # If the value is a simple item, append it
-                item = [QtGui.QStandardItem(key),
-                        QtGui.QStandardItem(str(value[0])),
-                        QtGui.QStandardItem(str(value[1])),
-                        QtGui.QStandardItem(str(value[2])),
-                        QtGui.QStandardItem(str(value[3]))]
-                parent.appendRow(item)
-        return parent
+        self.model_tree.set_dataset(dataset)
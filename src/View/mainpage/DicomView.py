@@ -1,9 +1,9 @@
 from PySide6 import QtWidgets, QtCore, QtGui
 
 from src.View.mainpage.DicomGraphicsScene import GraphicsScene
+from src.Model.LineFillConfiguration import get_line_fill_configuration
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.constants import INITIAL_ONE_VIEW_ZOOM
-from src.Controller.PathHandler import data_path
 
 class CustomGraphicsView(QtWidgets.QGraphicsView):
     def __init__(self, parent=None):
@@ -159,17 +159,10 @@ class DicomView(QtWidgets.QWidget):
             color = self.roi_color[roi_id]
         else:
             color = roi_color[roi_id]
-        with open(data_path('line&fill_configuration'), 'r') as stream:
-            elements = stream.readlines()
-            if len(elements) > 0:
-                roi_line = int(elements[0].replace('\n', ''))
-                roi_opacity = int(elements[1].replace('\n', ''))
-                line_width = float(elements[4].replace('\n', ''))
-            else:
-                roi_line = 1
-                roi_opacity = 10
-                line_width = 2.0
-            stream.close()
+        line_fill_configuration = get_line_fill_configuration()
+        roi_line = line_fill_configuration["roi_line"]
+        roi_opacity = line_fill_configuration["roi_opacity"]
+        line_width = line_fill_configuration["line_width"]
         roi_opacity = int((roi_opacity / 100) * 255)
         color.setAlpha(roi_opacity)
         pen_color = QtGui.QColor(color.red(), color.green(), color.blue())
@@ -18,7 +18,8 @@ class RoiInitialiser():
         self.close_window_signal = close_window_signal
         self.dataset_rtss = dataset_rtss
         self.p = PatientDictContainer()
-        self.display_pixmaps = []
+        self.pixmap_provider = None
+        self.display_pixmaps = None
         self.zoom_variable = 1.00
         self.get_pixmaps()
         self.setup_ui()
@@ -73,7 +74,6 @@ class RoiInitialiser():
         """
         updates the draw roi pixmaps
         """
-        self.display_pixmaps.clear()
         self.get_pixmaps()
         self.change_image(self.scroller.value())
 
@@ -226,15 +226,14 @@ class RoiInitialiser():
 
     def get_pixmaps(self):
         """
-        Gets all of the pixmap data and returns it
+        Gets the axial pixmaps of the patient's pixmap provider, which
+        renders each slice when it is displayed
         Parm : None
         Return : None
         """
-        pixmaps = self.p.get("pixmaps_axial")
-        i = len(pixmaps)
-        for j in range(i):
-            self.display_pixmaps.append(pixmaps[j])
-            
+        self.pixmap_provider = self.p.get("pixmap_provider")
+        self.display_pixmaps = self.pixmap_provider.plane("axial")
+
     def change_image(self, v):
         """
         Changes the image (patient image) according to the value
@@ -258,7 +257,7 @@ class RoiInitialiser():
 
         # Information to display
         self.current_slice_number = dataset['InstanceNumber'].value
-        total_slices = len(self.p.get("pixmaps_axial"))
+        total_slices = self.pixmap_provider.slice_count("axial")
         row_img = dataset['Rows'].value
         col_img = dataset['Columns'].value
         window = self.p.get("window")
@@ -9,11 +9,9 @@ from src.Controller.ROIOptionsController import ROIDelOption, \
 from src.Model.DICOM.Structure.DICOMSeries import Series
 from src.Model import ImageLoading
 from src.Model.CalculateDVHs import dvh2rtdose
-from src.Model.GetPatientInfo import DicomTree
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.MovingDictContainer import MovingDictContainer
-from src.Model.ROI import ordered_list_rois, get_roi_contour_pixel, \
-    calc_roi_polygon, transform_rois_contours, merge_rtss
+from src.Model.ROI import ordered_list_rois, merge_rtss
 from src.View.mainpage.StructureWidget import StructureWidget
 from src.View.util.SelectRTSSPopUp import SelectRTSSPopUp
 from src.Controller.PathHandler import data_path, resource_path
@@ -108,32 +106,23 @@ class StructureTab(QtWidgets.QWidget):
             dict: A dictionary mapping ROI IDs to QColor objects.
         """
         roi_color = {}
-        rtss = dict_container.get("dict_dicom_tree_rtss")
-        roi_contour_info = rtss.get("ROI Contour Sequence")
-
-        # Check if roi contour data dictionary exists
-        if isinstance(roi_contour_info, dict) and roi_contour_info:
-            for roi_key, roi_dict in roi_contour_info.items():
-                # Get roi numbers list if available
-                roi_numbers = roi_dict.get("Referenced ROI Number")
-
-                # Check exists and is list
-                if isinstance(roi_numbers, list) and roi_numbers:
-                    roi_id = roi_numbers[0]
-                else:
-                    continue  # skip if invalid
-
-                # Get ROI color list if available
-                roi_colors = roi_dict.get("ROI Display Color")
-
-                # Check ROI colors is a non-empty list of lists
-                if isinstance(roi_colors, list) and roi_colors and all(isinstance(color, list) for color in roi_colors)\
-                        and len(roi_colors[0]) == 3 and all(isinstance(color, (int, float)) for color in roi_colors[0]):
-                    r, g, b = roi_colors[0]     # Assign colors from roi color list
-                else:
-                    r, g, b = np.random.default_rng(seed=roi_id).integers(0, 256, 3) # Assign random colors
+        rtss = dict_container.get("dataset_rtss")
+        roi_contour_info = rtss.get("ROIContourSequence", [])
+
+        for roi_contour in roi_contour_info:
+            # Skip the item if it does not reference an ROI
+            roi_id = roi_contour.get("ReferencedROINumber")
+            if roi_id is None:
+                continue
+
+            # Get ROI color if available
+            roi_colors = roi_contour.get("ROIDisplayColor")
+            if roi_colors is not None and len(roi_colors) == 3:
+                r, g, b = (int(color) for color in roi_colors)
+            else:
+                r, g, b = np.random.default_rng(seed=roi_id).integers(0, 256, 3) # Assign random colors
 
-                roi_color[roi_id] = QtGui.QColor(r, g, b)
+            roi_color[roi_id] = QtGui.QColor(r, g, b)
 
         return roi_color
 
@@ -300,12 +289,6 @@ class StructureTab(QtWidgets.QWidget):
         self.moving_dict_container.set("dict_polygons_coronal", {})
 
         if "draw" in change_description or "transfer" in change_description:
-            dicom_tree_rtss = DicomTree(None)
-            dicom_tree_rtss.dataset = new_dataset
-            dicom_tree_rtss.dict = dicom_tree_rtss.dataset_to_dict(
-                dicom_tree_rtss.dataset)
-            self.moving_dict_container.set(
-                "dict_dicom_tree_rtss", dicom_tree_rtss.dict)
             self.color_dict = self.init_color_roi(self.moving_dict_container)
             self.moving_dict_container.set("roi_color_dict", self.color_dict)
             if self.moving_dict_container.has_attribute("raw_dvh"):
@@ -390,17 +373,13 @@ class StructureTab(QtWidgets.QWidget):
         self.patient_dict_container.set("list_roi_numbers", ordered_list_rois(
             self.patient_dict_container.get("rois")))
         self.patient_dict_container.set("selected_rois", [])
-        self.patient_dict_container.set("dict_polygons_axial", {})
-        self.patient_dict_container.set("dict_polygons_sagittal", {})
-        self.patient_dict_container.set("dict_polygons_coronal", {})
+        # Only the polygons of the ROIs whose contours changed are
+        # calculated again
+        polygon_provider = self.patient_dict_container.get("polygon_provider")
+        polygon_provider.update_contours()
+        polygon_provider.clear_rois()
 
         if "draw" in change_description or "transfer" in change_description:
-            dicom_tree_rtss = DicomTree(None)
-            dicom_tree_rtss.dataset = new_dataset
-            dicom_tree_rtss.dict = dicom_tree_rtss.dataset_to_dict(
-                dicom_tree_rtss.dataset)
-            self.patient_dict_container.set(
-                "dict_dicom_tree_rtss", dicom_tree_rtss.dict)
             self.color_dict = self.init_color_roi(self.patient_dict_container)
             self.patient_dict_container.set("roi_color_dict", self.color_dict)
             if self.patient_dict_container.has_attribute("raw_dvh"):
@@ -408,6 +387,14 @@ class StructureTab(QtWidgets.QWidget):
                 # recalculation will be required.
                 self.patient_dict_container.set("dvh_outdated", True)
 
+        # Track which ROIs have changed since the DVHs were calculated, so
+        # that only their DVHs need to be recalculated
+        if self.patient_dict_container.get("dvh_roi_hashes") is not None:
+            self.patient_dict_container.set(
+                "rtss_changes", ImageLoading.get_rtss_changes(
+                    self.patient_dict_container.get("dvh_roi_hashes"),
+                    new_dataset))
+
         if self.patient_dict_container.has_attribute("raw_dvh"):
             # Rename structures in DVH list
             if "rename" in change_description:
@@ -472,63 +459,20 @@ class StructureTab(QtWidgets.QWidget):
 
     def update_dict_polygons(self, state, roi_id):
         """
-        Update the polygon dictionaries (axial, coronal, sagittal) used to
-        display the ROIs.
+        Update the ROIs displayed by the polygon dictionaries (axial,
+        coronal, sagittal). Their polygons are calculated by the polygon
+        provider when the views ask for them.
         :param state: True if the ROI is selected, False otherwise
         :param roi_id: ROI number
         """
         rois = self.patient_dict_container.get("rois")
-        new_dict_polygons_axial = self.patient_dict_container.get(
-            "dict_polygons_axial")
-        new_dict_polygons_coronal = self.patient_dict_container.get(
-            "dict_polygons_coronal")
-        new_dict_polygons_sagittal = self.patient_dict_container.get(
-            "dict_polygons_sagittal")
-        aspect = self.patient_dict_container.get("pixmap_aspect")
+        polygon_provider = self.patient_dict_container.get("polygon_provider")
         roi_name = rois[roi_id]['name']
 
         if state:
-            new_dict_polygons_axial[roi_name] = {}
-            new_dict_polygons_coronal[roi_name] = {}
-            new_dict_polygons_sagittal[roi_name] = {}
-            dict_rois_contours_axial = get_roi_contour_pixel(
-                self.patient_dict_container.get("raw_contour"),
-                [roi_name], self.patient_dict_container.get("pixluts"))
-            dict_rois_contours_coronal, dict_rois_contours_sagittal = \
-                transform_rois_contours(
-                    dict_rois_contours_axial)
-
-            for slice_id in self.patient_dict_container.get(
-                    "dict_uid").values():
-                polygons = calc_roi_polygon(roi_name, slice_id,
-                                            dict_rois_contours_axial)
-                new_dict_polygons_axial[roi_name][slice_id] = polygons
-
-            for slice_id in range(0, len(self.patient_dict_container.get(
-                    "pixmaps_coronal"))):
-                polygons_coronal = calc_roi_polygon(
-                    roi_name, slice_id,
-                    dict_rois_contours_coronal,
-                    aspect["coronal"])
-                polygons_sagittal = calc_roi_polygon(
-                    roi_name, slice_id,
-                    dict_rois_contours_sagittal,
-                    1 / aspect["sagittal"])
-                new_dict_polygons_coronal[roi_name][
-                    slice_id] = polygons_coronal
-                new_dict_polygons_sagittal[roi_name][
-                    slice_id] = polygons_sagittal
-
-            self.patient_dict_container.set("dict_polygons_axial",
-                                            new_dict_polygons_axial)
-            self.patient_dict_container.set("dict_polygons_coronal",
-                                            new_dict_polygons_coronal)
-            self.patient_dict_container.set("dict_polygons_sagittal",
-                                            new_dict_polygons_sagittal)
+            polygon_provider.add_roi(roi_name)
         else:
-            new_dict_polygons_axial.pop(roi_name, None)
-            new_dict_polygons_coronal.pop(roi_name, None)
-            new_dict_polygons_sagittal.pop(roi_name, None)
+            polygon_provider.remove_roi(roi_name)
 
     def on_rtss_selected(self, selected_rtss):
         """
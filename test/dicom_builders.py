@@ -0,0 +1,87 @@
+"""
+Builders of the synthetic DICOM datasets shared by the model tests.
+"""
+
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+
+def create_dose(frames=6, rows=20, columns=20):
+    """
+    Creates an RT Dose dataset of a dose gradient along the x axis.
+    """
+    ds = Dataset()
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.481.2"
+    ds.SOPInstanceUID = generate_uid()
+    ds.Modality = "RTDOSE"
+    ds.ImagePositionPatient = [0, 0, 0]
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.PixelSpacing = [2, 2]
+    ds.GridFrameOffsetVector = [2 * i for i in range(frames)]
+    ds.DoseGridScaling = 0.01
+    ds.DoseUnits = "GY"
+    ds.Rows = rows
+    ds.Columns = columns
+    ds.NumberOfFrames = frames
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 0
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    dose = np.tile(np.arange(columns, dtype=np.uint16) * 100,
+                   (frames, rows, 1))
+    ds.PixelData = dose.tobytes()
+    return ds
+
+
+def create_rtss(squares):
+    """
+    Creates an RT Struct dataset with one ROI for each square, drawn on
+    the planes z = 2 to z = 6.
+    :param squares: Dictionary of ROI number to (x, y, size) of the square.
+    """
+    ds = Dataset()
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.481.3"
+    ds.SOPInstanceUID = generate_uid()
+    ds.Modality = "RTSTRUCT"
+    ds.StructureSetROISequence = Sequence()
+    ds.ROIContourSequence = Sequence()
+    ds.RTROIObservationsSequence = Sequence()
+    for roi_number, (x, y, size) in squares.items():
+        roi = Dataset()
+        roi.ROINumber = roi_number
+        roi.ROIName = "ROI %s" % roi_number
+        roi.ReferencedFrameOfReferenceUID = generate_uid()
+        roi.ROIGenerationAlgorithm = "MANUAL"
+        ds.StructureSetROISequence.append(roi)
+
+        roi_contour = Dataset()
+        roi_contour.ReferencedROINumber = roi_number
+        roi_contour.ROIDisplayColor = [255, 0, 0]
+        roi_contour.ContourSequence = Sequence()
+        for z in (2, 4, 6):
+            contour = Dataset()
+            contour.ContourGeometricType = "CLOSED_PLANAR"
+            contour.NumberOfContourPoints = 4
+            contour.ContourData = [x, y, z, x + size, y, z,
+                                   x + size, y + size, z, x, y + size, z]
+            roi_contour.ContourSequence.append(contour)
+        ds.ROIContourSequence.append(roi_contour)
+
+        observation = Dataset()
+        observation.ObservationNumber = roi_number
+        observation.ReferencedROINumber = roi_number
+        observation.RTROIInterpretedType = "ORGAN"
+        ds.RTROIObservationsSequence.append(observation)
+    return ds
+
+
+def add_file_meta(dataset):
+    dataset.file_meta = FileMetaDataset()
+    dataset.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    dataset.file_meta.MediaStorageSOPClassUID = dataset.SOPClassUID
+    dataset.file_meta.MediaStorageSOPInstanceUID = dataset.SOPInstanceUID
+    return dataset
@@ -0,0 +1,94 @@
+import os
+import sqlite3
+
+import pytest
+
+from src.Model.batchprocessing.BatchJournal import BatchJournal, \
+    get_changed_files, get_files_fingerprint, get_files_state
+
+
+def create_patient_files(directory):
+    directory.mkdir()
+    file_paths = []
+    for name in ("ct_0.dcm", "ct_1.dcm", "rtss.dcm"):
+        file_path = directory.joinpath(name)
+        file_path.write_bytes(b"DICM" + name.encode())
+        file_paths.append(str(file_path))
+    return file_paths
+
+
+def test_fingerprint_changes_with_the_files(tmp_path):
+    file_paths = create_patient_files(tmp_path.joinpath("patient"))
+    fingerprint = get_files_fingerprint(file_paths)
+
+    assert get_files_fingerprint(reversed(file_paths)) == fingerprint
+    os.utime(file_paths[0], ns=(0, 10 ** 9))
+    assert get_files_fingerprint(file_paths) != fingerprint
+    assert get_files_fingerprint(file_paths[1:]) \
+        != get_files_fingerprint(file_paths)
+
+
+def test_changed_files_are_found(tmp_path):
+    file_paths = create_patient_files(tmp_path.joinpath("patient"))
+    files_state = get_files_state([tmp_path.joinpath("patient")])
+
+    os.utime(file_paths[2], ns=(0, 10 ** 9))
+    tmp_path.joinpath("patient", "CSV").mkdir()
+    tmp_path.joinpath("patient", "CSV", "DVHs.csv").write_text("DVH")
+    sr_path = tmp_path.joinpath("patient", "Clinical-Data-SR.dcm")
+    sr_path.write_bytes(b"DICM")
+
+    assert get_changed_files(
+        files_state, get_files_state([tmp_path.joinpath("patient")])) \
+        == sorted([str(sr_path), file_paths[2]])
+    assert str(tmp_path.joinpath("patient", "CSV", "DVHs.csv")) in \
+        get_changed_files(files_state, get_files_state(
+            [tmp_path.joinpath("patient")], True))
+
+
+def test_only_completed_unchanged_processes_are_resumed(tmp_path):
+    batch_journal = BatchJournal(tmp_path)
+    batch_journal.record("A", {
+        "dvh2csv": {"status": "SUCCESS", "settings": '"/dvh"',
+                    "started": 1.0, "finished": 2.0,
+                    "artefacts": ["/dvh/CSV/DVHs.csv"]},
+        "iso2roi": {"status": "ISO_NO_RX_DOSE", "settings": "null"},
+        "pyrad2csv": {"status": "TIMEOUT", "settings": '"/pyrad"'}},
+        "fingerprint")
+
+    # The journal is kept in the batch directory between batches
+    batch_journal = BatchJournal(tmp_path)
+    settings = {"dvh2csv": '"/dvh"', "iso2roi": "null",
+                "pyrad2csv": '"/pyrad"'}
+    assert batch_journal.get_completed_processes(
+        "A", settings, "fingerprint") == {"dvh2csv", "iso2roi"}
+    assert batch_journal.get_completed_processes(
+        "A", settings, "changed") == set()
+    assert batch_journal.get_completed_processes(
+        "A", dict(settings, dvh2csv='"/other"'), "fingerprint") \
+        == {"iso2roi"}
+    assert batch_journal.get_completed_processes(
+        "B", settings, "fingerprint") == set()
+    assert batch_journal.get_entries("A")["dvh2csv"] == {
+        "status": "SUCCESS", "settings": '"/dvh"',
+        "fingerprint": "fingerprint", "started": 1.0, "finished": 2.0,
+        "artefacts": ["/dvh/CSV/DVHs.csv"]}
+
+
+def test_processes_are_recorded_again(tmp_path):
+    batch_journal = BatchJournal(tmp_path)
+    batch_journal.record(
+        "A", {"dvh2csv": {"status": "INTERRUPT", "settings": "null"}}, None)
+    batch_journal.record(
+        "A", {"dvh2csv": {"status": "SUCCESS", "settings": "null"}},
+        "fingerprint")
+
+    assert batch_journal.get_completed_processes(
+        "A", {"dvh2csv": "null"}, "fingerprint") == {"dvh2csv"}
+    assert len(batch_journal.get_entries("A")) == 1
+
+
+def test_journal_cannot_be_opened_in_a_missing_directory(tmp_path):
+    # The batch falls back to another directory, or to no journal
+    with pytest.raises(sqlite3.Error):
+        BatchJournal(tmp_path.joinpath("missing"))
@@ -0,0 +1,75 @@
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+
+from src.Model.BatchModel import create_batch_model
+from src.Model.PatientDictContainer import PatientDictContainer
+
+
+def create_datasets(slices=3):
+    dataset = {}
+    for index in range(slices):
+        dataset[index] = Dataset()
+        dataset[index].Modality = "CT"
+        dataset[index].PatientID = "BatchModel"
+        dataset[index].SOPInstanceUID = "1.2.3." + str(index)
+        dataset[index].Rows = 4
+        dataset[index].Columns = 4
+        dataset[index].PixelSpacing = [0.8, 0.8]
+        dataset[index].ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        dataset[index].ImagePositionPatient = [-100, -100, 2.5 * index]
+
+    roi = Dataset()
+    roi.ROINumber = 1
+    roi.ROIName = "GTV"
+    roi.ReferencedFrameOfReferenceUID = "1.2.3.4"
+    roi.ROIGenerationAlgorithm = "MANUAL"
+    dataset["rtss"] = Dataset()
+    dataset["rtss"].StructureSetROISequence = Sequence([roi])
+    return dataset
+
+
+def set_up_container(dataset):
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.clear()
+    patient_dict_container.set_initial_values(
+        "/patient", dataset, {"rtss": "/patient/rtss.dcm"})
+    return patient_dict_container
+
+
+def test_only_required_attributes_are_set():
+    patient_dict_container = set_up_container(create_datasets())
+
+    create_batch_model(("dict_uid", "pixluts", "dataset_rtss"))
+
+    assert set(patient_dict_container.additional_data) \
+        == {"dict_uid", "pixluts", "dataset_rtss"}
+    assert patient_dict_container.get("dict_uid") \
+        == {0: "1.2.3.0", 1: "1.2.3.1", 2: "1.2.3.2"}
+    assert patient_dict_container.get("pixluts").keys() \
+        == {"1.2.3.0", "1.2.3.1", "1.2.3.2"}
+    assert patient_dict_container.get("dataset_rtss") \
+        is patient_dict_container.dataset["rtss"]
+    patient_dict_container.clear()
+
+
+def test_dependent_attributes_are_calculated():
+    patient_dict_container = set_up_container(create_datasets())
+
+    create_batch_model(("list_roi_numbers",))
+
+    assert patient_dict_container.get("list_roi_numbers") == [1]
+    assert patient_dict_container.get("rois") \
+        == {1: {"uid": "1.2.3.4", "name": "GTV", "algorithm": "MANUAL"}}
+    patient_dict_container.clear()
+
+
+def test_attributes_of_missing_modalities_are_skipped():
+    patient_dict_container = set_up_container(create_datasets())
+
+    create_batch_model(("rtss_modified", "dose_pixluts",
+                        "rx_dose_in_cgray"))
+
+    assert patient_dict_container.get("rtss_modified") is False
+    assert not patient_dict_container.has_attribute("dose_pixluts")
+    assert not patient_dict_container.has_attribute("rx_dose_in_cgray")
+    patient_dict_container.clear()
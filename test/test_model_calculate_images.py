@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from PySide6 import QtGui
+
+from src.Model.CalculateImages import get_heatmap_colors, scaled_image
+
+
+def image_to_array(qimage):
+    """
+    :return: (height, width, 3) RGB copy of the pixels of a QImage.
+    """
+    qimage = qimage.convertToFormat(QtGui.QImage.Format_RGB888)
+    pixels = np.array(np.frombuffer(qimage.constBits(), dtype=np.uint8))
+    pixels = pixels.reshape(qimage.height(), qimage.bytesPerLine())
+    return pixels[:, :qimage.width() * 3].reshape(
+        qimage.height(), qimage.width(), 3)
+
+
+def window_pixels(np_pixels, window, level):
+    """
+    Windows pixels with the arithmetic the lookup tables replace.
+    """
+    np_pixels = np_pixels.astype(np.int16)
+    if window != 0 and level != 0:
+        np_pixels = (np_pixels - level) / window * 255
+    else:
+        max_val = np.amax(np_pixels)
+        min_val = np.amin(np_pixels)
+        np_pixels = (np_pixels - min_val) / (max_val - min_val) * 255
+    return np.clip(np_pixels, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("window, level, color", [
+    (400, 40, None), (0, 0, None), (1600, -300, "Heat"), (350, 0, "Heat")])
+def test_scaled_image_matches_windowing(window, level, color):
+    np_pixels = np.random.default_rng(0).integers(
+        -1500, 3000, size=(64, 48)).astype(np.float32)
+
+    qimage = scaled_image(np_pixels, window, level, 48, 64, color=color)
+
+    expected = window_pixels(np_pixels, window, level)
+    if color == "Heat":
+        expected = get_heatmap_colors()[expected]
+    else:
+        expected = np.repeat(expected[:, :, None], 3, axis=2)
+    assert np.array_equal(image_to_array(qimage), expected)
+
+    # The returned image does not share the reused render buffer
+    scaled_image(np_pixels + 500, window, level, 48, 64, color=color)
+    assert np.array_equal(image_to_array(qimage), expected)
@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+from skimage import measure
+
+from src.Model import ROI
+from src.Model.ContourExtraction import find_volume_contours, \
+    grid_to_patient
+
+
+def create_volume():
+    rng = np.random.default_rng(0)
+    volume = rng.random((5, 24, 32)) * 4
+    # A slice below every level
+    volume[3] = 0.5
+    return volume
+
+
+def test_volume_contours_match_slice_contours():
+    volume = create_volume()
+    levels = {"SUV-1": 1, "SUV-2": 2, "SUV-3": 3}
+
+    for max_workers in (1, 2):
+        contours = find_volume_contours(volume, levels,
+                                        max_workers=max_workers)
+        assert list(contours) == list(levels)
+        for name, level in levels.items():
+            expected = {index: measure.find_contours(volume[index], level)
+                        for index in range(len(volume))
+                        if level < volume[index].max()}
+            assert list(contours[name]) == list(expected)
+            for index, slice_contours in contours[name].items():
+                assert len(slice_contours) == len(expected[index])
+                for contour, expected_contour in zip(slice_contours,
+                                                     expected[index]):
+                    assert np.array_equal(contour, expected_contour)
+
+
+def test_only_selected_slices_are_traced():
+    contours = find_volume_contours(create_volume(), {"SUV-1": 1},
+                                    slice_indices=[0, 4], max_workers=1)
+    assert list(contours["SUV-1"]) == [0, 4]
+
+
+def test_interrupted_extraction_returns_none():
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert find_volume_contours(create_volume(), {"SUV-1": 1},
+                                interrupt_flag=interrupt_flag,
+                                max_workers=1) is None
+
+
+def test_grid_to_patient_matches_pixel_to_rcs():
+    contours = measure.find_contours(create_volume()[0], 2)
+    pixlut = [list(np.arange(-100, 100) * 0.8),
+              list(np.arange(-50, 150) * 1.2)]
+    dose_pixlut = [list(np.arange(32) * 2.5 + 10.5),
+                   list(np.arange(24) * 2.5 + 20.25)]
+
+    # Contours traced on the image
+    for contour, coordinates in zip(
+            contours, grid_to_patient(contours, pixlut, 12.5)):
+        expected = [list(ROI.pixel_to_rcs(pixlut, round(point[1]),
+                                          round(point[0]))) + [12.5]
+                    for point in contour]
+        assert np.array_equal(coordinates, expected)
+
+    # Contours traced on the dose grid, every second point
+    for contour, coordinates in zip(
+            contours, grid_to_patient(contours, pixlut, 12.5, dose_pixlut,
+                                      step=2)):
+        expected = []
+        for point in contour[::2]:
+            column = round(dose_pixlut[0][int(point[1])])
+            row = round(dose_pixlut[1][int(point[0])])
+            expected.append(list(ROI.pixel_to_rcs(pixlut, column, row))
+                            + [12.5])
+        assert np.array_equal(coordinates, expected)
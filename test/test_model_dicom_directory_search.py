@@ -0,0 +1,283 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from pydicom import dcmread
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.errors import InvalidDicomError
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from src.Model.DICOM import DICOMDirectorySearch
+from src.Model.DICOM.DICOMScanIndex import ScanIndex
+
+
+class FakeProgress:
+    """Stands in for the worker's progress signal"""
+
+    def __init__(self):
+        self.progress = []
+
+    def emit(self, value):
+        self.progress.append(value)
+
+
+def write_ct_slice(file_path, patient_id, study_uid, series_uid):
+    """
+    Writes a small CT image to the given path.
+    :return: SOPInstanceUID of the written image.
+    """
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    ds.SOPInstanceUID = generate_uid()
+    ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    ds.Modality = "CT"
+    ds.PatientID = patient_id
+    ds.PatientName = "Test^Patient"
+    ds.StudyInstanceUID = study_uid
+    ds.SeriesInstanceUID = series_uid
+    ds.FrameOfReferenceUID = generate_uid()
+    ds.Rows = 8
+    ds.Columns = 8
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.PixelData = np.zeros((8, 8), dtype=np.int16).tobytes()
+    ds.save_as(file_path, enforce_file_format=True)
+    return ds.SOPInstanceUID
+
+
+@pytest.fixture
+def dicom_dir(tmp_path):
+    """Directory with two patients and a non-DICOM file"""
+    root = tmp_path.joinpath("patients")
+    for patient_id in ("P1", "P2"):
+        patient_dir = root.joinpath(patient_id)
+        patient_dir.mkdir(parents=True)
+        study_uid = generate_uid()
+        series_uid = generate_uid()
+        for i in range(3):
+            write_ct_slice(patient_dir.joinpath("ct%s.dcm" % i),
+                           patient_id, study_uid, series_uid)
+    root.joinpath("notes.txt").write_text("not a DICOM file")
+    return root
+
+
+@pytest.fixture
+def scan_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("USER_ONKODICOM_HIDDEN", str(tmp_path))
+    return ScanIndex()
+
+
+@pytest.mark.parametrize("use_processes", [False, True])
+def test_get_dicom_structure(dicom_dir, use_processes):
+    progress = FakeProgress()
+    dicom_structure = DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), threading.Event(), progress,
+        max_workers=2, use_processes=use_processes)
+
+    assert sorted(dicom_structure.patients) == ["P1", "P2"]
+    assert len(dicom_structure.get_files()) == 6
+    assert progress.progress == list(range(1, 8))
+
+
+def test_get_dicom_structure_interrupted(dicom_dir):
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+    assert DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), interrupt_flag, FakeProgress()) is None
+
+
+def test_scan_index_rescan(dicom_dir, scan_index, monkeypatch):
+    read_paths = []
+    read_dicom_header = DICOMDirectorySearch.read_dicom_header
+
+    def counting_read(file_path):
+        read_paths.append(file_path)
+        return read_dicom_header(file_path)
+
+    monkeypatch.setattr(DICOMDirectorySearch, "read_dicom_header",
+                        counting_read)
+
+    first = DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), threading.Event(), FakeProgress(),
+        scan_index=scan_index)
+    assert len(read_paths) == 7
+
+    # Nothing changed, so nothing is read again and the same tree is built
+    read_paths.clear()
+    second = DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), threading.Event(), FakeProgress(),
+        scan_index=scan_index)
+    assert read_paths == []
+    assert sorted(second.get_files()) == sorted(first.get_files())
+    assert str(second.get_patient("P1").patient_name) == "Test^Patient"
+
+    # Only new files are read, and deleted files leave the index
+    read_paths.clear()
+    new_file = dicom_dir.joinpath("P3.dcm")
+    write_ct_slice(new_file, "P3", generate_uid(), generate_uid())
+    os.remove(dicom_dir.joinpath("P2", "ct0.dcm"))
+    third = DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), threading.Event(), FakeProgress(),
+        scan_index=scan_index)
+    assert read_paths == [str(dicom_dir) + os.sep + "P3.dcm"]
+    assert sorted(third.patients) == ["P1", "P2", "P3"]
+    assert len(third.get_files()) == 6
+    assert len(scan_index.get_entries(str(dicom_dir))) == 7
+
+
+def test_scan_index_matches_unnormalised_paths(dicom_dir, scan_index,
+                                               monkeypatch):
+    DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), threading.Event(), FakeProgress(),
+        scan_index=scan_index)
+
+    read_paths = []
+    monkeypatch.setattr(DICOMDirectorySearch, "read_dicom_header",
+                        read_paths.append)
+    for path in (str(dicom_dir) + os.sep,
+                 str(dicom_dir.joinpath("P1", os.pardir))):
+        dicom_structure = DICOMDirectorySearch.get_dicom_structure(
+            path, threading.Event(), FakeProgress(), scan_index=scan_index)
+        assert read_paths == []
+        assert sorted(dicom_structure.patients) == ["P1", "P2"]
+    assert len(scan_index.get_entries(str(dicom_dir) + os.sep)) == 7
+
+
+def test_scan_index_skips_headers_that_cannot_be_stored(dicom_dir,
+                                                        scan_index):
+    file_path = str(dicom_dir.joinpath("P1", "ct0.dcm"))
+    dicom_file = DICOMDirectorySearch.read_dicom_header(file_path)
+    broken_file = DICOMDirectorySearch.read_dicom_header(file_path)
+
+    def to_json():
+        raise TypeError("Cannot convert the header")
+
+    broken_file.to_json = to_json
+    scan_index.update_entries(
+        [(file_path, 1, 2, dicom_file),
+         (str(dicom_dir.joinpath("P1", "ct1.dcm")), 1, 2, broken_file)],
+        [])
+
+    assert list(scan_index.get_entries(str(dicom_dir))) == [file_path]
+
+
+def write_rt_file(file_path, modality, patient_id, study_uid, **elements):
+    """
+    Writes a small RT object (or SR) of the given modality to the path.
+    :param elements: Further elements of the dataset.
+    :return: SOPInstanceUID of the written file.
+    """
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.SOPClassUID = {
+        "RTSTRUCT": "1.2.840.10008.5.1.4.1.1.481.3",
+        "RTPLAN": "1.2.840.10008.5.1.4.1.1.481.5",
+        "RTDOSE": "1.2.840.10008.5.1.4.1.1.481.2",
+        "SR": "1.2.840.10008.5.1.4.1.1.88.33",
+    }[modality]
+    ds.file_meta.MediaStorageSOPClassUID = ds.SOPClassUID
+    ds.SOPInstanceUID = generate_uid()
+    ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+    ds.Modality = modality
+    if patient_id is not None:
+        ds.PatientID = patient_id
+    ds.PatientName = "Test^Patient"
+    ds.StudyInstanceUID = study_uid
+    ds.StudyDescription = "Study"
+    ds.SeriesInstanceUID = generate_uid()
+    ds.SeriesDescription = modality + " series"
+    for keyword, value in elements.items():
+        setattr(ds, keyword, value)
+    ds.save_as(file_path, enforce_file_format=True)
+    return ds.SOPInstanceUID
+
+
+def referenced_sop(sop_instance_uid):
+    item = Dataset()
+    item.ReferencedSOPInstanceUID = sop_instance_uid
+    return [item]
+
+
+def get_tree(dicom_structure):
+    """
+    :return: Nested dictionaries of everything the tree holds of each
+        patient, study, series and image.
+    """
+    tree = {}
+    for patient_id, patient in dicom_structure.patients.items():
+        studies = {}
+        for study_uid, study in patient.studies.items():
+            series_list = {}
+            for series_type in study.series.values():
+                for series_uid, series in series_type.items():
+                    attributes = {
+                        name: value for name, value in vars(series).items()
+                        if name != "images"}
+                    attributes["images"] = {
+                        image_uid: vars(image)
+                        for image_uid, image in series.images.items()}
+                    series_list[series_uid] = attributes
+            studies[study_uid] = (study.study_description, series_list)
+        tree[patient_id] = (str(patient.patient_name), studies)
+    return tree
+
+
+def test_header_only_search_builds_the_full_read_tree(dicom_dir):
+    # An RT Struct, Plan and Dose, an SR and a file with no patient ID,
+    # next to the CT images of P1
+    patient_dir = dicom_dir.joinpath("P1")
+    study_uid = generate_uid()
+    series_uid = generate_uid()
+    write_ct_slice(patient_dir.joinpath("ct_ref.dcm"), "P1", study_uid,
+                   series_uid)
+    referenced_series = Dataset()
+    referenced_series.SeriesInstanceUID = series_uid
+    referenced_study = Dataset()
+    referenced_study.RTReferencedSeriesSequence = [referenced_series]
+    referenced_frame = Dataset()
+    referenced_frame.RTReferencedStudySequence = [referenced_study]
+    rtss_uid = write_rt_file(
+        patient_dir.joinpath("rtss.dcm"), "RTSTRUCT", "P1", study_uid,
+        ReferencedFrameOfReferenceSequence=[referenced_frame])
+    plan_uid = write_rt_file(
+        patient_dir.joinpath("plan.dcm"), "RTPLAN", "P1", study_uid,
+        ReferencedStructureSetSequence=referenced_sop(rtss_uid))
+    write_rt_file(
+        patient_dir.joinpath("dose.dcm"), "RTDOSE", "P1", study_uid,
+        FrameOfReferenceUID=generate_uid(),
+        ReferencedStructureSetSequence=referenced_sop(rtss_uid),
+        ReferencedRTPlanSequence=referenced_sop(plan_uid))
+    write_rt_file(patient_dir.joinpath("sr.dcm"), "SR", "P1", study_uid,
+                  ReferencedFrameOfReferenceUID=generate_uid())
+    write_rt_file(dicom_dir.joinpath("no_id.dcm"), "RTPLAN", None,
+                  generate_uid())
+
+    # The tree built as before, from every file read in full in turn
+    full_read_structure = DICOMDirectorySearch.DICOMStructure()
+    files_with_no_patient_id = 1
+    for file_path in DICOMDirectorySearch.get_file_paths(
+            str(dicom_dir), threading.Event()):
+        try:
+            dicom_file = dcmread(file_path)
+        except InvalidDicomError:
+            continue
+        if DICOMDirectorySearch.add_dicom_file(
+                full_read_structure, file_path, dicom_file,
+                files_with_no_patient_id):
+            files_with_no_patient_id += 1
+
+    dicom_structure = DICOMDirectorySearch.get_dicom_structure(
+        str(dicom_dir), threading.Event(), FakeProgress(), max_workers=4)
+
+    assert get_tree(dicom_structure) == get_tree(full_read_structure)
+    assert "no_id_1" in dicom_structure.patients
+    assert len(get_tree(dicom_structure)["P1"][1]) == 2
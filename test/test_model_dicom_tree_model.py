@@ -0,0 +1,87 @@
+from PySide6.QtCore import QModelIndex, Qt
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+
+from src.Model.DicomTreeModel import DicomTreeModel
+
+
+def create_dataset(contours=600):
+    dataset = Dataset()
+    dataset.PatientName = "Test^Patient"
+    dataset.Modality = "RTSTRUCT"
+    roi_contour = Dataset()
+    roi_contour.ReferencedROINumber = 1
+    roi_contour.ROIDisplayColor = [255, 0, 0]
+    roi_contour.ContourSequence = Sequence()
+    for index in range(contours):
+        contour = Dataset()
+        contour.NumberOfContourPoints = 2
+        contour.ContourData = [index, 0.0, 1.5, index, 1.0, 1.5]
+        roi_contour.ContourSequence.append(contour)
+    dataset.ROIContourSequence = Sequence([roi_contour])
+    dataset.PixelData = b"\x00" * 8
+    return dataset
+
+
+def fetch_all(model, parent):
+    while model.canFetchMore(parent):
+        model.fetchMore(parent)
+
+
+def test_elements_are_listed_without_pixel_data():
+    dataset = create_dataset()
+    model = DicomTreeModel(dataset)
+
+    assert model.columnCount() == 5
+    assert model.headerData(1, Qt.Horizontal) == "Value"
+    assert [model.index(row, 0).data() for row in range(model.rowCount())] \
+        == ["Patient's Name", "Modality", "ROI Contour Sequence"]
+    assert model.index(0, 1).data() == "Test^Patient"
+    assert model.index(0, 2).data() == repr(dataset["PatientName"].tag)
+    assert model.index(0, 3).data() == "1"
+    assert model.index(0, 4).data() == "PN"
+    # Sequences only show their name
+    assert model.index(2, 1).data() == ""
+
+
+def test_sequences_are_expanded_on_demand():
+    model = DicomTreeModel(create_dataset(), fetch_size=256)
+    sequence_index = model.index(2, 0)
+
+    # Nothing under the sequence is created until it is expanded
+    assert model.hasChildren(sequence_index)
+    assert model.rowCount(sequence_index) == 0
+    assert model.canFetchMore(sequence_index)
+
+    item_index = model.index(0, 0, sequence_index)
+    assert not item_index.isValid()
+    model.fetchMore(sequence_index)
+    item_index = model.index(0, 0, sequence_index)
+    assert item_index.data() == "item 0"
+    assert model.parent(item_index) == sequence_index
+
+    model.fetchMore(item_index)
+    contour_sequence_index = model.index(2, 0, item_index)
+    assert contour_sequence_index.data() == "Contour Sequence"
+    model.fetchMore(contour_sequence_index)
+    assert model.rowCount(contour_sequence_index) == 256
+    fetch_all(model, contour_sequence_index)
+    assert model.rowCount(contour_sequence_index) == 600
+
+    contour_index = model.index(599, 0, contour_sequence_index)
+    assert contour_index.data() == "item 599"
+    assert model.parent(contour_index) == contour_sequence_index
+    fetch_all(model, contour_index)
+    assert model.index(1, 1, contour_index).data() \
+        == "[599.0, 0.0, 1.5, 599.0, 1.0, 1.5]"
+
+
+def test_dataset_can_be_replaced():
+    model = DicomTreeModel()
+    assert model.rowCount() == 0
+    assert not model.hasChildren(QModelIndex())
+
+    model.set_dataset(create_dataset(contours=1))
+    assert model.rowCount() == 3
+    model.set_dataset(None)
+    assert model.rowCount() == 0
@@ -0,0 +1,89 @@
+import threading
+
+import numpy as np
+import pytest
+from dicompylercore import dvh
+
+from dicom_builders import create_dose, create_rtss
+from src.Model import ImageLoading
+from src.Model.DVHCache import DVHCache
+
+
+@pytest.fixture
+def dvh_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("USER_ONKODICOM_HIDDEN", str(tmp_path))
+    return DVHCache()
+
+
+@pytest.fixture
+def count_dvh_calls(monkeypatch):
+    """
+    Replaces dicompylercore's DVH calculation with one that records the
+    ROIs it is called for and returns a DVH of the mean dose inside the
+    ROI's square.
+    """
+    calculated = []
+
+    def counting_get_dvh(rtss, dose, roi, limit=None, thickness=None):
+        calculated.append(roi)
+        roi_contour = next(roi_contour for roi_contour
+                           in rtss.ROIContourSequence
+                           if roi_contour.ReferencedROINumber == roi)
+        contour_data = roi_contour.ContourSequence[0].ContourData
+        scaling = float(dose.DoseGridScaling)
+        mean_dose = (contour_data[0] + contour_data[3]) / 4 * 100 * scaling
+        counts = np.linspace(10, 0, int(mean_dose * 100) + 1)
+        return dvh.DVH(counts, np.arange(len(counts) + 1) / 100,
+                       name="ROI %s" % roi, notes="")
+
+    monkeypatch.setattr(ImageLoading.dvhcalc, "get_dvh", counting_get_dvh)
+    monkeypatch.setattr(ImageLoading, "is_supported_dose", lambda _: False)
+    return calculated
+
+
+def calc_dvhs(dataset_rtss, dataset_rtdose, dvh_cache):
+    rois = ImageLoading.get_roi_info(dataset_rtss)
+    return ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose, rois, {},
+                                  threading.Event(), dvh_cache=dvh_cache)
+
+
+def test_unchanged_rois_are_not_recalculated(dvh_cache, count_dvh_calls):
+    dataset_rtdose = create_dose()
+    squares = {1: (4, 4, 10), 2: (10, 10, 20), 3: (2, 20, 12)}
+    first = calc_dvhs(create_rtss(squares), dataset_rtdose, dvh_cache)
+    assert sorted(count_dvh_calls) == [1, 2, 3]
+
+    # A new structure set with one edited ROI
+    count_dvh_calls.clear()
+    squares[2] = (12, 10, 20)
+    second = calc_dvhs(create_rtss(squares), dataset_rtdose, dvh_cache)
+    assert count_dvh_calls == [2]
+
+    for roi in (1, 3):
+        assert np.array_equal(second[roi].counts, first[roi].counts)
+        assert np.array_equal(second[roi].bins, first[roi].bins)
+        assert second[roi].name == first[roi].name
+        assert second[roi].volume_units == first[roi].volume_units
+        assert second[roi].mean == pytest.approx(first[roi].mean)
+    assert second[2].mean > first[2].mean
+
+    # A changed dose grid invalidates every ROI
+    count_dvh_calls.clear()
+    dataset_rtdose.DoseGridScaling = 0.02
+    calc_dvhs(create_rtss(squares), dataset_rtdose, dvh_cache)
+    assert sorted(count_dvh_calls) == [1, 2, 3]
+
+
+def test_least_recently_used_dvhs_are_evicted(dvh_cache, count_dvh_calls):
+    dataset_rtdose = create_dose()
+    dataset_rtss = create_rtss({1: (4, 4, 10), 2: (10, 10, 20)})
+    calc_dvhs(dataset_rtss, dataset_rtdose, dvh_cache)
+
+    # Only the DVH that has just been calculated is kept
+    dvh_cache.max_size = 1
+    calc_dvhs(create_rtss({3: (2, 20, 12)}), dataset_rtdose, dvh_cache)
+
+    count_dvh_calls.clear()
+    calc_dvhs(create_rtss({1: (4, 4, 10), 2: (10, 10, 20), 3: (2, 20, 12)}),
+              dataset_rtdose, dvh_cache)
+    assert sorted(count_dvh_calls) == [1, 2]
@@ -0,0 +1,138 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+from dicompylercore import dvh
+
+from dicom_builders import create_dose, create_rtss
+from src.Model import DVHEngine, ImageLoading
+from src.Model.DVHEngine import calc_dvhs_in_pool
+from src.Model.PatientDictContainer import PatientDictContainer
+
+
+def get_square_dvh(rtss, dose, roi, limit=None, thickness=None):
+    """
+    Stands in for dicompylercore's DVH calculation: returns a DVH of the
+    maximum dose inside the ROI's square, read from the dose grid, and the
+    process it was calculated in.
+    """
+    roi_contour = next(roi_contour for roi_contour in rtss.ROIContourSequence
+                       if roi_contour.ReferencedROINumber == roi)
+    x, y = roi_contour.ContourSequence[0].ContourData[0:2]
+    size = roi_contour.ContourSequence[0].ContourData[3] - x
+    dose_grid = np.frombuffer(dose.PixelData, dtype=np.uint16).reshape(
+        dose.NumberOfFrames, dose.Rows, dose.Columns)
+    square = dose_grid[:, int(y) // 2:int(y + size) // 2,
+                       int(x) // 2:int(x + size) // 2]
+    max_dose = float(square.max()) * float(dose.DoseGridScaling)
+    counts = np.linspace(10, 0, int(max_dose * 100) + 1)
+    return dvh.DVH(counts, np.arange(len(counts) + 1) / 100,
+                   name="ROI %s" % roi, notes=str(os.getpid()))
+
+
+def calc_square_dvh_task(roi, thickness, dose_limit=None):
+    """
+    Stands in for DVHEngine.calc_dvh_task. The worker processes are
+    spawned, so they import it from this module rather than seeing a
+    replaced dvhcalc.get_dvh.
+    """
+    return roi, get_square_dvh(DVHEngine._worker_datasets["rtss"],
+                               DVHEngine._worker_datasets["rtdose"], roi,
+                               dose_limit, thickness)
+
+
+@pytest.fixture(autouse=True)
+def square_dvh(monkeypatch):
+    monkeypatch.setattr(DVHEngine, "calc_dvh_task", calc_square_dvh_task)
+    # For DVHs calculated in this process
+    monkeypatch.setattr(DVHEngine.dvhcalc, "get_dvh", get_square_dvh)
+    # The pool is only used for dose grids the vectorised engine does not
+    # support
+    monkeypatch.setattr(ImageLoading, "is_supported_dose", lambda _: False)
+
+
+def test_pool_matches_serial_calculation():
+    dataset_rtdose = create_dose()
+    squares = {1: (4, 4, 10), 2: (10, 10, 20), 3: (2, 20, 12),
+               4: (20, 0, 6)}
+    dataset_rtss = create_rtss(squares)
+
+    dict_dvh, interrupted = calc_dvhs_in_pool(
+        dataset_rtss, dataset_rtdose, list(squares), {}, max_workers=2)
+
+    assert not interrupted
+    assert sorted(dict_dvh) == [1, 2, 3, 4]
+    for roi, roi_dvh in dict_dvh.items():
+        expected = get_square_dvh(dataset_rtss, dataset_rtdose, roi)
+        assert np.array_equal(roi_dvh.counts, expected.counts)
+        # Calculated in a worker process
+        assert roi_dvh.notes != str(os.getpid())
+
+
+def test_largest_rois_are_calculated_first():
+    dataset_rtdose = create_dose()
+    dataset_rtss = create_rtss({1: (4, 4, 10), 2: (10, 10, 20)})
+    # ROI 2 has twice the contour points of ROI 1
+    extra_contour = dataset_rtss.ROIContourSequence[1].ContourSequence
+    extra_contour.extend(extra_contour)
+
+    results = []
+    calc_dvhs_in_pool(dataset_rtss, dataset_rtdose, [1, 2], {},
+                      result_callback=lambda roi, _, completed, total:
+                      results.append((roi, completed, total)),
+                      max_workers=1)
+    assert results == [(2, 1, 2), (1, 2, 2)]
+
+
+def test_interrupt_stops_calculation():
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+
+    dict_dvh, interrupted = calc_dvhs_in_pool(
+        create_rtss({1: (4, 4, 10)}), create_dose(), [1], {},
+        interrupt_flag=interrupt_flag)
+
+    assert interrupted
+    assert dict_dvh == {}
+
+
+def test_rtss_changes_are_dropped_with_the_structure_set():
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.set_initial_values(None, {}, {})
+    patient_dict_container.set("rtss_changes", {"added": [1], "modified": [],
+                                                "removed": []})
+
+    patient_dict_container.set("dataset_rtss", create_rtss({}))
+
+    assert patient_dict_container.get("rtss_changes") is None
+    patient_dict_container.clear()
+
+
+def test_only_changed_rois_are_recalculated():
+    dataset_rtdose = create_dose()
+    squares = {1: (4, 4, 10), 2: (10, 10, 20), 3: (2, 20, 12)}
+    dataset_rtss = create_rtss(squares)
+    raw_dvh = ImageLoading.multi_calc_dvh(
+        dataset_rtss, dataset_rtdose, ImageLoading.get_roi_info(dataset_rtss),
+        {})
+    dvh_x_y = ImageLoading.converge_to_0_dvh(raw_dvh)
+    dvh_roi_hashes = ImageLoading.get_dvh_roi_hashes(dataset_rtss, raw_dvh)
+
+    # Move ROI 2, remove ROI 3 and add ROI 4
+    squares[2] = (20, 10, 12)
+    del squares[3]
+    squares[4] = (20, 0, 6)
+    dataset_rtss = create_rtss(squares)
+    rtss_changes = ImageLoading.get_rtss_changes(dvh_roi_hashes,
+                                                 dataset_rtss)
+    assert rtss_changes == {"added": [4], "modified": [2], "removed": [3]}
+
+    new_raw_dvh, new_dvh_x_y = ImageLoading.calc_changed_dvhs(
+        dataset_rtss, dataset_rtdose, {}, raw_dvh, dvh_x_y, rtss_changes)
+
+    assert sorted(new_raw_dvh) == sorted(new_dvh_x_y) == [1, 2, 4]
+    assert new_raw_dvh[1] is raw_dvh[1]
+    for roi in (2, 4):
+        expected = get_square_dvh(dataset_rtss, dataset_rtdose, roi)
+        assert np.array_equal(new_raw_dvh[roi].counts, expected.counts)
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from dicompylercore.dvh import DVH
+
+from src.Model.CalculateDVHs import dvh2pandas
+from src.Model.DVHMetrics import DVH_PERCENTAGES, get_dose_at_volumes, \
+    get_dvh_metrics
+
+
+def create_dvh(counts, name):
+    counts = np.asarray(counts, dtype=float)
+    return DVH(counts, np.arange(len(counts) + 1) * 0.01,
+               dvh_type='cumulative', name=name)
+
+
+def test_dose_is_interpolated_within_bins():
+    counts = [100, 100, 50, 50, 50, 0]
+
+    doses = get_dose_at_volumes(counts, [100, 75, 50, 25, 0])
+
+    np.testing.assert_allclose(doses, [1, 1.5, 4, 4.5, 5])
+
+
+def test_dose_of_volumes_outside_the_dvh():
+    counts = [80, 40, 20]
+
+    doses = get_dose_at_volumes(counts, [100, 80, 10])
+
+    assert np.isnan(doses[0])
+    np.testing.assert_allclose(doses[1:], [0, 2])
+    assert np.isnan(get_dose_at_volumes([], [50])).all()
+
+
+def test_dose_matches_the_dvh_of_every_step():
+    dvh = create_dvh(np.linspace(100, 0, 7001) ** 2 / 100, "GTV")
+    counts = dvh.relative_volume.counts
+
+    doses = get_dose_at_volumes(counts)
+
+    assert doses.shape == DVH_PERCENTAGES.shape
+    assert (np.diff(doses) >= 0).all()
+    # The DVH at each dose is the relative volume of the step
+    np.testing.assert_allclose(
+        np.interp(doses, np.arange(len(counts)), counts), DVH_PERCENTAGES,
+        atol=1e-6)
+
+
+def test_metrics_table_of_every_roi():
+    dict_dvh = {
+        1: create_dvh(np.linspace(1000, 0, 4001), "GTV"),
+        2: create_dvh([2, 1, 0], "Cord"),
+        3: create_dvh([], "Empty"),
+    }
+
+    table = get_dvh_metrics(dict_dvh, "DVHMetrics")
+
+    assert list(table.columns[:2]) == ['ROI', 'Volume (mL)']
+    assert list(table.columns[2:]) \
+        == [str(percent) + '%' for percent in DVH_PERCENTAGES]
+    assert list(table.index) == ["DVHMetrics"] * 3
+    assert list(table['ROI']) == ["GTV", "Cord", "Empty"]
+    assert list(table['Volume (mL)']) == [1000.0, 2.0, 0.0]
+    assert list(table.iloc[0][['100.0%', '50.0%', '0.0%']]) == [0, 2000, 4000]
+    assert list(table.iloc[1][['100.0%', '75.0%', '50.0%']]) == [0, 0, 1]
+    assert table.iloc[2, 2:].isna().all()
+    assert dvh2pandas(dict_dvh, "DVHMetrics").equals(table)
+
+
+def test_metrics_table_is_appended_to_csv(tmp_path):
+    csv_path = tmp_path.joinpath("DVHs.csv")
+    for index in range(2):
+        table = get_dvh_metrics(
+            {1: create_dvh([100, 0], "ROI " + str(index))}, index)
+        table.to_csv(csv_path, mode='a', header=index == 0)
+
+    csv_table = pd.read_csv(csv_path)
+    assert list(csv_table['ROI']) == ["ROI 0", "ROI 1"]
+    assert list(csv_table['100.0%']) == [0, 0]
+    assert list(csv_table['0.0%']) == [1, 1]
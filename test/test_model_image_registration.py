@@ -0,0 +1,87 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+import SimpleITK as sitk
+
+from src.Model import ImageRegistration
+from src.Model.ImageRegistration import DEFAULT_REGISTRATION_SETTINGS, \
+    get_registration_settings, register
+
+
+def create_image():
+    z, y, x = np.mgrid[:16, :48, :48]
+    array = np.full(z.shape, -1000, dtype=np.int16)
+    array[((x - 24) / 14) ** 2 + ((y - 22) / 10) ** 2
+          + ((z - 8) / 5) ** 2 < 1] = 0
+    array[((x - 30) / 4) ** 2 + ((y - 26) / 4) ** 2
+          + ((z - 7) / 3) ** 2 < 1] = 600
+    image = sitk.GetImageFromArray(array)
+    image.SetSpacing((2.0, 2.0, 3.0))
+    return image
+
+
+@pytest.fixture
+def images():
+    fixed_image = create_image()
+    moving_image = sitk.Resample(
+        fixed_image, sitk.TranslationTransform(3, (4.0, -2.0, 0.0)),
+        sitk.sitkLinear, -1000)
+    return fixed_image, moving_image
+
+
+@pytest.fixture
+def settings():
+    return dict(DEFAULT_REGISTRATION_SETTINGS, reg_method="translation",
+                shrink_factors=[2, 1], smooth_sigmas=[2, 0],
+                number_of_iterations=20, number_of_threads=2,
+                preview_interval=5)
+
+
+def test_registration_streams_transforms(images, settings):
+    fixed_image, moving_image = images
+    previews = []
+
+    def transform_callback(transform, level, iteration):
+        assert isinstance(transform, sitk.CompositeTransform)
+        previews.append((level, iteration))
+
+    registered_image, transform = register(
+        fixed_image, moving_image, settings,
+        transform_callback=transform_callback)
+
+    assert registered_image.GetSize() == fixed_image.GetSize()
+    assert registered_image.GetPixelID() == moving_image.GetPixelID()
+    assert {level for level, _ in previews} == {0, 1}
+    assert all(iteration % 5 == 0 for _, iteration in previews)
+    # The moving image was shifted by (-4, 2) mm in plane. The few slices
+    # of the image do not place it as closely along z.
+    assert np.allclose(transform.TransformPoint((0, 0, 0))[:2], (-4, 2),
+                       atol=0.5)
+
+
+def test_interrupted_registration_returns_none(images, settings):
+    interrupt_flag = threading.Event()
+    previews = []
+
+    def transform_callback(transform, level, iteration):
+        previews.append(iteration)
+        interrupt_flag.set()
+
+    assert register(*images, settings, interrupt_flag,
+                    transform_callback) is None
+    assert previews == [0]
+
+
+def test_settings_default_missing_keys(tmp_path, monkeypatch):
+    with open(tmp_path / "imageFusion.json", "w") as file_output:
+        json.dump({"shrink_factors": [8, 4], "smooth_sigmas": [4, 2]},
+                  file_output)
+    monkeypatch.setattr(ImageRegistration, "data_path",
+                        lambda name: str(tmp_path / name))
+
+    settings = get_registration_settings()
+    assert settings["shrink_factors"] == [8, 4]
+    assert settings["sampling_strategy"] == "random"
+    assert settings.keys() == DEFAULT_REGISTRATION_SETTINGS.keys()
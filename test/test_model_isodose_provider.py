@@ -0,0 +1,62 @@
+import numpy as np
+from pydicom.dataset import Dataset
+from skimage import measure
+
+from dicom_builders import add_file_meta, create_dose
+from src.Model.Isodose import get_dose_grid
+from src.Model.IsodoseProvider import IsodoseProvider, get_isodose_provider
+from src.Model.PatientDictContainer import PatientDictContainer
+
+
+def create_random_dose():
+    dataset_rtdose = add_file_meta(create_dose(frames=6, rows=30,
+                                               columns=40))
+    dataset_rtdose.PixelData = np.random.default_rng(0).integers(
+        0, 6000, size=(6, 30, 40), dtype=np.uint16).tobytes()
+    return dataset_rtdose
+
+
+def test_contours_match_dose_grid():
+    dataset_rtdose = create_random_dose()
+    # On a frame, between frames and past the last frame
+    slice_positions = [4, 5.2, 9.9, 40]
+    isodose_provider = IsodoseProvider(dataset_rtdose, slice_positions)
+
+    for index, z in enumerate(slice_positions):
+        expected = measure.find_contours(get_dose_grid(dataset_rtdose, z),
+                                         3000)
+        contours = isodose_provider.get_contours(index, 3000)
+        assert len(contours) == len(expected)
+        for contour, expected_contour in zip(contours, expected):
+            assert np.array_equal(contour, expected_contour)
+
+
+def test_contours_are_cached():
+    isodose_provider = IsodoseProvider(create_random_dose(), [4, 6],
+                                       cache_size=2)
+
+    contours = isodose_provider.get_contours(0, 3000)
+    assert isodose_provider.get_contours(0, 3000) is contours
+    isodose_provider.get_contours(0, 4000)
+    isodose_provider.get_contours(1, 3000)
+    assert list(isodose_provider._contours) == [(0, 4000), (1, 3000)]
+
+
+def test_provider_follows_rt_dose():
+    dataset = {index: Dataset() for index in range(3)}
+    for index in range(3):
+        dataset[index].ImagePositionPatient = [0, 0, 2 * index]
+    dataset['rtdose'] = create_random_dose()
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.clear()
+    patient_dict_container.set_initial_values(
+        None, dataset, {}, dict_uid={index: str(index) for index in range(3)})
+
+    isodose_provider = get_isodose_provider(patient_dict_container)
+    assert get_isodose_provider(patient_dict_container) is isodose_provider
+    assert len(isodose_provider.frames) == 3
+
+    dataset['rtdose'] = create_random_dose()
+    assert get_isodose_provider(patient_dict_container) \
+        is not isodose_provider
+    patient_dict_container.clear()
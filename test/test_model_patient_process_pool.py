@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+from src.Model.batchprocessing.PatientProcessPool import PATIENT_ERROR, \
+    PATIENT_INTERRUPT, PATIENT_SUCCESS, PATIENT_TIMEOUT, merge_csv_files, \
+    process_patients
+from src.Model.PatientDictContainer import PatientDictContainer
+
+
+def process_patient(patient_id, delay, interrupt_flag, progress_callback):
+    # Each patient has a container of its own
+    patient_dict_container = PatientDictContainer()
+    assert patient_dict_container.get("patient_id") is None
+    patient_dict_container.set_initial_values(None, {}, {})
+    patient_dict_container.set("patient_id", patient_id)
+
+    progress_callback.emit(("Processing", 50))
+    progress_callback.report(patient_id)
+    end_time = time.monotonic() + delay
+    while time.monotonic() < end_time:
+        if interrupt_flag.is_set():
+            return None
+        time.sleep(0.01)
+    if patient_id == "error":
+        raise ValueError("Patient could not be processed")
+    return {"patient": patient_dict_container.get("patient_id")}
+
+
+def get_process_id(patient_id, delay, interrupt_flag, progress_callback):
+    process_patient(patient_id, delay, interrupt_flag, progress_callback)
+    return os.getpid()
+
+
+def test_processes_are_reused_between_patients():
+    results = process_patients(
+        get_process_id, [(str(index), 0) for index in range(6)],
+        threading.Event(), worker_count=2)
+
+    assert all(status == PATIENT_SUCCESS for status, _ in results)
+    assert len({process_id for _, process_id in results}) <= 2
+    assert os.getpid() not in {process_id for _, process_id in results}
+
+
+def test_timed_out_process_is_replaced():
+    results = process_patients(
+        get_process_id, [("slow", 30), ("A", 0)], threading.Event(),
+        worker_count=1, timeout=2)
+
+    assert results[0] == (PATIENT_TIMEOUT, None)
+    assert results[1][0] == PATIENT_SUCCESS
+
+
+def test_results_are_in_patient_order():
+    progress = []
+    completed = []
+    results = process_patients(
+        process_patient, [("A", 0.5), ("B", 0), ("C", 0.1)],
+        threading.Event(), worker_count=3,
+        progress_callback=lambda index, value: progress.append(index),
+        completed_callback=lambda index, result, done, total:
+        completed.append((index, done, total)))
+
+    assert results == [(PATIENT_SUCCESS, {"patient": "A"}),
+                       (PATIENT_SUCCESS, {"patient": "B"}),
+                       (PATIENT_SUCCESS, {"patient": "C"})]
+    assert sorted(progress) == [0, 1, 2]
+    assert [done for _, done, _ in completed] == [1, 2, 3]
+    # The slowest patient finishes last
+    assert completed[-1][0] == 0
+
+
+def test_failed_and_slow_patients_do_not_stop_the_batch():
+    reports = []
+    results = process_patients(
+        process_patient, [("error", 0), ("slow", 30), ("D", 0)],
+        threading.Event(), worker_count=2, timeout=5,
+        report_callback=lambda index, value: reports.append((index, value)))
+
+    assert results == [(PATIENT_ERROR, None), (PATIENT_TIMEOUT, None),
+                       (PATIENT_SUCCESS, {"patient": "D"})]
+    # What the patients reported before they failed is kept
+    assert sorted(reports) == [(0, "error"), (1, "slow"), (2, "D")]
+
+
+def test_interrupted_batch_stops_every_patient():
+    interrupt_flag = threading.Event()
+    timer = threading.Timer(0.5, interrupt_flag.set)
+    timer.start()
+    start_time = time.monotonic()
+    results = process_patients(
+        process_patient, [("A", 30), ("B", 30), ("C", 0)],
+        interrupt_flag, worker_count=2)
+    timer.join()
+
+    assert time.monotonic() - start_time < 10
+    # Interrupted patients return early, and the last is never started
+    assert results == [(PATIENT_SUCCESS, None), (PATIENT_SUCCESS, None),
+                       (PATIENT_INTERRUPT, None)]
+
+
+def test_csv_files_are_appended_in_order(tmp_path):
+    for index in range(2):
+        csv_directory = tmp_path.joinpath("staging", str(index), "CSV")
+        csv_directory.mkdir(parents=True)
+        csv_directory.joinpath("DVHs.csv").write_text(
+            "Patient ID,ROI\n{0},GTV\n{0},CTV\n".format(index))
+
+    target_directory = tmp_path.joinpath("output")
+    for index in range(2):
+        merge_csv_files(tmp_path.joinpath("staging", str(index)),
+                        target_directory)
+    merge_csv_files(tmp_path.joinpath("staging", "missing"),
+                    target_directory)
+
+    assert target_directory.joinpath("CSV", "DVHs.csv").read_text() \
+        == "Patient ID,ROI\n0,GTV\n0,CTV\n1,GTV\n1,CTV\n"
+
+
+def test_only_the_given_csv_files_are_appended(tmp_path):
+    staging_directory = tmp_path.joinpath("staging")
+    staging_directory.mkdir()
+    for name in ("DVHs.csv", "PyRadiomics.csv"):
+        staging_directory.joinpath(name).write_text("Patient ID\nA\n")
+
+    target_directory = tmp_path.joinpath("output")
+    merge_csv_files(staging_directory, target_directory,
+                    [staging_directory.joinpath("DVHs.csv")])
+
+    assert target_directory.joinpath("DVHs.csv").read_text() \
+        == "Patient ID\nA\n"
+    assert not target_directory.joinpath("PyRadiomics.csv").exists()
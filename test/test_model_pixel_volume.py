@@ -0,0 +1,160 @@
+import numpy as np
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, RLELossless, generate_uid
+
+from src.Model import ImageLoading
+from src.Model.CalculateImages import convert_raw_data
+from src.Model.PixelVolume import LazySliceDataset, PixelVolume
+
+
+def write_ct_series(directory, slices=4, rows=64, columns=48,
+                    compressed=False):
+    """
+    Writes a small axial CT series with a known pixel pattern.
+    :return: List of file paths, and the stored pixel values ordered by
+        ImageLoading's slice order (descending z).
+    """
+    study_uid = generate_uid()
+    series_uid = generate_uid()
+    file_paths = []
+    stored = []
+    for i in range(slices):
+        pixels = (np.arange(rows * columns, dtype=np.int16)
+                  .reshape(rows, columns) + 100 * i)
+        ds = Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+        ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+        ds.SOPInstanceUID = generate_uid()
+        ds.file_meta.MediaStorageSOPInstanceUID = ds.SOPInstanceUID
+        ds.Modality = "CT"
+        ds.PatientID = "P1"
+        ds.StudyID = "1"
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.ImagePositionPatient = [0, 0, 2.5 * i]
+        ds.PixelSpacing = [1, 1]
+        ds.SliceThickness = 2.5
+        ds.RescaleSlope = 2
+        ds.RescaleIntercept = -1024
+        ds.Rows = rows
+        ds.Columns = columns
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.PixelData = pixels.tobytes()
+        if compressed:
+            ds.compress(RLELossless, encoding_plugin="pydicom")
+        file_path = str(directory.joinpath("ct%s.dcm" % i))
+        ds.save_as(file_path, enforce_file_format=True)
+        file_paths.append(file_path)
+        stored.append(pixels)
+    return file_paths, stored[::-1]
+
+
+@pytest.mark.parametrize("compressed", [False, True])
+def test_lazy_datasets_decode_on_demand(tmp_path, compressed):
+    file_paths, stored = write_ct_series(tmp_path, compressed=compressed)
+    read_data_dict, _ = ImageLoading.get_datasets(file_paths,
+                                                  lazy_pixels=True)
+
+    assert isinstance(read_data_dict[0], LazySliceDataset)
+    pixel_volume = read_data_dict[0].pixel_volume
+    assert isinstance(pixel_volume, PixelVolume)
+    assert not pixel_volume.loaded.any()
+
+    # Only the requested slice is decoded
+    assert np.array_equal(read_data_dict[2].pixel_array, stored[2])
+    assert pixel_volume.loaded.tolist() == [False, False, True, False]
+
+
+def test_lazy_convert_raw_data_matches_eager(tmp_path):
+    file_paths, _ = write_ct_series(tmp_path)
+    eager_dict, _ = ImageLoading.get_datasets(file_paths)
+    lazy_dict, _ = ImageLoading.get_datasets(file_paths, lazy_pixels=True)
+
+    # Decode one slice before the rescale is set, to check it is rescaled
+    # in place
+    lazy_dict[1].pixel_array
+
+    eager_pixels = convert_raw_data(eager_dict, False, True)
+    lazy_pixels = convert_raw_data(lazy_dict, False, True)
+
+    assert len(lazy_pixels) == len(eager_pixels)
+    assert np.allclose(np.asarray(lazy_pixels), np.array(eager_pixels))
+    for key in range(len(eager_pixels)):
+        assert np.allclose(lazy_dict[key].pixel_array,
+                           eager_dict[key].pixel_array)
+
+
+def test_slice_decoded_during_rescale_is_kept(tmp_path, monkeypatch):
+    file_paths, stored = write_ct_series(tmp_path, slices=2)
+    read_data_dict, _ = ImageLoading.get_datasets(file_paths,
+                                                  lazy_pixels=True)
+    pixel_volume = read_data_dict[0].pixel_volume
+    allocate = pixel_volume.allocate
+
+    def allocate_then_rescale():
+        volume = allocate()
+        # Another thread sets the rescale before the slice is stored
+        pixel_volume.set_rescale([2, 2], [0, 0])
+        return volume
+
+    monkeypatch.setattr(pixel_volume, "allocate", allocate_then_rescale)
+    pixel_volume.load_slice(0)
+
+    assert np.array_equal(pixel_volume.volume[0], stored[0] * 2)
+
+
+def test_convert_raw_data_rescales_volume(tmp_path):
+    file_paths, stored = write_ct_series(tmp_path, compressed=True)
+    read_data_dict, _ = ImageLoading.get_datasets(file_paths)
+
+    np_pixels = convert_raw_data(read_data_dict, False, True)
+
+    # Slope 2, intercept -1024 plus the CT rescale intercept of 1024
+    assert isinstance(np_pixels, np.ndarray)
+    assert np_pixels.dtype == np.float32
+    assert np.array_equal(np_pixels, np.array(stored) * 2)
+    assert np.shares_memory(read_data_dict[0].pixel_array, np_pixels)
+
+
+def test_lazy_datasets_read_rt_files_once(tmp_path, monkeypatch):
+    file_paths, _ = write_ct_series(tmp_path, slices=2)
+    rtss = Dataset()
+    rtss.file_meta = FileMetaDataset()
+    rtss.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    rtss.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.481.3"
+    rtss.SOPClassUID = "1.2.840.10008.5.1.4.1.1.481.3"
+    rtss.SOPInstanceUID = generate_uid()
+    rtss.file_meta.MediaStorageSOPInstanceUID = rtss.SOPInstanceUID
+    rtss.Modality = "RTSTRUCT"
+    rtss.StudyID = "1"
+    # Larger than the size deferred in lazy mode
+    rtss.ImageComments = "A" * 4096
+    rtss_path = str(tmp_path.joinpath("rtss.dcm"))
+    rtss.save_as(rtss_path, enforce_file_format=True)
+
+    read_files = []
+    dcmread = ImageLoading.dcmread
+
+    def counting_read(file, **kwargs):
+        read_files.append((file, kwargs.get("defer_size")))
+        return dcmread(file, **kwargs)
+
+    monkeypatch.setattr(ImageLoading, "dcmread", counting_read)
+    read_data_dict, _ = ImageLoading.get_datasets(file_paths + [rtss_path],
+                                                  lazy_pixels=True)
+
+    # Each file is read once, and only the slices are deferred
+    assert sorted(read_files) == sorted(
+        [(file_path, ImageLoading.LAZY_DEFER_SIZE)
+         for file_path in file_paths] + [(rtss_path, None)])
+    assert isinstance(read_data_dict[0], LazySliceDataset)
+    assert read_data_dict["rtss"].ImageComments == "A" * 4096
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from src.Model.PixmapProvider import PixmapProvider
+
+
+@pytest.fixture
+def pixmap_provider():
+    pixel_values = np.random.default_rng(0).integers(
+        -1000, 1000, size=(10, 32, 24)).astype(np.float32)
+    pixmap_aspect = {"axial": 1.0, "coronal": 2.0, "sagittal": 0.5}
+    return PixmapProvider(pixel_values, 400, 40, pixmap_aspect,
+                          cache_size=8, prefetch=1)
+
+
+def test_plane_lengths(pixmap_provider):
+    assert len(pixmap_provider.plane("axial")) == 10
+    assert len(pixmap_provider.plane("coronal")) == 32
+    assert len(pixmap_provider.plane("sagittal")) == 24
+    with pytest.raises(KeyError):
+        pixmap_provider.plane("axial")[10]
+
+
+def test_renders_on_demand_and_prefetches(pixmap_provider):
+    pixmap = pixmap_provider.plane("axial")[5]
+    assert not pixmap.isNull()
+    pixmap_provider.threadpool.waitForDone()
+
+    # The requested slice and its neighbours are cached, nothing else is
+    cached_slices = sorted(key[1] for key in pixmap_provider._cache)
+    assert cached_slices == [4, 5, 6]
+
+
+def test_window_change_and_eviction(pixmap_provider):
+    pixmap_provider.plane("coronal")[0]
+    pixmap_provider.set_window(1600, -300)
+    pixmap_provider.plane("coronal")[0]
+    pixmap_provider.threadpool.waitForDone()
+    windows = {key[2:4] for key in pixmap_provider._cache}
+    assert windows == {(400, 40), (1600, -300)}
+
+    for index in range(20):
+        pixmap_provider.plane("sagittal")[index]
+    pixmap_provider.threadpool.waitForDone()
+    assert len(pixmap_provider._cache) <= 8
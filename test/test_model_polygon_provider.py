@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from pydicom.dataset import Dataset
+
+from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.PolygonProvider import PolygonProvider
+from src.Model.ROI import calc_roi_polygon, get_roi_contour_pixel, \
+    transform_rois_contours
+
+
+def square(x, y, size, z):
+    return [x, y, z, x + size, y, z, x + size, y + size, z, x, y + size, z]
+
+
+def points(polygons):
+    return [[(point.x(), point.y()) for point in polygon]
+            for polygon in polygons]
+
+
+@pytest.fixture
+def polygon_provider():
+    """
+    A patient of 6 slices of 512 x 512 pixels of 1 mm, with two square
+    ROIs.
+    """
+    dataset = {}
+    for index in range(6):
+        dataset[index] = Dataset()
+        dataset[index].Rows = 512
+        dataset[index].Columns = 512
+    dict_uid = {index: "1.2.3.%s" % index for index in range(6)}
+    positions = np.arange(512, dtype=np.float64).tolist()
+    pixluts = {uid: [positions, positions] for uid in dict_uid.values()}
+    raw_contour = {
+        "Body": {dict_uid[index]: [square(10, 20, 100, index * 2)]
+                 for index in range(6)},
+        "Lung": {dict_uid[index]: [square(40, 50, 20, index * 2)]
+                 for index in range(2, 4)},
+    }
+
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.clear()
+    patient_dict_container.set_initial_values(
+        None, dataset, {}, dict_uid=dict_uid, pixluts=pixluts,
+        raw_contour=raw_contour, pixmaps_coronal=[None] * 512,
+        pixmaps_sagittal=[None] * 512,
+        pixmap_aspect={"axial": 1.0, "coronal": 2.0, "sagittal": 0.5})
+    provider = PolygonProvider(patient_dict_container, cache_size=16,
+                               prefetch=1)
+    yield provider
+    provider.threadpool.waitForDone()
+    patient_dict_container.clear()
+
+
+def test_axial_polygons_match_eager_calculation(polygon_provider):
+    polygon_provider.add_roi("Body")
+    raw_contour = polygon_provider.dict_container.get("raw_contour")
+    expected = get_roi_contour_pixel(
+        raw_contour, ["Body"], polygon_provider.dict_container.get("pixluts"))
+
+    polygons = polygon_provider.plane("axial")["Body"]["1.2.3.3"]
+    polygon_provider.threadpool.waitForDone()
+
+    assert points(polygons) \
+        == points(calc_roi_polygon("Body", "1.2.3.3", expected))
+    # Only the requested slice and its neighbours are calculated
+    assert sorted(key[2] for key in polygon_provider._cache) \
+        == ["1.2.3.2", "1.2.3.3", "1.2.3.4"]
+
+
+def test_coronal_polygons_match_eager_calculation(polygon_provider):
+    polygon_provider.add_roi("Lung")
+    raw_contour = polygon_provider.dict_container.get("raw_contour")
+    coronal, _ = transform_rois_contours(get_roi_contour_pixel(
+        raw_contour, ["Lung"], polygon_provider.dict_container.get("pixluts")))
+
+    for slice_id in (0, 45, 51, 60):
+        assert points(polygon_provider.plane("coronal")["Lung"][slice_id]) \
+            == points(calc_roi_polygon("Lung", slice_id, coronal, 2.0))
+
+
+def test_displayed_rois(polygon_provider):
+    axial = polygon_provider.plane("axial")
+    polygon_provider.add_roi("Body")
+    polygon_provider.add_roi("Lung")
+    polygon_provider.remove_roi("Body")
+
+    assert list(axial) == ["Lung"]
+    assert len(axial["Lung"]) == 6
+    with pytest.raises(KeyError):
+        axial["Body"]
+    with pytest.raises(KeyError):
+        axial["Lung"]["1.2.3.9"]
+
+
+def test_changed_contours_are_invalidated(polygon_provider):
+    polygon_provider.add_roi("Body")
+    polygon_provider.add_roi("Lung")
+    polygon_provider.plane("axial")["Body"]["1.2.3.0"]
+    old_polygons = polygon_provider.plane("axial")["Lung"]["1.2.3.2"]
+    polygon_provider.threadpool.waitForDone()
+
+    # Move the Lung contours
+    raw_contour = dict(polygon_provider.dict_container.get("raw_contour"))
+    raw_contour["Lung"] = {"1.2.3.2": [square(80, 50, 20, 4)]}
+    polygon_provider.dict_container.set("raw_contour", raw_contour)
+    polygon_provider.update_contours()
+
+    assert all(key[1] == "Body" for key in polygon_provider._cache)
+    new_polygons = polygon_provider.plane("axial")["Lung"]["1.2.3.2"]
+    assert points(new_polygons) != points(old_polygons)
@@ -14,7 +14,8 @@ from pydicom.tag import Tag
 from src.Model import ImageLoading
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.Model.ROI import add_to_roi, calculate_matrix, create_roi, roi_to_geometry, \
-    get_roi_contour_pixel, manipulate_rois, geometry_to_roi, create_initial_rtss_from_ct
+    get_roi_contour_pixel, manipulate_rois, geometry_to_roi, create_initial_rtss_from_ct, \
+    calculate_pixels, calculate_slice_pixels
 
 
 def find_DICOM_files(file_path):
@@ -278,3 +279,45 @@ def test_create_initial_rtss_from_ct(qtbot, test_object, init_config):
     # Checking type 1 sequence tags
     for tag in type_1_sequence_tags:
         assert (tag in rtss) is True
+
+
+def calculate_pixels_with_loops(pixlut, contour, prone=False, feetfirst=False):
+    """
+    Converts contour points to pixels one point at a time, the way the
+    vectorised conversion replaces.
+    """
+    np_x = np.array(pixlut[0])
+    np_y = np.array(pixlut[1])
+    pixels = []
+    for i in range(0, len(contour), 3):
+        if prone:
+            x = np.argmin(np_x < contour[i])
+            y = np.argmin(np_y < contour[i + 1])
+        elif feetfirst:
+            x = np.argmin(np_x < contour[i])
+            y = np.argmax(np_y > contour[i + 1])
+        else:
+            x = np.argmax(np_x > contour[i])
+            y = np.argmax(np_y > contour[i + 1])
+        pixels.append([x, y])
+    return pixels
+
+
+@pytest.mark.parametrize("prone, feetfirst",
+                         [(False, False), (False, True), (True, False)])
+@pytest.mark.parametrize("direction", [1, -1])
+def test_calculate_pixels_matches_point_loop(prone, feetfirst, direction):
+    rng = np.random.default_rng(0)
+    pixlut = (direction * (np.arange(64) * 0.75 - 20),
+              direction * (np.arange(48) * 0.75 - 10))
+    contour = rng.uniform(-40, 40, size=(500, 3))
+    # Points exactly on pixel positions
+    contour[:10, 0] = pixlut[0][10:20]
+    contour[:10, 1] = pixlut[1][10:20]
+    contour = contour.ravel().tolist()
+
+    expected = calculate_pixels_with_loops(pixlut, contour, prone, feetfirst)
+    assert calculate_pixels(pixlut, contour, prone, feetfirst) == expected
+    assert calculate_slice_pixels(
+        pixlut, [contour[:300], contour[300:]], prone, feetfirst) \
+        == [expected[:100], expected[100:]]
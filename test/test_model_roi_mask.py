@@ -0,0 +1,87 @@
+import numpy as np
+from matplotlib.path import Path
+
+from src.Model.ROIMask import ROIMask
+
+
+def rectangle(column, row, width, height):
+    return [[column, row], [column + width, row],
+            [column + width, row + height], [column, row + height]]
+
+
+def u_shape(column, row):
+    """
+    A U 30 pixels wide and 30 pixels high, open at the top, with a notch
+    10 pixels wide and 20 pixels deep.
+    """
+    return [[column, row], [column + 10, row], [column + 10, row + 20],
+            [column + 20, row + 20], [column + 20, row],
+            [column + 30, row], [column + 30, row + 30],
+            [column, row + 30]]
+
+
+def create_mask(slice_contours, shape=(10, 100, 80)):
+    """
+    :param slice_contours: Dictionary of slice index to the contours on
+        the slice.
+    """
+    slice_indices = {"1.2.3.%s" % index: index for index in range(shape[0])}
+    contour_pixels = {"1.2.3.%s" % index: contours
+                      for index, contours in slice_contours.items()}
+    return ROIMask.from_contour_pixels(contour_pixels, slice_indices, shape)
+
+
+def test_planes_of_mask():
+    roi_mask = create_mask({index: [rectangle(10, 20, 30, 40)]
+                            for index in range(2, 7)})
+
+    # Cropped to the bounding box and packed 8 columns to a byte
+    assert roi_mask.offset == (2, 20, 10)
+    assert roi_mask.size == (5, 41, 31)
+    assert roi_mask.packed.shape == (5, 41, 4)
+
+    coronal = roi_mask.plane("coronal", 30)
+    assert coronal.shape == (5, 31) and coronal.all()
+    sagittal = roi_mask.plane("sagittal", 17)
+    assert sagittal.shape == (5, 41) and sagittal.all()
+    assert roi_mask.plane("coronal", 61) is None
+    assert roi_mask.plane_contours("sagittal", 5) == []
+
+
+def test_outline_follows_pixel_edges():
+    roi_mask = create_mask({index: [rectangle(10, 20, 30, 40)]
+                            for index in range(2, 7)})
+
+    contours = roi_mask.plane_contours("coronal", 30)
+
+    assert len(contours) == 1
+    points = np.array(contours[0])
+    assert points[:, 0].min() == 10 and points[:, 0].max() == 41
+    assert points[:, 1].min() == 2 and points[:, 1].max() == 7
+    assert sorted(roi_mask.outlines("coronal")) == list(range(20, 61))
+
+
+def test_concave_roi_keeps_its_notch():
+    # The U is the same on every slice, so its sagittal planes are U
+    # shaped too
+    roi_mask = create_mask({index: [u_shape(20, 30)]
+                            for index in range(10)},
+                           shape=(10, 100, 80))
+    slices = roi_mask.plane("sagittal", 35)
+    assert not slices[:, 11:19].any()
+
+    # Across the notch, the coronal plane has one outline per arm of the U
+    contours = roi_mask.plane_contours("coronal", 40)
+    assert len(contours) == 2
+    for contour in contours:
+        assert not Path(contour).contains_point((35, 5))
+
+
+def test_holes_are_cut_out():
+    roi_mask = create_mask({index: [rectangle(10, 10, 40, 40),
+                                    rectangle(20, 20, 20, 20)]
+                            for index in range(3, 6)})
+
+    assert not roi_mask.plane("coronal", 30)[:, 12:29].any()
+    # An outline on each side of the hole
+    assert len(roi_mask.plane_contours("sagittal", 30)) == 2
@@ -0,0 +1,109 @@
+import numpy as np
+from pydicom.dataset import Dataset
+from pydicom.uid import generate_uid
+
+from dicom_builders import create_rtss
+from src.Model import ImageLoading, ROI
+from src.Model.RTSSModel import RTSSModel
+
+
+def create_image(z=2):
+    """
+    Creates the data set of a CT image for contours to reference.
+    """
+    ds = Dataset()
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    ds.SOPInstanceUID = generate_uid()
+    ds.FrameOfReferenceUID = generate_uid()
+    ds.SliceLocation = z
+    return ds
+
+
+def square(x, y, size, z, closed=True):
+    """
+    :return: Flat list of the coordinates of a square contour, which
+        repeats its first point at the end if it is closed.
+    """
+    points = [x, y, z, x + size, y, z, x + size, y + size, z, x, y + size, z]
+    return points + points[0:3] if closed else points
+
+
+def test_add_contours_to_new_roi():
+    rtss = create_rtss({1: (4, 4, 10), 2: (10, 10, 20)})
+    image = create_image()
+    rtss_model = RTSSModel(rtss)
+
+    roi_number = rtss_model.add_contours(
+        "ISO 50", [{'coords': square(0, 0, 5, 2), 'ds': image},
+                   {'coords': square(0, 0, 5, 4, closed=False), 'ds': image}],
+        "DOSE_REGION")
+
+    assert roi_number == 3
+    # Contours are only written to the dataset when it is saved
+    assert len(rtss.ROIContourSequence[2].ContourSequence) == 0
+    rtss = rtss_model.to_dataset()
+
+    assert rtss.StructureSetROISequence[2].ROIName == "ISO 50"
+    assert rtss.StructureSetROISequence[2].ReferencedFrameOfReferenceUID \
+        == rtss.StructureSetROISequence[0].ReferencedFrameOfReferenceUID
+    assert rtss.RTROIObservationsSequence[2].RTROIInterpretedType \
+        == "DOSE_REGION"
+    contours = rtss.ROIContourSequence[2].ContourSequence
+    assert [contour.ContourNumber for contour in contours] == [1, 2]
+    assert contours[0].ContourGeometricType == "CLOSED_PLANAR"
+    assert contours[0].NumberOfContourPoints == 4
+    assert np.allclose(contours[0].ContourData, square(0, 0, 5, 2, False))
+    assert contours[1].ContourGeometricType == "OPEN_PLANAR"
+    assert contours[0].ContourImageSequence[0].ReferencedSOPInstanceUID \
+        == image.SOPInstanceUID
+    assert rtss_model.get_roi_info() == ImageLoading.get_roi_info(rtss)
+
+
+def test_add_contours_to_existing_roi():
+    rtss = create_rtss({1: (4, 4, 10), 2: (10, 10, 20)})
+    rtss_model = RTSSModel(rtss)
+
+    assert rtss_model.add_contours(
+        "ROI 2", [{'coords': square(0, 0, 5, 8), 'ds': create_image(8)}]) == 2
+    rtss = rtss_model.to_dataset()
+
+    assert len(rtss.StructureSetROISequence) == 2
+    contours = rtss.ROIContourSequence[1].ContourSequence
+    assert len(contours) == 4
+    assert contours[3].ContourNumber == 4
+
+
+def test_delete_roi():
+    rtss = create_rtss({1: (4, 4, 10), 2: (10, 10, 20), 3: (2, 20, 12)})
+    rtss_model = RTSSModel(rtss)
+
+    assert rtss_model.delete_roi("ROI 2")
+    assert not rtss_model.delete_roi("ROI 2")
+    # A new ROI never reuses the number of a remaining ROI
+    assert rtss_model.add_contours(
+        "ROI 2", [{'coords': square(0, 0, 5, 2), 'ds': create_image()}]) == 4
+    rtss = rtss_model.to_dataset()
+
+    assert [roi.ROINumber for roi in rtss.StructureSetROISequence] \
+        == [1, 3, 4]
+    assert [roi.ReferencedROINumber for roi in rtss.ROIContourSequence] \
+        == [1, 3, 4]
+    assert [roi.ReferencedROINumber
+            for roi in rtss.RTROIObservationsSequence] == [1, 3, 4]
+    assert rtss_model.get_roi_info() == ImageLoading.get_roi_info(rtss)
+
+
+def test_create_roi_in_empty_rtss():
+    rtss = create_rtss({})
+    image = create_image()
+    roi_list = [{'coords': square(0, 0, 5, z), 'ds': image}
+                for z in range(0, 200, 2)]
+
+    rtss = ROI.create_roi(rtss, "Body", roi_list)
+    rtss = ROI.create_roi(rtss, "Body", roi_list[0:1])
+
+    assert len(rtss.StructureSetROISequence) == 1
+    assert rtss.StructureSetROISequence[0].ROINumber == 1
+    assert rtss.StructureSetROISequence[0].ReferencedFrameOfReferenceUID \
+        == image.FrameOfReferenceUID
+    assert len(rtss.ROIContourSequence[0].ContourSequence) == 101
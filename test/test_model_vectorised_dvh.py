@@ -0,0 +1,243 @@
+import threading
+
+import numpy as np
+import pydicom
+import pydicom.dicomio
+import pytest
+from dicompylercore import dvhcalc
+from pydicom.dataset import Dataset
+from pydicom.sequence import Sequence
+from pydicom.uid import generate_uid
+
+from dicom_builders import add_file_meta, create_dose, create_rtss
+from src.Model import ImageLoading
+from src.Model.DVHCache import DVHCache
+from src.Model.VectorisedDVH import calc_dvhs_vectorised
+
+
+def create_plan(seed=0):
+    """
+    Creates an RT Dose of random doses and an RT Struct of ROIs of
+    different sizes, some of them with holes and some of them reaching
+    past the end of the dose grid.
+    """
+    rng = np.random.default_rng(seed)
+    dataset_rtdose = add_file_meta(create_dose(frames=20, rows=40,
+                                               columns=50))
+    dataset_rtdose.ImagePositionPatient = [-50.3, -40.7, -10]
+    dataset_rtdose.PixelSpacing = [2.5, 2.5]
+    dataset_rtdose.GridFrameOffsetVector = [3 * i for i in range(20)]
+    dataset_rtdose.PixelData = rng.integers(
+        0, 6000, size=(20, 40, 50), dtype=np.uint16).tobytes()
+
+    dataset_rtss = add_file_meta(create_rtss({}))
+    angles = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+    for roi_number in range(1, 9):
+        roi = Dataset()
+        roi.ROINumber = roi_number
+        roi.ROIName = "ROI %s" % roi_number
+        roi.ReferencedFrameOfReferenceUID = generate_uid()
+        roi.ROIGenerationAlgorithm = "MANUAL"
+        dataset_rtss.StructureSetROISequence.append(roi)
+
+        roi_contour = Dataset()
+        roi_contour.ReferencedROINumber = roi_number
+        roi_contour.ContourSequence = Sequence()
+        center_x, center_y = rng.uniform(-20, 20, 2)
+        radius = rng.uniform(4, 25)
+        first_z = rng.uniform(-15, 40)
+        radii = [radius, radius / 3] if roi_number % 3 == 0 else [radius]
+        for plane in range(int(rng.integers(1, 12))):
+            for contour_radius in radii:
+                contour = Dataset()
+                contour.ContourGeometricType = "CLOSED_PLANAR"
+                contour.NumberOfContourPoints = len(angles)
+                contour.ContourData = np.column_stack((
+                    center_x + contour_radius * np.cos(angles),
+                    center_y + contour_radius * np.sin(angles),
+                    np.full(len(angles), round(first_z + 2.5 * plane, 2))
+                )).round(3).ravel().tolist()
+                roi_contour.ContourSequence.append(contour)
+        dataset_rtss.ROIContourSequence.append(roi_contour)
+    return dataset_rtss, dataset_rtdose
+
+
+def test_dvh_of_square_in_dose_gradient():
+    # Columns x = 4 to 12 mm inside the square have 2 to 6 Gy
+    dataset_rtss = create_rtss({1: (3, 3, 10)})
+
+    dataset_rtdose = add_file_meta(create_dose())
+
+    roi_dvh = calc_dvhs_vectorised(dataset_rtss, dataset_rtdose, [1], {})[1]
+
+    # 5 x 5 voxels of 2 x 2 mm on 3 planes 2 mm apart
+    assert roi_dvh.dvh_type == "cumulative"
+    assert roi_dvh.name == "ROI 1"
+    assert roi_dvh.volume == pytest.approx(0.6)
+    assert roi_dvh.min == pytest.approx(2, abs=0.01)
+    assert roi_dvh.max == pytest.approx(6, abs=0.01)
+    assert roi_dvh.mean == pytest.approx(4, abs=0.01)
+
+
+def test_dose_limit_and_thickness():
+    dataset_rtss = create_rtss({1: (3, 3, 10)})
+
+    dataset_rtdose = add_file_meta(create_dose())
+
+    roi_dvh = calc_dvhs_vectorised(dataset_rtss, dataset_rtdose, [1], {1: 4},
+                                   dose_limit=400)[1]
+
+    # Voxels above the limit are left out of the DVH
+    assert roi_dvh.max == pytest.approx(4, abs=0.01)
+    assert roi_dvh.volume == pytest.approx(0.72)
+
+
+def test_rois_outside_dose_grid():
+    dataset_rtss = create_rtss({1: (3, 3, 10), 2: (100, 100, 10)})
+    for contour in dataset_rtss.ROIContourSequence[0].ContourSequence:
+        points = np.reshape(contour.ContourData, (-1, 3))
+        points[:, 2] += 6
+        contour.ContourData = points.ravel().tolist()
+
+    dataset_rtdose = add_file_meta(create_dose())
+
+    dict_dvh = calc_dvhs_vectorised(dataset_rtss, dataset_rtdose, [1, 2], {})
+
+    # Only the planes at 8 and 10 mm are inside the dose grid
+    assert dict_dvh[1].volume == pytest.approx(0.6)
+    assert dict_dvh[1].notes.startswith("Dose grid does not encompass")
+    assert dict_dvh[2].notes == "Empty DVH"
+
+
+def test_interrupt_stops_calculation():
+    interrupt_flag = threading.Event()
+    interrupt_flag.set()
+
+    assert calc_dvhs_vectorised(create_rtss({1: (3, 3, 10)}),
+                                add_file_meta(create_dose()), [1], {},
+                                interrupt_flag=interrupt_flag) is None
+
+
+def test_dvhs_are_reported_as_they_are_calculated():
+    dataset_rtss, dataset_rtdose = create_plan()
+    interrupt_flag = threading.Event()
+    reported = []
+
+    def result_callback(roi, dvh):
+        reported.append(roi)
+        interrupt_flag.set()
+
+    # The first ROI is reported before the planes of the others are done
+    assert calc_dvhs_vectorised(dataset_rtss, dataset_rtdose, range(1, 9),
+                                {}, interrupt_flag=interrupt_flag,
+                                result_callback=result_callback) is None
+    assert 0 < len(reported) < 8
+
+
+def test_calculated_dvhs_are_cached(tmp_path, monkeypatch):
+    monkeypatch.setenv("USER_ONKODICOM_HIDDEN", str(tmp_path))
+    dvh_cache = DVHCache()
+    dataset_rtss, dataset_rtdose = create_plan()
+    rois = ImageLoading.get_roi_info(dataset_rtss)
+
+    first = ImageLoading.vectorised_calc_dvh(
+        dataset_rtss, dataset_rtdose, rois, {}, dvh_cache=dvh_cache)
+    monkeypatch.setattr(ImageLoading, "calc_dvhs_vectorised",
+                        lambda *args: pytest.fail("DVHs were recalculated"))
+    second = ImageLoading.vectorised_calc_dvh(
+        dataset_rtss, dataset_rtdose, rois, {}, dvh_cache=dvh_cache)
+
+    for roi in rois:
+        assert np.allclose(second[roi].counts, first[roi].counts)
+
+
+@pytest.fixture
+def pydicom_read_file(monkeypatch):
+    """
+    Released versions of dicompylercore import read_file, which pydicom 3
+    renamed to dcmread.
+    """
+    monkeypatch.setattr(pydicom.dicomio, "read_file", pydicom.dcmread,
+                        raising=False)
+
+
+def test_matches_dicompylercore(pydicom_read_file):
+    dataset_rtss, dataset_rtdose = create_plan()
+    expected = {roi: dvhcalc.get_dvh(dataset_rtss, dataset_rtdose, roi)
+                for roi in range(1, 9)}
+
+    dict_dvh = calc_dvhs_vectorised(dataset_rtss, dataset_rtdose,
+                                    range(1, 9), {})
+
+    for roi, expected_dvh in expected.items():
+        assert dict_dvh[roi].name == expected_dvh.name
+        assert dict_dvh[roi].notes == expected_dvh.notes
+        assert np.array_equal(dict_dvh[roi].bins, expected_dvh.bins)
+        assert np.allclose(dict_dvh[roi].counts, expected_dvh.counts)
+
+
+def test_calc_dvhs_use_the_vectorised_engine(monkeypatch):
+    dataset_rtss, dataset_rtdose = create_plan()
+    rois = ImageLoading.get_roi_info(dataset_rtss)
+    expected = calc_dvhs_vectorised(dataset_rtss, dataset_rtdose, rois, {})
+    monkeypatch.setattr(ImageLoading.dvhcalc, "get_dvh", lambda *args, **kw:
+                        pytest.fail("dicompylercore calculated a DVH"))
+    monkeypatch.setattr(ImageLoading, "calc_dvhs_in_pool", lambda *args:
+                        pytest.fail("The pool calculated a DVH"))
+
+    results = []
+    for dict_dvh in (
+            ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose, rois, {},
+                                   threading.Event()),
+            ImageLoading.multi_calc_dvh(
+                dataset_rtss, dataset_rtdose, rois, {},
+                result_callback=lambda roi, _, completed, total:
+                results.append((completed, total)))):
+        assert sorted(dict_dvh) == sorted(expected)
+        for roi, roi_dvh in dict_dvh.items():
+            assert np.array_equal(roi_dvh.counts, expected[roi].counts)
+    assert results == [(completed, 8) for completed in range(1, 9)]
+
+
+def test_unsupported_dose_falls_back_to_dicompylercore(monkeypatch):
+    dataset_rtss = create_rtss({1: (3, 3, 10)})
+    # A single frame dose grid, which the vectorised engine does not support
+    dataset_rtdose = add_file_meta(create_dose(frames=1))
+    del dataset_rtdose.GridFrameOffsetVector
+    calculated = []
+
+    def get_dvh(rtss, dose, roi, limit=None, thickness=None):
+        calculated.append(roi)
+        return "DVH"
+
+    monkeypatch.setattr(ImageLoading.dvhcalc, "get_dvh", get_dvh)
+    monkeypatch.setattr(ImageLoading, "calc_dvhs_vectorised", lambda *args:
+                        pytest.fail("The vectorised engine calculated a DVH"))
+
+    assert ImageLoading.calc_dvhs(
+        dataset_rtss, dataset_rtdose, ImageLoading.get_roi_info(dataset_rtss),
+        {}, threading.Event()) == {1: "DVH"}
+    assert calculated == [1]
+
+
+def test_only_unsupported_datasets_fall_back(monkeypatch):
+    dataset_rtss, dataset_rtdose = create_plan()
+    rois = ImageLoading.get_roi_info(dataset_rtss)
+    monkeypatch.setattr(ImageLoading.dvhcalc, "get_dvh",
+                        lambda *args, **kwargs: "DVH")
+
+    def calc_dvhs_vectorised(*args):
+        raise error
+
+    monkeypatch.setattr(ImageLoading, "calc_dvhs_vectorised",
+                        calc_dvhs_vectorised)
+    error = AttributeError("DoseGridScaling")
+    assert ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose, rois, {},
+                                  threading.Event()) \
+        == {roi: "DVH" for roi in rois}
+
+    # Other errors are not hidden by the fallback
+    error = MemoryError()
+    with pytest.raises(MemoryError):
+        ImageLoading.calc_dvhs(dataset_rtss, dataset_rtdose, rois, {},
+                               threading.Event())
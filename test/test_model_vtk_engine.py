@@ -0,0 +1,168 @@
+import numpy as np
+import pytest
+import SimpleITK as sitk
+import vtk
+from pydicom.dataset import Dataset
+from vtkmodules.util import numpy_support
+
+from src.Model.MovingDictContainer import MovingDictContainer
+from src.Model.PatientDictContainer import PatientDictContainer
+from src.Model.VTKEngine import VTKEngine
+
+
+def create_image(array, spacing):
+    image = vtk.vtkImageData()
+    image.SetDimensions(array.shape[2], array.shape[1], array.shape[0])
+    image.SetSpacing(*spacing)
+    image.GetPointData().SetScalars(
+        numpy_support.numpy_to_vtk(array.ravel(), deep=True))
+    producer = vtk.vtkImageChangeInformation()
+    producer.SetInputData(image)
+    producer.Update()
+    return producer
+
+
+@pytest.fixture
+def vtk_engine():
+    moving_dict_container = MovingDictContainer()
+    moving_dict_container.set_initial_values(None, {}, {})
+    rng = np.random.default_rng(0)
+    vtk_engine = VTKEngine()
+    vtk_engine.fixed_reader = create_image(
+        rng.integers(-1000, 1000, size=(12, 30, 40)).astype(np.int16),
+        (0.8, 0.8, 2.5))
+    vtk_engine.moving_reader = create_image(
+        rng.integers(-1000, 1000, size=(10, 36, 36)).astype(np.int16),
+        (1.0, 1.0, 3.0))
+    vtk_engine.undo = np.zeros(3)
+    vtk_engine.reslice3d.SetInputConnection(
+        vtk_engine.moving_reader.GetOutputPort())
+    vtk_engine._sync_reslice_output_to_fixed()
+    vtk_engine._wire_blend()
+    yield vtk_engine
+    moving_dict_container.clear()
+
+
+def volume_slice(image, orientation, slice_idx):
+    extent = image.GetExtent()
+    volume = numpy_support.vtk_to_numpy(
+        image.GetPointData().GetScalars()).reshape(
+        extent[5] - extent[4] + 1, extent[3] - extent[2] + 1,
+        extent[1] - extent[0] + 1)
+    if orientation == "axial":
+        return volume[slice_idx - extent[4]]
+    if orientation == "coronal":
+        return volume[:, slice_idx - extent[2]]
+    return volume[:, :, slice_idx - extent[0]]
+
+
+def test_slice_reslice_matches_volume_reslice(vtk_engine):
+    vtk_engine.set_translation(3.5, -2.0, 4.0)
+    vtk_engine.set_rotation_deg(5, -3, 10)
+
+    # The full reslice of the moving volume onto the fixed grid
+    vtk_engine.reslice3d.Update()
+    volume = vtk_engine.reslice3d.GetOutput()
+    for orientation, slice_idx in [("axial", 5), ("coronal", 12),
+                                   ("sagittal", 30)]:
+        image = vtk_engine.reslice_slice(orientation, slice_idx)
+        assert np.array_equal(
+            volume_slice(image, orientation, slice_idx),
+            volume_slice(volume, orientation, slice_idx))
+
+
+def test_slice_reslice_follows_transform(vtk_engine):
+    fixed_slice, moving_slice = vtk_engine.get_slice_numpy("axial", 4)
+    assert fixed_slice.shape == moving_slice.shape == (30, 40)
+
+    vtk_engine.set_translation(10, 0, 0)
+    _, moved_slice = vtk_engine.get_slice_numpy("axial", 4)
+    assert not np.array_equal(moving_slice, moved_slice)
+
+    vtk_engine.set_interpolation_linear(False)
+    image = vtk_engine.reslice_slice("axial", 4)
+    assert vtk_engine.reslice2d["axial"].GetInterpolationMode() \
+        == vtk_engine.reslice3d.GetInterpolationMode()
+    assert image.GetExtent()[4:] == (4, 4)
+
+
+def test_registration_transform_is_stored_for_roi_transfer(vtk_engine):
+    vtk_engine.undo = np.array([4.0, -6.0, 10.0])
+    initial_transform = sitk.Euler3DTransform(
+        (12.0, -20.0, 15.0), 0.0, 0.0, 0.0, (3.0, 1.0, -2.0))
+    transform = sitk.Euler3DTransform(
+        (12.0, -20.0, 15.0), 0.05, -0.03, 0.1, (-4.0, 2.5, 1.5))
+    registration_transform = sitk.CompositeTransform(
+        [initial_transform, transform])
+
+    vtk_engine.set_registration_transform(registration_transform)
+
+    # ROI transfer uses the transform the views show
+    tfm = MovingDictContainer().get("tfm")
+    for point in [(0, 0, 0), (50, -30, 20), (-80, 60, -40)]:
+        assert np.allclose(tfm.TransformPoint(point),
+                           registration_transform.TransformPoint(point),
+                           atol=1e-6)
+
+
+def test_affine_registration_transform_is_kept_for_roi_transfer(
+        vtk_engine):
+    transform = sitk.AffineTransform(3)
+    transform.SetMatrix((1.1, 0.05, 0.0, 0.0, 0.95, 0.0, 0.0, 0.0, 1.0))
+    transform.SetTranslation((-4.0, 2.5, 1.5))
+
+    vtk_engine.set_registration_transform(transform)
+
+    # The views show the rigid part, ROI transfer uses the whole transform
+    assert MovingDictContainer().get("tfm") is transform
+    rotation = np.reshape(vtk_engine.sitktransform.GetMatrix(), (3, 3))
+    assert np.allclose(rotation @ rotation.T, np.eye(3))
+
+
+def create_series(modality, slices=4):
+    dataset = {}
+    for index in range(slices):
+        dataset[index] = Dataset()
+        dataset[index].Modality = modality
+        dataset[index].PixelSpacing = [0.7, 0.9]
+        dataset[index].ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        # Sorted from the top of the stack down, as ImageLoading sorts them
+        dataset[index].ImagePositionPatient = [-100, -80, 30 - 2.5 * index]
+    return dataset
+
+
+@pytest.mark.parametrize("modality", ["CT", "MR"])
+def test_fixed_volume_is_loaded_from_container(modality):
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.clear()
+    patient_dict_container.set_initial_values(None, create_series(modality),
+                                              {})
+    pixel_values = np.random.default_rng(0).integers(
+        0, 2000, size=(4, 6, 5)).astype(np.float32)
+    patient_dict_container.set("pixel_values", pixel_values)
+
+    vtk_engine = VTKEngine()
+    assert vtk_engine.load_fixed_from_container()
+
+    image = vtk_engine.fixed_reader.GetOutput()
+    volume = numpy_support.vtk_to_numpy(
+        image.GetPointData().GetScalars()).reshape(4, 6, 5)
+    assert image.GetSpacing() == pytest.approx((0.9, 0.7, 2.5))
+    assert np.allclose(vtk_engine.fixed_matrix[:3, 3], [100, 80, 30])
+    if modality == "CT":
+        assert np.array_equal(volume, pixel_values - 1024)
+    else:
+        # Handed to VTK without a copy
+        assert np.shares_memory(volume, pixel_values)
+    assert vtk_engine.reslice3d.GetBackgroundLevel() == volume.min()
+    patient_dict_container.clear()
+
+
+def test_container_without_volume_is_not_loaded():
+    patient_dict_container = PatientDictContainer()
+    patient_dict_container.clear()
+    patient_dict_container.set_initial_values(None, create_series("PT"), {})
+    patient_dict_container.set("pixel_values", np.zeros((4, 6, 5)))
+
+    assert not VTKEngine().load_fixed_from_container()
+    patient_dict_container.clear()
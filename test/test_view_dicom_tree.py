@@ -4,8 +4,7 @@ import pytest
 from src.Controller.GUIController import MainWindow
 from src.Model.PatientDictContainer import PatientDictContainer
 from src.View.ImageLoader import ImageLoading
-from src.Model.GetPatientInfo import DicomTree
-
+from PySide6.QtCore import QModelIndex
 from pydicom import dcmread
 from pydicom.errors import InvalidDicomError
 from pathlib import Path
@@ -32,27 +31,38 @@ def get_dicom_files(directory):
     return dicom_files
 
 
-def recursive_search(dict_tree, parent):
+def recursive_search(model, dataset, parent=QModelIndex()):
     """
-    Recursive Function to test all rows match the data from the dictionary
-    :param dict_tree: The dictionary to be compared to
-    :param parent: Parent node of the DICOM Tree
+    Recursive Function to test all rows match the data from the dataset
+    :param model: The DicomTreeModel of the DICOM Tree
+    :param dataset: The dataset to be compared to
+    :param parent: Index of the parent node of the DICOM Tree
     """
-    count = 0  # Keep track of rows
-    for key in dict_tree:
-        value = dict_tree[key]  # get value from dict tree
-        if isinstance(value, type(dict_tree)):  # if dict_tree object in row
-            child = parent.child(count)
-            recursive_search(value, child)
+    elements = [element for element in dataset
+                if element.name != 'Pixel Data']
+    # Rows are only created when a node is expanded
+    while model.canFetchMore(parent):
+        model.fetchMore(parent)
+    assert model.rowCount(parent) == len(elements)
+
+    for row, element in enumerate(elements):
+        index = model.index(row, 0, parent)
+        assert index.data() == element.name
+        if element.VR == 'SQ':
+            while model.canFetchMore(index):
+                model.fetchMore(index)
+            assert model.rowCount(index) == len(element.value)
+            for item_row, item in enumerate(element.value):
+                item_index = model.index(item_row, 0, index)
+                assert item_index.data() == 'item ' + str(item_row)
+                recursive_search(model, item, item_index)
         else:
             # Check row matches
-            assert parent.child(count, 0).text() == key
-            assert parent.child(count, 1).text() == str(value[0])
-            assert parent.child(count, 2).text() == str(value[1])
-            assert parent.child(count, 3).text() == str(value[2])
-            assert parent.child(count, 4).text() == str(value[3])
-        count += 1
-    return count
+            assert model.index(row, 1, parent).data() == str(element.value)
+            assert model.index(row, 2, parent).data() == repr(element.tag)
+            assert model.index(row, 3, parent).data() == str(element.VM)
+            assert model.index(row, 4, parent).data() == str(element.VR)
+    return len(elements)
 
 
 class TestDICOMTreeTab:
@@ -124,35 +134,30 @@ def test_file_components(test_obj):
         test_obj.dicom_tree.item_selected(i)
         current_text = test_obj.dicom_tree.selector.currentText()
 
-        # Make New Tree to compare
+        # Dataset to compare the tree to
+        container = test_obj.dicom_tree.patient_dict_container
         if i > len(test_obj.dicom_tree.special_files):
             index = i - len(test_obj.dicom_tree.special_files) - 1
-            name = test_obj.dicom_tree.patient_dict_container.filepaths[index]
-            dicom_tree_slice = DicomTree(name)
-            dict_tree = dicom_tree_slice.dict
+            dataset = container.dataset[index]
             text = "Image Slice " + str(index + 1)
             assert current_text == text
 
         elif test_obj.dicom_tree.special_files[i - 1] == "rtss":
-            dict_tree = test_obj.dicom_tree.patient_dict_container.get(
-                "dict_dicom_tree_rtss")
+            dataset = container.get("dataset_rtss")
             assert current_text == "RT Structure Set"
 
         elif test_obj.dicom_tree.special_files[i - 1] == "rtdose":
-            dict_tree = test_obj.dicom_tree.patient_dict_container.get(
-                "dict_dicom_tree_rtdose")
+            dataset = container.dataset["rtdose"]
             assert current_text == "RT Dose"
 
         elif test_obj.dicom_tree.special_files[i - 1] == "rtplan":
-            dict_tree = test_obj.dicom_tree.patient_dict_container.get(
-                "dict_dicom_tree_rtplan")
+            dataset = container.dataset["rtplan"]
             assert current_text == "RT Plan"
 
         else:
-            dict_tree = None
+            dataset = None
             print("Error filename in update_tree function")
 
         # Loop Through Each Row
-        parent = test_obj.dicom_tree.model_tree.invisibleRootItem()
-        total_count = test_obj.dicom_tree.model_tree.rowCount()
-        assert recursive_search(dict_tree, parent) == total_count
+        model = test_obj.dicom_tree.model_tree
+        assert recursive_search(model, dataset) == model.rowCount()